@@ -305,6 +305,8 @@ struct VolatileBackendParams : public DatabaseBackendParams {
       DatabaseOverflowPolicy_t::EvictRandom};  // Policy to use in case an overflow has been
                                                // detected.
   double overflow_resolution_target{0.8};  // Target margin after applying overflow handling policy.
+  size_t overflow_sample_size{0};  // If > 0, hash map backends evict the least used / oldest of
+                                   // this many sampled entries instead of sorting the partition.
 
   inline size_t overflow_resolution_margin() const {
     const size_t margin = static_cast<size_t>(
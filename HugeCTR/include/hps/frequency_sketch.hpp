@@ -0,0 +1,75 @@
+/*
+ * Copyright (c) 2023, NVIDIA CORPORATION.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#pragma once
+
+#include <common.hpp>
+#include <cstdint>
+#include <vector>
+
+namespace HugeCTR {
+
+/**
+ * Estimates how often each key was seen recently (TinyLFU). Counts are kept in a count-min sketch
+ * with saturating 8-bit counters. All counters are halved every \p window increments, so that the
+ * estimates of keys which are no longer requested decay over time. Not thread-safe.
+ */
+class FrequencySketch final {
+ public:
+  HCTR_DISALLOW_COPY_AND_MOVE(FrequencySketch);
+
+  static constexpr uint32_t max_frequency{UINT8_MAX};
+
+  /**
+   * @param window Number of increments after which all counters are halved.
+   */
+  explicit FrequencySketch(size_t window);
+
+  size_t window() const { return window_; }
+
+  /**
+   * Counts one occurrence of a key.
+   *
+   * @param key The key (or hash of the key) that was seen.
+   *
+   * @return Estimated frequency of the key, including this occurrence.
+   */
+  uint32_t increment(uint64_t key);
+
+  /**
+   * @param key The key (or hash of the key) to look up.
+   *
+   * @return Estimated frequency of the key.
+   */
+  uint32_t estimate(uint64_t key) const;
+
+  /**
+   * Forget all keys.
+   */
+  void clear();
+
+ private:
+  static constexpr size_t num_rows_{4};
+
+  size_t index_(size_t row, uint64_t key) const;
+  void age_();
+
+  const size_t window_;
+  size_t width_mask_;
+  size_t num_increments_{0};
+  std::vector<uint8_t> counters_;
+};
+
+}  // namespace HugeCTR
@@ -22,6 +22,8 @@
 #include <deque>
 #include <functional>
 #include <hps/database_backend.hpp>
+#include <hps/value_format.hpp>
+#include <regex>
 #include <shared_mutex>
 #include <thread>
 #include <thread_pool.hpp>
@@ -37,6 +39,10 @@ namespace HugeCTR {
 struct HashMapBackendParams final : public VolatileBackendParams {
   size_t allocation_rate{256L * 1024 *
                          1024};  // Number of additional bytes to allocate per allocation cycle.
+  DatabaseValueFormat_t value_format{
+      DatabaseValueFormat_t::FP32};  // Format in which the values of selected tables are stored.
+  std::vector<std::string> value_format_filters{
+      {".+"}};  // Regular expressions of table names that are stored in `value_format`.
 };
 
 /**
@@ -115,12 +121,16 @@ class HashMapBackend final : public VolatileBackend<Key, HashMapBackendParams> {
       uint64_t access_count;
     };
     ValuePtr value;
+    size_t key_index;  // Position of the key in `Partition::keys` (if maintained).
   };
   using Entry = std::pair<const Key, Payload>;
 
   struct Partition final {
     const uint32_t value_size;
+    const DatabaseValueFormat_t value_format;
+    const uint32_t encoded_value_size;
     const size_t allocation_rate;
+    const size_t overflow_sample_size;
 
     // Pooled payload storage.
     std::vector<ValuePage> value_pages;
@@ -129,20 +139,34 @@ class HashMapBackend final : public VolatileBackend<Key, HashMapBackendParams> {
     // Key -> Payload map.
     phmap::flat_hash_map<Key, Payload> entries;
 
+    // Dense array of all keys in `entries`, to sample keys for overflow resolution. Only maintained
+    // if `overflow_sample_size > 0`.
+    std::vector<Key> keys;
+
+    // Access control.
+    mutable std::shared_mutex read_write_guard;
+
     Partition() = delete;
 
-    Partition(const uint32_t value_size, const HashMapBackendParams& params)
-        : value_size{value_size}, allocation_rate{params.allocation_rate} {}
+    Partition(const uint32_t value_size, const DatabaseValueFormat_t value_format,
+              const HashMapBackendParams& params)
+        : value_size{value_size},
+          value_format{value_format},
+          encoded_value_size{get_encoded_value_size(value_format, value_size)},
+          allocation_rate{params.allocation_rate},
+          overflow_sample_size{params.overflow_sample_size} {}
   };
 
-  // Actual data.
+  // Actual data. Partitions are never moved after creation, because their locks are not movable.
   CharAllocator char_allocator_;
-  std::unordered_map<std::string, std::vector<Partition>> tables_;
+  std::unordered_map<std::string, std::deque<Partition>> tables_;
+  std::vector<std::regex> value_format_filters_;
 
-  // Access control.
+  // Access control. Only guards the creation and deletion of tables. The contents of each partition
+  // are guarded by the lock of that partition.
   mutable std::shared_mutex read_write_guard_;
 
-  // Overflow resolution.
+  // Overflow resolution. The caller must hold the write lock of the partition.
   size_t resolve_overflow_(const std::string& table_name, size_t part_index, Partition& part);
 };
 
@@ -17,6 +17,7 @@
 
 #include <hps/database_backend_detail.hpp>
 #include <hps/inference_utils.hpp>
+#include <hps/value_format.hpp>
 #include <thread_pool.hpp>
 #include <type_traits>
 
@@ -44,21 +45,29 @@ namespace HugeCTR {
 #ifdef HCTR_HPS_HASH_MAP_EVICT_K_
 #error HCTR_HPS_HASH_MAP_EVICT_K_ already defined. Potential naming conflict!
 #endif
-#define HCTR_HPS_HASH_MAP_EVICT_K_()                                \
-  do {                                                              \
-    static_assert(std::is_same_v<decltype(num_deletions), size_t>); \
-    static_assert(std::is_same_v<decltype(k), const Key*> ||        \
-                  std::is_same_v<decltype(k), const Key* const>);   \
-                                                                    \
-    const auto& it{part.entries.find(*k)};                          \
-    if (it != part.entries.end()) {                                 \
-      const Payload& payload{it->second};                           \
-                                                                    \
-      /* Stash pointer and reference in map. */                     \
-      part.value_slots.emplace_back(payload.value);                 \
-      part.entries.erase(it);                                       \
-      ++num_deletions;                                              \
-    }                                                               \
+#define HCTR_HPS_HASH_MAP_EVICT_K_()                                       \
+  do {                                                                     \
+    static_assert(std::is_same_v<decltype(num_deletions), size_t>);        \
+    static_assert(std::is_same_v<decltype(k), const Key*> ||               \
+                  std::is_same_v<decltype(k), const Key* const>);          \
+                                                                           \
+    const auto& it{part.entries.find(*k)};                                 \
+    if (it != part.entries.end()) {                                        \
+      const Payload& payload{it->second};                                  \
+                                                                           \
+      /* Move the last key into the vacated key slot. */                   \
+      if (part.overflow_sample_size > 0) {                                 \
+        const Key last_key{part.keys.back()};                              \
+        part.entries.find(last_key)->second.key_index = payload.key_index; \
+        part.keys[payload.key_index] = last_key;                           \
+        part.keys.pop_back();                                              \
+      }                                                                    \
+                                                                           \
+      /* Stash pointer and reference in map. */                            \
+      part.value_slots.emplace_back(payload.value);                        \
+      part.entries.erase(it);                                              \
+      ++num_deletions;                                                     \
+    }                                                                      \
   } while (0)
 
 #ifdef HCTR_HPS_HASH_MAP_EVICT_
@@ -91,7 +100,8 @@ namespace HugeCTR {
                                                                                              \
       /* Race-conditions here are deliberately ignored because insignificant in practice. */ \
       __VA_ARGS__;                                                                           \
-      std::copy_n(payload.value, part.value_size, &values[(k - keys) * value_stride]);       \
+      decode_value(part.value_format, &*payload.value, part.value_size,                      \
+                   &values[(k - keys) * value_stride]);                                      \
     } else {                                                                                 \
       on_miss(k - keys);                                                                     \
       ++miss_count;                                                                          \
@@ -144,8 +154,8 @@ namespace HugeCTR {
     if (res.second) {                                                                        \
       /* If no free space, allocate another buffer, and fill pointer queue. */               \
       if (part.value_slots.empty()) {                                                        \
-        const size_t stride{(value_size + value_page_alignment - 1) / value_page_alignment * \
-                            value_page_alignment};                                           \
+        const size_t stride{(part.encoded_value_size + value_page_alignment - 1) /           \
+                            value_page_alignment * value_page_alignment};                    \
         const size_t num_values{part.allocation_rate / stride};                              \
         HCTR_CHECK(num_values > 0);                                                          \
                                                                                              \
@@ -164,10 +174,18 @@ namespace HugeCTR {
       /* Fetch storage slot. */                                                              \
       payload.value = part.value_slots.back();                                               \
       part.value_slots.pop_back();                                                           \
+                                                                                             \
+      /* Append key to the key array. */                                                     \
+      if (part.overflow_sample_size > 0) {                                                   \
+        payload.key_index = part.keys.size();                                                \
+        part.keys.emplace_back(*k);                                                          \
+      }                                                                                      \
       ++num_inserts;                                                                         \
     }                                                                                        \
                                                                                              \
-    std::copy_n(&values[(k - keys) * value_stride], value_size, payload.value);              \
+    /* Encode the value in the storage format of the partition, and write it to its slot. */ \
+    encode_value(part.value_format, &values[(k - keys) * value_stride], value_size,          \
+                 &*payload.value);                                                           \
   } while (0)
 
 /**
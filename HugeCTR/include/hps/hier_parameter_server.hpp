@@ -18,12 +18,14 @@
 #include <common.hpp>
 #include <hps/database_backend.hpp>
 #include <hps/embedding_cache_base.hpp>
+#include <hps/frequency_sketch.hpp>
 #include <hps/hier_parameter_server_base.hpp>
 #include <hps/inference_utils.hpp>
 #include <hps/memory_pool.hpp>
 #include <hps/message.hpp>
 #include <iostream>
 #include <memory>
+#include <mutex>
 #include <string>
 #include <thread>
 #include <unordered_map>
@@ -76,6 +78,10 @@ class HierParameterServer : public HierParameterServerBase {
   bool volatile_db_initialize_after_startup_;
   double volatile_db_cache_rate_;
   bool volatile_db_cache_missed_embeddings_;
+  // Admission filter for missed embeddings (nullptr = admit all).
+  std::unique_ptr<FrequencySketch> volatile_db_admission_filter_;
+  size_t volatile_db_admission_threshold_;
+  std::mutex volatile_db_admission_filter_guard_;
   mutable ThreadPool volatile_db_async_inserter_{"vdb inserter", 1};
 
   std::unique_ptr<DatabaseBackendBase<TypeHashKey>> persistent_db_;
@@ -57,6 +57,12 @@ enum class DatabaseOverflowPolicy_t {
   EvictLeastUsed,
   EvictOldest,
 };
+enum class DatabaseValueFormat_t {
+  FP32,
+  FP16,
+  BF16,
+  INT8,
+};
 enum class UpdateSourceType_t {
   Null,
   KafkaMessageQueue,
@@ -116,6 +122,21 @@ constexpr const char* hctr_enum_to_c_str(const DatabaseOverflowPolicy_t value) {
       return "<unknown DatabaseOverflowPolicy_t value>";
   }
 }
+constexpr const char* hctr_enum_to_c_str(const DatabaseValueFormat_t value) {
+  // Remark: Dependent functions assume lower-case, and underscore separated.
+  switch (value) {
+    case DatabaseValueFormat_t::FP32:
+      return "fp32";
+    case DatabaseValueFormat_t::FP16:
+      return "fp16";
+    case DatabaseValueFormat_t::BF16:
+      return "bf16";
+    case DatabaseValueFormat_t::INT8:
+      return "int8";
+    default:
+      return "<unknown DatabaseValueFormat_t value>";
+  }
+}
 constexpr const char* hctr_enum_to_c_str(const UpdateSourceType_t value) {
   // Remark: Dependent functions assume lower-case, and underscore separated.
   switch (value) {
@@ -134,6 +155,9 @@ inline std::ostream& operator<<(std::ostream& os, DatabaseType_t value) {
 inline std::ostream& operator<<(std::ostream& os, DatabaseOverflowPolicy_t value) {
   return os << hctr_enum_to_c_str(value);
 }
+inline std::ostream& operator<<(std::ostream& os, DatabaseValueFormat_t value) {
+  return os << hctr_enum_to_c_str(value);
+}
 inline std::ostream& operator<<(std::ostream& os, UpdateSourceType_t value) {
   return os << hctr_enum_to_c_str(value);
 }
@@ -148,6 +172,8 @@ UpdateSourceType_t get_hps_updatesource_type(const nlohmann::json& json, const s
                                              UpdateSourceType_t default_value);
 DatabaseOverflowPolicy_t get_hps_overflow_policy(const nlohmann::json& json, const std::string& key,
                                                  DatabaseOverflowPolicy_t default_value);
+DatabaseValueFormat_t get_hps_value_format(const nlohmann::json& json, const std::string& key,
+                                           DatabaseValueFormat_t default_value);
 EmbeddingCacheType_t get_hps_embeddingcache_type(const nlohmann::json& json, const std::string& key,
                                                  EmbeddingCacheType_t default_value);
 
@@ -175,15 +201,22 @@ struct VolatileDatabaseParams {
   std::string tls_client_key{"client_key.pem"};
   std::string tls_server_name_identification{"redis.localhost"};
 
+  // Only used with HashMap type backends.
+  DatabaseValueFormat_t value_format{DatabaseValueFormat_t::FP32};
+  std::vector<std::string> value_format_filters{{".+"}};  // Tables stored in `value_format`.
+
   // Overflow handling related.
   size_t overflow_margin{std::numeric_limits<size_t>::max()};
   DatabaseOverflowPolicy_t overflow_policy{DatabaseOverflowPolicy_t::EvictRandom};
   double overflow_resolution_target{0.8};
+  size_t overflow_sample_size{0};
 
   // Caching behavior related.
   bool initialize_after_startup{true};
   double initial_cache_rate{1.0};
   bool cache_missed_embeddings{false};
+  size_t cache_admission_threshold{0};  // 0 = Cache all missed embeddings.
+  size_t cache_admission_window{1000L * 1000};
 
   // Real-time update mechanism related.
   std::vector<std::string> update_filters{{"^hps_.+$"}};  // Should be a regex for Kafka.
@@ -204,7 +237,10 @@ struct VolatileDatabaseParams {
       // Caching behavior related.
       bool initialize_after_startup, double initial_cache_rate, bool cache_missed_embeddings,
       // Real-time update mechanism related.
-      const std::vector<std::string>& update_filters);
+      const std::vector<std::string>& update_filters,
+      // Later additions, appended so that positional arguments keep their meaning.
+      size_t overflow_sample_size, size_t cache_admission_threshold, size_t cache_admission_window,
+      DatabaseValueFormat_t value_format, const std::vector<std::string>& value_format_filters);
 
   bool operator==(const VolatileDatabaseParams& p) const;
   bool operator!=(const VolatileDatabaseParams& p) const;
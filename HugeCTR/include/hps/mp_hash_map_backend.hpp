@@ -24,6 +24,8 @@
 #include <boost/unordered_map.hpp>
 #include <core/macro.hpp>
 #include <hps/database_backend.hpp>
+#include <hps/value_format.hpp>
+#include <regex>
 
 namespace HugeCTR {
 
@@ -41,6 +43,10 @@ struct MultiProcessHashMapBackendParams final : public VolatileBackendParams {
   std::chrono::nanoseconds heart_beat_frequency{std::chrono::milliseconds{
       100}};               // Frequency at which we tick up the heart-beat frequency counter.
   bool auto_remove{true};  // Remove SHM if this is the last process to detach from the SHM.
+  DatabaseValueFormat_t value_format{
+      DatabaseValueFormat_t::FP32};  // Format in which the values of selected tables are stored.
+  std::vector<std::string> value_format_filters{
+      {".+"}};  // Regular expressions of table names that are stored in `value_format`.
 };
 
 template <typename Key>
@@ -121,15 +127,19 @@ class MultiProcessHashMapBackend final
       uint64_t access_count;
     };
     ValuePtr value;
+    size_t key_index;  // Position of the key in `Partition::keys` (if maintained).
   };
   using Entry = std::pair<const Key, Payload>;
 
   struct Partition final {
     uint32_t value_size;
+    DatabaseValueFormat_t value_format;
+    uint32_t encoded_value_size;
     size_t allocation_rate;
     size_t overflow_margin;
     DatabaseOverflowPolicy_t overflow_policy;
     double overflow_resolution_target;
+    size_t overflow_sample_size;
 
     // Pooled payload storage.
     SharedVector<ValuePage> value_pages;
@@ -138,18 +148,26 @@ class MultiProcessHashMapBackend final
     // Key -> Payload map.
     SharedFlatMap<Key, Payload> entries;
 
+    // Dense array of all keys in `entries`, to sample keys for overflow resolution. Only maintained
+    // if `overflow_sample_size > 0`.
+    SharedVector<Key> keys;
+
     Partition() = delete;
 
-    Partition(const uint32_t value_size, const MultiProcessHashMapBackendParams& params,
-              Segment& segment)
+    Partition(const uint32_t value_size, const DatabaseValueFormat_t value_format,
+              const MultiProcessHashMapBackendParams& params, Segment& segment)
         : value_size{value_size},
+          value_format{value_format},
+          encoded_value_size{get_encoded_value_size(value_format, value_size)},
           allocation_rate{params.allocation_rate},
           overflow_margin{params.overflow_margin},
           overflow_policy{params.overflow_policy},
           overflow_resolution_target{params.overflow_resolution_target},
+          overflow_sample_size{params.overflow_sample_size},
           value_pages(segment.get_allocator<ValuePage>()),
           value_slots(segment.get_allocator<ValuePtr>()),
-          entries(segment.get_allocator<Entry>()) {}
+          entries(segment.get_allocator<Entry>()),
+          keys(segment.get_allocator<Key>()) {}
   };
 
   struct SharedMemory final {
@@ -180,6 +198,7 @@ class MultiProcessHashMapBackend final
   SegmentAllocator<ValuePage> value_page_allocator_;
   SegmentAllocator<Partition> partition_allocator_;
   SharedMemory* sm_;
+  std::vector<std::regex> value_format_filters_;
 
   // Heart beat system.
   bool heart_stop_signal_ = false;
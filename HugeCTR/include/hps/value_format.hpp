@@ -0,0 +1,74 @@
+/*
+ * Copyright (c) 2023, NVIDIA CORPORATION.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#pragma once
+
+#include <cstdint>
+#include <hps/inference_utils.hpp>
+#include <regex>
+#include <string>
+#include <vector>
+
+namespace HugeCTR {
+
+/**
+ * Determines the format in which the values of a table are stored.
+ *
+ * @param table_name The name of the table.
+ * @param value_format The format of tables that match any of the \p filters .
+ * @param filters Regular expressions that select tables by their name.
+ *
+ * @return \p value_format if \p table_name matches any of the \p filters , otherwise `FP32`.
+ */
+DatabaseValueFormat_t select_value_format(const std::string& table_name,
+                                          DatabaseValueFormat_t value_format,
+                                          const std::vector<std::regex>& filters);
+
+/**
+ * Determines how many bytes are required to store a value in a certain format.
+ *
+ * @param value_format The format in which the value is stored.
+ * @param value_size Size of the value in bytes (a vector of `float`, unless \p value_format is
+ * `FP32`).
+ *
+ * @return Size of the encoded value in bytes.
+ */
+uint32_t get_encoded_value_size(DatabaseValueFormat_t value_format, uint32_t value_size);
+
+/**
+ * Converts a vector of `float` into the storage format.
+ *
+ * @param value_format The format in which the value is stored.
+ * @param value Pointer to the value. Need not be aligned.
+ * @param value_size Size of the value in bytes.
+ * @param encoded Pointer to the `get_encoded_value_size(value_format, value_size)` bytes that
+ * receive the encoded value. Need not be aligned.
+ */
+void encode_value(DatabaseValueFormat_t value_format, const char* value, uint32_t value_size,
+                  char* encoded);
+
+/**
+ * Reverses `encode_value`.
+ *
+ * @param value_format The format in which the value is stored.
+ * @param encoded Pointer to the encoded value. Need not be aligned.
+ * @param value_size Size of the decoded value in bytes.
+ * @param value Pointer to the \p value_size bytes that receive the decoded value. Need not be
+ * aligned.
+ */
+void decode_value(DatabaseValueFormat_t value_format, const char* encoded, uint32_t value_size,
+                  char* value);
+
+}  // namespace HugeCTR
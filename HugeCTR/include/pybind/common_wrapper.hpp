@@ -239,6 +239,16 @@ void CommonPybind(pybind11::module& m) {
       .value(HugeCTR::hctr_enum_to_c_str(HugeCTR::DatabaseOverflowPolicy_t::EvictOldest),
              HugeCTR::DatabaseOverflowPolicy_t::EvictOldest)
       .export_values();
+  pybind11::enum_<HugeCTR::DatabaseValueFormat_t>(m, "DatabaseValueFormat_t")
+      .value(HugeCTR::hctr_enum_to_c_str(HugeCTR::DatabaseValueFormat_t::FP32),
+             HugeCTR::DatabaseValueFormat_t::FP32)
+      .value(HugeCTR::hctr_enum_to_c_str(HugeCTR::DatabaseValueFormat_t::FP16),
+             HugeCTR::DatabaseValueFormat_t::FP16)
+      .value(HugeCTR::hctr_enum_to_c_str(HugeCTR::DatabaseValueFormat_t::BF16),
+             HugeCTR::DatabaseValueFormat_t::BF16)
+      .value(HugeCTR::hctr_enum_to_c_str(HugeCTR::DatabaseValueFormat_t::INT8),
+             HugeCTR::DatabaseValueFormat_t::INT8)
+      .export_values();
   pybind11::enum_<HugeCTR::UpdateSourceType_t>(m, "UpdateSourceType_t")
       .value(HugeCTR::hctr_enum_to_c_str(HugeCTR::UpdateSourceType_t::Null),
              HugeCTR::UpdateSourceType_t::Null)
@@ -290,6 +290,9 @@ void HPSPybind(pybind11::module& m) {
                          // Caching behavior related.
                          bool, double, bool,
                          // Real-time update mechanism related.
+                         const std::vector<std::string>&,
+                         // Later additions.
+                         size_t, size_t, size_t, DatabaseValueFormat_t,
                          const std::vector<std::string>&>(),
           pybind11::arg("type") = DatabaseType_t::ParallelHashMap,
           // Backend specific.
@@ -315,7 +318,12 @@ void HPSPybind(pybind11::module& m) {
           pybind11::arg("initial_cache_rate") = 1.0,
           pybind11::arg("cache_missed_embeddings") = false,
           // Real-time update mechanism related.
-          pybind11::arg("update_filters") = std::vector<std::string>{"^hps_.+$"});
+          pybind11::arg("update_filters") = std::vector<std::string>{"^hps_.+$"},
+          // Later additions, after the original arguments to not rebind positional callers.
+          pybind11::arg("overflow_sample_size") = 0, pybind11::arg("cache_admission_threshold") = 0,
+          pybind11::arg("cache_admission_window") = 1000L * 1000L,
+          pybind11::arg("value_format") = DatabaseValueFormat_t::FP32,
+          pybind11::arg("value_format_filters") = std::vector<std::string>{".+"});
 
   pybind11::class_<HugeCTR::PersistentDatabaseParams,
                    std::shared_ptr<HugeCTR::PersistentDatabaseParams>>(infer,
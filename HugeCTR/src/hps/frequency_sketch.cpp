@@ -0,0 +1,87 @@
+/*
+ * Copyright (c) 2023, NVIDIA CORPORATION.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include <algorithm>
+#include <hps/frequency_sketch.hpp>
+
+namespace HugeCTR {
+
+FrequencySketch::FrequencySketch(const size_t window) : window_{window} {
+  HCTR_CHECK_HINT(window_ > 0, "The window of a frequency sketch must not be empty!");
+
+  // About one counter per 8 increments and row is sufficient, because counters are aged.
+  size_t width{64};
+  while (width < window_ / 8) {
+    width *= 2;
+  }
+  width_mask_ = width - 1;
+  counters_.resize(num_rows_ * width);
+}
+
+uint32_t FrequencySketch::increment(const uint64_t key) {
+  size_t indices[num_rows_];
+  uint8_t min_count{UINT8_MAX};
+  for (size_t row{}; row != num_rows_; ++row) {
+    indices[row] = index_(row, key);
+    min_count = std::min(min_count, counters_[indices[row]]);
+  }
+
+  // Conservative update: Only raise the counters that determine the estimate.
+  if (min_count != UINT8_MAX) {
+    for (const size_t index : indices) {
+      if (counters_[index] == min_count) {
+        ++counters_[index];
+      }
+    }
+    ++min_count;
+  }
+
+  if (++num_increments_ >= window_) {
+    age_();
+  }
+  return min_count;
+}
+
+uint32_t FrequencySketch::estimate(const uint64_t key) const {
+  uint8_t min_count{UINT8_MAX};
+  for (size_t row{}; row != num_rows_; ++row) {
+    min_count = std::min(min_count, counters_[index_(row, key)]);
+  }
+  return min_count;
+}
+
+void FrequencySketch::clear() {
+  std::fill(counters_.begin(), counters_.end(), 0);
+  num_increments_ = 0;
+}
+
+size_t FrequencySketch::index_(const size_t row, uint64_t key) const {
+  // SplitMix64 finalizer, seeded differently for each row.
+  key += (row + 1) * 0x9e3779b97f4a7c15ULL;
+  key = (key ^ (key >> 30)) * 0xbf58476d1ce4e5b9ULL;
+  key = (key ^ (key >> 27)) * 0x94d049bb133111ebULL;
+  key ^= key >> 31;
+  return row * (width_mask_ + 1) + static_cast<size_t>(key & width_mask_);
+}
+
+void FrequencySketch::age_() {
+  for (uint8_t& count : counters_) {
+    count >>= 1;
+  }
+  num_increments_ /= 2;
+}
+
+}  // namespace HugeCTR
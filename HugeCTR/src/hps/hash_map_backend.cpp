@@ -31,6 +31,9 @@ namespace HugeCTR {
 
 template <typename Key>
 HashMapBackend<Key>::HashMapBackend(const HashMapBackendParams& params) : Base(params) {
+  for (const std::string& filter : params.value_format_filters) {
+    value_format_filters_.emplace_back(filter);
+  }
   HCTR_LOG_C(DEBUG, WORLD, "Created blank database backend in local memory!\n");
 }
 
@@ -43,10 +46,13 @@ size_t HashMapBackend<Key>::size(const std::string& table_name) const {
   if (tables_it == tables_.end()) {
     return 0;
   }
-  const std::vector<Partition>& parts{tables_it->second};
+  const std::deque<Partition>& parts{tables_it->second};
 
   return std::accumulate(parts.begin(), parts.end(), UINT64_C(0),
-                         [](const size_t a, const Partition& b) { return a + b.entries.size(); });
+                         [](const size_t a, const Partition& b) {
+                           const std::shared_lock part_lock(b.read_write_guard);
+                           return a + b.entries.size();
+                         });
 }
 
 template <typename Key>
@@ -61,7 +67,7 @@ size_t HashMapBackend<Key>::contains(const std::string& table_name, const size_t
   if (tables_it == tables_.end()) {
     return Base::contains(table_name, num_keys, keys, time_budget);
   }
-  const std::vector<Partition>& parts{tables_it->second};
+  const std::deque<Partition>& parts{tables_it->second};
 
   const Key* const keys_end{&keys[num_keys]};
   const size_t num_partitions{parts.size()};
@@ -75,6 +81,7 @@ size_t HashMapBackend<Key>::contains(const std::string& table_name, const size_t
   } else if (num_keys == 1 || num_partitions == 1) {
     const size_t part_index{num_partitions == 1 ? 0 : HCTR_HPS_KEY_TO_PART_INDEX_(*keys)};
     const Partition& part{parts[part_index]};
+    const std::shared_lock part_lock(part.read_write_guard);
 
     // Step through keys batch-by-batch.
     std::chrono::nanoseconds elapsed;
@@ -96,6 +103,7 @@ size_t HashMapBackend<Key>::contains(const std::string& table_name, const size_t
 
     HCTR_HPS_DB_PARALLEL_FOR_EACH_PART_({
       const Partition& part{parts[part_index]};
+      const std::shared_lock part_lock(part.read_write_guard);
 
       size_t hit_count{0};
 
@@ -132,19 +140,32 @@ size_t HashMapBackend<Key>::insert(const std::string& table_name, const size_t n
                                    const uint32_t value_size, const size_t value_stride) {
   HCTR_CHECK(value_size <= value_stride);
 
-  const std::unique_lock lock(read_write_guard_);
+  std::shared_lock lock(read_write_guard_);
 
   // Locate the partitions, or create them, if they do not exist yet.
-  const auto& tables_it{tables_.try_emplace(table_name).first};
-  std::vector<Partition>& parts{tables_it->second};
-  if (parts.empty()) {
-    HCTR_CHECK(value_size > 0 && value_size <= this->params_.allocation_rate);
-
-    parts.reserve(this->params_.num_partitions);
-    while (parts.size() < this->params_.num_partitions) {
-      parts.emplace_back(value_size, this->params_);
+  auto tables_it{tables_.find(table_name)};
+  while (tables_it == tables_.end()) {
+    lock.unlock();
+    {
+      const std::unique_lock create_lock(read_write_guard_);
+
+      std::deque<Partition>& parts{tables_.try_emplace(table_name).first->second};
+      if (parts.empty()) {
+        HCTR_CHECK(value_size > 0 && value_size <= this->params_.allocation_rate);
+        const DatabaseValueFormat_t value_format{
+            select_value_format(table_name, this->params_.value_format, value_format_filters_)};
+
+        while (parts.size() < this->params_.num_partitions) {
+          parts.emplace_back(value_size, value_format, this->params_);
+        }
+      }
     }
+    lock.lock();
+
+    // Retry, in case another thread evicted the table in the meantime.
+    tables_it = tables_.find(table_name);
   }
+  std::deque<Partition>& parts{tables_it->second};
 
   const Key* const keys_end{&keys[num_pairs]};
   const size_t num_partitions{parts.size()};
@@ -160,8 +181,10 @@ size_t HashMapBackend<Key>::insert(const std::string& table_name, const size_t n
     Partition& part{parts[part_index]};
     HCTR_CHECK(part.value_size == value_size);
 
-    // Step through batch-by-batch.
+    // Step through batch-by-batch. Readers of the partition may proceed between batches.
     for (const Key* k{keys}; k != keys_end;) {
+      const std::unique_lock part_lock(part.read_write_guard);
+
       // Check overflow condition.
       if (part.entries.size() >= this->params_.overflow_margin) {
         resolve_overflow_(table_name, part_index, part);
@@ -186,9 +209,11 @@ size_t HashMapBackend<Key>::insert(const std::string& table_name, const size_t n
 
       size_t num_inserts{0};
 
-      // Step through batch-by-batch.
+      // Step through batch-by-batch. Readers of the partition may proceed between batches.
       size_t num_batches{0};
       for (const Key* k{keys}; k != keys_end; ++num_batches) {
+        const std::unique_lock part_lock(part.read_write_guard);
+
         // Check overflow condition.
         if (part.entries.size() >= this->params_.overflow_margin) {
           resolve_overflow_(table_name, part_index, part);
@@ -229,7 +254,7 @@ size_t HashMapBackend<Key>::fetch(const std::string& table_name, const size_t nu
   if (tables_it == tables_.end()) {
     return Base::fetch(table_name, num_keys, keys, values, value_stride, on_miss, time_budget);
   }
-  std::vector<Partition>& parts{tables_it->second};
+  std::deque<Partition>& parts{tables_it->second};
 
   const Key* const keys_end{&keys[num_keys]};
   const size_t num_partitions{parts.size()};
@@ -245,6 +270,7 @@ size_t HashMapBackend<Key>::fetch(const std::string& table_name, const size_t nu
     const size_t part_index{num_partitions == 1 ? 0 : HCTR_HPS_KEY_TO_PART_INDEX_(*keys)};
     Partition& part{parts[part_index]};
     HCTR_CHECK(part.value_size <= value_stride);
+    const std::shared_lock part_lock(part.read_write_guard);
 
     // Step through input batch-by-batch.
     std::chrono::nanoseconds elapsed;
@@ -267,6 +293,7 @@ size_t HashMapBackend<Key>::fetch(const std::string& table_name, const size_t nu
     HCTR_HPS_DB_PARALLEL_FOR_EACH_PART_({
       Partition& part{parts[part_index]};
       HCTR_CHECK(part.value_size <= value_stride);
+      const std::shared_lock part_lock(part.read_write_guard);
 
       size_t miss_count{0};
 
@@ -314,7 +341,7 @@ size_t HashMapBackend<Key>::fetch(const std::string& table_name, const size_t nu
     return Base::fetch(table_name, num_indices, indices, keys, values, value_stride, on_miss,
                        time_budget);
   }
-  std::vector<Partition>& parts{tables_it->second};
+  std::deque<Partition>& parts{tables_it->second};
 
   const size_t* const indices_end{&indices[num_indices]};
   const size_t num_partitions{parts.size()};
@@ -330,6 +357,7 @@ size_t HashMapBackend<Key>::fetch(const std::string& table_name, const size_t nu
     const size_t part_index{num_partitions == 1 ? 0 : HCTR_HPS_KEY_TO_PART_INDEX_(*keys)};
     Partition& part{parts[part_index]};
     HCTR_CHECK(part.value_size <= value_stride);
+    const std::shared_lock part_lock(part.read_write_guard);
 
     // Step through input batch-by-batch.
     std::chrono::nanoseconds elapsed;
@@ -352,6 +380,7 @@ size_t HashMapBackend<Key>::fetch(const std::string& table_name, const size_t nu
     HCTR_HPS_DB_PARALLEL_FOR_EACH_PART_({
       Partition& part{parts[part_index]};
       HCTR_CHECK(part.value_size <= value_stride);
+      const std::shared_lock part_lock(part.read_write_guard);
 
       size_t miss_count{0};
 
@@ -393,7 +422,7 @@ size_t HashMapBackend<Key>::evict(const std::string& table_name) {
   if (tables_it == tables_.end()) {
     return 0;
   }
-  const std::vector<Partition>& parts{tables_it->second};
+  const std::deque<Partition>& parts{tables_it->second};
 
   // Count items and erase.
   size_t num_deletions{0};
@@ -410,14 +439,14 @@ size_t HashMapBackend<Key>::evict(const std::string& table_name) {
 template <typename Key>
 size_t HashMapBackend<Key>::evict(const std::string& table_name, const size_t num_keys,
                                   const Key* const keys) {
-  const std::unique_lock lock(read_write_guard_);
+  const std::shared_lock lock(read_write_guard_);
 
   // Locate the partitions.
   const auto& tables_it{tables_.find(table_name)};
   if (tables_it == tables_.end()) {
     return 0;
   }
-  std::vector<Partition>& parts{tables_it->second};
+  std::deque<Partition>& parts{tables_it->second};
 
   const Key* const keys_end{&keys[num_keys]};
   const size_t num_partitions{parts.size()};
@@ -433,6 +462,8 @@ size_t HashMapBackend<Key>::evict(const std::string& table_name, const size_t nu
 
     // Step through input batch-by-batch.
     for (const Key* k{keys}; k != keys_end;) {
+      const std::unique_lock part_lock(part.read_write_guard);
+
       const size_t batch_size{std::min<size_t>(keys_end - k, max_batch_size)};
       const size_t prev_num_deletions{num_deletions};
       HCTR_HPS_HASH_MAP_EVICT_(SEQUENTIAL_DIRECT);
@@ -452,6 +483,8 @@ size_t HashMapBackend<Key>::evict(const std::string& table_name, const size_t nu
       // Step through input batch-by-batch.
       size_t num_batches{0};
       for (const Key* k{keys}; k != keys_end; ++num_batches) {
+        const std::unique_lock part_lock(part.read_write_guard);
+
         const size_t prev_num_deletions{num_deletions};
         size_t batch_size{0};
         HCTR_HPS_HASH_MAP_EVICT_(PARALLEL_DIRECT);
@@ -496,19 +529,23 @@ size_t HashMapBackend<Key>::dump_bin(const std::string& table_name, std::ofstrea
   if (tables_it == tables_.end()) {
     return 0;
   }
-  const std::vector<Partition>& parts{tables_it->second};
+  const std::deque<Partition>& parts{tables_it->second};
 
   // Store value size.
   const uint32_t value_size{parts.empty() ? 0 : parts.front().value_size};
   file.write(reinterpret_cast<const char*>(&value_size), sizeof(uint32_t));
 
-  // Store values.
+  // Store values (decoded).
   size_t num_entries{0};
+  std::vector<char> value(value_size);
 
   for (const Partition& part : parts) {
+    const std::shared_lock part_lock(part.read_write_guard);
+
     for (const Entry& entry : part.entries) {
+      decode_value(part.value_format, entry.second.value, value_size, value.data());
       file.write(reinterpret_cast<const char*>(&entry.first), sizeof(Key));
-      file.write(entry.second.value, value_size);
+      file.write(value.data(), value_size);
     }
     num_entries += part.entries.size();
   }
@@ -526,7 +563,15 @@ size_t HashMapBackend<Key>::dump_sst(const std::string& table_name, rocksdb::Sst
   if (tables_it == tables_.end()) {
     return 0;
   }
-  const std::vector<Partition>& parts{tables_it->second};
+  const std::deque<Partition>& parts{tables_it->second};
+
+  // Hold all partitions until the entries were written. Locks are always taken in ascending
+  // order, and writers never hold more than one partition lock.
+  std::vector<std::shared_lock<std::shared_mutex>> part_locks;
+  part_locks.reserve(parts.size());
+  for (const Partition& part : parts) {
+    part_locks.emplace_back(part.read_write_guard);
+  }
 
   // Sort keys by value.
   std::vector<const Entry*> entries;
@@ -543,13 +588,18 @@ size_t HashMapBackend<Key>::dump_sst(const std::string& table_name, rocksdb::Sst
   std::sort(entries.begin(), entries.end(),
             [](const auto& a, const auto& b) { return a->first < b->first; });
 
-  // Iterate over pairs and insert.
+  // Iterate over pairs and insert (decoded).
+  const uint32_t value_size{parts.empty() ? 0 : parts.front().value_size};
+  const DatabaseValueFormat_t value_format{parts.empty() ? DatabaseValueFormat_t::FP32
+                                                         : parts.front().value_format};
+  std::vector<char> value(value_size);
+
   rocksdb::Slice k_view{nullptr, sizeof(Key)};
-  rocksdb::Slice v_view{nullptr, parts.empty() ? 0 : parts.front().value_size};
+  rocksdb::Slice v_view{value.data(), value_size};
 
   for (const Entry* const entry : entries) {
+    decode_value(value_format, entry->second.value, value_size, value.data());
     k_view.data_ = reinterpret_cast<const char*>(&entry->first);
-    v_view.data_ = entry->second.value;
     HCTR_ROCKSDB_CHECK(file.Put(k_view, v_view));
   }
 
@@ -564,6 +614,76 @@ size_t HashMapBackend<Key>::resolve_overflow_(const std::string& table_name,
 
   size_t num_deletions{0};
 
+  // Sampled overflow resolution. Each eviction costs `overflow_sample_size` lookups, regardless of
+  // the partition size.
+  const size_t sample_size{part.overflow_sample_size};
+  if (sample_size > 0) {
+    HCTR_LOG_C(TRACE, WORLD, get_name(), " backend; Partition ", table_name, '/', part_index,
+               " is overflowing (size = ", part.entries.size(), " > ",
+               this->params_.overflow_margin, "): Attempting to evict ",
+               part.entries.size() - this->overflow_resolution_margin_,
+               " SAMPLED key/value pairs!\n");
+
+    // TODO: This randomizer should fetch its seed from a central source.
+    std::random_device rd;
+    std::default_random_engine gen(rd());
+
+    std::vector<Payload*> candidates;
+    candidates.reserve(sample_size);
+
+    while (part.entries.size() > this->overflow_resolution_margin_) {
+      std::uniform_int_distribution<size_t> key_dist(0, part.keys.size() - 1);
+      Key key{part.keys[key_dist(gen)]};
+
+      // Pick the least used / oldest of the sampled keys.
+      switch (this->params_.overflow_policy) {
+        case DatabaseOverflowPolicy_t::EvictRandom:
+          break;
+        case DatabaseOverflowPolicy_t::EvictLeastUsed: {
+          Payload* min_payload{&part.entries.find(key)->second};
+          candidates.clear();
+          candidates.emplace_back(min_payload);
+          for (size_t i{1}; i < sample_size; ++i) {
+            const Key& candidate{part.keys[key_dist(gen)]};
+            Payload* const payload{&part.entries.find(candidate)->second};
+            candidates.emplace_back(payload);
+            if (payload->access_count < min_payload->access_count) {
+              key = candidate;
+              min_payload = payload;
+            }
+          }
+
+          // Age the surviving candidates like the normalization of the exact resolution below.
+          // Otherwise, keys that were hot once could never be evicted. Candidates sampled more
+          // than once are aged once.
+          const uint64_t min_access_count{min_payload->access_count};
+          std::sort(candidates.begin(), candidates.end());
+          candidates.erase(std::unique(candidates.begin(), candidates.end()), candidates.end());
+          for (Payload* const payload : candidates) {
+            if (payload != min_payload) {
+              payload->access_count = (payload->access_count - min_access_count) / 2;
+            }
+          }
+        } break;
+        case DatabaseOverflowPolicy_t::EvictOldest: {
+          time_t min_last_access{part.entries.find(key)->second.last_access};
+          for (size_t i{1}; i < sample_size; ++i) {
+            const Key& candidate{part.keys[key_dist(gen)]};
+            const time_t last_access{part.entries.find(candidate)->second.last_access};
+            if (last_access < min_last_access) {
+              key = candidate;
+              min_last_access = last_access;
+            }
+          }
+        } break;
+      }
+
+      const Key* const k{&key};
+      HCTR_HPS_HASH_MAP_EVICT_K_();
+    }
+    return num_deletions;
+  }
+
   switch (this->params_.overflow_policy) {
     case DatabaseOverflowPolicy_t::EvictRandom: {
       // Fetch all keys.
@@ -647,7 +767,8 @@ size_t HashMapBackend<Key>::resolve_overflow_(const std::string& table_name,
       if (km_it != keys_metas.end()) {
         const uint64_t min_access_count{km_it->second};
         for (; km_it != keys_metas.end(); ++km_it) {
-          km_it->second = (km_it->second - min_access_count) / 2;
+          part.entries.find(km_it->first)->second.access_count =
+              (km_it->second - min_access_count) / 2;
         }
       }
     } break;
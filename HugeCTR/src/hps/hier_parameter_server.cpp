@@ -117,7 +117,10 @@ HierParameterServer<TypeHashKey>::HierParameterServer(const parameter_server_con
             conf.overflow_margin,
             conf.overflow_policy,
             conf.overflow_resolution_target,
+            conf.overflow_sample_size,
             conf.allocation_rate,
+            conf.value_format,
+            conf.value_format_filters,
         };
         volatile_db_ = std::make_unique<HashMapBackend<TypeHashKey>>(params);
       } break;
@@ -131,11 +134,14 @@ HierParameterServer<TypeHashKey>::HierParameterServer(const parameter_server_con
             conf.overflow_margin,
             conf.overflow_policy,
             conf.overflow_resolution_target,
+            conf.overflow_sample_size,
             conf.allocation_rate,
             conf.shared_memory_size,
             conf.shared_memory_name,
             std::chrono::milliseconds{100},  // heart_beat_frequency
             conf.shared_memory_auto_remove,
+            conf.value_format,
+            conf.value_format_filters,
         };
         volatile_db_ = std::make_unique<MultiProcessHashMapBackend<TypeHashKey>>(params);
       } break;
@@ -149,6 +155,7 @@ HierParameterServer<TypeHashKey>::HierParameterServer(const parameter_server_con
             conf.overflow_margin,
             conf.overflow_policy,
             conf.overflow_resolution_target,
+            conf.overflow_sample_size,
             conf.address,
             conf.user_name,
             conf.password,
@@ -174,6 +181,18 @@ HierParameterServer<TypeHashKey>::HierParameterServer(const parameter_server_con
                             << std::endl;
     HCTR_LOG_S(INFO, WORLD) << "Volatile DB: cache missed embeddings = "
                             << volatile_db_cache_missed_embeddings_ << std::endl;
+    volatile_db_admission_threshold_ = conf.cache_admission_threshold;
+    if (volatile_db_cache_missed_embeddings_ && volatile_db_admission_threshold_ > 0) {
+      HCTR_CHECK_HINT(volatile_db_admission_threshold_ <= FrequencySketch::max_frequency,
+                      "Volatile DB: cache_admission_threshold must not exceed ",
+                      FrequencySketch::max_frequency, "!");
+      volatile_db_admission_filter_ =
+          std::make_unique<FrequencySketch>(conf.cache_admission_window);
+      HCTR_LOG_S(INFO, WORLD) << "Volatile DB: cache admission threshold = "
+                              << volatile_db_admission_threshold_
+                              << ", window = " << volatile_db_admission_filter_->window()
+                              << std::endl;
+    }
   }
 
   // Connect to persistent database.
@@ -798,8 +817,31 @@ void HierParameterServer<TypeHashKey>::lookup(const void* const h_keys, const si
       HCTR_LOG_C(TRACE, WORLD, persistent_db_->get_name(), ": ", hit_count, " hits, ",
                  length - hit_count, " still missing!\n");
 
+      // Only elevate keys that missed often enough recently.
+      if (volatile_db_cache_missed_embeddings_ && volatile_db_admission_filter_) {
+        const size_t num_missed{indices.size()};
+        const uint64_t salt{std::hash<std::string>{}(tag_name)};
+        const TypeHashKey* const keys{reinterpret_cast<const TypeHashKey*>(h_keys)};
+
+        start = profiler::start();
+        {
+          const std::lock_guard lock(volatile_db_admission_filter_guard_);
+          indices.erase(std::remove_if(indices.begin(), indices.end(),
+                                       [&](const size_t index) {
+                                         return volatile_db_admission_filter_->increment(
+                                                    static_cast<uint64_t>(keys[index]) ^ salt) <
+                                                volatile_db_admission_threshold_;
+                                       }),
+                        indices.end());
+        }
+        hps_profiler->end(start, "Filter the missing embedding keys for admission into the VDB");
+
+        HCTR_LOG_C(TRACE, WORLD, "Admitted ", indices.size(), " of ", num_missed,
+                   " missing embeddings into ", volatile_db_->get_name(), ".\n");
+      }
+
       // Elevate KV pairs if desired and possible.
-      if (volatile_db_cache_missed_embeddings_) {
+      if (volatile_db_cache_missed_embeddings_ && !indices.empty()) {
         // If the layer 0 cache should be optimized as we go, elevate missed keys.
         auto keys_to_elevate{std::make_shared<std::vector<TypeHashKey>>(indices.size())};
         auto values_to_elevate{
@@ -42,13 +42,17 @@ bool VolatileDatabaseParams::operator==(const VolatileDatabaseParams& p) const {
          enable_tls == p.enable_tls && tls_ca_certificate == p.tls_ca_certificate &&
          tls_client_certificate == p.tls_client_certificate && tls_client_key == p.tls_client_key &&
          tls_server_name_identification == p.tls_server_name_identification &&
+         value_format == p.value_format && value_format_filters == p.value_format_filters &&
          // Overflow handling related.
          overflow_margin == p.overflow_margin && overflow_policy == p.overflow_policy &&
          overflow_resolution_target == p.overflow_resolution_target &&
+         overflow_sample_size == p.overflow_sample_size &&
          // Caching behavior related.
          initialize_after_startup == p.initialize_after_startup &&
          initial_cache_rate == p.initial_cache_rate &&
          cache_missed_embeddings == p.cache_missed_embeddings &&
+         cache_admission_threshold == p.cache_admission_threshold &&
+         cache_admission_window == p.cache_admission_window &&
          // Real-time update mechanism related.
          update_filters == p.update_filters;
 }
@@ -101,7 +105,11 @@ VolatileDatabaseParams::VolatileDatabaseParams(
     const bool initialize_after_startup, const double initial_cache_rate,
     const bool cache_missed_embeddings,
     // Real-time update mechanism related.
-    const std::vector<std::string>& update_filters)
+    const std::vector<std::string>& update_filters,
+    // Later additions.
+    const size_t overflow_sample_size, const size_t cache_admission_threshold,
+    const size_t cache_admission_window, const DatabaseValueFormat_t value_format,
+    const std::vector<std::string>& value_format_filters)
     : type{type},
       // Backend specific.
       address{address},
@@ -119,14 +127,19 @@ VolatileDatabaseParams::VolatileDatabaseParams(
       tls_client_certificate{tls_client_certificate},
       tls_client_key{tls_client_key},
       tls_server_name_identification{tls_server_name_identification},
+      value_format{value_format},
+      value_format_filters{value_format_filters},
       // Overflow handling related.
       overflow_margin{overflow_margin},
       overflow_policy{overflow_policy},
       overflow_resolution_target{overflow_resolution_target},
+      overflow_sample_size{overflow_sample_size},
       // Caching behavior related.
       initialize_after_startup{initialize_after_startup},
       initial_cache_rate{initial_cache_rate},
       cache_missed_embeddings{cache_missed_embeddings},
+      cache_admission_threshold{cache_admission_threshold},
+      cache_admission_window{cache_admission_window},
       // Real-time update mechanism related.
       update_filters{update_filters} {}
 
@@ -474,6 +487,16 @@ void parameter_server_config::init(const std::string& hps_json_config_file) {
     params.tls_server_name_identification = get_value_from_json_soft(
         volatile_db, "tls_server_name_identification", params.tls_server_name_identification);
 
+    params.value_format = get_hps_value_format(volatile_db, "value_format", params.value_format);
+    if (volatile_db.find("value_format_filters") != volatile_db.end()) {
+      params.value_format_filters.clear();
+      auto value_format_filters = get_json(volatile_db, "value_format_filters");
+      for (size_t filter_index = 0; filter_index < value_format_filters.size(); ++filter_index) {
+        params.value_format_filters.emplace_back(
+            value_format_filters[filter_index].get<std::string>());
+      }
+    }
+
     // Overflow handling related.
     params.overflow_margin =
         get_value_from_json_soft(volatile_db, "overflow_margin", params.overflow_margin);
@@ -481,6 +504,8 @@ void parameter_server_config::init(const std::string& hps_json_config_file) {
         get_hps_overflow_policy(volatile_db, "overflow_policy", params.overflow_policy);
     params.overflow_resolution_target = get_value_from_json_soft(
         volatile_db, "overflow_resolution_target", params.overflow_resolution_target);
+    params.overflow_sample_size =
+        get_value_from_json_soft(volatile_db, "overflow_sample_size", params.overflow_sample_size);
 
     // Caching behavior related.
     params.initial_cache_rate =
@@ -488,6 +513,10 @@ void parameter_server_config::init(const std::string& hps_json_config_file) {
 
     params.cache_missed_embeddings = get_value_from_json_soft(
         volatile_db, "cache_missed_embeddings", params.cache_missed_embeddings);
+    params.cache_admission_threshold = get_value_from_json_soft(
+        volatile_db, "cache_admission_threshold", params.cache_admission_threshold);
+    params.cache_admission_window = get_value_from_json_soft(volatile_db, "cache_admission_window",
+                                                             params.cache_admission_window);
 
     // Real-time update mechanism related.
     if (volatile_db.find("update_filters") != volatile_db.end()) {
@@ -992,4 +1021,44 @@ DatabaseOverflowPolicy_t get_hps_overflow_policy(const nlohmann::json& json, con
   return default_value;
 }
 
+DatabaseValueFormat_t get_hps_value_format(const nlohmann::json& json, const std::string& key,
+                                           const DatabaseValueFormat_t default_value) {
+  if (json.find(key) == json.end()) {
+    return default_value;
+  }
+  std::string tmp = get_value_from_json<std::string>(json, key);
+  DatabaseValueFormat_t enum_value;
+  std::unordered_set<const char*> names;
+
+  enum_value = DatabaseValueFormat_t::FP32;
+  names = {hctr_enum_to_c_str(enum_value), "float32", "float"};
+  for (const char* name : names)
+    if (tmp == name) {
+      return enum_value;
+    }
+
+  enum_value = DatabaseValueFormat_t::FP16;
+  names = {hctr_enum_to_c_str(enum_value), "float16", "half"};
+  for (const char* name : names)
+    if (tmp == name) {
+      return enum_value;
+    }
+
+  enum_value = DatabaseValueFormat_t::BF16;
+  names = {hctr_enum_to_c_str(enum_value), "bfloat16"};
+  for (const char* name : names)
+    if (tmp == name) {
+      return enum_value;
+    }
+
+  enum_value = DatabaseValueFormat_t::INT8;
+  names = {hctr_enum_to_c_str(enum_value)};
+  for (const char* name : names)
+    if (tmp == name) {
+      return enum_value;
+    }
+
+  return default_value;
+}
+
 }  // namespace HugeCTR
@@ -43,6 +43,10 @@ MultiProcessHashMapBackend<Key>::MultiProcessHashMapBackend(
   HCTR_CHECK(sm_->heart_beat_frequency == params.heart_beat_frequency);
   HCTR_CHECK(sm_->auto_remove == params.auto_remove);
 
+  for (const std::string& filter : params.value_format_filters) {
+    value_format_filters_.emplace_back(filter);
+  }
+
   HCTR_LOG_S(INFO, WORLD) << "Connecting to shared memory '" << params.shared_memory_name << "'..."
                           << std::endl;
 
@@ -217,10 +221,12 @@ size_t MultiProcessHashMapBackend<Key>::insert(const std::string& table_name,
   SharedVector<Partition>& parts{tables_it->second};
   if (parts.empty()) {
     HCTR_CHECK(value_size > 0 && value_size <= this->params_.allocation_rate);
+    const DatabaseValueFormat_t value_format{
+        select_value_format(table_name, this->params_.value_format, value_format_filters_)};
 
     parts.reserve(this->params_.num_partitions);
     while (parts.size() < this->params_.num_partitions) {
-      parts.emplace_back(value_size, this->params_, sm_segment_);
+      parts.emplace_back(value_size, value_format, this->params_, sm_segment_);
     }
   }
 
@@ -588,13 +594,15 @@ size_t MultiProcessHashMapBackend<Key>::dump_bin(const std::string& table_name,
   const uint32_t value_size{parts.empty() ? 0 : parts.front().value_size};
   file.write(reinterpret_cast<const char*>(&value_size), sizeof(uint32_t));
 
-  // Store values.
+  // Store values (decoded).
   size_t num_entries{0};
+  std::vector<char> value(value_size);
 
   for (const Partition& part : parts) {
     for (const Entry& entry : part.entries) {
+      decode_value(part.value_format, entry.second.value.get(), value_size, value.data());
       file.write(reinterpret_cast<const char*>(&entry.first), sizeof(Key));
-      file.write(entry.second.value.get(), value_size);
+      file.write(value.data(), value_size);
     }
     num_entries += part.entries.size();
   }
@@ -630,13 +638,18 @@ size_t MultiProcessHashMapBackend<Key>::dump_sst(const std::string& table_name,
   std::sort(entries.begin(), entries.end(),
             [](const auto& a, const auto& b) { return a->first < b->first; });
 
-  // Iterate over pairs and insert.
+  // Iterate over pairs and insert (decoded).
+  const uint32_t value_size{parts.empty() ? 0 : parts.front().value_size};
+  const DatabaseValueFormat_t value_format{parts.empty() ? DatabaseValueFormat_t::FP32
+                                                         : parts.front().value_format};
+  std::vector<char> value(value_size);
+
   rocksdb::Slice k_view{nullptr, sizeof(Key)};
-  rocksdb::Slice v_view{nullptr, parts.empty() ? 0 : parts.front().value_size};
+  rocksdb::Slice v_view{value.data(), value_size};
 
   for (const Entry* const entry : entries) {
+    decode_value(value_format, entry->second.value.get(), value_size, value.data());
     k_view.data_ = reinterpret_cast<const char*>(&entry->first);
-    v_view.data_ = entry->second.value.get();
     HCTR_ROCKSDB_CHECK(file.Put(k_view, v_view));
   }
 
@@ -652,6 +665,75 @@ size_t MultiProcessHashMapBackend<Key>::resolve_overflow_(const std::string& tab
 
   size_t num_deletions{0};
 
+  // Sampled overflow resolution. Each eviction costs `overflow_sample_size` lookups, regardless of
+  // the partition size.
+  const size_t sample_size{part.overflow_sample_size};
+  if (sample_size > 0) {
+    HCTR_LOG_C(TRACE, WORLD, get_name(), " backend; Partition ", table_name, '/', part_index,
+               " is overflowing (size = ", part.entries.size(), " > ", part.overflow_margin,
+               "): Attempting to evict ", part.entries.size() - this->overflow_resolution_margin_,
+               " SAMPLED key/value pairs!\n");
+
+    // TODO: This randomizer should fetch its seed from a central source.
+    std::random_device rd;
+    std::default_random_engine gen(rd());
+
+    std::vector<Payload*> candidates;
+    candidates.reserve(sample_size);
+
+    while (part.entries.size() > this->overflow_resolution_margin_) {
+      std::uniform_int_distribution<size_t> key_dist(0, part.keys.size() - 1);
+      Key key{part.keys[key_dist(gen)]};
+
+      // Pick the least used / oldest of the sampled keys.
+      switch (part.overflow_policy) {
+        case DatabaseOverflowPolicy_t::EvictRandom:
+          break;
+        case DatabaseOverflowPolicy_t::EvictLeastUsed: {
+          Payload* min_payload{&part.entries.find(key)->second};
+          candidates.clear();
+          candidates.emplace_back(min_payload);
+          for (size_t i{1}; i < sample_size; ++i) {
+            const Key& candidate{part.keys[key_dist(gen)]};
+            Payload* const payload{&part.entries.find(candidate)->second};
+            candidates.emplace_back(payload);
+            if (payload->access_count < min_payload->access_count) {
+              key = candidate;
+              min_payload = payload;
+            }
+          }
+
+          // Age the surviving candidates like the normalization of the exact resolution below.
+          // Otherwise, keys that were hot once could never be evicted. Candidates sampled more
+          // than once are aged once.
+          const uint64_t min_access_count{min_payload->access_count};
+          std::sort(candidates.begin(), candidates.end());
+          candidates.erase(std::unique(candidates.begin(), candidates.end()), candidates.end());
+          for (Payload* const payload : candidates) {
+            if (payload != min_payload) {
+              payload->access_count = (payload->access_count - min_access_count) / 2;
+            }
+          }
+        } break;
+        case DatabaseOverflowPolicy_t::EvictOldest: {
+          time_t min_last_access{part.entries.find(key)->second.last_access};
+          for (size_t i{1}; i < sample_size; ++i) {
+            const Key& candidate{part.keys[key_dist(gen)]};
+            const time_t last_access{part.entries.find(candidate)->second.last_access};
+            if (last_access < min_last_access) {
+              key = candidate;
+              min_last_access = last_access;
+            }
+          }
+        } break;
+      }
+
+      const Key* const k{&key};
+      HCTR_HPS_HASH_MAP_EVICT_K_();
+    }
+    return num_deletions;
+  }
+
   switch (part.overflow_policy) {
     case DatabaseOverflowPolicy_t::EvictRandom: {
       // Fetch all keys.
@@ -733,7 +815,8 @@ size_t MultiProcessHashMapBackend<Key>::resolve_overflow_(const std::string& tab
       if (km_it != keys_metas.end()) {
         const uint64_t min_access_count{km_it->second};
         for (; km_it != keys_metas.end(); ++km_it) {
-          km_it->second = (km_it->second - min_access_count) / 2;
+          part.entries.find(km_it->first)->second.access_count =
+              (km_it->second - min_access_count) / 2;
         }
       }
     } break;
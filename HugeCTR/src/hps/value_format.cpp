@@ -0,0 +1,232 @@
+/*
+ * Copyright (c) 2023, NVIDIA CORPORATION.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include <algorithm>
+#include <cmath>
+#include <core23/logger.hpp>
+#include <cstring>
+#include <hps/value_format.hpp>
+
+namespace HugeCTR {
+
+// TODO: Remove me!
+#pragma GCC diagnostic push
+#pragma GCC diagnostic error "-Wconversion"
+
+// The conversion loops below are branch-free and access memory through `std::memcpy`, so that
+// the compiler can vectorize them regardless of the alignment of the values.
+
+namespace {
+
+inline uint32_t float_bits(const float f) {
+  uint32_t u;
+  std::memcpy(&u, &f, sizeof(float));
+  return u;
+}
+
+inline float bits_float(const uint32_t u) {
+  float f;
+  std::memcpy(&f, &u, sizeof(float));
+  return f;
+}
+
+// Same as `c ? a : b`, but without a branch.
+inline uint32_t select(const bool c, const uint32_t a, const uint32_t b) {
+  const uint32_t mask{0u - static_cast<uint32_t>(c)};
+  return (a & mask) | (b & ~mask);
+}
+
+// Round to nearest even. Overflows to infinity and preserves NaN.
+inline uint16_t float_to_half(const float f) {
+  const uint32_t u{float_bits(f)};
+  const uint32_t sign{u & 0x80000000u};
+  const uint32_t x{u ^ sign};
+
+  // Infinity and NaN (if |f| >= 65520).
+  const uint32_t inf_nan{select(x > 0x7f800000u, 0x7e00u, 0x7c00u)};
+  // Subnormal (if |f| < 2^-14). Adding 0.5 lets the FPU do the rounding.
+  const uint32_t subnormal{float_bits(bits_float(x) + 0.5f) - 0x3f000000u};
+  // Normal. Rebias the exponent and round the mantissa.
+  const uint32_t normal{(x + 0xc8000fffu + ((x >> 13) & 1u)) >> 13};
+
+  const uint32_t h{select(x >= 0x47800000u, inf_nan, select(x < 0x38800000u, subnormal, normal))};
+  return static_cast<uint16_t>(h | (sign >> 16));
+}
+
+inline float half_to_float(const uint16_t h) {
+  const uint32_t x{static_cast<uint32_t>(h & 0x7fffu) << 13};
+  const uint32_t exponent{x & 0x0f800000u};
+
+  // Normal. Rebias the exponent.
+  const uint32_t normal{x + 0x38000000u};
+  // Infinity and NaN.
+  const uint32_t inf_nan{x + 0x70000000u};
+  // Zero and subnormal. Renormalized by the FPU.
+  const uint32_t subnormal{float_bits(bits_float(x + 0x38800000u) - 6.103515625e-05f)};
+
+  const uint32_t u{
+      select(exponent == 0x0f800000u, inf_nan, select(exponent == 0, subnormal, normal))};
+  return bits_float(u | (static_cast<uint32_t>(h & 0x8000u) << 16));
+}
+
+// Round to nearest even. Preserves NaN.
+inline uint16_t float_to_bfloat(const float f) {
+  const uint32_t u{float_bits(f)};
+  const uint32_t rounded{u + 0x7fffu + ((u >> 16) & 1u)};
+  const uint32_t quiet_nan{u | 0x00400000u};
+  return static_cast<uint16_t>(((u & 0x7fffffffu) > 0x7f800000u ? quiet_nan : rounded) >> 16);
+}
+
+inline float bfloat_to_float(const uint16_t b) {
+  return bits_float(static_cast<uint32_t>(b) << 16);
+}
+
+template <typename T>
+inline T load(const char* const p, const size_t i) {
+  T v;
+  std::memcpy(&v, &p[i * sizeof(T)], sizeof(T));
+  return v;
+}
+
+template <typename T>
+inline void store(char* const p, const size_t i, const T v) {
+  std::memcpy(&p[i * sizeof(T)], &v, sizeof(T));
+}
+
+// Int8 values are stored as a `float` scale, followed by one signed byte per element. The scale
+// only depends on the finite elements. Infinities saturate to the largest code, and NaNs are
+// stored as zero.
+constexpr float int8_max{127.f};
+
+void encode_int8(const char* const value, const size_t n, char* const encoded) {
+  // The bits of non-negative floats sort like their values.
+  uint32_t max_abs_bits{0};
+  for (size_t i{}; i != n; ++i) {
+    const uint32_t abs_bits{float_bits(load<float>(value, i)) & 0x7fffffffu};
+    max_abs_bits = std::max(max_abs_bits, select(abs_bits < 0x7f800000u, abs_bits, 0u));
+  }
+  const float max_abs{bits_float(max_abs_bits)};
+  const float scale{max_abs / int8_max};
+  const float inv_scale{max_abs > 0.f ? int8_max / max_abs : 0.f};
+  store<float>(encoded, 0, scale);
+
+  char* const codes{&encoded[sizeof(float)]};
+  for (size_t i{}; i != n; ++i) {
+    const float v{load<float>(value, i) * inv_scale};
+    const float r{std::min(std::max(v + (v < 0.f ? -0.5f : 0.5f), -int8_max), int8_max)};
+    // `r` is NaN if the element is NaN, or infinite while all finite elements are zero.
+    codes[i] = static_cast<char>(static_cast<int8_t>(std::isnan(r) ? 0.f : r));
+  }
+}
+
+void decode_int8(const char* const encoded, const size_t n, char* const value) {
+  const float scale{load<float>(encoded, 0)};
+
+  const char* const codes{&encoded[sizeof(float)]};
+  for (size_t i{}; i != n; ++i) {
+    store<float>(value, i, static_cast<float>(static_cast<int8_t>(codes[i])) * scale);
+  }
+}
+
+}  // namespace
+
+DatabaseValueFormat_t select_value_format(const std::string& table_name,
+                                          const DatabaseValueFormat_t value_format,
+                                          const std::vector<std::regex>& filters) {
+  for (const std::regex& filter : filters) {
+    if (std::regex_match(table_name, filter)) {
+      return value_format;
+    }
+  }
+  return DatabaseValueFormat_t::FP32;
+}
+
+uint32_t get_encoded_value_size(const DatabaseValueFormat_t value_format,
+                                const uint32_t value_size) {
+  if (value_format == DatabaseValueFormat_t::FP32) {
+    return value_size;
+  }
+  HCTR_CHECK_HINT(value_size % sizeof(float) == 0, "Values stored as ", value_format,
+                  " must be float vectors (value_size = ", value_size, ")!");
+  const uint32_t n{value_size / static_cast<uint32_t>(sizeof(float))};
+
+  switch (value_format) {
+    case DatabaseValueFormat_t::FP16:
+    case DatabaseValueFormat_t::BF16:
+      return n * static_cast<uint32_t>(sizeof(uint16_t));
+    case DatabaseValueFormat_t::INT8:
+      return static_cast<uint32_t>(sizeof(float)) + n;
+    default:
+      HCTR_DIE("Unsupported value format (", value_format, ")!");
+  }
+}
+
+void encode_value(const DatabaseValueFormat_t value_format, const char* const value,
+                  const uint32_t value_size, char* const encoded) {
+  const size_t n{value_size / sizeof(float)};
+
+  switch (value_format) {
+    case DatabaseValueFormat_t::FP32:
+      std::copy_n(value, value_size, encoded);
+      break;
+    case DatabaseValueFormat_t::FP16:
+      for (size_t i{}; i != n; ++i) {
+        store<uint16_t>(encoded, i, float_to_half(load<float>(value, i)));
+      }
+      break;
+    case DatabaseValueFormat_t::BF16:
+      for (size_t i{}; i != n; ++i) {
+        store<uint16_t>(encoded, i, float_to_bfloat(load<float>(value, i)));
+      }
+      break;
+    case DatabaseValueFormat_t::INT8:
+      encode_int8(value, n, encoded);
+      break;
+    default:
+      HCTR_DIE("Unsupported value format (", value_format, ")!");
+  }
+}
+
+void decode_value(const DatabaseValueFormat_t value_format, const char* const encoded,
+                  const uint32_t value_size, char* const value) {
+  const size_t n{value_size / sizeof(float)};
+
+  switch (value_format) {
+    case DatabaseValueFormat_t::FP32:
+      std::copy_n(encoded, value_size, value);
+      break;
+    case DatabaseValueFormat_t::FP16:
+      for (size_t i{}; i != n; ++i) {
+        store<float>(value, i, half_to_float(load<uint16_t>(encoded, i)));
+      }
+      break;
+    case DatabaseValueFormat_t::BF16:
+      for (size_t i{}; i != n; ++i) {
+        store<float>(value, i, bfloat_to_float(load<uint16_t>(encoded, i)));
+      }
+      break;
+    case DatabaseValueFormat_t::INT8:
+      decode_int8(encoded, n, value);
+      break;
+    default:
+      HCTR_DIE("Unsupported value format (", value_format, ")!");
+  }
+}
+
+// TODO: Remove me!
+#pragma GCC diagnostic pop
+
+}  // namespace HugeCTR
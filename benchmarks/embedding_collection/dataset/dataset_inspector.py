@@ -1,112 +1,281 @@
+"""
+Inspect a raw dataset generated by generate_dataset.py, e.g.
+
+    python3 dataset_inspector.py configs/dcnv2.json /workdir/dataset/data.bin --output stats.json
+
+The whole file is memory-mapped and processed in chunks, optionally by multiple processes. For
+every table it reports the key range check, the distinct keys (exact or HyperLogLog), the
+top-k heavy hitters (count-min sketch) and the unique ratios of several batch sizes. The json
+output has the format of the frequency summaries of the sharding planner, so it can be given to
+train.py --sharding_frequency_summaries directly.
+"""
+
+import argparse
+import json
+import multiprocessing
 import os
 import numpy as np
-import struct
-import random
-
-alpha = 1.1
-output_filename = "/workdir/dataset/dcnv2_synthetic_alpha{}.bin".format(alpha)
-
-dataset_info = [
-    (7, 1, 100),
-    (2, 1, 1000),
-    (2, 1, 10000),
-    (2, 10, 1000),
-    (5, 10, 10000),
-    (2, 10, 500000),
-    (1, 5, 3000000),
-    (4, 10, 40000000),
-    (1, 100, 40000000),
-]
-
-# output_filename = '/data/train_data.bin'
-#
-# dataset_info = [
-#     (1, 3, 40000000),
-#     (1, 2, 39060),
-#     (1, 1, 17295),
-#     (1, 2, 7424),
-#     (1, 6, 20265),
-#     (1, 1, 3),
-#     (1, 1, 7122),
-#     (1, 1, 1543),
-#     (1, 1, 63),
-#     (1, 7, 40000000),
-#     (1, 3, 3067956),
-#     (1, 8, 405282),
-#     (1, 1, 10),
-#     (1, 6, 2209),
-#     (1, 9, 11938),
-#     (1, 5, 155),
-#     (1, 1, 4),
-#     (1, 1, 976),
-#     (1, 1, 14),
-#     (1, 12, 40000000),
-#     (1, 100, 40000000),
-#     (1, 27, 40000000),
-#     (1, 10, 590152),
-#     (1, 3, 12973),
-#     (1, 1, 108),
-#     (1, 1, 36),
-# ]
-num_dense_features = 13
-num_label = 1
-
-n = 1024  # 100 * 65536
-
-num_cate_features = sum([num_table * hotness for (num_table, hotness, _) in dataset_info])
-max_vocabulary_size = sum([v for _, _, v in dataset_info])
-item_num_per_sample = 1 + num_dense_features + num_cate_features
-sample_format = r"1I" + str(num_dense_features) + "f" + str(num_cate_features) + "I"
-sample_size_in_bytes = 1 * 4 + num_dense_features * 4 + num_cate_features * 4
-
-print("num_dense_features", num_dense_features)
-print("num_cate_features", num_cate_features)
-print("item_num_per_sample", item_num_per_sample)
-print("sample_format", sample_format)
-
-with open(output_filename, "rb") as file:
-    file_stats = os.stat(output_filename)
-    file_size = file_stats.st_size
-    assert file_size % sample_size_in_bytes == 0
-    sample_start_id = random.randint(0, file_size / sample_size_in_bytes - n - 1)
-    file.seek(sample_start_id * sample_size_in_bytes)
-    data_buffer = file.read(n * sample_size_in_bytes)
-    data = struct.unpack(sample_format * n, data_buffer)
-    data = [list(data[i * item_num_per_sample : (i + 1) * item_num_per_sample]) for i in range(n)]
-
-cate_features = [v[1 + num_dense_features :] for v in data]
-cate_features = np.asarray(cate_features)
-print(cate_features.shape)
-
-hotness_offset = 0
-cate_offset = 0
-table_id = 0
-all_cate_features = []
-for num_table, hotness, vocabulary_size in dataset_info:
-    for t in range(num_table):
-        current_table_keys = cate_features[:, hotness_offset : hotness_offset + hotness]
-        current_table_keys = current_table_keys + cate_offset
-        all_cate_features.append(current_table_keys)
+from generate_dataset import DatasetConfig
+
+summary_version = 1
+hll_precision = 14
+cms_depth = 4
+cms_width = 1 << 15
+hash_seeds = [0x9E3779B97F4A7C15, 0xBF58476D1CE4E5B9, 0x94D049BB133111EB, 0xD6E8FEB86659FD93]
+
+
+def hash64(keys: np.array, seed: int) -> np.array:
+    """splitmix64 of the keys, uint64 arithmetic wraps around"""
+    with np.errstate(over="ignore"):
+        x = keys.astype(np.uint64) + np.uint64(seed)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def hll_update(registers: np.array, keys: np.array) -> None:
+    hashes = hash64(keys, hash_seeds[0])
+    index = (hashes >> np.uint64(64 - hll_precision)).astype(np.int64)
+    remaining = (hashes << np.uint64(hll_precision)).astype(np.float64)
+    # position of the first 1 bit in the remaining 64 - precision bits
+    rank = np.where(
+        remaining > 0,
+        64 - np.floor(np.log2(np.maximum(remaining, 1))),
+        64 - hll_precision + 1,
+    ).astype(np.uint8)
+    np.maximum.at(registers, index, rank)
+
+
+def hll_estimate(registers: np.array) -> int:
+    m = registers.size
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.power(2.0, -registers.astype(np.float64)))
+    num_zeros = int(np.sum(registers == 0))
+    if estimate <= 2.5 * m and num_zeros > 0:
+        estimate = m * np.log(m / num_zeros)
+    return int(round(estimate))
+
+
+def cms_update(sketch: np.array, keys: np.array, counts: np.array) -> None:
+    for row in range(sketch.shape[0]):
+        index = (hash64(keys, hash_seeds[row]) % np.uint64(sketch.shape[1])).astype(np.int64)
+        sketch[row] += np.bincount(index, weights=counts, minlength=sketch.shape[1]).astype(
+            np.int64
+        )
+
+
+def cms_estimate(sketch: np.array, keys: np.array) -> np.array:
+    estimates = []
+    for row in range(sketch.shape[0]):
+        index = (hash64(keys, hash_seeds[row]) % np.uint64(sketch.shape[1])).astype(np.int64)
+        estimates.append(sketch[row][index])
+    return np.min(estimates, axis=0)
+
+
+class TableStats:
+    """The mergeable statistics of the keys of a table"""
+
+    def __init__(self, hotness: int, vocabulary_size: int, args):
+        self.hotness = hotness
+        self.vocabulary_size = vocabulary_size
+        self.exact_distinct = args.distinct == "exact"
+        self.top_k = args.top_k
+        self.batch_sizes = args.batch_sizes
+        self.num_lookups = 0
+        self.min_key = None
+        self.max_key = None
+        self.out_of_range = 0
+        self.distinct_keys = np.zeros(0, dtype=np.int64)
+        self.registers = np.zeros(1 << hll_precision, dtype=np.uint8)
+        self.sketch = np.zeros((cms_depth, args.cms_width), dtype=np.int64)
+        self.candidates = np.zeros(0, dtype=np.int64)
+        self.num_unique = np.zeros(len(self.batch_sizes), dtype=np.int64)
+        self.num_batches = np.zeros(len(self.batch_sizes), dtype=np.int64)
+
+    def update(self, keys: np.array, curve_batches: int) -> None:
+        """keys in shape of (num_samples, hotness)"""
+        flat_keys = keys.ravel()
+        self.num_lookups += flat_keys.size
+        min_key, max_key = int(flat_keys.min()), int(flat_keys.max())
+        self.min_key = min_key if self.min_key is None else min(self.min_key, min_key)
+        self.max_key = max_key if self.max_key is None else max(self.max_key, max_key)
+        self.out_of_range += int(np.sum((flat_keys < 0) | (flat_keys >= self.vocabulary_size)))
+
+        unique_keys, counts = np.unique(flat_keys, return_counts=True)
+        if self.exact_distinct:
+            self.distinct_keys = np.union1d(self.distinct_keys, unique_keys)
+        else:
+            hll_update(self.registers, unique_keys)
+        cms_update(self.sketch, unique_keys, counts)
+        top = np.argsort(counts)[::-1][: self.top_k]
+        self.candidates = np.union1d(self.candidates, unique_keys[top])
+        self.prune_candidates()
+
+        for i, batchsize in enumerate(self.batch_sizes):
+            for batch_id in range(min(keys.shape[0] // batchsize, curve_batches)):
+                batch = keys[batch_id * batchsize : (batch_id + 1) * batchsize]
+                self.num_unique[i] += np.unique(batch).size
+                self.num_batches[i] += 1
+
+    def prune_candidates(self) -> None:
+        if self.candidates.size > 2 * self.top_k:
+            estimates = cms_estimate(self.sketch, self.candidates)
+            self.candidates = np.sort(self.candidates[np.argsort(estimates)[::-1][: self.top_k]])
+
+    def merge(self, other) -> None:
+        self.num_lookups += other.num_lookups
+        if other.min_key is not None:
+            self.min_key = (
+                other.min_key if self.min_key is None else min(self.min_key, other.min_key)
+            )
+            self.max_key = (
+                other.max_key if self.max_key is None else max(self.max_key, other.max_key)
+            )
+        self.out_of_range += other.out_of_range
+        self.distinct_keys = np.union1d(self.distinct_keys, other.distinct_keys)
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.sketch += other.sketch
+        self.candidates = np.union1d(self.candidates, other.candidates)
+        self.prune_candidates()
+        self.num_unique += other.num_unique
+        self.num_batches += other.num_batches
+
+    def summary(self, top_k_mass) -> dict:
+        estimates = cms_estimate(self.sketch, self.candidates)
+        order = np.argsort(estimates)[::-1][: self.top_k]
+        heavy_hitters, heavy_hitter_counts = self.candidates[order], estimates[order]
+        cumsum_counts = np.cumsum(heavy_hitter_counts)
+        measured = self.num_batches > 0
+        batch_sizes = np.array(self.batch_sizes, dtype=np.int64)[measured]
+        unique_ratios = self.num_unique[measured] / (
+            self.num_batches[measured] * batch_sizes * self.hotness
+        )
+        summary = {
+            "hotness": self.hotness,
+            "batch_sizes": batch_sizes.tolist(),
+            "unique_ratios": unique_ratios.tolist(),
+            "top_k": [k for k in top_k_mass if k <= self.top_k],
+            "heavy_hitter_mass": [
+                float(cumsum_counts[min(k, cumsum_counts.size) - 1] / self.num_lookups)
+                for k in top_k_mass
+                if k <= self.top_k
+            ],
+            "vocabulary_size": self.vocabulary_size,
+            "num_lookups": self.num_lookups,
+            "min_key": self.min_key,
+            "max_key": self.max_key,
+            "out_of_range": self.out_of_range,
+            "distinct_keys": (
+                int(self.distinct_keys.size)
+                if self.exact_distinct
+                else hll_estimate(self.registers)
+            ),
+            "distinct_method": "exact" if self.exact_distinct else "hyperloglog",
+            "heavy_hitters": heavy_hitters.tolist(),
+            "heavy_hitter_counts": heavy_hitter_counts.tolist(),
+        }
+        return summary
+
+
+def inspect_chunks(task):
+    """Accumulate the statistics of a contiguous range of chunks"""
+    config, dataset_path, begin, end, chunk_samples, args = task
+    samples = np.memmap(dataset_path, dtype=config.sample_type, mode="r")
+    stats = [
+        TableStats(hotness, vocabulary_size, args) for hotness, vocabulary_size in config.tables
+    ]
+    for chunk_begin in range(begin, end, chunk_samples):
+        keys = samples["keys"][chunk_begin : min(chunk_begin + chunk_samples, end)]
+        keys = keys.astype(np.int64)
+        offset = 0
+        for table_stats in stats:
+            table_stats.update(keys[:, offset : offset + table_stats.hotness], args.curve_batches)
+            offset += table_stats.hotness
+    return stats
+
+
+def inspect_dataset(config: DatasetConfig, dataset_path: str, args) -> dict:
+    file_size = os.path.getsize(dataset_path)
+    sample_size = config.sample_type.itemsize
+    if file_size % sample_size != 0:
+        raise RuntimeError(
+            "File size {} is not a multiple of the sample size {}, the config does not match "
+            "the dataset".format(file_size, sample_size)
+        )
+    num_samples = file_size // sample_size
+    if args.max_samples is not None:
+        num_samples = min(num_samples, args.max_samples)
+    # chunks are aligned to the largest batch size of the unique ratio curve
+    max_batchsize = max(args.batch_sizes)
+    chunk_samples = max(args.chunk_mb * 1024 * 1024 // sample_size, max_batchsize)
+    chunk_samples = chunk_samples // max_batchsize * max_batchsize
+    num_chunks = (num_samples + chunk_samples - 1) // chunk_samples
+    # every worker gets a contiguous range of chunks and sends back its statistics once
+    num_workers = max(1, min(args.num_workers, num_chunks))
+    bounds = [
+        min(num_chunks * i // num_workers * chunk_samples, num_samples)
+        for i in range(num_workers + 1)
+    ]
+    tasks = [
+        (config, dataset_path, begin, end, chunk_samples, args)
+        for begin, end in zip(bounds[:-1], bounds[1:])
+        if end > begin
+    ]
+    stats = None
+    with multiprocessing.Pool(len(tasks)) as pool:
+        for worker_stats in pool.imap_unordered(inspect_chunks, tasks):
+            if stats is None:
+                stats = worker_stats
+            else:
+                for table_stats, other in zip(stats, worker_stats):
+                    table_stats.merge(other)
+    top_k_mass = [16, 256, 4096, 65536]
+    return {
+        "version": summary_version,
+        "num_samples": int(num_samples),
+        "sample_size_in_bytes": int(sample_size),
+        "tables": [table_stats.summary(top_k_mass) for table_stats in stats],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the key distribution of a raw dataset")
+    parser.add_argument("config", type=str, help="The json config of generate_dataset.py")
+    parser.add_argument("dataset_path", type=str)
+    parser.add_argument("--output", type=str, default=None, help="Save the statistics as json")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk_mb", type=int, default=256)
+    parser.add_argument("--max_samples", type=int, default=None)
+    parser.add_argument("--distinct", type=str, choices=["exact", "hll"], default="hll")
+    parser.add_argument("--top_k", type=int, default=4096)
+    parser.add_argument("--cms_width", type=int, default=cms_width)
+    parser.add_argument("--batch_sizes", type=str, default="1024,4096,16384,65536")
+    parser.add_argument(
+        "--curve_batches",
+        type=int,
+        default=2,
+        help="Number of batches of every chunk to measure the unique ratio curve",
+    )
+    args = parser.parse_args()
+    args.batch_sizes = [int(v) for v in args.batch_sizes.split(",")]
+
+    with open(args.config, "r") as f:
+        config = DatasetConfig(json.load(f))
+    result = inspect_dataset(config, args.dataset_path, args)
+    print("num_samples", result["num_samples"])
+    for table_id, summary in enumerate(result["tables"]):
         print(
             "table id",
             table_id,
-            "unique ratio",
-            np.unique(current_table_keys).size / current_table_keys.size,
+            "distinct keys",
+            summary["distinct_keys"],
+            "out of range",
+            summary["out_of_range"],
+            "unique ratios",
+            summary["unique_ratios"],
+            "heavy-hitter mass",
+            summary["heavy_hitter_mass"],
         )
-        hotness_offset += hotness
-        cate_offset += vocabulary_size
-        table_id += 1
-        assert np.max(current_table_keys) < cate_offset
-        assert np.max(current_table_keys) >= np.min(current_table_keys)
-        assert np.max(current_table_keys) - np.min(current_table_keys) < vocabulary_size
-
-all_cate_features = np.concatenate(all_cate_features, axis=1)
-assert all_cate_features.size == n * num_cate_features
-print(
-    "bz:",
-    n,
-    "alpha:",
-    alpha,
-    ", total unique ratio ",
-    np.unique(all_cate_features).size / all_cate_features.size,
-)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,191 @@
+"""
+Generate a synthetic raw dataset of embedding collection benchmarks from a config, e.g.
+
+    python3 generate_dataset.py configs/7table_470B_hotness20.json /workdir/dataset/data.bin
+
+The keys of every table follow a Zipf distribution over the vocabulary. They are sampled by
+rejection-inversion, which takes O(1) memory regardless of the vocabulary size, and the hot
+ranks are scattered over the vocabulary by an affine permutation. The samples are generated
+in chunks by multiple processes and every chunk has its own seed, so the output only depends
+on the config, the number of samples, the chunk size and the seed.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+
+
+class ZipfSampler:
+    """
+    Sample the rank in [1, n] with probability proportional to 1 / rank ** alpha, by the
+    rejection-inversion method of Hormann and Derflinger
+    """
+
+    def __init__(self, alpha: float, n: int):
+        assert alpha > 0 and n >= 1
+        self.alpha = alpha
+        self.n = n
+        self.one_minus_alpha = 1.0 - alpha
+        self.h_integral_x1 = self.h_integral(1.5) - 1.0
+        self.h_integral_n = self.h_integral(n + 0.5)
+        self.s = 2.0 - self.h_integral_inverse(self.h_integral(2.5) - self.h(2.0))
+
+    def h(self, x):
+        return np.exp(-self.alpha * np.log(x))
+
+    def h_integral(self, x):
+        # the integral of h, log(x) when alpha is 1
+        if abs(self.one_minus_alpha) < 1e-8:
+            return np.log(x)
+        return np.expm1(self.one_minus_alpha * np.log(x)) / self.one_minus_alpha
+
+    def h_integral_inverse(self, x):
+        if abs(self.one_minus_alpha) < 1e-8:
+            return np.exp(x)
+        t = np.maximum(x * self.one_minus_alpha, -1.0)
+        return np.exp(np.log1p(t) / self.one_minus_alpha)
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.array:
+        ranks = np.empty(size, dtype=np.int64)
+        pending = np.arange(size)
+        while pending.size > 0:
+            u = self.h_integral_n + rng.random(pending.size) * (
+                self.h_integral_x1 - self.h_integral_n
+            )
+            x = self.h_integral_inverse(u)
+            k = np.clip(np.rint(x), 1, self.n)
+            # most of the samples are accepted without evaluating h
+            accepted = k - x <= self.s
+            rest = np.flatnonzero(~accepted)
+            accepted[rest] = u[rest] >= self.h_integral(k[rest] + 0.5) - self.h(k[rest])
+            ranks[pending[accepted]] = k[accepted]
+            pending = pending[~accepted]
+        return ranks
+
+
+def get_affine_permutation(n: int, seed: int):
+    """
+    An affine permutation key = (a * rank + b) % n of [0, n), a is coprime to n and small
+    enough so that a * rank does not overflow int64
+    """
+    rng = np.random.default_rng(seed)
+    a_max = max(2, min(n, (1 << 62) // max(n, 1)))
+    while True:
+        a = int(rng.integers(1, a_max))
+        if math.gcd(a, n) == 1:
+            break
+    b = int(rng.integers(0, n))
+    return a, b
+
+
+class DatasetConfig:
+    def __init__(self, config: dict):
+        self.alpha = config.get("alpha", 1.1)
+        self.num_dense_features = config.get("num_dense_features", 13)
+        self.num_label = config.get("num_label", 1)
+        self.tables = []  # (hotness, vocabulary_size) of every table
+        for num_table, hotness, vocabulary_size in config["dataset_info"]:
+            self.tables += [(hotness, vocabulary_size)] * num_table
+        max_vocabulary_size = max(v for _, v in self.tables)
+        self.i64_input_key = config.get("i64_input_key", max_vocabulary_size > (1 << 32))
+        key_type = np.int64 if self.i64_input_key else np.uint32
+        self.num_cate_features = sum(hotness for hotness, _ in self.tables)
+        self.sample_type = np.dtype(
+            [
+                ("label", np.int32, (self.num_label,)),
+                ("dense", np.float32, (self.num_dense_features,)),
+                ("keys", key_type, (self.num_cate_features,)),
+            ]
+        )
+
+
+def generate_chunk(config: DatasetConfig, num_samples: int, seed: int, chunk_id: int):
+    rng = np.random.default_rng([seed, chunk_id])
+    samples = np.empty(num_samples, dtype=config.sample_type)
+    samples["label"] = rng.integers(0, 2, size=(num_samples, config.num_label))
+    samples["dense"] = rng.random((num_samples, config.num_dense_features), dtype=np.float32)
+    offset = 0
+    for table_id, (hotness, vocabulary_size) in enumerate(config.tables):
+        sampler = ZipfSampler(config.alpha, vocabulary_size)
+        # the permutation of a table is the same in every chunk
+        a, b = get_affine_permutation(vocabulary_size, seed * 1000003 + table_id)
+        ranks = sampler.sample(rng, num_samples * hotness) - 1
+        keys = (ranks * a + b) % vocabulary_size
+        samples["keys"][:, offset : offset + hotness] = keys.reshape(num_samples, hotness)
+        offset += hotness
+    return samples
+
+
+def write_chunk(task):
+    config, output_path, num_samples, chunk_samples, seed, chunk_id = task
+    begin = chunk_id * chunk_samples
+    samples = generate_chunk(config, min(chunk_samples, num_samples - begin), seed, chunk_id)
+    fd = os.open(output_path, os.O_WRONLY)
+    try:
+        os.pwrite(fd, samples.tobytes(), begin * config.sample_type.itemsize)
+    finally:
+        os.close(fd)
+    return samples.shape[0]
+
+
+def generate_dataset(
+    config: DatasetConfig,
+    output_path: str,
+    num_samples: int,
+    seed: int = 0,
+    num_workers: int = 1,
+    chunk_bytes: int = 256 * 1024 * 1024,
+):
+    chunk_samples = max(1, chunk_bytes // config.sample_type.itemsize)
+    num_chunks = (num_samples + chunk_samples - 1) // chunk_samples
+    with open(output_path, "wb") as f:
+        f.truncate(num_samples * config.sample_type.itemsize)
+    tasks = [
+        (config, output_path, num_samples, chunk_samples, seed, chunk_id)
+        for chunk_id in range(num_chunks)
+    ]
+    start = time.time()
+    num_written = 0
+    with multiprocessing.Pool(num_workers) as pool:
+        for num_chunk_samples in pool.imap_unordered(write_chunk, tasks):
+            num_written += num_chunk_samples
+            elapsed = time.time() - start
+            print(
+                "{}/{} samples, {:.1f} MB/s".format(
+                    num_written,
+                    num_samples,
+                    num_written * config.sample_type.itemsize / 1024 / 1024 / elapsed,
+                )
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic raw dataset")
+    parser.add_argument("config", type=str, help="A json config with dataset_info")
+    parser.add_argument("output", type=str, help="Path of the generated dataset")
+    parser.add_argument("--num_samples", type=int, default=100 * 65536)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--chunk_mb", type=int, default=256, help="Size of the samples generated at a time"
+    )
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = DatasetConfig(json.load(f))
+    print("num_tables", len(config.tables))
+    print("num_cate_features", config.num_cate_features)
+    print("sample_size_in_bytes", config.sample_type.itemsize)
+    print("i64_input_key", config.i64_input_key)
+    generate_dataset(
+        config,
+        args.output,
+        args.num_samples,
+        args.seed,
+        args.num_workers,
+        args.chunk_mb * 1024 * 1024,
+    )
@@ -1,2 +1,2 @@
 from .generate_plan import generate_plan
-from .planner import Cost, CostModel, Planner, ShardingState
+from .planner import Cost, CostModel, IncrementalCost, Planner, ShardingState
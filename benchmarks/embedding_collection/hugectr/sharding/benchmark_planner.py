@@ -0,0 +1,118 @@
+# Copyright (c) 2023, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import contextlib
+import inspect
+import io
+import os
+import sys
+import time
+import numpy as np
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from sharding import CostModel, Planner
+
+
+def generate_tables(num_tables, seed):
+    # zipfian hotness and log-uniform table sizes, similar to the production models
+    rng = np.random.default_rng(seed)
+    list_hotness = rng.zipf(1.5, num_tables).clip(1, 200).tolist()
+    ev_sizes = rng.choice([16, 32, 64, 128, 256], num_tables)
+    list_table_size = (10 ** rng.uniform(1, 7.5, num_tables)).astype(int).tolist()
+    return list_hotness, ev_sizes, list_table_size
+
+
+def run_planner(args, num_gpus, use_incremental_cost):
+    list_hotness, ev_sizes, list_table_size = generate_tables(args.num_tables, args.seed)
+    num_nodes = num_gpus // args.num_gpus_per_node
+    num_gpus_per_bucket = args.num_gpus_per_node if args.hier else 1
+    cost_model = CostModel(
+        1,
+        args.mem_comm_bw_ratio,
+        args.mem_comm_work_ratio,
+        args.dense_comm_work_ratio,
+        args.batchsize,
+        ev_sizes * 8 / 1024 / 1024 / 1024,
+        ev_sizes,
+        args.memory_cap_for_embedding * num_gpus_per_bucket,
+        list_table_size,
+        1,
+    )
+    planner = Planner(
+        list_hotness,
+        ev_sizes,
+        num_nodes,
+        args.num_gpus_per_node,
+        args.batchsize,
+        args.hier,
+        cost_model,
+        max_search_iter=args.max_search_iter,
+        use_column_wise_sharding=args.use_column_wise_shard,
+        use_incremental_cost=use_incremental_cost,
+        refine_time_budget=args.refine_time_budget,
+    )
+    t0 = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        planner.plan()
+    return time.time() - t0, planner.list_candidate[0][0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the runtime and the plan quality of the greedy sharding planner "
+        "with the incremental cost model and with the full cost recomputation."
+    )
+    parser.add_argument("--num_tables", type=int, default=500)
+    parser.add_argument("--num_gpus", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--num_gpus_per_node", type=int, default=8)
+    parser.add_argument("--batchsize", type=int, default=65536)
+    parser.add_argument("--mem_comm_bw_ratio", type=float, default=7)
+    parser.add_argument("--mem_comm_work_ratio", type=float, default=4)
+    parser.add_argument("--dense_comm_work_ratio", type=float, default=4)
+    parser.add_argument("--memory_cap_for_embedding", type=float, default=60)
+    parser.add_argument("--max_search_iter", type=int, default=20)
+    parser.add_argument("--refine_time_budget", type=float, default=0)
+    parser.add_argument("--hier", action="store_true")
+    parser.add_argument("--use_column_wise_shard", action="store_true")
+    parser.add_argument(
+        "--skip_full_cost", action="store_true", help="only run the incremental cost model"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for num_gpus in args.num_gpus:
+        incremental_time, incremental_cost = run_planner(args, num_gpus, True)
+        print(
+            "tables %d, gpus %d, incremental cost: %.3f sec, max bucket cost %.6g"
+            % (args.num_tables, num_gpus, incremental_time, incremental_cost)
+        )
+        if args.skip_full_cost:
+            continue
+        full_time, full_cost = run_planner(args, num_gpus, False)
+        print(
+            "tables %d, gpus %d, full cost: %.3f sec, max bucket cost %.6g, speedup %.1fx, "
+            "cost diff %.3f%%"
+            % (
+                args.num_tables,
+                num_gpus,
+                full_time,
+                full_cost,
+                full_time / incremental_time,
+                (incremental_cost - full_cost) / full_cost * 100,
+            )
+        )
@@ -0,0 +1,229 @@
+# Copyright (c) 2023, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Fit the coefficients of CostModel from per-iteration timing logs of past runs.
+
+A timing log is a json lines file, each line is one iteration (or the average of several
+iterations) of a run with a given sharding plan of the reduction-based tables:
+
+    {
+        "batchsize": 65536,                  # global batch size
+        "num_gpus_per_node": 8,
+        "is_hier": false,                    # whether shard_matrix is a hier_auto plan of nodes
+        "hotness": [80, 20, ...],            # hotness of every sharded table
+        "ev_sizes": [128, 64, ...],          # ev_size of every sharded table
+        "shard_matrix": [[0, 3], [1, 2]],    # tables of every bucket (GPU, or node if is_hier)
+        "dense_hotness": [1, 1, ...],        # optional, hotness of the dense (unique) tables
+        "dense_ev_sizes": [128, 128, ...],   # optional, ev_size of the dense (unique) tables
+        "time_ms": 12.5                      # embedding time of the iteration, or a list of
+                                             # the time of every bucket
+    }
+
+The costs of a calibrated CostModel are the predicted time in the unit of the timing logs.
+"""
+
+import json
+import logging
+from typing import List
+
+import numpy as np
+
+from .planner import cost_profile_version, default_hier_comm_factor, ev_size_compensation
+
+# order of the columns of the regression, which are the bucket costs of CostModel.get_cost
+feature_names = ["mem_comm_work_ratio", "mem_comm_bw_ratio", "hier_comm", "dense_comm_work_ratio"]
+num_features = len(feature_names) + 1  # plus the intercept
+
+
+def load_timing_logs(paths: List[str]) -> List[dict]:
+    records = []
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if len(line) == 0 or line.startswith("#"):
+                    continue
+                records.append(json.loads(line))
+    if len(records) == 0:
+        raise RuntimeError("No timing record found in {}".format(paths))
+    return records
+
+
+def get_bucket_features(record: dict, compensation=None) -> np.array:
+    """
+    The regression features of every bucket of a timing record, in the same form as
+    CostModel.get_cost so the fitted coefficients can be used by CostModel directly
+    """
+    batchsize = record["batchsize"]
+    hotness = np.array(record["hotness"], dtype=np.float64)
+    ev_sizes = np.array(record["ev_sizes"], dtype=np.float64)
+    shard_matrix = record["shard_matrix"]
+    is_hier = record.get("is_hier", False)
+    num_gpus_per_node = record.get("num_gpus_per_node", 1)
+
+    array_num_split = np.zeros(hotness.size)
+    for shard_list in shard_matrix:
+        array_num_split[shard_list] += 1
+    array_num_split[array_num_split == 0] = 1
+    compensated_ev_sizes = ev_size_compensation(ev_sizes, compensation)
+
+    features = np.zeros((len(shard_matrix), num_features))
+    for bucket_id, shard_list in enumerate(shard_matrix):
+        hotness_cost = (
+            batchsize
+            * (
+                hotness[shard_list] * compensated_ev_sizes[shard_list] / array_num_split[shard_list]
+            ).sum()
+        )
+        comm_cost = batchsize * ev_sizes[shard_list].sum()
+        if is_hier:
+            features[bucket_id, 0] = hotness_cost / num_gpus_per_node
+            features[bucket_id, 2] = comm_cost / num_gpus_per_node
+        else:
+            features[bucket_id, 0] = hotness_cost
+            features[bucket_id, 1] = comm_cost
+
+    if "dense_hotness" in record:
+        num_gpus = len(shard_matrix) * (num_gpus_per_node if is_hier else 1)
+        # dense tables are evenly distributed to all the GPUs
+        features[:, 3] = (
+            batchsize
+            * (
+                np.array(record["dense_hotness"], dtype=np.float64)
+                * np.array(record["dense_ev_sizes"], dtype=np.float64)
+            ).sum()
+            / num_gpus
+        )
+    features[:, 4] = 1
+    return features
+
+
+def solve_non_negative(x: np.array, y: np.array) -> np.array:
+    """
+    Least squares with non-negative coefficients, columns with a negative coefficient are
+    removed one by one. Columns which are all zeros get a zero coefficient
+    """
+    active = np.any(x != 0, axis=0)
+    coef = np.zeros(x.shape[1])
+    while active.any():
+        coef[:] = 0
+        coef[active] = np.linalg.lstsq(x[:, active], y, rcond=None)[0]
+        if (coef >= 0).all():
+            break
+        active[np.argmin(coef)] = False
+    return coef
+
+
+def fit_coefficients(
+    records: List[dict], compensation=None, init_coef: np.array = None, max_iter: int = 20
+):
+    """
+    Fit the coefficients for a given ev_size compensation. When a record only has the time of
+    the whole iteration, the iteration is bounded by its slowest bucket, which is selected with
+    the coefficients of the previous round until the selection does not change any more
+    """
+    list_features = [get_bucket_features(record, compensation) for record in records]
+    list_time = [np.array(record["time_ms"], dtype=np.float64) for record in records]
+    coef = init_coef
+    selection = None
+    for _ in range(max_iter):
+        list_x, list_y, new_selection = [], [], []
+        for features, time in zip(list_features, list_time):
+            if time.ndim == 1:
+                assert time.size == features.shape[0], "time_ms should have a time per bucket"
+                list_x.append(features)
+                list_y.append(time)
+            else:
+                slowest = int(np.argmax(features @ coef))
+                new_selection.append(slowest)
+                list_x.append(features[slowest : slowest + 1])
+                list_y.append(time.reshape(1))
+        x = np.concatenate(list_x)
+        y = np.concatenate(list_y)
+        coef = solve_non_negative(x, y)
+        if new_selection == selection:
+            break
+        selection = new_selection
+    residual = y - x @ coef
+    sse = float((residual**2).sum())
+    sst = float(((y - y.mean()) ** 2).sum())
+    return coef, {
+        "num_samples": int(y.size),
+        "rmse": float(np.sqrt(sse / y.size)),
+        "r2": 1 - sse / sst if sst > 0 else 1.0,
+        "sse": sse,
+    }
+
+
+def get_compensation_candidates(align: int = 128, step: int = 16) -> List[dict]:
+    candidates = [None]
+    for intercept in range(0, align + 1, step):
+        for slope_range in range(0, align - intercept + 1, step):
+            candidates.append({"align": align, "intercept": intercept, "slope_range": slope_range})
+    return candidates
+
+
+def fit_cost_profile(
+    records: List[dict],
+    init_coef: np.array = None,
+    fit_ev_size_compensation: bool = True,
+    min_improvement: float = 0.01,
+) -> dict:
+    """
+    Fit a cost profile for CostModel. The ev_size compensation is selected from a grid of
+    candidates and only used when it reduces the squared error by more than min_improvement
+    """
+    if init_coef is None:
+        # default ratios of train.py
+        init_coef = np.array([8 / 2, 2000 / 25, 2000 / 25 * default_hier_comm_factor, 4 / 2, 0])
+    candidates = get_compensation_candidates() if fit_ev_size_compensation else [None]
+    best = None
+    for compensation in candidates:
+        coef, stats = fit_coefficients(records, compensation, init_coef)
+        if best is None or stats["sse"] < best[2]["sse"] * (1 - min_improvement):
+            best = (compensation, coef, stats)
+    compensation, coef, stats = best
+
+    if coef[0] <= 0:
+        raise RuntimeError("Can not fit the lookup cost, the timing logs have no hotness variance")
+    has_flat = any(not record.get("is_hier", False) for record in records)
+    has_hier = any(record.get("is_hier", False) for record in records)
+    if has_flat:
+        band_width_ratio = coef[1]
+        hier_comm_factor = (
+            coef[2] / coef[1] if has_hier and coef[1] > 0 else default_hier_comm_factor
+        )
+    else:
+        # the intra-node communication can not be separated from the inter-node one
+        band_width_ratio = coef[2] / default_hier_comm_factor
+        hier_comm_factor = default_hier_comm_factor
+    cost_profile = {
+        "version": cost_profile_version,
+        "mem_comm_work_ratio": float(coef[0]),
+        "mem_comm_bw_ratio": float(band_width_ratio),
+        "hier_comm_factor": float(hier_comm_factor),
+        "ev_size_compensation": compensation,
+        "intercept": float(coef[4]),
+        "fit": {key: stats[key] for key in ["num_samples", "rmse", "r2"]},
+    }
+    if any("dense_hotness" in record for record in records):
+        cost_profile["dense_comm_work_ratio"] = float(coef[3])
+    return cost_profile
+
+
+def save_cost_profile(cost_profile: dict, path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(cost_profile, f, indent=2)
+    logging.info("Saved the cost profile to %s", path)
@@ -0,0 +1,91 @@
+# Copyright (c) 2023, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import logging
+from typing import List
+
+import numpy as np
+
+
+def map_raw_samples(
+    dataset_path: str,
+    multi_hot_sizes: List[int],
+    dense_dim: int = 13,
+    num_label: int = 1,
+    i64_input_key: bool = False,
+) -> np.memmap:
+    key_type = np.int64 if i64_input_key else np.uint32
+    sample_type = np.dtype(
+        [
+            ("label", np.int32, (num_label,)),
+            ("dense", np.float32, (dense_dim,)),
+            ("keys", key_type, (sum(multi_hot_sizes),)),
+        ]
+    )
+    return np.memmap(dataset_path, dtype=sample_type, mode="r")
+
+
+def load_raw_batches(
+    dataset_path: str,
+    multi_hot_sizes: List[int],
+    batchsize: int,
+    num_batches: int,
+    dense_dim: int = 13,
+    num_label: int = 1,
+    i64_input_key: bool = False,
+    start_batch: int = 0,
+):
+    """
+    Yield the keys of every table of the batches of a raw multi-hot dataset, whose samples are
+    label (int32), dense (float32) and the keys of every table
+    """
+    samples = map_raw_samples(dataset_path, multi_hot_sizes, dense_dim, num_label, i64_input_key)
+    offsets = np.cumsum([0] + list(multi_hot_sizes))
+    max_batches = samples.shape[0] // batchsize - start_batch
+    if num_batches > max_batches:
+        logging.warning("Only %d batches in %s", max_batches, dataset_path)
+        num_batches = max_batches
+    for batch_id in range(start_batch, start_batch + num_batches):
+        keys = np.asarray(samples["keys"][batch_id * batchsize : (batch_id + 1) * batchsize])
+        keys = keys.astype(np.int64)
+        yield [keys[:, offsets[i] : offsets[i + 1]] for i in range(len(multi_hot_sizes))]
+
+
+def add_dataset_args(parser: argparse.ArgumentParser) -> None:
+    """The dataset and table configs, same as train.py"""
+    parser.add_argument("--dataset_path", type=str, required=True)
+    parser.add_argument("--i64_input_key", action="store_true")
+    parser.add_argument("--dense_dim", type=int, default=13)
+    parser.add_argument("--num_table", type=str, default="1")
+    parser.add_argument("--vocabulary_size_per_table", type=str, default="40000000")
+    parser.add_argument("--nnz_per_table", type=str, default="1")
+    parser.add_argument("--ev_size_per_table", type=str, default="128")
+
+
+def parse_table_args(args: argparse.Namespace) -> None:
+    num_table_list = [int(v) for v in args.num_table.split(",")]
+    vocabulary_size_per_table = args.vocabulary_size_per_table.split(",")
+    nnz_per_table = args.nnz_per_table.split(",")
+    ev_size_per_table = args.ev_size_per_table.split(",")
+    if len(ev_size_per_table) == 1:
+        ev_size_per_table = ev_size_per_table * len(num_table_list)
+    assert len(vocabulary_size_per_table) == len(num_table_list)
+    assert len(nnz_per_table) == len(num_table_list)
+    args.TABLE_SIZE_ARRAY, args.MULTI_HOT_SIZES, args.EMB_VEC_SIZES = [], [], []
+    for i, num_table in enumerate(num_table_list):
+        for _ in range(num_table):
+            args.TABLE_SIZE_ARRAY.append(int(vocabulary_size_per_table[i]))
+            args.MULTI_HOT_SIZES.append(int(nnz_per_table[i]))
+            args.EMB_VEC_SIZES.append(int(ev_size_per_table[i]))
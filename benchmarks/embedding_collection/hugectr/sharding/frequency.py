@@ -0,0 +1,174 @@
+# Copyright (c) 2023, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-table key frequency summaries measured on a sample of a dataset. A summary holds the
+unique ratio, i.e., unique keys / (batch size * hotness), of several batch sizes and the
+heavy-hitter mass, i.e., the fraction of the lookups hitting the top-k keys:
+
+    {
+        "hotness": 20,
+        "batch_sizes": [1024, 4096, 16384, 65536],
+        "unique_ratios": [0.61, 0.45, 0.32, 0.21],
+        "top_k": [16, 256, 4096, 65536],
+        "heavy_hitter_mass": [0.15, 0.32, 0.55, 0.79]
+    }
+
+The planner uses the unique ratio to estimate the lookup work after the dedup of a batch.
+
+Run it as a module to summarize a raw dataset, e.g. python -m sharding.frequency
+--dataset_path data.bin --num_table ... --nnz_per_table ... --output summaries.json
+"""
+
+import argparse
+import json
+import logging
+from typing import List
+
+import numpy as np
+
+from .dataset import add_dataset_args, load_raw_batches, map_raw_samples, parse_table_args
+
+frequency_summary_version = 1
+default_batch_sizes = [1024, 4096, 16384, 65536, 262144]
+default_top_k = [16, 256, 4096, 65536]
+
+
+def compute_frequency_summary(
+    keys: np.array,
+    batch_sizes: List[int] = default_batch_sizes,
+    top_k: List[int] = default_top_k,
+    max_batches: int = 8,
+) -> dict:
+    """
+    The summary of the keys of a table in shape of (num_samples, hotness), the unique ratio
+    of a batch size is averaged over at most max_batches consecutive batches
+    """
+    num_samples, hotness = keys.shape
+    summary = {"hotness": int(hotness), "batch_sizes": [], "unique_ratios": []}
+    if 0 < num_samples < min(batch_sizes):
+        # a sample smaller than every batch size is measured as a single batch
+        batch_sizes = [num_samples]
+    for batchsize in batch_sizes:
+        num_batches = min(num_samples // batchsize, max_batches)
+        if num_batches == 0:
+            continue
+        num_unique = [
+            np.unique(keys[i * batchsize : (i + 1) * batchsize]).size for i in range(num_batches)
+        ]
+        summary["batch_sizes"].append(int(batchsize))
+        summary["unique_ratios"].append(float(np.mean(num_unique)) / (batchsize * hotness))
+
+    _, counts = np.unique(keys, return_counts=True)
+    cumsum_counts = np.cumsum(np.sort(counts)[::-1])
+    summary["top_k"] = [int(k) for k in top_k]
+    summary["heavy_hitter_mass"] = [
+        float(cumsum_counts[min(k, cumsum_counts.size) - 1] / keys.size) for k in top_k
+    ]
+    return summary
+
+
+def get_unique_ratio(summary: dict, batchsize: int) -> float:
+    """
+    The unique ratio of a batch size, interpolated or extrapolated linearly in the log-log
+    space of the measured curve, which is a power law for Zipfian keys. Without any measured
+    batch size, every key is assumed to be unique
+    """
+    if len(summary["batch_sizes"]) == 0:
+        return 1.0
+    batch_sizes = np.log(np.array(summary["batch_sizes"], dtype=np.float64))
+    unique_ratios = np.log(np.array(summary["unique_ratios"], dtype=np.float64))
+    x = np.log(batchsize)
+    if batch_sizes.size == 1:
+        log_ratio = unique_ratios[0]
+    elif x < batch_sizes[0]:
+        slope = (unique_ratios[1] - unique_ratios[0]) / (batch_sizes[1] - batch_sizes[0])
+        log_ratio = unique_ratios[0] + slope * (x - batch_sizes[0])
+    elif x > batch_sizes[-1]:
+        slope = (unique_ratios[-1] - unique_ratios[-2]) / (batch_sizes[-1] - batch_sizes[-2])
+        log_ratio = unique_ratios[-1] + slope * (x - batch_sizes[-1])
+    else:
+        log_ratio = np.interp(x, batch_sizes, unique_ratios)
+    # there is at least one unique key in a batch
+    return float(np.clip(np.exp(log_ratio), 1 / (batchsize * summary["hotness"]), 1))
+
+
+def get_unique_ratios(summaries: List[dict], batchsize: int) -> np.array:
+    return np.array([get_unique_ratio(summary, batchsize) for summary in summaries])
+
+
+def get_effective_hotness(summaries: List[dict], multi_hot_sizes: List[int], batchsize: int):
+    """The average unique keys of a sample in a batch, i.e., the hotness after the dedup"""
+    if summaries is None:
+        return list(multi_hot_sizes)
+    return (np.array(multi_hot_sizes) * get_unique_ratios(summaries, batchsize)).tolist()
+
+
+def save_frequency_summaries(summaries: List[dict], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump({"version": frequency_summary_version, "tables": summaries}, f, indent=2)
+    logging.info("Saved the frequency summaries of %d tables to %s", len(summaries), path)
+
+
+def load_frequency_summaries(path: str) -> List[dict]:
+    with open(path, "r") as f:
+        summaries = json.load(f)
+    if summaries.get("version") != frequency_summary_version:
+        raise RuntimeError(
+            "Unsupported frequency summary version {} in {}".format(summaries.get("version"), path)
+        )
+    return summaries["tables"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Summarize the key frequency of every table of a sample of a raw dataset"
+    )
+    add_dataset_args(parser)
+    parser.add_argument("--num_samples", type=int, default=1 << 20)
+    parser.add_argument(
+        "--batch_sizes",
+        type=str,
+        default=",".join(str(v) for v in default_batch_sizes),
+        help="Comma separated batch sizes of the unique ratio curve",
+    )
+    parser.add_argument("--output", type=str, required=True)
+    args = parser.parse_args()
+    parse_table_args(args)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    num_samples = map_raw_samples(
+        args.dataset_path, args.MULTI_HOT_SIZES, args.dense_dim, 1, args.i64_input_key
+    ).shape[0]
+    table_keys = next(
+        load_raw_batches(
+            args.dataset_path,
+            args.MULTI_HOT_SIZES,
+            min(args.num_samples, num_samples),
+            1,
+            args.dense_dim,
+            1,
+            args.i64_input_key,
+        )
+    )
+    batch_sizes = [int(v) for v in args.batch_sizes.split(",")]
+    summaries = [compute_frequency_summary(keys, batch_sizes) for keys in table_keys]
+    for table_id, summary in enumerate(summaries):
+        logging.info(
+            "table %d: unique ratios %s, heavy-hitter mass %s",
+            table_id,
+            summary["unique_ratios"],
+            summary["heavy_hitter_mass"],
+        )
+    save_frequency_summaries(summaries, args.output)
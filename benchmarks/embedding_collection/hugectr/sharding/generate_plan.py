@@ -12,11 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
+import json
 import logging
 from argparse import Namespace
 from itertools import chain, product
 from typing import List
 import numpy as np
+from .calibration import fit_cost_profile, load_timing_logs, save_cost_profile
+from .frequency import get_effective_hotness, load_frequency_summaries
 from .planner import CostModel, Planner
 
 
@@ -102,6 +106,9 @@ def generate_plan_ragged_ev_size(
         return shard_matrix_after_replacement, shard_strategy_after_replacement
 
     byte_per_elem = get_byte_per_elem(args)
+    frequency_summaries = getattr(args, "FREQUENCY_SUMMARIES", None)
+    if frequency_summaries is not None:
+        frequency_summaries = [frequency_summaries[table_id] for table_id in table_id_list]
     if sharding_plan in ["round_robin", "uniform", "table_row_wise"]:
         # sharding strategies that don't exploit system configs
         mp_table = [i for i in range(len(slot_size_array))]
@@ -152,6 +159,8 @@ def generate_plan_ragged_ev_size(
                 dram_cap,
                 slot_size_array,
                 1,
+                cost_profile=getattr(args, "sharding_cost_profile", None),
+                frequency_summaries=frequency_summaries,
             )
             planner = Planner(
                 multi_hot_sizes,
@@ -163,6 +172,7 @@ def generate_plan_ragged_ev_size(
                 cost_model,
                 log_result=log_result,
                 use_column_wise_sharding=args.use_column_wise_shard,
+                refine_time_budget=getattr(args, "sharding_refine_time_budget", 0),
             )
             shard_strategy_, shard_matrix_, shard_column_wise_nums_ = planner.plan()
 
@@ -182,6 +192,8 @@ def generate_plan_ragged_ev_size(
                 dram_cap * args.num_gpus_per_node,
                 slot_size_array,
                 1,
+                cost_profile=getattr(args, "sharding_cost_profile", None),
+                frequency_summaries=frequency_summaries,
             )
             planner = Planner(
                 multi_hot_sizes,
@@ -193,6 +205,7 @@ def generate_plan_ragged_ev_size(
                 cost_model,
                 log_result=log_result,
                 use_column_wise_sharding=args.use_column_wise_shard,
+                refine_time_budget=getattr(args, "sharding_refine_time_budget", 0),
             )
             shard_strategy_, shard_matrix_node_, shard_column_wise_nums_ = planner.plan()
             shard_matrix_ = []
@@ -236,6 +249,16 @@ def generate_plan(
 
     num_table = len(slot_size_array)
 
+    # hotness after the dedup of the keys of the samples on a GPU, which is the raw hotness
+    # without the frequency summaries
+    args.FREQUENCY_SUMMARIES = None
+    if getattr(args, "sharding_frequency_summaries", None) is not None:
+        args.FREQUENCY_SUMMARIES = load_frequency_summaries(args.sharding_frequency_summaries)
+        assert len(args.FREQUENCY_SUMMARIES) == num_table, "frequency summaries mismatch tables"
+    local_hotness = get_effective_hotness(
+        args.FREQUENCY_SUMMARIES, multi_hot_sizes, args.batchsize // num_gpus
+    )
+
     # 1. select dp tables based on sorting table_size
     def filter_dp_tables(candidate_table_ids, threshold):
         candidate_table_meta = []
@@ -245,7 +268,7 @@ def generate_plan(
                     table_id,
                     (
                         slot_size_array[table_id] * ev_size_list[table_id],
-                        -1 * multi_hot_sizes[table_id],
+                        -1 * local_hotness[table_id],
                     ),
                 )
             )
@@ -277,7 +300,7 @@ def generate_plan(
             candidate_table_meta.append(
                 (
                     table_id,
-                    (multi_hot_sizes[table_id], slot_size_array[table_id] * ev_size_list[table_id]),
+                    (local_hotness[table_id], slot_size_array[table_id] * ev_size_list[table_id]),
                 )
             )
         sorted_table_meta = sorted(candidate_table_meta, key=lambda x: x[1])
@@ -367,6 +390,11 @@ def generate_plan(
         logging.info("num_gpu_per_nodes: %d", args.num_gpus_per_node)
         logging.info("Memory to communication BW ratio: %f", args.mem_comm_bw_ratio)
         logging.info("Memory to communication work ratio: %f", args.mem_comm_work_ratio)
+        if getattr(args, "sharding_cost_profile", None) is not None:
+            logging.info("Cost profile: %s", args.sharding_cost_profile)
+        if args.FREQUENCY_SUMMARIES is not None:
+            logging.info("Hotness after the dedup of the samples on a GPU:")
+            logging.info(local_hotness)
         logging.info("DRAM capacity: %f GB", args.memory_cap_for_embedding)
         logging.info("shard_matrix:")
         logging.info(shard_matrix)
@@ -384,3 +412,34 @@ def generate_plan(
         logging.info(sparse_table_shard_column_wise_nums)
         logging.info("\n")
     return shard_matrix, shard_strategy, unique_table_ids, reduction_table_ids
+
+
+def calibrate(timing_logs: List[str], output: str, fit_ev_size_compensation: bool = True):
+    records = load_timing_logs(timing_logs)
+    cost_profile = fit_cost_profile(records, fit_ev_size_compensation=fit_ev_size_compensation)
+    logging.info("Calibrated cost profile from %d timing records:", len(records))
+    logging.info(json.dumps(cost_profile))
+    save_cost_profile(cost_profile, output)
+    return cost_profile
+
+
+if __name__ == "__main__":
+    # run as a module, e.g. python -m sharding.generate_plan calibrate timing.jsonl --output p.json
+    parser = argparse.ArgumentParser(description="Tools of the automatic sharding plan")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = subparsers.add_parser(
+        "calibrate",
+        help="Fit the coefficients of CostModel from per-iteration timing logs of past runs "
+        "and save them to a cost profile, which can be used by train.py --sharding_cost_profile",
+    )
+    calibrate_parser.add_argument("timing_logs", nargs="+", help="Timing logs in json lines")
+    calibrate_parser.add_argument("--output", required=True, help="Path of the cost profile")
+    calibrate_parser.add_argument(
+        "--no_ev_size_compensation",
+        action="store_true",
+        help="Use the ev_size as is instead of fitting an ev_size compensation",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "calibrate":
+        calibrate(args.timing_logs, args.output, not args.no_ev_size_compensation)
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import heapq
+import json
 import logging
 import time
 from typing import List, Tuple
@@ -19,20 +21,34 @@ from typing import List, Tuple
 import numpy as np
 import copy
 
+from .frequency import get_unique_ratios
 
-def ev_size_compensation(ev_sizes_array):
+cost_profile_version = 1
+# the communication cost of the hierarchical plan is scaled by this ratio of the NIC to NVLink cost
+default_hier_comm_factor = 3 / 2
+
+
+def ev_size_compensation(ev_sizes_array, compensation=None):
+    """
+    The effective ev_size of the lookup work. Without a compensation (the default) the ev_size
+    is used as is, otherwise every ev_size is aligned to compensation["align"] and the remainder
+    is compensated by an intercept plus a linear slope, as fitted by the calibration
+    """
+    if compensation is None:
+        return ev_sizes_array
     # use some magic num to evaluation ev_size conpensation
-    align_128 = (np.floor((ev_sizes_array - 1) / 128)).astype(np.int32)
-    align_128 = (align_128 * 128).astype(np.int32)
+    align = int(compensation.get("align", 128))
+    align_128 = (np.floor((ev_sizes_array - 1) / align)).astype(np.int32)
+    align_128 = (align_128 * align).astype(np.int32)
     remainders = (ev_sizes_array - align_128).astype(np.int32)
 
-    intercept = int(96)
-    slope_range = int(32)
+    intercept = compensation.get("intercept", 96)
+    slope_range = compensation.get("slope_range", 32)
 
     ev_sizes_compensation = (
-        align_128 + intercept + (np.floor((remainders / 128) * slope_range)).astype(np.int32)
+        align_128 + intercept + (np.floor((remainders / align) * slope_range)).astype(np.int32)
     )
-    return ev_sizes_array
+    return ev_sizes_compensation
 
 
 class ShardingState:
@@ -66,9 +82,7 @@ class ShardingState:
         mp_table_id = np.arange(array_hotness.size)
         array_hotness_mp = array_hotness[mp_table_id]
         array_evsizes_mp = array_evsizes[mp_table_id]
-        array_cost_mp = cost.get_cost_per_lookup(
-            array_hotness_mp, ev_size_compensation(array_evsizes_mp)
-        )
+        array_cost_mp = cost.get_cost_per_lookup(array_hotness_mp, array_evsizes_mp, mp_table_id)
 
         sorted_idx = np.argsort(array_cost_mp)[::-1]  # hotness idx from max to min
         self.array_unshard_hotness = array_hotness  # raw hotness array
@@ -90,8 +104,22 @@ class ShardingState:
         self.array_num_split = np.zeros(self.array_unshard_hotness.size, dtype=int)
         self.array_num_split[mp_table_id] = 1
         self.shard_ll = [[] for i in range(self.num_bucket)]  # N device list
+        self.shard_sets = [set() for i in range(self.num_bucket)]  # tables of each device
         self.is_hier = is_hier
 
+    def copy(self):
+        """
+        A cheaper replacement of copy.deepcopy, only the containers mutated by the planner
+        are copied
+        """
+        ss = copy.copy(self)
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray):
+                setattr(ss, name, value.copy())
+        ss.shard_ll = [list(shard_list) for shard_list in self.shard_ll]
+        ss.shard_sets = [set(shard_set) for shard_set in self.shard_sets]
+        return ss
+
     def split_hot_shard(self, cost, is_column_wise=False):
         """
         split the shard with the largest hotness
@@ -99,7 +127,11 @@ class ShardingState:
         # shards are sorted based on the hotness. Find the first hot shard that
         # can be split further
         # TODO:maybe we can change the algo of split, we need consider the column-wise sharding
-        tmp_embedding_length_cost = ev_size_compensation(self.array_evsizes) * self.array_hotness
+        tmp_embedding_length_cost = (
+            cost.compensate_ev_sizes(self.array_evsizes)
+            * self.array_hotness
+            * cost.array_unique_ratio[self.array_table_id]
+        )
         tmp_embedding_com_cost = self.array_evsizes * 80
         # tmp_ratio = tmp_embedding_length_cost/tmp_embedding_com_cost
         # tmp_ratio = tmp_embedding_length_cost
@@ -160,7 +192,7 @@ class ShardingState:
                 break
 
         self.array_cost = cost.get_cost_per_lookup(
-            self.array_hotness, ev_size_compensation(self.array_evsizes)
+            self.array_hotness, self.array_evsizes, self.array_table_id
         )
         # sort after splitting to maintain the shard hotness in order
         sorted_idx = np.argsort(self.array_cost)[::-1]
@@ -216,7 +248,9 @@ class ShardingState:
                 )
             )
 
-            self.array_cost = cost.get_cost_per_lookup(self.array_hotness, self.array_evsizes)
+            self.array_cost = cost.get_cost_per_lookup(
+                self.array_hotness, self.array_evsizes, self.array_table_id
+            )
             # sort after splitting to maintain the shard hotness in order
             sorted_idx = np.argsort(self.array_cost)[::-1]
             self.array_cost = self.array_cost[sorted_idx]
@@ -235,6 +269,7 @@ class ShardingState:
 
     def reset_shard_ll(self):
         self.shard_ll = [[] for i in range(self.num_bucket)]
+        self.shard_sets = [set() for i in range(self.num_bucket)]
 
     def get_column_wise_sharding_nums(self):
         return self.array_unshard_evsizes / self.array_unshard_evsizes_update
@@ -245,12 +280,17 @@ class ShardingState:
         table_id: int,
     ) -> None:
         self.shard_ll[bucket_id].append(table_id)
+        self.shard_sets[bucket_id].add(table_id)
 
     def pop_bucket(
         self,
         bucket_id: int,
     ) -> None:
-        self.shard_ll[bucket_id].pop()
+        table_id = self.shard_ll[bucket_id].pop()
+        self.shard_sets[bucket_id].discard(table_id)
+
+    def in_bucket(self, bucket_id: int, table_id: int) -> bool:
+        return table_id in self.shard_sets[bucket_id]
 
 
 class Cost:
@@ -280,6 +320,9 @@ class CostModel:
         mem_capacity: float,
         table_size: List[int],
         key_embedding_type_ratio: int = 1,
+        *,
+        cost_profile=None,
+        frequency_summaries: List[dict] = None,
     ) -> None:
         self.unit_hotness_cost = hotness_cost
         self.band_width_ratio = band_width_ratio
@@ -291,6 +334,46 @@ class CostModel:
         self.mem_capacity = mem_capacity
         self.array_table_size = np.array(table_size)
         self.key_embedding_type_ratio = key_embedding_type_ratio
+        self.hier_comm_factor = default_hier_comm_factor
+        self.ev_size_compensation = None
+        if cost_profile is not None:
+            self.apply_cost_profile(cost_profile)
+        # the lookup work of a table is its hotness after the dedup of the keys in a batch
+        self.array_unique_ratio = np.ones(self.array_table_size.size)
+        if frequency_summaries is not None:
+            assert len(frequency_summaries) == self.array_table_size.size
+            self.array_unique_ratio = get_unique_ratios(frequency_summaries, batchsize)
+
+    @staticmethod
+    def load_cost_profile(path: str) -> dict:
+        with open(path, "r") as f:
+            cost_profile = json.load(f)
+        if cost_profile.get("version") != cost_profile_version:
+            raise RuntimeError(
+                "Unsupported cost profile version {} in {}".format(
+                    cost_profile.get("version"), path
+                )
+            )
+        return cost_profile
+
+    def apply_cost_profile(self, cost_profile) -> None:
+        """
+        Override the coefficients with a cost profile fitted by `generate_plan.py calibrate`,
+        the cost profile can be either a path to the json file or the loaded dict. Coefficients
+        missing in the profile keep their current values
+        """
+        if isinstance(cost_profile, str):
+            cost_profile = self.load_cost_profile(cost_profile)
+        self.band_width_ratio = cost_profile.get("mem_comm_bw_ratio", self.band_width_ratio)
+        self.sparse_work_ratio = cost_profile.get("mem_comm_work_ratio", self.sparse_work_ratio)
+        self.dense_work_ratio = cost_profile.get("dense_comm_work_ratio", self.dense_work_ratio)
+        self.hier_comm_factor = cost_profile.get("hier_comm_factor", self.hier_comm_factor)
+        self.ev_size_compensation = cost_profile.get(
+            "ev_size_compensation", self.ev_size_compensation
+        )
+
+    def compensate_ev_sizes(self, ev_sizes_array: np.array) -> np.array:
+        return ev_size_compensation(ev_sizes_array, self.ev_size_compensation)
 
     def get_cost(
         self,
@@ -308,7 +391,8 @@ class CostModel:
                 * self.batchsize
                 * (
                     ss.array_unshard_hotness[shard_list]
-                    * ev_size_compensation(ss.array_unshard_evsizes_update[shard_list])
+                    * self.array_unique_ratio[shard_list]
+                    * self.compensate_ev_sizes(ss.array_unshard_evsizes_update[shard_list])
                     / np.array(ss.array_num_split)[shard_list]
                 ).sum()
             )
@@ -319,8 +403,8 @@ class CostModel:
 
             if ss.is_hier:
                 comm_cost = comm_cost / ss.num_gpus_per_node
-                # TODO:give a ratio of nvlink bw compare to NIC bw
-                comm_cost = comm_cost * 3 / 2
+                # ratio of the inter-node to the intra-node communication cost
+                comm_cost = comm_cost * self.hier_comm_factor
                 hotness_cost = hotness_cost / ss.num_gpus_per_node
             if len(shard_list) > 0:
                 mem_cost = (
@@ -349,18 +433,95 @@ class CostModel:
             max(list_mem_cost) > self.mem_capacity,
         )
 
-    def get_cost_per_lookup(self, hotness_array: np.array, ev_sizes_array: np.array) -> np.array:
+    def get_cost_per_shard(
+        self,
+        ss: ShardingState,
+    ) -> Tuple[np.array, np.array, np.array]:
+        """
+        The hotness, communication and memory cost of one shard of every table, the cost of a
+        bucket in get_cost is the sum of the costs of the shards in it
+        """
+        array_num_split = np.array(ss.array_num_split).astype(np.float64)
+        # tables which are not split yet still have a shard in the default plan
+        array_num_split[array_num_split == 0] = 1
+        hotness_cost = (
+            self.unit_hotness_cost
+            * self.sparse_work_ratio
+            * self.batchsize
+            * (
+                ss.array_unshard_hotness
+                * self.array_unique_ratio
+                * self.compensate_ev_sizes(ss.array_unshard_evsizes_update)
+                / array_num_split
+            )
+        )
+        comm_cost = self.band_width_ratio * self.batchsize * ss.array_unshard_evsizes_update
+        if ss.is_hier:
+            comm_cost = comm_cost / ss.num_gpus_per_node
+            comm_cost = comm_cost * self.hier_comm_factor
+            hotness_cost = hotness_cost / ss.num_gpus_per_node
+        mem_cost = (
+            self.unit_mem_cost
+            / (ss.array_unshard_evsizes / ss.array_unshard_evsizes_update)
+            * self.array_table_size
+            / array_num_split
+        )
+        return hotness_cost, comm_cost, mem_cost
+
+    def get_cost_per_lookup(
+        self, hotness_array: np.array, ev_sizes_array: np.array, table_ids: np.array = None
+    ) -> np.array:
+        if table_ids is not None:
+            hotness_array = hotness_array * self.array_unique_ratio[table_ids]
         hotness_cost = (
             self.unit_hotness_cost
             * self.sparse_work_ratio
             * self.batchsize
-            * ev_size_compensation(ev_sizes_array)
+            * self.compensate_ev_sizes(ev_sizes_array)
             * hotness_array
         )
         comm_cost = self.band_width_ratio * self.batchsize * ev_sizes_array
         return hotness_cost + comm_cost
 
 
+class IncrementalCost:
+    """
+    Keep the running sums of the bucket costs of CostModel.get_cost, so pushing a shard into
+    or popping a shard from a bucket updates the costs in O(1) instead of recomputing all the
+    buckets.
+    """
+
+    def __init__(
+        self,
+        cost_model: CostModel,
+        ss: ShardingState,
+    ) -> None:
+        (
+            self.shard_hotness_cost,
+            self.shard_comm_cost,
+            self.shard_mem_cost,
+        ) = cost_model.get_cost_per_shard(ss)
+        self.shard_cost = self.shard_hotness_cost + self.shard_comm_cost
+        self.mem_capacity = cost_model.mem_capacity
+        self.cost = np.zeros(ss.num_bucket)
+        self.mem_cost = np.zeros(ss.num_bucket)
+        for bucket_id, shard_list in enumerate(ss.shard_ll):
+            for table_id in shard_list:
+                self.push(bucket_id, table_id)
+
+    def fit(self, bucket_id: int, table_id: int) -> bool:
+        # the other buckets are not changed, so only the pushed bucket can be OOM
+        return self.mem_cost[bucket_id] + self.shard_mem_cost[table_id] <= self.mem_capacity
+
+    def push(self, bucket_id: int, table_id: int) -> None:
+        self.cost[bucket_id] += self.shard_cost[table_id]
+        self.mem_cost[bucket_id] += self.shard_mem_cost[table_id]
+
+    def pop(self, bucket_id: int, table_id: int) -> None:
+        self.cost[bucket_id] -= self.shard_cost[table_id]
+        self.mem_cost[bucket_id] -= self.shard_mem_cost[table_id]
+
+
 class Planner:
     """
     The planner work out a series of plans iteratively.
@@ -383,6 +544,8 @@ class Planner:
         max_search_iter: int = 20,
         use_column_wise_sharding: bool = False,
         log_result: bool = False,
+        use_incremental_cost: bool = True,
+        refine_time_budget: float = 0.0,
     ) -> None:
         self.array_hotness = np.array(list_hotness)
         self.ev_sizes = np.array(ev_sizes)
@@ -398,6 +561,8 @@ class Planner:
         self.list_candidate = []
         self.max_search_iter = max_search_iter
         self.log_result = log_result
+        self.use_incremental_cost = use_incremental_cost
+        self.refine_time_budget = refine_time_budget
 
         # Create the default sharding plan. Throw if even this default sharding plan cannot fit, as
         # it should be the most memory-efficient
@@ -427,6 +592,7 @@ class Planner:
                 cost.hotness_cost,
                 cost.comm_cost,
                 cost.mem_cost,
+                np.array(sharding_state_default.array_num_split),
                 sharding_state_default.get_column_wise_sharding_nums(),
                 sharding_state_default.shard_ll,
             )
@@ -454,6 +620,46 @@ class Planner:
         This is a heuristic based on greedy policy. The shard is placed to the bucket with the
         lowest hotness cost
         """
+        if not self.use_incremental_cost:
+            return self.greedy_plan_full_cost(ss)
+
+        ss.reset_shard_ll()
+        incremental_cost = IncrementalCost(self.cost_model, ss)
+        # min heap of (bucket cost, bucket id)
+        bucket_heap = [(0.0, bucket_id) for bucket_id in range(ss.num_bucket)]
+
+        for i in range(ss.array_cost.size):  # mp table num
+            table_id = ss.array_table_id[i]
+            sharded = False
+            skipped_buckets = []
+            while bucket_heap:
+                bucket_cost, bucket_id = heapq.heappop(bucket_heap)
+                # for now, only uniform sharding is supported. Hence cannot put two shards
+                # from the same table into the same bucket
+                if not ss.in_bucket(bucket_id, table_id) and incremental_cost.fit(
+                    bucket_id, table_id
+                ):
+                    ss.push_bucket(bucket_id, table_id)
+                    incremental_cost.push(bucket_id, table_id)
+                    heapq.heappush(bucket_heap, (incremental_cost.cost[bucket_id], bucket_id))
+                    sharded = True
+                    break
+                # Current bucket cannot fit. Iterate to the next best bucket
+                skipped_buckets.append((bucket_cost, bucket_id))
+            for skipped_bucket in skipped_buckets:
+                heapq.heappush(bucket_heap, skipped_bucket)
+            if not sharded:
+                # This means the shard is too large to fit within any bucket
+                cost, _ = self.cost_model.get_cost(ss)
+                return table_id, ss, cost
+        cost, _ = self.cost_model.get_cost(ss)
+        return None, ss, cost
+
+    def greedy_plan_full_cost(self, ss):
+        """
+        The reference implementation of greedy_plan, which recomputes the costs of all the
+        buckets after every tentative push
+        """
         array_cost = np.zeros(ss.num_bucket)
 
         ss.reset_shard_ll()
@@ -481,6 +687,98 @@ class Planner:
                 return ss.array_table_id[i], ss, cost
         return None, ss, cost
 
+    def refine_plan(self, candidate):
+        """
+        Refine a plan with a local search minimizing the max bucket cost under the memory
+        capacity. In each step, the shards of the most expensive bucket are moved to or swapped
+        with the shards of another bucket, choosing the step with the lowest resulting cost of
+        the two buckets. The search stops at a local optimum or when refine_time_budget runs out.
+        """
+        t0 = time.time()
+        _, _, _, _, array_num_split, shard_column_wise_nums, shard_ll = candidate
+        ss = self.sharding_state.copy()
+        ss.array_num_split = np.array(array_num_split)
+        ss.array_unshard_evsizes_update = ss.array_unshard_evsizes / np.array(
+            shard_column_wise_nums
+        )
+        ss.reset_shard_ll()
+        for bucket_id, shard_list in enumerate(shard_ll):
+            for table_id in shard_list:
+                ss.push_bucket(bucket_id, table_id)
+
+        incremental_cost = IncrementalCost(self.cost_model, ss)
+        bucket_cost = incremental_cost.cost
+        bucket_mem = incremental_cost.mem_cost
+        shard_cost = incremental_cost.shard_cost
+        shard_mem = incremental_cost.shard_mem_cost
+        mem_capacity = self.cost_model.mem_capacity
+        num_steps = 0
+        while time.time() - t0 < self.refine_time_budget:
+            src = int(np.argmax(bucket_cost))
+            src_cost = bucket_cost[src]
+            # (cost of the two buckets after the step, dst bucket, src table, dst table or None)
+            best_step = (src_cost, None, None, None)
+            for table_id in set(ss.shard_ll[src]):
+                # move a shard of table_id from src to dst
+                new_cost = np.maximum(
+                    bucket_cost + shard_cost[table_id], src_cost - shard_cost[table_id]
+                )
+                feasible = bucket_mem + shard_mem[table_id] <= mem_capacity
+                for dst in range(ss.num_bucket):
+                    if dst == src or ss.in_bucket(dst, table_id):
+                        continue
+                    if feasible[dst] and new_cost[dst] < best_step[0]:
+                        best_step = (new_cost[dst], dst, table_id, None)
+                    # swap with a cheaper shard of dst, also if dst has no memory for the move
+                    for dst_table_id in set(ss.shard_ll[dst]):
+                        delta = shard_cost[table_id] - shard_cost[dst_table_id]
+                        if delta <= 0 or ss.in_bucket(src, dst_table_id):
+                            continue
+                        swap_cost = max(src_cost - delta, bucket_cost[dst] + delta)
+                        if (
+                            swap_cost < best_step[0]
+                            and bucket_mem[dst] + shard_mem[table_id] - shard_mem[dst_table_id]
+                            <= mem_capacity
+                            and bucket_mem[src] - shard_mem[table_id] + shard_mem[dst_table_id]
+                            <= mem_capacity
+                        ):
+                            best_step = (swap_cost, dst, table_id, dst_table_id)
+            _, dst, table_id, dst_table_id = best_step
+            if dst is None:
+                break
+            self.move_shard(ss, incremental_cost, src, dst, table_id)
+            if dst_table_id is not None:
+                self.move_shard(ss, incremental_cost, dst, src, dst_table_id)
+            num_steps += 1
+
+        cost, oom = self.cost_model.get_cost(ss)
+        assert not oom, "refinement should never break the memory capacity"
+        if self.log_result:
+            logging.info(
+                "Refinement took %f sec, %d steps, max bucket cost %f -> %f"
+                % (time.time() - t0, num_steps, candidate[0], cost.cost.max())
+            )
+        if cost.cost.max() >= candidate[0]:
+            return candidate
+        return (
+            cost.cost.max(),
+            cost.hotness_cost,
+            cost.comm_cost,
+            cost.mem_cost,
+            array_num_split,
+            shard_column_wise_nums,
+            ss.shard_ll,
+        )
+
+    @staticmethod
+    def move_shard(ss, incremental_cost, src, dst, table_id):
+        shard_list = ss.shard_ll[src]
+        shard_list.remove(table_id)
+        ss.shard_sets[src].discard(table_id)
+        incremental_cost.pop(src, table_id)
+        ss.push_bucket(dst, table_id)
+        incremental_cost.push(dst, table_id)
+
     def plan(self):
         t0 = time.time()
         for i in range(self.max_search_iter):
@@ -493,6 +791,7 @@ class Planner:
                         cost.hotness_cost,
                         cost.comm_cost,
                         cost.mem_cost,
+                        np.array(self.sharding_state.array_num_split),
                         self.sharding_state.get_column_wise_sharding_nums(),
                         self.sharding_state.shard_ll,
                     )
@@ -501,8 +800,8 @@ class Planner:
 
                 if self.use_column_wise_sharding:
                     # we have two choice , first is row split , second is column split
-                    sharding_state_row = copy.deepcopy(self.sharding_state)
-                    sharding_state_col = copy.deepcopy(self.sharding_state)
+                    sharding_state_row = self.sharding_state.copy()
+                    sharding_state_col = self.sharding_state.copy()
                     my_dict = vars(sharding_state_row)
                     ss_dict = vars(self.sharding_state)
                     sharding_state_row.split_hot_shard(cost=self.cost_model, is_column_wise=False)
@@ -552,8 +851,8 @@ class Planner:
                     self.sharding_state.split_hot_shard(cost=self.cost_model)
             else:
                 if self.use_column_wise_sharding:
-                    sharding_state_row = copy.deepcopy(self.sharding_state)
-                    sharding_state_col = copy.deepcopy(self.sharding_state)
+                    sharding_state_row = self.sharding_state.copy()
+                    sharding_state_col = self.sharding_state.copy()
 
                     oom_table_can_split_row = sharding_state_row.split_oom_shard(
                         oom_table_id, cost=self.cost_model, is_column_wise=False
@@ -598,6 +897,8 @@ class Planner:
                     break
 
         self.list_candidate.sort(key=lambda x: x[0])
+        if self.refine_time_budget > 0:
+            self.list_candidate[0] = self.refine_plan(self.list_candidate[0])
 
         sparse_cost = self.list_candidate[0][0]
         print("sparse cost = ", sparse_cost)
@@ -0,0 +1,304 @@
+# Copyright (c) 2023, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Replay batches of a dataset against a sharding plan on CPU, to compare the plans on real keys.
+
+It follows the placement rules of the embedding collection:
+1. a dp table is looked up by every GPU with the keys of its own samples.
+2. a mp table is placed on the GPUs having it in shard_matrix, in the order of the GPU id. A
+   column-wise sharded table (table_id, n) is split into n tables of ev_size / n, the i-th one
+   is placed on the i-th 1/n of these GPUs.
+3. the keys of a mp table are routed to gpus[key % len(gpus)] of its GPUs.
+4. a reduction table sends back the pooled embedding of every sample from every GPU it is on,
+   a unique table sends back the embedding of every unique key of every sample GPU.
+
+Run it as a module, e.g. python -m sharding.simulator --dataset_path data.bin --sharding_plans
+round_robin,auto with the table configs of train.py.
+"""
+
+import argparse
+import copy
+import json
+import logging
+from typing import List
+
+import numpy as np
+
+from .dataset import add_dataset_args, load_raw_batches, parse_table_args
+from .generate_plan import generate_plan
+
+report_metrics = [
+    "keys",
+    "unique_keys",
+    "lookup_bytes",
+    "a2a_send_bytes",
+    "a2a_recv_bytes",
+    "inter_node_send_bytes",
+]
+
+
+def to_table_id(table):
+    return int(table[0]) if isinstance(table, (tuple, list)) else int(table)
+
+
+class PlanSimulator:
+    def __init__(
+        self,
+        shard_matrix: List[List],
+        shard_strategy: List,
+        ev_size_list: List[int],
+        num_gpus_per_node: int,
+        unique_table_ids: List = None,
+        key_bytes: int = 8,
+        emb_bytes: int = 4,
+    ) -> None:
+        self.num_gpus = len(shard_matrix)
+        self.num_gpus_per_node = num_gpus_per_node
+        self.key_bytes = key_bytes
+        self.emb_bytes = emb_bytes
+        self.ev_size_list = ev_size_list
+        self.unique_table_ids = set(int(table_id) for table_id in (unique_table_ids or []))
+        gpu_sets = [set(to_table_id(table) for table in tables) for tables in shard_matrix]
+
+        # table id -> list of (gpus, ev_size) of its column-wise shards, None for dp tables
+        self.table_shards = {}
+        for strategy, tables in shard_strategy:
+            for table in tables:
+                table_id = to_table_id(table)
+                if strategy == "dp":
+                    self.table_shards[table_id] = None
+                    continue
+                num_column_shards = int(table[1]) if isinstance(table, (tuple, list)) else 1
+                gpus = [gpu_id for gpu_id in range(self.num_gpus) if table_id in gpu_sets[gpu_id]]
+                assert len(gpus) > 0, "table {} is not placed on any GPU".format(table_id)
+                assert len(gpus) % num_column_shards == 0, "column-wise GPUs can not be divided"
+                num_row_shards = len(gpus) // num_column_shards
+                self.table_shards[table_id] = [
+                    (
+                        np.array(gpus[i * num_row_shards : (i + 1) * num_row_shards]),
+                        ev_size_list[table_id] // num_column_shards,
+                    )
+                    for i in range(num_column_shards)
+                ]
+        self.reset()
+
+    def reset(self) -> None:
+        self.num_batches = 0
+        self.keys = np.zeros(self.num_gpus, dtype=np.int64)
+        self.unique_keys = np.zeros(self.num_gpus, dtype=np.int64)
+        self.lookup_bytes = np.zeros(self.num_gpus, dtype=np.int64)
+        # bytes sent from the row GPU to the column GPU in the all-to-all of keys and embeddings
+        self.a2a_bytes = np.zeros((self.num_gpus, self.num_gpus), dtype=np.int64)
+
+    def simulate_batch(self, table_keys: List[np.array]) -> None:
+        """
+        Replay a global batch, table_keys[i] are the keys of table i in shape of
+        (batchsize, hotness). The samples are evenly distributed to the GPUs in order
+        """
+        batchsize = table_keys[0].shape[0]
+        assert batchsize % self.num_gpus == 0, "batchsize should be divisible by the number of GPUs"
+        batchsize_per_gpu = batchsize // self.num_gpus
+        for table_id, shards in self.table_shards.items():
+            keys = table_keys[table_id].reshape(self.num_gpus, -1)
+            if shards is None:
+                ev_size = self.ev_size_list[table_id]
+                for gpu_id in range(self.num_gpus):
+                    num_unique = np.unique(keys[gpu_id]).size
+                    self.keys[gpu_id] += keys[gpu_id].size
+                    self.unique_keys[gpu_id] += num_unique
+                    self.lookup_bytes[gpu_id] += num_unique * ev_size * self.emb_bytes
+                continue
+            for gpus, ev_size in shards:
+                dst = gpus[keys % gpus.size]
+                self.keys += np.bincount(dst.ravel(), minlength=self.num_gpus)
+                unique_keys = np.unique(keys)
+                num_unique = np.bincount(
+                    gpus[unique_keys % gpus.size], minlength=self.num_gpus
+                ).astype(np.int64)
+                self.unique_keys += num_unique
+                self.lookup_bytes += num_unique * ev_size * self.emb_bytes
+                # every column-wise shard is a lookup of its own, which gets the keys
+                for src in range(self.num_gpus):
+                    self.a2a_bytes[src] += (
+                        np.bincount(dst[src], minlength=self.num_gpus) * self.key_bytes
+                    )
+                if table_id in self.unique_table_ids:
+                    for src in range(self.num_gpus):
+                        src_unique_keys = np.unique(keys[src])
+                        self.a2a_bytes[:, src] += (
+                            np.bincount(gpus[src_unique_keys % gpus.size], minlength=self.num_gpus)
+                            * ev_size
+                            * self.emb_bytes
+                        )
+                else:
+                    self.a2a_bytes[gpus] += batchsize_per_gpu * ev_size * self.emb_bytes
+        self.num_batches += 1
+
+    def report(self) -> dict:
+        """
+        The per-GPU metrics averaged over the replayed batches and their load imbalance,
+        i.e., max / mean. Self-sends are excluded from the all-to-all bytes
+        """
+        a2a_bytes = self.a2a_bytes.copy()
+        np.fill_diagonal(a2a_bytes, 0)
+        node_ids = np.arange(self.num_gpus) // self.num_gpus_per_node
+        inter_node = node_ids[:, None] != node_ids[None, :]
+        per_gpu = {
+            "keys": self.keys,
+            "unique_keys": self.unique_keys,
+            "lookup_bytes": self.lookup_bytes,
+            "a2a_send_bytes": a2a_bytes.sum(axis=1),
+            "a2a_recv_bytes": a2a_bytes.sum(axis=0),
+            "inter_node_send_bytes": (a2a_bytes * inter_node).sum(axis=1),
+        }
+        report = {"num_batches": self.num_batches}
+        for name in report_metrics:
+            value = per_gpu[name] / max(self.num_batches, 1)
+            mean = value.mean()
+            report[name] = value.tolist()
+            report[name + "_imbalance"] = float(value.max() / mean) if mean > 0 else 1.0
+        return report
+
+
+def simulate_plans(args: argparse.Namespace) -> dict:
+    reports = {}
+    plans = {}
+    if args.plan_file is not None:
+        with open(args.plan_file, "r") as f:
+            plan = json.load(f)
+        plans[args.plan_file] = (
+            plan["shard_matrix"],
+            plan["shard_strategy"],
+            plan.get("unique_table_ids", []),
+        )
+    for sharding_plan in args.sharding_plans:
+        plan_args = copy.copy(args)
+        plan_args.sharding_plan = sharding_plan
+        shard_matrix, shard_strategy, unique_table_ids, _ = generate_plan(
+            args.TABLE_SIZE_ARRAY,
+            args.MULTI_HOT_SIZES,
+            args.EMB_VEC_SIZES,
+            args.num_nodes,
+            args.num_gpus_per_node,
+            plan_args,
+            False,
+        )
+        plans[sharding_plan] = (shard_matrix, shard_strategy, unique_table_ids)
+
+    simulators = {
+        name: PlanSimulator(
+            shard_matrix,
+            shard_strategy,
+            args.EMB_VEC_SIZES,
+            args.num_gpus_per_node,
+            unique_table_ids,
+            key_bytes=8 if args.i64_input_key else 4,
+            emb_bytes=2 if args.use_mixed_precision else 4,
+        )
+        for name, (shard_matrix, shard_strategy, unique_table_ids) in plans.items()
+    }
+    for table_keys in load_raw_batches(
+        args.dataset_path,
+        args.MULTI_HOT_SIZES,
+        args.batchsize,
+        args.num_batches,
+        args.dense_dim,
+        1,
+        args.i64_input_key,
+        args.start_batch,
+    ):
+        for simulator in simulators.values():
+            simulator.simulate_batch(table_keys)
+    for name, simulator in simulators.items():
+        reports[name] = simulator.report()
+    return reports
+
+
+def log_reports(reports: dict) -> None:
+    logging.info(
+        "%-24s %12s %14s %12s %14s %16s %14s",
+        "plan",
+        "max_unique",
+        "max_lookup_MB",
+        "max_a2a_MB",
+        "max_inter_MB",
+        "lookup_imbalance",
+        "a2a_imbalance",
+    )
+    for name, report in reports.items():
+        logging.info(
+            "%-24s %12d %14.2f %12.2f %14.2f %16.2f %14.2f",
+            name,
+            max(report["unique_keys"]),
+            max(report["lookup_bytes"]) / 1024 / 1024,
+            max(max(report["a2a_send_bytes"]), max(report["a2a_recv_bytes"])) / 1024 / 1024,
+            max(report["inter_node_send_bytes"]) / 1024 / 1024,
+            report["lookup_bytes_imbalance"],
+            max(report["a2a_send_bytes_imbalance"], report["a2a_recv_bytes_imbalance"]),
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Replay a sample of a raw dataset against sharding plans on CPU and report "
+        "the per-GPU unique keys, lookup bytes, all-to-all bytes and load imbalance."
+    )
+    add_dataset_args(parser)
+    parser.add_argument("--num_batches", type=int, default=10)
+    parser.add_argument("--start_batch", type=int, default=0)
+    parser.add_argument("--batchsize", type=int, default=65536)
+    parser.add_argument("--num_nodes", type=int, default=1)
+    parser.add_argument("--num_gpus_per_node", type=int, default=8)
+    parser.add_argument("--use_mixed_precision", action="store_true")
+    parser.add_argument(
+        "--sharding_plans",
+        type=str,
+        default="round_robin,uniform,auto",
+        help="Comma separated sharding plans generated by generate_plan",
+    )
+    parser.add_argument(
+        "--plan_file",
+        type=str,
+        default=None,
+        help="A json file with shard_matrix, shard_strategy and optional unique_table_ids",
+    )
+    parser.add_argument("--output", type=str, default=None, help="Save the reports as json")
+    # the planner configs, same as train.py
+    parser.add_argument("--optimizer", type=str, choices=["adagrad", "sgd"], default="sgd")
+    parser.add_argument("--mem_comm_bw_ratio", type=float, default=2000 / 25)
+    parser.add_argument("--mem_comm_work_ratio", type=float, default=8 / 2)
+    parser.add_argument("--dense_comm_work_ratio", type=float, default=4 / 2)
+    parser.add_argument("--memory_cap_for_embedding", type=float, default=60)
+    parser.add_argument("--sharding_cost_profile", type=str, default=None)
+    parser.add_argument("--sharding_frequency_summaries", type=str, default=None)
+    parser.add_argument("--sharding_refine_time_budget", type=float, default=0)
+    parser.add_argument("--dp_threshold", type=int, default=0)
+    parser.add_argument("--dense_threshold", type=int, default=0)
+    parser.add_argument("--use_column_wise_shard", action="store_true")
+    args = parser.parse_args()
+
+    parse_table_args(args)
+    args.sharding_plans = [v for v in args.sharding_plans.split(",") if len(v) > 0]
+    return args
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_args()
+    reports = simulate_plans(args)
+    log_reports(reports)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
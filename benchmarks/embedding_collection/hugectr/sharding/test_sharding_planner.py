@@ -1,16 +1,19 @@
 import inspect
 import os
 import sys
+import tempfile
 import unittest
 from itertools import chain
 import numpy as np
 
-
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 
-from sharding import CostModel, Planner
+from sharding import CostModel, Planner, ShardingState
+from sharding.calibration import fit_cost_profile, save_cost_profile
+from sharding.frequency import compute_frequency_summary, get_unique_ratio
+from sharding.simulator import PlanSimulator
 
 list_table_size = [
     40000000,
@@ -113,7 +116,6 @@ class TestShardingPlanner(unittest.TestCase):
             60,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(list_hotness, ev_sizes, 1, 8, batchsize, False, cost_model)
         shard_strategy, shard_matrix, shard_column_wise_num = planner.plan()
@@ -140,7 +142,6 @@ class TestShardingPlanner(unittest.TestCase):
             60,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(list_hotness, ev_sizes, 2, 8, batchsize, False, cost_model)
         shard_strategy, shard_matrix, shard_column_wise_num = planner.plan()
@@ -167,7 +168,6 @@ class TestShardingPlanner(unittest.TestCase):
             480,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(list_hotness, ev_sizes, 2, 8, batchsize, True, cost_model)
         shard_strategy, shard_matrix, shard_column_wise_num = planner.plan()
@@ -194,7 +194,6 @@ class TestShardingPlanner(unittest.TestCase):
             60,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(list_hotness, ev_sizes, 4, 8, batchsize, False, cost_model)
         shard_strategy, shard_matrix, shard_column_wise_num = planner.plan()
@@ -221,7 +220,6 @@ class TestShardingPlanner(unittest.TestCase):
             480,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(list_hotness, ev_sizes, 4, 8, batchsize, True, cost_model)
         shard_strategy, shard_matrix, shard_column_wise_num = planner.plan()
@@ -248,7 +246,6 @@ class TestShardingPlanner(unittest.TestCase):
             60,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(
             list_hotness,
@@ -289,7 +286,6 @@ class TestShardingPlanner(unittest.TestCase):
             480,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(
             list_hotness, ev_sizes, 2, 8, batchsize, True, cost_model, use_column_wise_sharding=True
@@ -323,7 +319,6 @@ class TestShardingPlanner(unittest.TestCase):
             60,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(
             list_hotness,
@@ -364,7 +359,6 @@ class TestShardingPlanner(unittest.TestCase):
             480,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(
             list_hotness, ev_sizes, 4, 8, batchsize, True, cost_model, use_column_wise_sharding=True
@@ -398,7 +392,6 @@ class TestShardingPlanner(unittest.TestCase):
             480,
             list_table_size,
             1,
-            0.3,
         )
         planner = Planner(
             list_hotness,
@@ -442,7 +435,6 @@ class TestShardingPlanner(unittest.TestCase):
             60,
             list_table_size_oom,
             1,
-            0.4,
         )
 
         self.assertRaises(
@@ -450,6 +442,267 @@ class TestShardingPlanner(unittest.TestCase):
         )
         print("######################oom raise error end")
 
+    def test_incremental_cost(self):
+        print("######################incremental cost matches full cost")
+        batchsize = 2048
+        mem_cost = ev_sizes * 8 * 1e-9
+        for num_nodes, is_hier, use_column_wise_sharding in [
+            (1, False, False),
+            (2, False, True),
+            (4, True, True),
+        ]:
+            max_costs = []
+            for use_incremental_cost in [False, True]:
+                cost_model = CostModel(
+                    1,
+                    72,
+                    4,
+                    4,
+                    batchsize,
+                    mem_cost,
+                    ev_sizes,
+                    480 if is_hier else 60,
+                    list_table_size,
+                    1,
+                )
+                planner = Planner(
+                    list_hotness,
+                    ev_sizes,
+                    num_nodes,
+                    8,
+                    batchsize,
+                    is_hier,
+                    cost_model,
+                    use_column_wise_sharding=use_column_wise_sharding,
+                    use_incremental_cost=use_incremental_cost,
+                )
+                shard_strategy, shard_matrix, shard_column_wise_num = planner.plan()
+                sanity_check(shard_matrix, shard_strategy)
+                max_costs.append(planner.list_candidate[0][0])
+            self.assertAlmostEqual(max_costs[0], max_costs[1], delta=max_costs[0] * 1e-9)
+
+    def test_refine_plan(self):
+        print("######################refined plan is not worse than greedy plan")
+        batchsize = 2048
+        mem_cost = ev_sizes * 8 * 1e-9
+        for num_nodes, is_hier, use_column_wise_sharding in [(1, False, False), (4, True, True)]:
+            max_costs = []
+            for refine_time_budget in [0, 10]:
+                cost_model = CostModel(
+                    1,
+                    72,
+                    4,
+                    4,
+                    batchsize,
+                    mem_cost,
+                    ev_sizes,
+                    480 if is_hier else 60,
+                    list_table_size,
+                    1,
+                )
+                planner = Planner(
+                    list_hotness,
+                    ev_sizes,
+                    num_nodes,
+                    8,
+                    batchsize,
+                    is_hier,
+                    cost_model,
+                    use_column_wise_sharding=use_column_wise_sharding,
+                    refine_time_budget=refine_time_budget,
+                )
+                shard_strategy, shard_matrix, shard_column_wise_num = planner.plan()
+                sanity_check(shard_matrix, shard_strategy)
+                self.assertTrue((planner.list_candidate[0][3] <= cost_model.mem_capacity).all())
+                max_costs.append(planner.list_candidate[0][0])
+            self.assertLessEqual(max_costs[1], max_costs[0])
+
+    def test_refine_plan_swap_under_memory_capacity(self):
+        print("######################refinement swaps shards into a bucket without memory to move")
+        # tables A, B in bucket 0 (cost 6), C, D in bucket 1 (cost 4) which is full, so no shard
+        # can be moved to bucket 1, but swapping B and C gives cost 5
+        hotness = [4, 2, 1, 3]
+        table_size = [1, 5, 5, 5]
+        ev_size = np.full(4, 16)
+        cost_model = CostModel(1, 0, 1, 1, 1, np.ones(4), ev_size, 10, table_size, 1)
+        costs = []
+        for refine_time_budget in [0, 10]:
+            planner = Planner(
+                hotness, ev_size, 1, 2, 1, False, cost_model, refine_time_budget=refine_time_budget
+            )
+            candidate = (np.inf, None, None, None, [1] * 4, [1] * 4, [[0, 1], [2, 3]])
+            costs.append(planner.refine_plan(candidate)[0])
+        self.assertAlmostEqual(costs[1] / costs[0], 5 / 6)
+
+    def test_calibrate_cost_profile(self):
+        print("######################calibrated cost profile recovers the cost model")
+        batchsize = 2048
+        mem_cost = ev_sizes * 8 * 1e-9
+        true_profile = {
+            "version": 1,
+            "mem_comm_work_ratio": 0.5,
+            "mem_comm_bw_ratio": 30,
+            "hier_comm_factor": 2.0,
+            "ev_size_compensation": {"align": 128, "intercept": 96, "slope_range": 32},
+        }
+        intercept = 1000
+        rng = np.random.default_rng(0)
+        records = []
+        for num_nodes, is_hier in [(1, False), (2, False), (4, True)] * 10:
+            cost_model = CostModel(
+                1,
+                72,
+                4,
+                4,
+                batchsize,
+                mem_cost,
+                ev_sizes,
+                60,
+                list_table_size,
+                1,
+                cost_profile=true_profile,
+            )
+            ss = ShardingState(
+                np.array(list_hotness),
+                ev_sizes,
+                num_nodes * 8,
+                num_nodes,
+                8,
+                batchsize,
+                cost_model,
+                is_hier,
+            )
+            # a random plan, every table is put in one or two buckets
+            for table_id in range(len(list_hotness)):
+                num_split = min(ss.num_bucket, int(rng.integers(1, 3)))
+                for bucket_id in rng.choice(ss.num_bucket, num_split, replace=False):
+                    ss.push_bucket(int(bucket_id), table_id)
+            ss.update_split_num()
+            cost, _ = cost_model.get_cost(ss)
+            records.append(
+                {
+                    "batchsize": batchsize,
+                    "num_gpus_per_node": 8,
+                    "is_hier": is_hier,
+                    "hotness": list_hotness,
+                    "ev_sizes": ev_sizes.tolist(),
+                    "shard_matrix": ss.shard_ll,
+                    "time_ms": float(cost.cost.max()) + intercept,
+                }
+            )
+        cost_profile = fit_cost_profile(records)
+        self.assertEqual(cost_profile["ev_size_compensation"], true_profile["ev_size_compensation"])
+        for name in ["mem_comm_work_ratio", "mem_comm_bw_ratio", "hier_comm_factor"]:
+            self.assertAlmostEqual(cost_profile[name], true_profile[name], delta=1e-6)
+        self.assertAlmostEqual(cost_profile["intercept"], intercept, delta=1e-3)
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = os.path.join(work_dir, "cost_profile.json")
+            save_cost_profile(cost_profile, path)
+            cost_model = CostModel(
+                1,
+                72,
+                4,
+                4,
+                batchsize,
+                mem_cost,
+                ev_sizes,
+                60,
+                list_table_size,
+                1,
+                cost_profile=path,
+            )
+            self.assertAlmostEqual(cost_model.band_width_ratio, 30, delta=1e-6)
+            self.assertAlmostEqual(cost_model.hier_comm_factor, 2.0, delta=1e-6)
+
+    def test_plan_simulator(self):
+        print("######################plan simulator matches brute force")
+        rng = np.random.default_rng(0)
+        batchsize, num_gpus, ev_size = 64, 4, 8
+        table_keys = [rng.integers(0, 100, (batchsize, hotness)) for hotness in [3, 2, 1]]
+        # table 0 is row-wise sharded on 3 GPUs, table 1 is column-wise sharded, table 2 is dp
+        shard_matrix = [["0", "1", "2"], ["0", "2"], ["1", "2"], ["0", "2"]]
+        shard_strategy = [("dp", ["2"]), ("mp", ["0", ("1", 2)])]
+        simulator = PlanSimulator(
+            shard_matrix, shard_strategy, [ev_size] * 3, 2, unique_table_ids=["1"]
+        )
+        simulator.simulate_batch(table_keys)
+        report = simulator.report()
+
+        unique_keys = np.zeros(num_gpus)
+        for key in np.unique(table_keys[0]):
+            unique_keys[[0, 1, 3][key % 3]] += 1
+        unique_keys[[0, 2]] += np.unique(table_keys[1]).size
+        for gpu_id in range(num_gpus):
+            samples = slice(gpu_id * batchsize // num_gpus, (gpu_id + 1) * batchsize // num_gpus)
+            unique_keys[gpu_id] += np.unique(table_keys[2][samples]).size
+        self.assertEqual(report["unique_keys"], unique_keys.tolist())
+        self.assertEqual(sum(report["keys"]), table_keys[0].size + table_keys[1].size * 2 + 64)
+        lookup_bytes = (
+            unique_keys * ev_size * 4
+            - np.array([1, 0, 1, 0]) * np.unique(table_keys[1]).size * ev_size // 2 * 4
+        )
+        self.assertEqual(report["lookup_bytes"], lookup_bytes.tolist())
+        # gpu 1 sends the pooled embedding of table 0, and the keys of its samples
+        bpg = batchsize // num_gpus
+        dst = np.array([0, 1, 3])[table_keys[0][bpg : 2 * bpg] % 3]
+        send_keys = (dst != 1).sum() + table_keys[1][bpg : 2 * bpg].size * 2
+        inter_node_keys = (dst == 3).sum() + table_keys[1][bpg : 2 * bpg].size
+        self.assertEqual(report["a2a_send_bytes"][1], 3 * bpg * ev_size * 4 + send_keys * 8)
+        self.assertEqual(
+            report["inter_node_send_bytes"][1], 2 * bpg * ev_size * 4 + inter_node_keys * 8
+        )
+
+    def test_frequency_summaries(self):
+        print("######################skew-aware cost with frequency summaries")
+        rng = np.random.default_rng(0)
+        keys = rng.zipf(1.2, (8192, 4))
+        summary = compute_frequency_summary(keys, [256, 1024, 4096])
+        for batchsize, unique_ratio in zip(summary["batch_sizes"], summary["unique_ratios"]):
+            self.assertAlmostEqual(get_unique_ratio(summary, batchsize), unique_ratio)
+        self.assertTrue(summary["unique_ratios"][0] > get_unique_ratio(summary, 512))
+        self.assertTrue(get_unique_ratio(summary, 512) > summary["unique_ratios"][1])
+        self.assertTrue(get_unique_ratio(summary, 1 << 20) < summary["unique_ratios"][-1])
+        self.assertTrue(np.all(np.diff(summary["heavy_hitter_mass"]) >= 0))
+
+        # a sample smaller than every batch size is measured as a single batch
+        summary = compute_frequency_summary(keys[:100])
+        self.assertEqual(summary["batch_sizes"], [100])
+        self.assertAlmostEqual(get_unique_ratio(summary, 100), summary["unique_ratios"][0])
+        summary = {"hotness": 4, "batch_sizes": [], "unique_ratios": []}
+        self.assertEqual(get_unique_ratio(summary, 1024), 1.0)
+
+        # a constant unique ratio halves the lookup work of every table
+        batchsize = 2048
+        mem_cost = ev_sizes * 8 * 1e-9
+        summaries = [
+            {"hotness": hotness, "batch_sizes": [1024, 4096], "unique_ratios": [0.5, 0.5]}
+            for hotness in list_hotness
+        ]
+        cost_models = [
+            CostModel(
+                1,
+                72,
+                4,
+                4,
+                batchsize,
+                mem_cost,
+                ev_sizes,
+                60,
+                list_table_size,
+                1,
+                frequency_summaries=frequency_summaries,
+            )
+            for frequency_summaries in [None, summaries]
+        ]
+        planner = Planner(list_hotness, ev_sizes, 1, 8, batchsize, False, cost_models[1])
+        shard_strategy, shard_matrix, shard_column_wise_num = planner.plan()
+        sanity_check(shard_matrix, shard_strategy)
+        costs = [
+            cost_model.get_cost_per_shard(planner.sharding_state) for cost_model in cost_models
+        ]
+        np.testing.assert_allclose(costs[1][0], costs[0][0] * 0.5)
+        np.testing.assert_allclose(costs[1][1], costs[0][1])
+
 
 if __name__ == "__main__":
     unittest.main()
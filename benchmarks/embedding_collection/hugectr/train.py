@@ -125,6 +125,24 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
         type=float,
         default=60,
     )
+    parser.add_argument(
+        "--sharding_cost_profile",
+        help="Cost profile fitted by `python -m sharding.generate_plan calibrate`, which overrides the ratios above",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--sharding_frequency_summaries",
+        help="Key frequency summaries of the tables from `python -m sharding.frequency`, to plan with the hotness after the dedup",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--sharding_refine_time_budget",
+        help="Time budget in seconds of the local search refining the auto sharding plans, 0 to disable",
+        type=float,
+        default=0,
+    )
 
     # embedding + mlp
     parser.add_argument(
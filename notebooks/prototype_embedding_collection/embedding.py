@@ -14,14 +14,17 @@ class EmbeddingPlanner:
     def generate_embedding_plan_from_json_file(self, plan_file):
         with open(plan_file, 'r') as f:
             plan = json.load(f)
+        self.generate_embedding_plan_from_json(plan)
+
+    def generate_embedding_plan_from_json(self, plan):
         assert len(plan) == self.num_gpus
         for gpu_id in range(self.num_gpus):
             local_plan = plan[gpu_id]
             for embedding_plan in local_plan:
                 local_embedding_list = embedding_plan['local_embedding_list']
                 global_embedding_list = embedding_plan['global_embedding_list']
-                sharding_id = 0 if 'sharding_id' not in embedding_plan else embedding_plan['sharding_id']
-                num_sharding = 1 if 'num_sharding' not in embedding_plan else embedding_plan['num_sharding']
+                sharding_id = embedding_plan.get('sharding_id', embedding_plan.get('shard_id', 0))
+                num_sharding = embedding_plan.get('num_sharding', embedding_plan.get('shards_count', 1))
                 table_placement_strategy = embedding_plan['table_placement_strategy']
                 if table_placement_strategy == 'dp' and num_sharding > 1:
                     raise RuntimeError("dp embedding can not shard")
@@ -185,12 +188,12 @@ class LocalizedEmbedding:
     def init_model_comm_buffer(self):
         model_comm_buffer_size = self.get_model_comm_buffer_size(self.universal_batch_size)
 
-        return [[0.0 for _ in range(size)] for size in model_comm_buffer_size if self.embedding_collection_param.emb_type == 'float' or self.embedding_collection_param.emb_type == 'half']
+        return [np.zeros(size) for size in model_comm_buffer_size if self.embedding_collection_param.emb_type == 'float' or self.embedding_collection_param.emb_type == 'half']
 
     def init_network_comm_buffer(self):
         network_comm_buffer_size = self.get_network_comm_buffer_size(self.universal_batch_size)
 
-        return [[0.0 for _ in range(size)] for size in network_comm_buffer_size if self.embedding_collection_param.emb_type == 'float' or self.embedding_collection_param.emb_type == 'half']
+        return [np.zeros(size) for size in network_comm_buffer_size if self.embedding_collection_param.emb_type == 'float' or self.embedding_collection_param.emb_type == 'half']
 
     def get_model_comm_buffer_size(self, batch_size):
         num_buffer_size = 0
@@ -518,8 +521,9 @@ class EmbeddingCollection:
             # print("local_grad_key_offset", local_grad_key_offset)
             # print("local_grad_ev_offset", local_grad_ev_offset)
 
-            grad_key.extend(local_grad_key[:num_local_grad_key])
-            grad_ev.extend(local_grad_ev[: local_grad_ev_offset[-1]])
+            # grad_key and grad_ev get one array per embedding, grad_key_offset and grad_ev_offset index their concatenation
+            grad_key.append(local_grad_key[:num_local_grad_key])
+            grad_ev.append(local_grad_ev[: local_grad_ev_offset[-1]])
             for idx in range(len(local_id_space_list)):
                 grad_key_offset.append(local_grad_key_offset[idx + 1] - local_grad_key_offset[idx])
                 grad_ev_offset.append(local_grad_ev_offset[idx + 1] - local_grad_ev_offset[idx])
@@ -23,7 +23,8 @@ class ILookup(abc.ABC):
         id_space_offset: typing.List[int] or None,
         num_offset: typing.List[int] or None,
         id_space_list: typing.List[int],
-    ) -> typing.List[typing.List[float]]:
+    ) -> typing.List[np.ndarray]:
+        # one [num keys, ev_size] array of the keys in [id_space_offset[i], id_space_offset[i + 1])
         pass
 
 
@@ -36,7 +37,7 @@ class IEmbeddingTable(ILookup):
         id_space_offset: typing.List[int] or None,
         num_offset: typing.List[int] or None,
         id_space_list: typing.List[int],
-    ) -> typing.List[typing.List[float]]:
+    ) -> typing.List[np.ndarray]:
         pass
 
     def update(
@@ -82,10 +83,10 @@ def global_init_key(num_gpus, global_embedding_sharding_param_list, global_emb_t
                 if id_space in id_space_set:
                     continue
                 id_space_set.add(id_space)
-                for key in init_keys[id_space]:
-                    if key % embedding_sharding_param.num_sharding == embedding_sharding_param.sharding_id:
-                        sharding_keys.append(key)
-                offset.append(len(sharding_keys))
+                keys = np.asarray(init_keys[id_space], dtype=np.int64)
+                sharding_keys.append(keys[keys % embedding_sharding_param.num_sharding == embedding_sharding_param.sharding_id])
+                offset.append(offset[-1] + len(sharding_keys[-1]))
+            sharding_keys = np.concatenate(sharding_keys) if len(sharding_keys) > 0 else np.zeros(0, dtype=np.int64)
             embedding_table.init(sharding_keys, len(sharding_keys), offset, len(offset))
 
     # hack for dp. embedding table should be responsible for init same ev for same key on differente device
@@ -118,11 +119,9 @@ def global_dump_emb_table(num_gpus, global_embedding_sharding_param_list, global
                 start = id_space_offset_list[i]
                 end = id_space_offset_list[i + 1]
                 ev_size = ev_size_list[i]
-                for r in range(start, end):
-                    k = keys[r]
-                    ev = ev_list[ev_offset: ev_offset + ev_size]
-                    emb_table_dict[id_space][k] = ev
-                    ev_offset += ev_size
+                ev = np.asarray(ev_list[ev_offset: ev_offset + (end - start) * ev_size]).reshape(-1, ev_size)
+                emb_table_dict[id_space].update(zip(np.asarray(keys[start:end]).tolist(), ev))
+                ev_offset += (end - start) * ev_size
     # for id_space in emb_table_dict:
     #     for key in emb_table_dict[id_space]:
     #         print('id_space:{}, key:{}, ev_size:{}'.format(id_space, key, len(emb_table_dict[id_space][key])))
@@ -155,8 +154,9 @@ class GroupedStaticEmbeddingTable(IEmbeddingTable):
         offset: typing.List[int],
         num_offset: int,
         id_space_list: typing.List[int],
-    ) -> typing.List[typing.List[float]]:
-        emb_vec = [None for _ in range(num_keys)]
+    ) -> typing.List[np.ndarray]:
+        keys = np.asarray(keys)
+        emb_vec = []
         for idx in range(num_offset - 1):
             id_space = id_space_list[idx]
             start = offset[idx]
@@ -164,13 +164,19 @@ class GroupedStaticEmbeddingTable(IEmbeddingTable):
             local_idx = self.id_space_idx[id_space]
             table_size_offset = self.embedding_table_size_offset[local_idx]
             ev_size = self.ev_size_list[local_idx]
-
-            for i in range(start, end):
-                key = keys[i]
-                location = self.key_location[id_space][key]
-                emb_vec[i] = [0. for _ in range(ev_size)]
-                for ev_id in range(ev_size):
-                    emb_vec[i][ev_id] = self.embedding_table[table_size_offset + location * ev_size + ev_id]
+            sorted_keys = self.sorted_keys_list[local_idx]
+
+            id_space_keys = keys[start:end]
+            position = np.searchsorted(sorted_keys, id_space_keys)
+            found = position < len(sorted_keys)
+            found[found] = sorted_keys[position[found]] == id_space_keys[found]
+            if not found.all():
+                raise KeyError(id_space_keys[~found][0])
+            location = self.sorted_location_list[local_idx][position]
+            table = self.embedding_table[
+                table_size_offset : table_size_offset + self.vocabulary_size_list[local_idx] * ev_size
+            ].reshape(-1, ev_size)
+            emb_vec.append(table[location])
         return emb_vec
 
     def update(
@@ -197,22 +203,23 @@ class GroupedStaticEmbeddingTable(IEmbeddingTable):
         assert num_offset == len(self.id_space_list) + 1
         emb_table_size_list = []
         self.vocabulary_size_list = []
-        self.key_location = defaultdict(dict)
+        # the keys of every id space are sorted, a key is located by binary search
+        self.sorted_keys_list = []
+        self.sorted_location_list = []
         self.id_space_offset_list = [0]
+        keys = np.asarray(keys, dtype=np.int64)
         for idx in range(num_offset - 1):
             start = offset[idx]
             end = offset[idx + 1]
             vocabulary_size = end - start
-            id_space = self.id_space_list[idx]
 
             self.vocabulary_size_list.append(vocabulary_size)
             emb_table_size_list.append(vocabulary_size * self.ev_size_list[idx])
 
-            id_space_offset = self.id_space_offset_list[-1]
-            for i in range(start, end):
-                key = keys[i]
-                self.key_location[id_space][key] = i - start
-            self.id_space_offset_list.append(id_space_offset + end - start)
+            location = np.argsort(keys[start:end], kind="stable")
+            self.sorted_keys_list.append(keys[start:end][location])
+            self.sorted_location_list.append(location)
+            self.id_space_offset_list.append(self.id_space_offset_list[-1] + end - start)
         emb_table_size = sum(emb_table_size_list)
 
         self.keys = keys
@@ -236,11 +243,8 @@ class EmbeddingTable(IEmbeddingTable):
         id_space_offset: typing.List[int],
         num_offset: typing.List[int],
         id_space_list: typing.List[int],
-    ) -> typing.List[typing.List[float]]:
-        emb_vec = []
-        for i in range(num_keys):
-            emb_vec.append(self.embedding_table[keys[i]].tolist())
-        return emb_vec
+    ) -> np.ndarray:
+        return self.embedding_table[np.asarray(keys[:num_keys])]
 
 
 class GroupedEmbeddingTable(IEmbeddingTable):
@@ -256,18 +260,16 @@ class GroupedEmbeddingTable(IEmbeddingTable):
         offset: typing.List[int],
         num_offset: int,
         id_space_list: typing.List[int],
-    ) -> typing.List[typing.List[float]]:
-        emb_vec = [None for _ in range(num_keys)]
+    ) -> typing.List[np.ndarray]:
+        emb_vec = []
         for idx in range(num_offset - 1):
             idx_start = offset[idx]
             idx_end = offset[idx + 1]
             id_space = id_space_list[idx]
             emb_table = self.emb_table_dict[id_space]
-            select_key_in_this_id_space = [keys[idx_key] for idx_key in range(idx_start, idx_end)]
+            select_key_in_this_id_space = keys[idx_start:idx_end]
 
-            emb_vec_in_this_id_space = emb_table.lookup(select_key_in_this_id_space, idx_end - idx_start, None, None, None)
-            for i, ev in enumerate(emb_vec_in_this_id_space):
-                emb_vec[idx_start + i] = ev
+            emb_vec.append(emb_table.lookup(select_key_in_this_id_space, idx_end - idx_start, None, None, None))
         return emb_vec
 
 # creator of embedding table for multiple use case
@@ -1,9 +1,11 @@
 from ast import arg
+import argparse
 from concurrent.futures import thread
 import typing
 from itertools import accumulate, chain
 import collections
 import threading
+import time
 from embedding import *
 from common import *
 from embedding_table import *
@@ -22,8 +24,7 @@ class Model:
         num_output_buffer_per_gpu = len(output_buffer) // self.num_gpus
 
         def forward_per_gpu(gpu_id):
-            current_output_buffer = [
-                0 for _ in range(num_output_buffer_per_gpu)]
+            current_output_buffer = np.zeros(num_output_buffer_per_gpu)
             self.embedding_collection_list[gpu_id].forward_per_gpu(
                 key, bucket_range, embedding_tables[gpu_id], current_output_buffer)
             output_buffer[num_output_buffer_per_gpu * gpu_id: num_output_buffer_per_gpu * (gpu_id + 1)] = current_output_buffer
@@ -58,104 +59,187 @@ class RefEmbedding:
         self.embedding_collection_param = embedding_collection_param
 
     def forward(self, keys, bucket_range, emb_table):
+        keys = np.asarray(keys)
+        bucket_range = np.asarray(bucket_range)
         batch_size = (len(bucket_range) - 1) // self.embedding_collection_param.num_embeddings
         batch_size_per_gpu = batch_size // self.num_gpus
         embedding_params = self.embedding_collection_param.embedding_params
+        # the sorted keys and the evs of every id space
+        array_table = {}
+        for id_space, table in emb_table.items():
+            table_keys = np.fromiter(table.keys(), dtype=np.int64, count=len(table))
+            order = np.argsort(table_keys)
+            array_table[id_space] = table_keys[order], np.stack(list(table.values()))[order]
         output = []
         for gpu_id in range(self.num_gpus):
             for embedding_id in range(self.embedding_collection_param.num_embeddings):
                 ev_size = embedding_params[embedding_id].ev_size
                 combiner = embedding_params[embedding_id].combiner
                 id_space = embedding_params[embedding_id].id_space
-                for batch_id in range(batch_size_per_gpu):
-                    start = bucket_range[embedding_id * batch_size + gpu_id * batch_size_per_gpu +  batch_id]
-                    end = bucket_range[embedding_id * batch_size + gpu_id * batch_size_per_gpu +  batch_id + 1]
-                    ev = [0. for _ in range(ev_size)]
-                    for r in range(start, end):
-                        key = keys[r]
-                        for ev_id in range(ev_size):
-                            ev[ev_id] += emb_table[id_space][key][ev_id]
-                    if combiner == 'mean' and end > start:
-                        ev = [ e / (end - start) for e in ev]
-                    if combiner == 'concat':
-                        raise RuntimeError('not implemented')
-                    output.extend(ev)
-        return output
+                if combiner == 'concat':
+                    raise RuntimeError('not implemented')
+                bucket_start = embedding_id * batch_size + gpu_id * batch_size_per_gpu
+                bucket = bucket_range[bucket_start: bucket_start + batch_size_per_gpu + 1]
+                table_keys, table_ev = array_table[id_space]
+                ev = table_ev[np.searchsorted(table_keys, keys[bucket[0]: bucket[-1]])]
+                # sum of the evs of every bucket by the difference of prefix sums
+                ev_prefix_sum = np.concatenate([np.zeros((1, ev_size)), np.cumsum(ev, axis=0)])
+                ev = ev_prefix_sum[bucket[1:] - bucket[0]] - ev_prefix_sum[bucket[:-1] - bucket[0]]
+                if combiner == 'mean':
+                    ev /= np.maximum(np.diff(bucket), 1)[:, None]
+                output.append(ev.ravel())
+        return np.concatenate(output)
 
     def backward(self, top_grad, keys, bucket_range):
+        keys = np.asarray(keys)
+        bucket_range = np.asarray(bucket_range)
         batch_size = (len(bucket_range) - 1) // self.embedding_collection_param.num_embeddings
         batch_size_per_gpu = batch_size // self.num_gpus
         embedding_params = self.embedding_collection_param.embedding_params
         ev_size_offset_list = list(accumulate([0] + [b.ev_size for b in embedding_params]))
-        grad = defaultdict(dict)
+        key_grad = defaultdict(list)
         for gpu_id in range(self.num_gpus):
             for embedding_id in range(self.embedding_collection_param.num_embeddings):
                 ev_size = embedding_params[embedding_id].ev_size
                 ev_size_offset = batch_size_per_gpu * ev_size_offset_list[embedding_id]
                 id_space = embedding_params[embedding_id].id_space
 
-                for batch_id in range(batch_size_per_gpu):
-                    start = bucket_range[embedding_id * batch_size + gpu_id * batch_size_per_gpu +  batch_id]
-                    end = bucket_range[embedding_id * batch_size + gpu_id * batch_size_per_gpu +  batch_id + 1]
-                    for r in range(start, end):
-                        key = keys[r]
-                        if key not in grad[id_space]:
-                            grad[id_space][key] = [0. for _ in range(ev_size)]
-                        ev = top_grad[gpu_id][ev_size_offset + batch_id * ev_size: ev_size_offset + (batch_id + 1) * ev_size]
-                        for ev_id in range(ev_size):
-                            grad[id_space][key][ev_id] += ev[ev_id]
-
-        return grad
-
-
-key = [
-    [4],
-    [6, 8, 9, 10],
-    [4, 5],
-    [1, 4, 5],
-    [1, 2],
-    [3],
-    [4],
-    [6, 8],
-    [5],
-    [6],
-    [7],
-    [1, 9],
-    [4, 6, 8, 9],
-    [1, 2, 3, 4],
-    [8, 9, 1, 10],
-    [1, 10],
-    [4, 5],
-    [3, 6],
-    [1, 10],
-    [11]
-]
-bucketcount = [len(v) for v in key]
-bucket_range = [0] + list(accumulate([len(v) for v in key]))
-key = list(chain.from_iterable(key))
-print('key', key)
-print('bucket_range', bucket_range)
-num_embeddings = 5
-num_gpus = 2
-batch_size = len(bucket_range) // num_embeddings
+                bucket_start = embedding_id * batch_size + gpu_id * batch_size_per_gpu
+                bucket = bucket_range[bucket_start: bucket_start + batch_size_per_gpu + 1]
+                ev = np.asarray(top_grad[gpu_id][ev_size_offset: ev_size_offset + batch_size_per_gpu * ev_size]).reshape(-1, ev_size)
+                key_grad[id_space].append((keys[bucket[0]: bucket[-1]], np.repeat(ev, np.diff(bucket), axis=0)))
+        return accumulate_grad(key_grad)
+
+
+def accumulate_grad(key_grad):
+    # id_space -> sorted unique keys and the sum of their grads
+    grad = {}
+    for id_space, grad_list in key_grad.items():
+        unique_keys, inverse = np.unique(np.concatenate([k for k, _ in grad_list]), return_inverse=True)
+        ev_grad = np.concatenate([g for _, g in grad_list])
+        grad[id_space] = unique_keys, np.zeros((len(unique_keys), ev_grad.shape[1]))
+        np.add.at(grad[id_space][1], inverse, ev_grad)
+    return grad
+
+
+def generate_synthetic_plan(num_gpus, num_embeddings, embedding_id_space, rng):
+    # every table is placed on a gpu, sharded by key among all the gpus or data parallel
+    num_table = max(embedding_id_space) + 1
+    table_placement = rng.choice(['localized', 'sharded', 'dp'], size=num_table, p=[0.5, 0.3, 0.2])
+    localized_embedding_list = [
+        [i for i in range(num_embeddings) if table_placement[embedding_id_space[i]] == 'localized' and embedding_id_space[i] % num_gpus == gpu_id]
+        for gpu_id in range(num_gpus)
+    ]
+    sharded_embedding_list = [i for i in range(num_embeddings) if table_placement[embedding_id_space[i]] == 'sharded']
+    dp_embedding_list = [i for i in range(num_embeddings) if table_placement[embedding_id_space[i]] == 'dp']
+    plan = []
+    for gpu_id in range(num_gpus):
+        local_plan = []
+        if any(len(embedding_list) > 0 for embedding_list in localized_embedding_list):
+            local_plan.append({
+                'local_embedding_list': localized_embedding_list[gpu_id],
+                'global_embedding_list': localized_embedding_list,
+                'table_placement_strategy': 'localized'
+            })
+        if len(sharded_embedding_list) > 0:
+            local_plan.append({
+                'local_embedding_list': sharded_embedding_list,
+                'global_embedding_list': [sharded_embedding_list for _ in range(num_gpus)],
+                'sharding_id': gpu_id,
+                'num_sharding': num_gpus,
+                'table_placement_strategy': 'localized'
+            })
+        if len(dp_embedding_list) > 0:
+            local_plan.append({
+                'local_embedding_list': dp_embedding_list,
+                'global_embedding_list': [dp_embedding_list for _ in range(num_gpus)],
+                'table_placement_strategy': 'dp'
+            })
+        plan.append(local_plan)
+    return plan
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--plan_file', type=str, default='./plan_file_2.json')
+parser.add_argument('--synthetic', action='store_true', help='check the random keys of a large batch instead of the example')
+parser.add_argument('--num_gpus', type=int, default=8)
+parser.add_argument('--batch_size', type=int, default=8192)
+parser.add_argument('--num_table', type=int, default=100)
+parser.add_argument('--max_hotness', type=int, default=4)
+parser.add_argument('--vocabulary_size', type=int, default=10000)
+parser.add_argument('--seed', type=int, default=0)
+args = parser.parse_args()
+
+if args.synthetic:
+    rng = np.random.default_rng(args.seed)
+    num_gpus = args.num_gpus
+    batch_size = args.batch_size
+    num_table = args.num_table
+    # a quarter of the embeddings look up the table of another embedding
+    num_embeddings = num_table + num_table // 4
+    embedding_id_space = list(range(num_table)) + rng.integers(0, num_table, num_embeddings - num_table).tolist()
+    embedding_vocabulary_size_list = [args.vocabulary_size for _ in range(num_table)]
+    embedding_tables_ev_size = rng.choice([8, 16, 32], size=num_table).tolist()
+    embedding_combiner = rng.choice(['mean', 'sum'], size=num_embeddings).tolist()
+    embedding_hotness = rng.integers(1, args.max_hotness + 1, size=num_embeddings).tolist()
+    bucketcount = rng.integers(0, np.repeat(embedding_hotness, batch_size) + 1)
+    bucket_range = np.concatenate([[0], np.cumsum(bucketcount)])
+    # small keys are hot
+    key_vocabulary_size = np.repeat(np.repeat(np.asarray(embedding_vocabulary_size_list)[embedding_id_space], batch_size), bucketcount)
+    key = (key_vocabulary_size * rng.random(len(key_vocabulary_size)) ** 3).astype(np.int64)
+    plan = generate_synthetic_plan(num_gpus, num_embeddings, embedding_id_space, rng)
+    print('num_gpus', num_gpus, 'batch_size', batch_size, 'num_embeddings', num_embeddings, 'num_keys', len(key))
+else:
+    key = [
+        [4],
+        [6, 8, 9, 10],
+        [4, 5],
+        [1, 4, 5],
+        [1, 2],
+        [3],
+        [4],
+        [6, 8],
+        [5],
+        [6],
+        [7],
+        [1, 9],
+        [4, 6, 8, 9],
+        [1, 2, 3, 4],
+        [8, 9, 1, 10],
+        [1, 10],
+        [4, 5],
+        [3, 6],
+        [1, 10],
+        [11]
+    ]
+    bucketcount = [len(v) for v in key]
+    bucket_range = [0] + list(accumulate([len(v) for v in key]))
+    key = list(chain.from_iterable(key))
+    print('key', key)
+    print('bucket_range', bucket_range)
+    num_embeddings = 5
+    num_gpus = 2
+    batch_size = len(bucket_range) // num_embeddings
+    print('batch_size', batch_size)
+
+    num_table = 4
+    embedding_vocabulary_size_list = [100, 100, 100, 100]
+    embedding_tables_ev_size = [8, 16, 8, 8]
+    embedding_id_space = [0, 1, 2, 1, 3]
+    embedding_combiner = ['mean', 'sum', 'sum', 'sum', 'sum']
+    embedding_hotness = [max(bucketcount[batch_size * i: batch_size * (i + 1)])
+                      for i in range(num_embeddings)]
+    with open(args.plan_file, 'r') as f:
+        plan = json.load(f)
 assert(batch_size % num_gpus == 0)
-print('batch_size', batch_size)
-
+init_nccl_communication(num_gpus)
 
-num_table = 4
-embedding_vocabulary_size_list = [100, 100, 100, 100]
-embedding_tables_ev_size = [8, 16, 8, 8]
 embedding_table_params = [EmbeddingTableParam(
     id_space=id_space,
     vocabulary_size=embedding_vocabulary_size_list[id_space],
     ev_size=embedding_tables_ev_size[id_space]
 ) for id_space in range(num_table)]
 
-embedding_id_space = [0, 1, 2, 1, 3]
-embedding_combiner = ['mean', 'sum', 'sum', 'sum', 'sum']
-embedding_hotness = [max(bucketcount[batch_size * i: batch_size * (i + 1)])
-                  for i in range(num_embeddings)]
-
 embedding_collection_param = EmbeddingCollectionParam(
     num_embeddings=num_embeddings,
     embedding_params=[EmbeddingParam(
@@ -173,9 +257,7 @@ embedding_collection_param = EmbeddingCollectionParam(
 
 
 planner = EmbeddingPlanner(num_gpus, embedding_collection_param)
-# planner.generate_embedding_plan_from_json_file('./plan_file_0.json')
-# planner.generate_embedding_plan_from_json_file('./plan_file_1.json')
-planner.generate_embedding_plan_from_json_file('./plan_file_2.json')
+planner.generate_embedding_plan_from_json(plan)
 
 emb_tables = []
 for gpu_id in range(num_gpus):
@@ -187,7 +269,7 @@ for gpu_id in range(num_gpus):
     ))
 
 init_keys = [
-    [key for key in range(embedding_vocabulary_size_list[i])] for i in range(num_table)
+    np.arange(embedding_vocabulary_size_list[i]) for i in range(num_table)
 ]
 
 global_init_key(num_gpus, planner.global_embedding_sharding_param_list, emb_tables, embedding_collection_param, init_keys)
@@ -197,11 +279,13 @@ model = Model(planner, num_gpus)
 num_output_elements = batch_size * \
     sum([b.ev_size if b.combiner != 'concat' else b.ev_size *
         b.hotness for b in embedding_collection_param.embedding_params])
-output_buffer = [0 for _ in range(num_output_elements)]
+output_buffer = np.zeros(num_output_elements)
+start = time.time()
 model.forward(key, bucket_range, emb_tables, output_buffer)
+print('forward takes {:.3f}s'.format(time.time() - start))
 
 top_grad = [
-    [random.random() for i in range(num_output_elements // num_gpus)] for gpu_id in range(num_gpus)
+    np.random.rand(num_output_elements // num_gpus) for gpu_id in range(num_gpus)
 ]
 
 ref_embedding_table = global_dump_emb_table(num_gpus, planner.global_embedding_sharding_param_list, emb_tables)
@@ -212,10 +296,10 @@ ref_output = ref_embedding.forward(key, bucket_range, ref_embedding_table)
 ref_grad = ref_embedding.backward(top_grad, key, bucket_range)
 
 assert len(ref_output) == len(output_buffer), '{} != {} {}'.format(len(ref_output), len(output_buffer), num_output_elements)
-for i in range(len(ref_output)):
-    if abs(ref_output[i] - output_buffer[i]) > 1e-3:
-        print('forward check', i, ref_output[i], output_buffer[i])
-    assert abs(ref_output[i] - output_buffer[i]) < 1e-3
+mismatch = np.flatnonzero(np.abs(ref_output - output_buffer) > 1e-3)
+for i in mismatch[:10]:
+    print('forward check', i, ref_output[i], output_buffer[i])
+assert len(mismatch) == 0
 print('pass forward check')
 
 grad_key = []
@@ -230,7 +314,9 @@ for gpu_id in range(num_gpus):
     grad_ev_offset.append([0])
     grad_id_space_list.append([])
 
+start = time.time()
 model.backward(top_grad, grad_key, grad_key_offset, grad_ev, grad_ev_offset, grad_id_space_list, True)
+print('backward takes {:.3f}s'.format(time.time() - start))
 
 # print("grad_id_space_list", grad_id_space_list)
 # print("grad_key", grad_key)
@@ -238,12 +324,18 @@ model.backward(top_grad, grad_key, grad_key_offset, grad_ev, grad_ev_offset, gra
 # print("grad_ev", grad_ev)
 # print("grad_ev_offset", grad_ev_offset)
 
-dp_id_space = [3]
-grad = defaultdict(dict)
+# the grads of dp tables are allreduced, so only the ones of gpu 0 are counted
+dp_id_space = set(
+    embedding_id_space[embedding_id]
+    for embedding_sharding_param in planner.global_embedding_sharding_param_list[0]
+    if embedding_sharding_param.table_placement_strategy == 'dp'
+    for embedding_id in embedding_sharding_param.local_embedding_list
+)
+key_grad = defaultdict(list)
 for gpu_id in range(num_gpus):
-    local_grad_key = grad_key[gpu_id]
+    local_grad_key = np.concatenate(grad_key[gpu_id] + [np.zeros(0, dtype=np.int64)])
     local_grad_key_offset = grad_key_offset[gpu_id]
-    local_grad_ev = grad_ev[gpu_id]
+    local_grad_ev = np.concatenate(grad_ev[gpu_id] + [np.zeros(0)])
     local_grad_ev_offset = grad_ev_offset[gpu_id]
     local_grad_id_space_list = grad_id_space_list[gpu_id]
     for idx in range(len(local_grad_key_offset) - 1):
@@ -253,20 +345,13 @@ for gpu_id in range(num_gpus):
         if id_space in dp_id_space and gpu_id > 0:
             continue
         ev_size = embedding_tables_ev_size[id_space]
-        for i in range(start, end):
-            key = local_grad_key[i]
-            ev_grad = local_grad_ev[local_grad_ev_offset[idx] + (i - start) * ev_size: local_grad_ev_offset[idx] + (i - start + 1) * ev_size]
-            # grad[id_space][key] = ev_grad
-            if key not in grad[id_space]:
-                grad[id_space][key] = [0. for _ in range(ev_size)]
-            for ev_id in range(ev_size):
-                grad[id_space][key][ev_id] += ev_grad[ev_id]
-
+        ev_grad = local_grad_ev[local_grad_ev_offset[idx]: local_grad_ev_offset[idx + 1]].reshape(-1, ev_size)
+        key_grad[id_space].append((local_grad_key[start:end], ev_grad))
+grad = accumulate_grad(key_grad)
 
 for id_space in ref_grad:
-    for key in ref_grad[id_space]:
-        ref_ev_grad = ref_grad[id_space][key]
-        ev_grad = grad[id_space][key]
-        for i in range(len(ref_ev_grad)):
-            assert abs(ref_ev_grad[i] - ev_grad[i]) < 1e-3
+    ref_keys, ref_ev_grad = ref_grad[id_space]
+    keys, ev_grad = grad[id_space]
+    assert np.array_equal(ref_keys, keys)
+    assert np.allclose(ref_ev_grad, ev_grad, rtol=0, atol=1e-3)
 print('pass backward check')
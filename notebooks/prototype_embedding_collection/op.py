@@ -11,36 +11,52 @@ from utils import *
 from threading import get_ident
 
 
+def segment_ranges(begin_offsets, end_offsets):
+    # the indices in [begin, end) of every segment and the segment of each index
+    begin_offsets = np.asarray(begin_offsets, dtype=np.int64)
+    end_offsets = np.asarray(end_offsets, dtype=np.int64)
+    lengths = end_offsets - begin_offsets
+    segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+    segment_starts = np.cumsum(lengths) - lengths
+    indices = np.arange(lengths.sum()) - segment_starts[segment_ids] + begin_offsets[segment_ids]
+    return indices, segment_ids
+
+
 def segmented_sort(keys_in, num_items, values_in, begin_offsets, end_offsets, num_segments):
     assert len(begin_offsets) == num_segments
     assert len(end_offsets) == num_segments
     assert num_items == end_offsets[-1]
-    keys_out = []
-    values_out = []
-    for i in range(num_segments):
-        start = begin_offsets[i]
-        end = end_offsets[i]
-        tmp = [(v, p) for v, p in zip(keys_in[start:end], values_in[start:end])]
-        sorted_tmp = sorted(tmp, key=lambda x: x[0])
-        keys_out.extend([v[0] for v in sorted_tmp])
-        values_out.extend([v[1] for v in sorted_tmp])
-    return keys_out, values_out
+    indices, segment_ids = segment_ranges(begin_offsets, end_offsets)
+    keys = np.asarray(keys_in)[indices]
+    values = np.asarray(values_in)[indices]
+    # lexsort is stable, the equal keys of a segment keep their order like in cub radix sort
+    order = np.lexsort((keys, segment_ids))
+    return keys[order], values[order]
 
 
 def segmented_reduce_sum(d_in, num_sgements, begin_offsets, end_offsets):
-    output = [0 for _ in range(num_sgements)]
-    for i in range(num_sgements):
-        start = begin_offsets[i]
-        end = end_offsets[i]
-        output[i] = sum(d_in[start:end])
+    begin_offsets = np.asarray(begin_offsets, dtype=np.int64)
+    end_offsets = np.asarray(end_offsets, dtype=np.int64)
+    assert len(begin_offsets) == num_sgements
+    if num_sgements == 0:
+        return np.zeros(0, dtype=np.int64)
+    # reduceat sums [begin, end) for every (begin, end) pair, the padding keeps end in range
+    d_in = np.append(np.asarray(d_in)[: end_offsets.max()], 0)
+    output = np.add.reduceat(d_in, np.stack([begin_offsets, end_offsets], axis=1).ravel())[::2]
+    return np.where(end_offsets > begin_offsets, output, 0)
+
+
+def segmented_reduce_rows(d_in, offsets):
+    # sum of the rows of every segment [offsets[i], offsets[i + 1]), 0 for empty segments
+    offsets = np.asarray(offsets, dtype=np.int64)
+    output = np.zeros((len(offsets) - 1,) + d_in.shape[1:], dtype=d_in.dtype)
+    non_empty = offsets[1:] > offsets[:-1]
+    if non_empty.any():
+        # the next non-empty segment starts where a non-empty segment ends
+        output[non_empty] = np.add.reduceat(d_in[: offsets[-1]], offsets[:-1][non_empty], axis=0)
     return output
 
 
-def clear_tensor(tensor):
-    for e in tensor:
-        e = 0.0
-
-
 # class FlattenConcatembeddingOp:
 #     def __init__(self, local_embedding_list) -> None:
 #         self.local_embedding_list = local_embedding_list
@@ -70,41 +86,35 @@ class ModelIndexCalcualtion:
         key_type,
         offset_type
     ) -> None:
-        local_hotness_sum = sum(local_hotness_list)
-        hotness_list_sum = sum(hotness_list)
         self.num_local_embedding = num_local_embedding
-        self.model_key = [0 for _ in range(universal_batch_size * local_hotness_sum) if key_type == 'int32_t' or key_type == 'int64_t' ]
-        self.model_idx_offsets = [0 for _ in range(universal_batch_size * num_local_embedding + 1) if offset_type == 'uint32_t' or offset_type == 'uint64_t' ]
-        self.num_key_in_bucket_for_combiner = [0 for _ in range(universal_batch_size * num_local_embedding) if offset_type == 'uint32_t' or offset_type == 'uint64_t' ]
+        self.model_key = np.zeros(0, dtype=np.int64)
+        self.model_idx_offsets = np.zeros(1, dtype=np.int64)
+        self.num_key_in_bucket_for_combiner = np.zeros(0, dtype=np.int64)
         self.num_model_key = 0
-        self.flag = [int(0) for _ in range(universal_batch_size * hotness_list_sum)]
 
     def compute(self, key, bucket_range, local_embedding_list, sharding_id, num_sharding, batch_size):
-        clear_tensor(self.flag)
-        self.model_idx_offsets[0] = 0
-
         if self.num_local_embedding > 0:
-            for idx in range(self.num_local_embedding):
-                embedding_id = local_embedding_list[idx]
-                for batch_id in range(batch_size):
-                    bucket_start = bucket_range[batch_size * embedding_id + batch_id]
-                    bucket_end = bucket_range[batch_size * embedding_id + batch_id + 1]
-                    for r in range(bucket_start, bucket_end):
-                        if key[r] % num_sharding == sharding_id:
-                            self.flag[r] = 1
-
-            for idx in range(self.num_local_embedding):
-                embedding_id = local_embedding_list[idx]
-                for batch_id in range(batch_size):
-                    bucket_start = bucket_range[batch_size * embedding_id + batch_id]
-                    bucket_end = bucket_range[batch_size * embedding_id + batch_id + 1]
-                    self.model_idx_offsets[1 + idx * batch_size + batch_id] = sum(self.flag[bucket_start:bucket_end])
-                    self.num_key_in_bucket_for_combiner[idx * batch_size + batch_id] = bucket_end - bucket_start
+            key = np.asarray(key)
+            bucket_range = np.asarray(bucket_range, dtype=np.int64)
+            # bucket of idx * batch_size + batch_id
+            bucket_id = (
+                np.asarray(local_embedding_list, dtype=np.int64)[:, None] * batch_size + np.arange(batch_size)
+            ).ravel()
+            bucket_start = bucket_range[bucket_id]
+            bucket_end = bucket_range[bucket_id + 1]
+            indices, _ = segment_ranges(bucket_start, bucket_end)
+            flag = np.zeros(len(key), dtype=bool)
+            flag[indices] = key[indices] % num_sharding == sharding_id
+
+            self.num_key_in_bucket_for_combiner = bucket_end - bucket_start
             # cub select
-            self.num_model_key = sum(self.flag)
-            self.model_key[: self.num_model_key] = list(compress(key, self.flag))
+            self.model_key = key[flag]
+            self.num_model_key = len(self.model_key)
             # cub inclusive scan
-            self.model_idx_offsets = list(accumulate(self.model_idx_offsets))
+            self.model_idx_offsets = np.zeros(len(bucket_id) + 1, dtype=np.int64)
+            self.model_idx_offsets[1:] = np.cumsum(
+                segmented_reduce_sum(flag, len(bucket_id), bucket_start, bucket_end)
+            )
         return self.model_key, self.model_idx_offsets, self.num_model_key, self.num_key_in_bucket_for_combiner
 
 
@@ -119,9 +129,9 @@ class NetworkIndexCalculation:
             ev_list = [h_ev_size_offset[b + 1] - h_ev_size_offset[b] for b in embedding_list]
             ev_offset = [0] + list(accumulate(ev_list))
             network_ev_offsets.append(ev_offset)
-        network_idx = [] 
-        network_gpu_idx = [] 
-        network_offset = [0 for _ in range(1 + num_dst_embedding_id)] 
+        network_idx = []
+        network_gpu_idx = []
+        network_offset = [0 for _ in range(1 + num_dst_embedding_id)]
         # this can be placed on cpu
         for local_embedding_id in range(len(dst_embedding_id_list)):
             dst_embedding_id = dst_embedding_id_list[local_embedding_id]
@@ -146,34 +156,27 @@ class NetworkIndexCalculation:
 
 class CompressOffset:
     def __init__(self, stride) -> None:
-        self.compressed_offset = [0 for _ in range(1 + stride)] # uint32_t
         self.stride = stride
 
     def compute(self, offset, batch_size):
-        self.compressed_offset[0] = 0
-        for s in range(self.stride):
-            self.compressed_offset[1 + s] = offset[(s + 1) * batch_size] - offset[s * batch_size]
-        return list(accumulate(self.compressed_offset))
+        offset = np.asarray(offset, dtype=np.int64)
+        return offset[np.arange(1 + self.stride) * batch_size] - offset[0]
 
 
 class GradIndexCalculation:
     def __init__(self, num_local_embedding, h_local_hotness_list, universal_batch_size, key_type, offset_type) -> None:
         self.num_local_embedding = num_local_embedding
-        local_hotness_sum = sum(h_local_hotness_list)
-        self.unique_key_flag = [0 for _ in range(universal_batch_size * local_hotness_sum)] # int32_t
-        self.unique_key = [0 for _ in range(universal_batch_size * local_hotness_sum) if key_type == 'int32_t' or key_type == 'int64_t'] 
+        self.unique_key = np.zeros(0, dtype=np.int64)
         self.num_unique_key = 0
-        self.unique_key_flag_scan = [0 for _ in range(universal_batch_size * local_hotness_sum)] # int32_t
-        
-        self.unique_key_bucket_idx = [0 for _ in range(universal_batch_size * local_hotness_sum) if offset_type == 'uint32_t' or offset_type == 'uint64_t']
-        self.unique_key_bucket_idx_offset = [0 for _ in range(universal_batch_size * local_hotness_sum) if offset_type == 'uint32_t' or offset_type == 'uint64_t']
-        self.unique_key_ev_size_offset = [0 for _ in range(1 + universal_batch_size * local_hotness_sum)] # int
-        
-        self.unique_key_id_space_offset = [0 for _ in range(1 + num_local_embedding)] # int
-        self.unique_key_ev_id_space_offset = [0 for _ in range(1 + num_local_embedding)] # int
+        self.unique_key_bucket_idx = np.zeros(0, dtype=np.int64)
+        self.unique_key_bucket_idx_offset = np.zeros(1, dtype=np.int64)
+        self.unique_key_ev_size_offset = np.zeros(1, dtype=np.int64)
+        self.unique_key_id_space_offset = np.zeros(1 + num_local_embedding, dtype=np.int64)
+        self.unique_key_ev_id_space_offset = np.zeros(1 + num_local_embedding, dtype=np.int64)
 
     def compute(self, model_key, bucket_idx, num_model_key, id_space_offset, d_local_ev_size_offset):
         if self.num_local_embedding > 0:
+            id_space_offset = np.asarray(id_space_offset[: 1 + self.num_local_embedding], dtype=np.int64)
             # cub segmented radix sort pairs
             sorted_key, sorted_bucket_idx = segmented_sort(
                 model_key,
@@ -184,47 +187,31 @@ class GradIndexCalculation:
                 self.num_local_embedding,
             )
 
-            # cub select
-            for idx in range(self.num_local_embedding):
-                embedding_start = id_space_offset[idx]
-                embedding_end = id_space_offset[idx + 1]
-                for local_i in range(embedding_end - embedding_start):
-                    i = local_i + embedding_start
-                    if i == 0:
-                        self.unique_key_flag[i] = 1
-                    elif sorted_key[i] != sorted_key[i - 1]:
-                        self.unique_key_flag[i] = 1
-                    else:
-                        self.unique_key_flag[i] = 0
-
-
-            self.num_unique_key = sum(self.unique_key_flag[:num_model_key])
-            self.unique_key[:self.num_unique_key] = list(compress(sorted_key, self.unique_key_flag))
-            self.unique_key_id_space_offset[1:] = segmented_reduce_sum(
-                self.unique_key_flag,
+            # cub select, the first key of every id space is unique even if the previous id space ends with it
+            unique_key_flag = np.ones(num_model_key, dtype=bool)
+            unique_key_flag[1:] = sorted_key[1:] != sorted_key[:-1]
+            unique_key_flag[id_space_offset[:-1][id_space_offset[:-1] < num_model_key]] = True
+
+            self.num_unique_key = int(unique_key_flag.sum())
+            self.unique_key = sorted_key[unique_key_flag]
+            num_unique_key_per_id_space = segmented_reduce_sum(
+                unique_key_flag,
                 self.num_local_embedding,
                 id_space_offset[: self.num_local_embedding],
                 id_space_offset[1:],
             )
+            self.unique_key_id_space_offset = np.zeros(1 + self.num_local_embedding, dtype=np.int64)
+            self.unique_key_id_space_offset[1:] = np.cumsum(num_unique_key_per_id_space)
 
-            self.unique_key_bucket_idx[:num_model_key] = sorted_bucket_idx[:num_model_key]
-            self.unique_key_flag_scan[:1 + num_model_key] = list(accumulate([0] + self.unique_key_flag[:num_model_key]))
-            for i in range(1, num_model_key):
-                if self.unique_key_flag_scan[i] != self.unique_key_flag_scan[i + 1]:
-                    self.unique_key_bucket_idx_offset[self.unique_key_flag_scan[i]] = i
-            self.unique_key_bucket_idx_offset[self.num_unique_key] = num_model_key
-            self.unique_key_id_space_offset = list(accumulate(self.unique_key_id_space_offset))
-            
-            for embedding_idx in range(self.num_local_embedding):
-                start = self.unique_key_id_space_offset[embedding_idx]
-                end = self.unique_key_id_space_offset[embedding_idx + 1]
-                for s in range(start, end):
-                    self.unique_key_ev_size_offset[1 + s] = d_local_ev_size_offset[embedding_idx + 1] - d_local_ev_size_offset[embedding_idx]
-            self.unique_key_ev_size_offset[:self.num_unique_key + 1] = list(accumulate(self.unique_key_ev_size_offset[:self.num_unique_key + 1]))
-            
-            for idx in range(self.num_local_embedding):
-                self.unique_key_ev_id_space_offset[1 + idx] = (self.unique_key_id_space_offset[idx + 1] - self.unique_key_id_space_offset[idx]) * (d_local_ev_size_offset[idx + 1] - d_local_ev_size_offset[idx])
-            self.unique_key_ev_id_space_offset = list(accumulate(self.unique_key_ev_id_space_offset))
+            self.unique_key_bucket_idx = sorted_bucket_idx
+            self.unique_key_bucket_idx_offset = np.append(np.flatnonzero(unique_key_flag), num_model_key)
+
+            ev_size_per_id_space = np.diff(np.asarray(d_local_ev_size_offset[: 1 + self.num_local_embedding]))
+            self.unique_key_ev_size_offset = np.zeros(1 + self.num_unique_key, dtype=np.int64)
+            self.unique_key_ev_size_offset[1:] = np.cumsum(np.repeat(ev_size_per_id_space, num_unique_key_per_id_space))
+
+            self.unique_key_ev_id_space_offset = np.zeros(1 + self.num_local_embedding, dtype=np.int64)
+            self.unique_key_ev_id_space_offset[1:] = np.cumsum(num_unique_key_per_id_space * ev_size_per_id_space)
 
         return (
             self.unique_key,
@@ -241,8 +228,8 @@ class ModelBackwardIndexCalculation:
     def __init__(
         self,
         num_gpus,
-        num_local_embedding, 
-        h_local_hotness_list, 
+        num_local_embedding,
+        h_local_hotness_list,
         universal_batch_size,
         key_type,
         offset_type
@@ -252,30 +239,25 @@ class ModelBackwardIndexCalculation:
             num_local_embedding, h_local_hotness_list, universal_batch_size, key_type, offset_type
         )
         self.num_local_embedding = num_local_embedding
-        local_hotness_sum = sum(h_local_hotness_list)
-        self.bucket_idx = [0 for _ in range(universal_batch_size * local_hotness_sum)  if offset_type == 'uint32_t' or offset_type == 'uint64_t']
-        
+        self.bucket_idx = np.zeros(0, dtype=np.int64)
 
     def compute(self, model_key, num_model_key, model_offset, id_space_offset, d_local_ev_size_offset, batch_size):
         batch_size_per_gpu = batch_size // self.num_gpus
         if self.num_local_embedding > 0:
-            # target idx: model comm buffer 
-            for idx in range(batch_size * self.num_local_embedding):
-                local_embedding_id = idx // batch_size
-                batch_id = idx % batch_size
-                gpu_id = batch_id // batch_size_per_gpu
-                local_batch_id = batch_id % batch_size_per_gpu
-                
-                swizzle_idx = local_batch_id + local_embedding_id * batch_size_per_gpu + gpu_id * batch_size_per_gpu * self.num_local_embedding
-                start = model_offset[idx]
-                end = model_offset[idx + 1]
-                for i in range(start, end):
-                    self.bucket_idx[i] = swizzle_idx
+            # target idx: model comm buffer
+            idx = np.arange(batch_size * self.num_local_embedding)
+            local_embedding_id = idx // batch_size
+            batch_id = idx % batch_size
+            gpu_id = batch_id // batch_size_per_gpu
+            local_batch_id = batch_id % batch_size_per_gpu
+
+            swizzle_idx = local_batch_id + local_embedding_id * batch_size_per_gpu + gpu_id * batch_size_per_gpu * self.num_local_embedding
+            self.bucket_idx = np.repeat(swizzle_idx, np.diff(np.asarray(model_offset[: 1 + len(idx)])))
         return self.grad_index_calculation.compute(
-            model_key, 
+            model_key,
             self.bucket_idx,
-            num_model_key, 
-            id_space_offset, 
+            num_model_key,
+            id_space_offset,
             d_local_ev_size_offset
         )
 
@@ -295,39 +277,31 @@ class DPLocalReduceIndexCalculation:
         )
         self.num_local_embedding = num_local_embedding
         self.num_embedding = num_embedding
-        local_hotness_sum = sum(h_local_hotness_list)
-        hotness_sum = sum(h_hotness_list)
-        self.all_dp_key = [0 for _ in range(universal_batch_size * local_hotness_sum) if key_type == 'int32_t' or key_type == 'int64_t']
-        self.all_dp_bucket_idx = [0 for _ in range(universal_batch_size * local_hotness_sum) if offset_type == 'uint32_t' or offset_type == 'uint64_t']
-        self.all_key_flag = [0 for _ in range(universal_batch_size * hotness_sum)] #int
-        self.all_key_bucket_idx = [0 for _ in range(universal_batch_size * hotness_sum) if offset_type == 'uint32_t' or offset_type == 'uint64_t']
-        self.all_dp_id_space_offset = [0 for _ in range(num_embedding + 1)] #int
         self.compress_id_space_offset = CompressOffset(self.num_embedding)
 
     def compute(self, key, bucket_range, d_local_embedding_list, d_local_ev_size_offset, batch_size):
+        bucket_range = np.asarray(bucket_range, dtype=np.int64)
         id_space_offset = self.compress_id_space_offset.compute(bucket_range, batch_size)
-        for idx in range(self.num_local_embedding):
-            embedding_id = d_local_embedding_list[idx]
-            for batch_id in range(batch_size):
-                start = bucket_range[embedding_id * batch_size + batch_id]
-                end = bucket_range[embedding_id * batch_size + batch_id + 1]
-                for i in range(start, end):
-                    self.all_key_flag[i] = 1
-                    self.all_key_bucket_idx[i] = embedding_id * batch_size + batch_id
-        self.num_all_dp_key = sum(self.all_key_flag)
-        self.all_dp_key[: self.num_all_dp_key] = list(compress(key, self.all_key_flag))
-        self.all_dp_bucket_idx[: self.num_all_dp_key] = list(compress(self.all_key_bucket_idx, self.all_key_flag))
-
-        self.all_dp_id_space_offset = segmented_reduce_sum(
-            self.all_key_flag,
+        num_bucket = self.num_embedding * batch_size
+        all_key_bucket_idx = np.repeat(np.arange(num_bucket), np.diff(bucket_range[: 1 + num_bucket]))
+        is_local_embedding = np.zeros(self.num_embedding, dtype=bool)
+        is_local_embedding[np.asarray(d_local_embedding_list, dtype=np.int64)] = True
+        all_key_flag = is_local_embedding[all_key_bucket_idx // batch_size]
+
+        self.all_dp_key = np.asarray(key)[: len(all_key_flag)][all_key_flag]
+        self.num_all_dp_key = len(self.all_dp_key)
+        self.all_dp_bucket_idx = all_key_bucket_idx[all_key_flag]
+
+        num_dp_key_per_embedding = segmented_reduce_sum(
+            all_key_flag,
             self.num_embedding,
             id_space_offset[: self.num_embedding],
             id_space_offset[1:],
         )
-        self.all_dp_id_space_offset = [0] + [
-            self.all_dp_id_space_offset[d_local_embedding_list[idx]] for idx in range(self.num_local_embedding)
-        ]
-        self.all_dp_id_space_offset = list(accumulate(self.all_dp_id_space_offset))
+        self.all_dp_id_space_offset = np.zeros(1 + self.num_local_embedding, dtype=np.int64)
+        self.all_dp_id_space_offset[1:] = np.cumsum(
+            num_dp_key_per_embedding[np.asarray(d_local_embedding_list, dtype=np.int64)]
+        )
         # print('all_dp_key', self.all_dp_key)
         # print('all_dp_bucket_idx', self.all_dp_bucket_idx)
         # print('id_space_offset', id_space_offset)
@@ -367,33 +341,32 @@ class DPIndexCalculation:
         self.gpu_id = gpu_id
         self.num_gpus = num_gpus
         self.num_local_embedding = num_local_embedding
-        universal_batch_size_per_gpu = universal_batch_size // num_gpus
-        local_hotness_sum = sum(h_local_hotness_list)
-        hotness_sum = sum(h_hotness_list)
-
-        self.dp_key = [0 for _ in range(universal_batch_size_per_gpu * local_hotness_sum) if key_type == 'int32_t' or key_type == 'int64_t']
-        self.dp_offset = [0 for _ in range(universal_batch_size_per_gpu * self.num_local_embedding + 1) if offset_type == 'uint32_t' or offset_type == 'uint64_t']
-        self.flag = [0 for _ in range(universal_batch_size * hotness_sum)]
+        self.dp_key = np.zeros(0, dtype=np.int64)
+        self.dp_offset = np.zeros(1, dtype=np.int64)
         self.num_dp_key = 0
 
     def compute(self, key, bucket_range, d_local_embedding_list, batch_size):
         batch_size_per_gpu = batch_size // self.num_gpus
+        key = np.asarray(key)
+        bucket_range = np.asarray(bucket_range, dtype=np.int64)
+        # bucket of idx * batch_size_per_gpu + batch_id in the batch of this gpu
+        bucket_id = (
+            np.asarray(d_local_embedding_list, dtype=np.int64)[:, None] * batch_size
+            + batch_size_per_gpu * self.gpu_id
+            + np.arange(batch_size_per_gpu)
+        ).ravel()
+        bucket_start = bucket_range[bucket_id]
+        bucket_end = bucket_range[bucket_id + 1]
         # mask flag
-        for idx in range(self.num_local_embedding):
-            embedding_id = d_local_embedding_list[idx]
-            local_batch_start = batch_size * embedding_id + batch_size_per_gpu * self.gpu_id
-            batch_bucket_start = bucket_range[local_batch_start]
-            batch_bucket_end = bucket_range[local_batch_start + batch_size_per_gpu]
-            self.flag[batch_bucket_start:batch_bucket_end] = [1 for _ in range(batch_bucket_end - batch_bucket_start)]
-            for batch_id in range(batch_size_per_gpu):
-                start = bucket_range[local_batch_start + batch_id]
-                end = bucket_range[local_batch_start + batch_id + 1]
-                self.dp_offset[1 + idx * batch_size_per_gpu + batch_id] = end - start
+        indices, _ = segment_ranges(bucket_start, bucket_end)
+        flag = np.zeros(len(key), dtype=bool)
+        flag[indices] = True
         # select
-        self.num_dp_key = sum(self.flag)
-        self.dp_key[: self.num_dp_key] = list(compress(key, self.flag))
+        self.dp_key = key[flag]
+        self.num_dp_key = len(self.dp_key)
         # cub inclusive sum
-        self.dp_offset = list(accumulate(self.dp_offset))
+        self.dp_offset = np.zeros(len(bucket_id) + 1, dtype=np.int64)
+        self.dp_offset[1:] = np.cumsum(bucket_end - bucket_start)
         return self.dp_key, self.dp_offset, self.num_dp_key
 
 
@@ -413,26 +386,21 @@ class DPModelForward:
         batch_size,
     ):
         batch_size_per_gpu = batch_size // self.num_gpus
+        dp_offset = np.asarray(dp_offset, dtype=np.int64)
         # print('DPModelForward', dp_ev, dp_offset, d_local_embedding_list, batch_size_per_gpu)
         for idx in range(self.num_local_embedding):
             embedding_id = d_local_embedding_list[idx]
             ev_size = d_ev_size_offset[embedding_id + 1] - d_ev_size_offset[embedding_id]
             combiner = d_local_combiner_list[idx]
             assert combiner != "concat"
-            for batch_id in range(batch_size_per_gpu):
-                start = dp_offset[idx * batch_size_per_gpu + batch_id]
-                end = dp_offset[idx * batch_size_per_gpu + batch_id + 1]
-                accumulate_ev = [0.0 for _ in range(ev_size)]
-                for i in range(start, end):
-                    for ev_id in range(ev_size):
-                        accumulate_ev[ev_id] += dp_ev[i][ev_id]
-                if combiner == "mean" and end > start:
-                    accumulate_ev = [v / (end - start) for v in accumulate_ev]
-                output_buffer[
-                    d_ev_size_offset[embedding_id] * batch_size_per_gpu
-                    + batch_id * ev_size : d_ev_size_offset[embedding_id] * batch_size_per_gpu
-                    + (batch_id + 1) * ev_size
-                ] = accumulate_ev
+            bucket_offset = dp_offset[idx * batch_size_per_gpu : (idx + 1) * batch_size_per_gpu + 1]
+            accumulate_ev = segmented_reduce_rows(dp_ev[idx], bucket_offset - bucket_offset[0])
+            if combiner == "mean":
+                accumulate_ev /= np.maximum(np.diff(bucket_offset), 1)[:, None]
+            output_buffer[
+                d_ev_size_offset[embedding_id] * batch_size_per_gpu : (d_ev_size_offset[embedding_id] + ev_size)
+                * batch_size_per_gpu
+            ] = accumulate_ev.ravel()
 
 
 class ModelForward:
@@ -451,27 +419,24 @@ class ModelForward:
         batch_size,
     ):
         batch_size_per_gpu = batch_size // self.num_gpus
+        model_offset = np.asarray(model_offset, dtype=np.int64)
         if self.num_local_embedding > 0:
             for idx in range(self.num_local_embedding):
                 combiner = d_local_combiner_list[idx]
                 ev_size = d_local_ev_size_offset[idx + 1] - d_local_ev_size_offset[idx]
-                for batch_id in range(batch_size):
-                    bucket_start = model_offset[idx * batch_size + batch_id]
-                    bucket_end = model_offset[idx * batch_size + batch_id + 1]
-                    tmp_ev = [0.0 for _ in range(ev_size)]
-                    for bucket_id in range(bucket_start, bucket_end):
-                        for ev_id in range(ev_size):
-                            tmp_ev[ev_id] += mp_ev[bucket_id][ev_id]
-                    if combiner == "mean" and bucket_end > bucket_start:
-                        for ev_id in range(ev_size):
-                            tmp_ev[ev_id] /= num_key_in_bucket_for_combiner[idx * batch_size + batch_id]
-                    gpu_id = batch_id // batch_size_per_gpu
-                    local_batch_id = batch_id % batch_size_per_gpu
-                    local_comm_buffer_offset = (
-                        d_local_ev_size_offset[idx] * batch_size_per_gpu + local_batch_id * ev_size
-                    )
-                    for ev_id in range(ev_size):
-                        model_comm_buffer[gpu_id][local_comm_buffer_offset + ev_id] = tmp_ev[ev_id]
+                bucket_offset = model_offset[idx * batch_size : (idx + 1) * batch_size + 1]
+                tmp_ev = segmented_reduce_rows(mp_ev[idx], bucket_offset - bucket_offset[0])
+                if combiner == "mean":
+                    non_empty = bucket_offset[1:] > bucket_offset[:-1]
+                    num_key_in_bucket = np.asarray(num_key_in_bucket_for_combiner[idx * batch_size : (idx + 1) * batch_size])
+                    tmp_ev[non_empty] /= num_key_in_bucket[non_empty][:, None]
+                # batch_id = gpu_id * batch_size_per_gpu + local_batch_id
+                tmp_ev = tmp_ev.reshape(self.num_gpus, batch_size_per_gpu * ev_size)
+                local_comm_buffer_offset = d_local_ev_size_offset[idx] * batch_size_per_gpu
+                for gpu_id in range(self.num_gpus):
+                    model_comm_buffer[gpu_id][
+                        local_comm_buffer_offset : local_comm_buffer_offset + batch_size_per_gpu * ev_size
+                    ] = tmp_ev[gpu_id]
 
 
 class NetworkForward:
@@ -499,16 +464,15 @@ class NetworkForward:
             ev_size = d_ev_size_offset[dst_embedding_id + 1] - d_ev_size_offset[dst_embedding_id]
             combiner =  d_combiner_list[dst_embedding_id]
             batch_dst_ev_offset = d_ev_size_offset[dst_embedding_id] * batch_size_per_gpu
+            output_ev = output_buffer[batch_dst_ev_offset: batch_dst_ev_offset + ev_size * batch_size_per_gpu]
             # handle missing key
             if end == start:
-                output_buffer[batch_dst_ev_offset: batch_dst_ev_offset + ev_size * batch_size_per_gpu] = 0.
-            
+                output_ev[:] = 0.
+
             for i in range(start, end):
                 n_i = network_idx[i]
                 ng_i = network_gpu_idx[i]
-                batch_ev = network_comm_buffer[ng_i][n_i* batch_size_per_gpu: (n_i + ev_size) * batch_size_per_gpu]
-                for e in range(ev_size * batch_size_per_gpu):
-                    output_buffer[batch_dst_ev_offset + e] += batch_ev[e]
+                output_ev += network_comm_buffer[ng_i][n_i* batch_size_per_gpu: (n_i + ev_size) * batch_size_per_gpu]
 
 class NetworkBackward:
     def __init__(self, num_gpus) -> None:
@@ -542,13 +506,35 @@ class NetworkBackward:
             end = network_offset[idx + 1]
             ev_size = d_ev_size_offset[dst_embedding_id + 1] - d_ev_size_offset[dst_embedding_id]
             batch_dst_ev_offset = d_ev_size_offset[dst_embedding_id] * batch_size_per_gpu
-            
+
             for i in range(start, end):
                 n_i = network_idx[i]
                 ng_i = network_gpu_idx[i]
-                batch_ev = top_grad[batch_dst_ev_offset: batch_dst_ev_offset + ev_size * batch_size_per_gpu]
-                for e in range(ev_size * batch_size_per_gpu):
-                    network_comm_buffer[ng_i][n_i* batch_size_per_gpu + e] = batch_ev[e]
+                network_comm_buffer[ng_i][n_i* batch_size_per_gpu: (n_i + ev_size) * batch_size_per_gpu] = top_grad[batch_dst_ev_offset: batch_dst_ev_offset + ev_size * batch_size_per_gpu]
+
+
+def reduce_bucket_ev(
+    src_buffer,
+    src_ev_offset,
+    unique_key_ev_size_offset,
+    unique_key_bucket_idx_offset,
+    num_unique_key,
+    bucket_mask=None,
+):
+    # the grad of every unique key is the sum of the evs of its buckets, the ev of the i-th bucket
+    # starts from src_ev_offset[i] in src_buffer
+    unique_key_ev_size_offset = np.asarray(unique_key_ev_size_offset[: 1 + num_unique_key], dtype=np.int64)
+    num_bucket_per_key = np.diff(np.asarray(unique_key_bucket_idx_offset[: 1 + num_unique_key], dtype=np.int64))
+    bucket_key_idx = np.repeat(np.arange(num_unique_key), num_bucket_per_key)
+    bucket_ev_size = np.diff(unique_key_ev_size_offset)[bucket_key_idx]
+    if bucket_mask is not None:
+        bucket_key_idx = bucket_key_idx[bucket_mask]
+        bucket_ev_size = bucket_ev_size[bucket_mask]
+        src_ev_offset = src_ev_offset[bucket_mask]
+    src_idx, bucket = segment_ranges(src_ev_offset, src_ev_offset + bucket_ev_size)
+    dst_idx = unique_key_ev_size_offset[bucket_key_idx][bucket] + src_idx - src_ev_offset[bucket]
+    # bincount accumulates in the order of the buckets like the sequential sum
+    return np.bincount(dst_idx, weights=src_buffer[src_idx], minlength=unique_key_ev_size_offset[-1])
 
 
 class ModelBackward:
@@ -563,11 +549,7 @@ class ModelBackward:
     ) -> None:
         self.num_local_embedding = num_local_embedding
         self.num_gpus = num_gpus
-
-        max_unique_key_ev_buffer_size = sum(
-            [hotness * ev_size for hotness, ev_size in zip(h_local_hotness_list, h_local_ev_size_list)]
-        )
-        self.grad_ev = [0.0 for _ in range(universal_batch_size * max_unique_key_ev_buffer_size) if emb_type == 'float' or emb_type == 'half']
+        self.grad_ev = np.zeros(0)
 
     def compute(
         self,
@@ -581,24 +563,30 @@ class ModelBackward:
     ):
         batch_size_per_gpu = batch_size // self.num_gpus
         num_bucket_per_gpu = self.num_local_embedding * batch_size_per_gpu
-
-        for unique_key_idx in range(num_unique_key):
-            start = unique_key_bucket_idx_offset[unique_key_idx]
-            end = unique_key_bucket_idx_offset[unique_key_idx + 1]
-            ev_size = unique_key_ev_size_offset[unique_key_idx + 1] - unique_key_ev_size_offset[unique_key_idx]
-            
-            accumulate_ev = [0.0 for _ in range(ev_size)]
-            for i in range(start, end):
-                r = unique_key_bucket_idx[i]
-                gpu_id = r // num_bucket_per_gpu
-                local_r = r - gpu_id * num_bucket_per_gpu
-                local_embedding_id = local_r // batch_size_per_gpu
-                batch_id = local_r % batch_size_per_gpu
-                ev = model_comm_buffer[gpu_id][batch_size_per_gpu * d_local_ev_size_offset[local_embedding_id] + batch_id * ev_size: batch_size_per_gpu * d_local_ev_size_offset[local_embedding_id] + (batch_id + 1) * ev_size]
-                for ev_id in range(ev_size):
-                    accumulate_ev[ev_id] += ev[ev_id]
-            self.grad_ev[unique_key_ev_size_offset[unique_key_idx]: unique_key_ev_size_offset[unique_key_idx + 1]] = accumulate_ev
-        
+        if self.num_local_embedding == 0:
+            return self.grad_ev
+
+        # all the model comm buffers have the same size
+        model_comm_buffer_size = len(model_comm_buffer[0])
+        r = np.asarray(unique_key_bucket_idx[: unique_key_bucket_idx_offset[num_unique_key]], dtype=np.int64)
+        gpu_id = r // num_bucket_per_gpu
+        local_r = r - gpu_id * num_bucket_per_gpu
+        local_embedding_id = local_r // batch_size_per_gpu
+        batch_id = local_r % batch_size_per_gpu
+        d_local_ev_size_offset = np.asarray(d_local_ev_size_offset, dtype=np.int64)
+        ev_size = d_local_ev_size_offset[local_embedding_id + 1] - d_local_ev_size_offset[local_embedding_id]
+        src_ev_offset = (
+            gpu_id * model_comm_buffer_size
+            + batch_size_per_gpu * d_local_ev_size_offset[local_embedding_id]
+            + batch_id * ev_size
+        )
+        self.grad_ev = reduce_bucket_ev(
+            np.concatenate(model_comm_buffer),
+            src_ev_offset,
+            unique_key_ev_size_offset,
+            unique_key_bucket_idx_offset,
+            num_unique_key,
+        )
         return self.grad_ev
 
 
@@ -616,11 +604,7 @@ class DPLocalReduce:
         self.gpu_id = gpu_id
         self.num_gpus = num_gpus
         self.num_local_embedding = num_local_embedding
-
-        max_unique_key_ev_buffer_size = sum(
-            [hotness * ev_size for hotness, ev_size in zip(h_local_hotness_list, h_local_ev_size_list)]
-        )
-        self.grad_ev = [0.0 for _ in range(universal_batch_size * max_unique_key_ev_buffer_size)  if emb_type == 'float' or emb_type == 'half']
+        self.grad_ev = np.zeros(0)
 
     def compute(
         self,
@@ -641,22 +625,22 @@ class DPLocalReduce:
         # print('unique_key_bucket_idx_offset={}'.format(unique_key_bucket_idx_offset))
         # print('num_unique_key={}'.format(num_unique_key))
         # print('d_ev_size_offset={}'.format(d_ev_size_offset))
-        for unique_key_idx in range(num_unique_key):
-            start = unique_key_bucket_idx_offset[unique_key_idx]
-            end = unique_key_bucket_idx_offset[unique_key_idx + 1]
-            ev_size = unique_key_ev_size_offset[unique_key_idx + 1] - unique_key_ev_size_offset[unique_key_idx]
-            accumulate_ev = [0.0 for _ in range(ev_size)]
-            for i in range(start, end):
-                r = unique_key_bucket_idx[i]
-                embedding_id = r // batch_size
-                batch_id = r % batch_size
-                # maybe we should filter in dp local reduce index calculation
-                if batch_id >= local_batch_start and batch_id < local_batch_end:
-                    local_batch_id = batch_id - local_batch_start
-                    ev = top_grad[batch_size_per_gpu * d_ev_size_offset[embedding_id] + local_batch_id * ev_size: batch_size_per_gpu * d_ev_size_offset[embedding_id] + (local_batch_id + 1) * ev_size]
-                    for ev_id in range(ev_size):
-                        accumulate_ev[ev_id] += ev[ev_id]
-            self.grad_ev[unique_key_ev_size_offset[unique_key_idx]: unique_key_ev_size_offset[unique_key_idx + 1]] = accumulate_ev
+        r = np.asarray(unique_key_bucket_idx[: unique_key_bucket_idx_offset[num_unique_key]], dtype=np.int64)
+        embedding_id = r // batch_size
+        batch_id = r % batch_size
+        # maybe we should filter in dp local reduce index calculation
+        is_local_batch = (batch_id >= local_batch_start) & (batch_id < local_batch_end)
+        d_ev_size_offset = np.asarray(d_ev_size_offset, dtype=np.int64)
+        ev_size = d_ev_size_offset[embedding_id + 1] - d_ev_size_offset[embedding_id]
+        src_ev_offset = batch_size_per_gpu * d_ev_size_offset[embedding_id] + (batch_id - local_batch_start) * ev_size
+        self.grad_ev = reduce_bucket_ev(
+            np.asarray(top_grad),
+            src_ev_offset,
+            unique_key_ev_size_offset,
+            unique_key_bucket_idx_offset,
+            num_unique_key,
+            is_local_batch,
+        )
         return self.grad_ev
 
 
@@ -2,6 +2,7 @@ from collections import defaultdict
 from itertools import chain
 import threading
 from time import sleep
+import numpy as np
 class NcclComm:
     def __init__(self) -> None:
         self.send_dict = defaultdict(dict)
@@ -22,13 +23,9 @@ class NcclComm:
         count = [self.send_dict[gpu_id]['allreduce'][1] for gpu_id in range(num_gpus)]
         assert sum(count) == count[0] * num_gpus
 
-        allreduce_buffer = [0. for _ in range(count[0])]
-        for gpu_id in range(num_gpus):
-            for i in range(count[0]):
-                allreduce_buffer[i] += buffer[gpu_id][i]
+        allreduce_buffer = np.sum([b[:count[0]] for b in buffer], axis=0)
         for b in buffer:
-            for i in range(count[0]):
-                b[i] = allreduce_buffer[i]
+            b[:count[0]] = allreduce_buffer
                 
     def clear(self):
         self.send_dict.clear()
@@ -38,6 +35,10 @@ class NcclComm:
 global_nccl_comm = NcclComm()
 barrier = threading.Barrier(2)
 
+def init_nccl_communication(num_gpus):
+    global barrier
+    barrier = threading.Barrier(num_gpus)
+
 class nccl_communication:
     def __init__(self, typ, gpu_id, num_gpus) -> None:
         self.typ = typ
@@ -17,6 +17,7 @@
 from hugectr2onnx.hugectr_loader import HugeCTRLoader, LayerParams
 from hugectr2onnx.graph_builder import GraphBuilder
 import argparse
+import time
 
 
 def convert(
@@ -27,6 +28,9 @@ def convert(
     sparse_models=None,
     ntp_file=None,
     graph_name="hugectr",
+    compact_key_mapping=False,
+    save_as_external_data=False,
+    external_data_threshold=1024,
 ):
     """Convert a HugeCTR model to an ONNX model
     Args:
@@ -37,13 +41,27 @@ def convert(
         sparse_models: the files of the sparse embeddings for the HugeCTR model (optional)
         ntp_file: the file of the non-trainable parameters for the HugeCTR model (optional)
         graph_name: the graph name for the ONNX model (optional)
+        compact_key_mapping: whether to map keys with a per-table sorted key layout instead of the dense key to indice hash (optional)
+        save_as_external_data: whether to stream the embedding tables and key mappings to the external data file <onnx_model_path>.data (optional)
+        external_data_threshold: the min size in bytes of the initializers saved as external data (optional)
     """
-    loader = HugeCTRLoader(graph_config, dense_model, convert_embedding, sparse_models, ntp_file)
-    builder = GraphBuilder(convert_embedding)
+    loader = HugeCTRLoader(
+        graph_config, dense_model, convert_embedding, sparse_models, ntp_file, compact_key_mapping
+    )
+    external_data_path = onnx_model_path + ".data" if save_as_external_data else None
+    builder = GraphBuilder(
+        convert_embedding, compact_key_mapping, external_data_path, external_data_threshold
+    )
     for _ in range(loader.layers):
+        start = time.time()
         layer_params, weights_dict, dimensions = loader.load_layer()
-        print(f"[HUGECTR2ONNX][INFO]: Converting {layer_params.layer_type} layer to ONNX")
+        parse_time = time.time() - start
+        print(
+            f"[HUGECTR2ONNX][INFO]: Converting {layer_params.layer_type} layer to ONNX, parsed in {parse_time:.3f}s"
+        )
         builder.add_layer(layer_params, weights_dict, dimensions)
+        # Release the weights before loading the next layer
+        del weights_dict
     builder.create_graph(graph_name)
     builder.save_model(onnx_model_path)
 
@@ -67,6 +85,22 @@ if __name__ == "__main__":
     parser.add_argument(
         "--graph_name", type=str, default="hugectr", help="Graph name for the ONNX model (optional)"
     )
+    parser.add_argument(
+        "--compact_key_mapping",
+        action="store_true",
+        help="Map keys to embedding table indices with a compact sorted key layout (optional)",
+    )
+    parser.add_argument(
+        "--save_as_external_data",
+        action="store_true",
+        help="Stream embedding tables to an ONNX external data file (optional)",
+    )
+    parser.add_argument(
+        "--external_data_threshold",
+        type=int,
+        default=1024,
+        help="Min size in bytes of the initializers saved as external data (optional)",
+    )
     args = parser.parse_args()
     print(args)
     convert(
@@ -77,4 +111,7 @@ if __name__ == "__main__":
         args.sparse_models,
         args.ntp_file,
         args.graph_name,
+        args.compact_key_mapping,
+        args.save_as_external_data,
+        args.external_data_threshold,
     )
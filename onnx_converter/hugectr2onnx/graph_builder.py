@@ -18,15 +18,61 @@ from onnx import AttributeProto, TensorProto, GraphProto, helper, numpy_helper
 from hugectr2onnx.hugectr_loader import HugeCTRLoader, LayerParams
 import numpy as np
 import onnx
+import os
+
+# Alignment in bytes of the initializers in the external data file
+EXTERNAL_DATA_ALIGNMENT = 4096
+
+
+def build_compact_key_mapping(keys):
+    """Build the sorted layout that maps the keys of an embedding table to its rows.
+    The keys are deduplicated (the last occurrence wins) and sorted. The sorted keys are padded
+    with the max int64 to a power of two length, so that a lookup can binary search them in a
+    fixed number of steps and pick the indice of the matched key, or 0 for non-existing keys.
+    Args:
+        keys: np.ndarray, int64 keys of the embedding table, row i + 1 of the table stores key i
+    Returns:
+        sorted_keys: np.ndarray, unique keys in ascending order, padded with the max int64
+        sorted_indices: np.ndarray, embedding table indices of sorted_keys, padded with 0
+        num_steps: int, number of binary search steps, log2 of the padded length
+    """
+    num_keys = keys.shape[0]
+    unique_keys, reversed_positions = np.unique(keys[::-1], return_index=True)
+    num_unique_keys = unique_keys.shape[0]
+    # The padded length must exceed the number of keys, so that a lookup ends on a valid slot
+    num_steps = int(num_unique_keys).bit_length()
+    sorted_keys = np.full(
+        shape=(1 << num_steps,), fill_value=np.iinfo(np.int64).max, dtype=np.int64
+    )
+    sorted_keys[:num_unique_keys] = unique_keys
+    sorted_indices = np.zeros(shape=(1 << num_steps,), dtype=np.int64)
+    sorted_indices[:num_unique_keys] = num_keys - reversed_positions
+    return sorted_keys, sorted_indices, num_steps
 
 
 class GraphBuilder(object):
-    def __init__(self, convert_embedding):
+    def __init__(
+        self,
+        convert_embedding,
+        compact_key_mapping=False,
+        external_data_path=None,
+        external_data_threshold=1024,
+    ):
         """Create GraphBuilder
         Args:
             convert_embedding: boolean, whether converting sparse embedding models to ONNX
+            compact_key_mapping: boolean, whether mapping keys to embedding table indices with a
+                per-table sorted key layout instead of the dense key to indice hash
+            external_data_path: str, file to which the embedding tables and key mappings are
+                streamed as ONNX external data, it must be in the same folder as the ONNX model
+            external_data_threshold: int, min size in bytes of the streamed initializers
         """
         self.__convert_embeddding = convert_embedding
+        self.__compact_key_mapping = compact_key_mapping
+        self.__external_data_path = external_data_path
+        self.__external_data_threshold = external_data_threshold
+        if self.__external_data_path is not None:
+            open(self.__external_data_path, "wb").close()
         self.__nodes = []
         self.__initializers = []
         self.__inputs = []
@@ -73,19 +119,24 @@ class GraphBuilder(object):
                         )
                     )
 
-            self.__key_to_indice_hash_all_tables = weights_dict["key_to_indice_hash_all_tables"]
-            key_to_indice_hash_all_tables = weights_dict["key_to_indice_hash_all_tables"]
-            key_to_indice_hash_all_tables_name = "key_to_indice_hash_all_tables"
-            self.__initializers.append(
-                helper.make_tensor(
-                    name=key_to_indice_hash_all_tables_name,
-                    data_type=onnx.mapping.NP_TYPE_TO_TENSOR_TYPE[
-                        key_to_indice_hash_all_tables.dtype
-                    ],
-                    dims=key_to_indice_hash_all_tables.shape,
-                    vals=key_to_indice_hash_all_tables.flatten(),
-                )
-            )
+            if not self.__compact_key_mapping:
+                self.__key_to_indice_hash_all_tables = weights_dict["key_to_indice_hash_all_tables"]
+                key_to_indice_hash_all_tables = weights_dict["key_to_indice_hash_all_tables"]
+                key_to_indice_hash_all_tables_name = "key_to_indice_hash_all_tables"
+                # The key to indice hash is still being filled, it is finalized in create_graph
+                if self.__use_external_data(key_to_indice_hash_all_tables):
+                    self.__initializers.append(TensorProto(name=key_to_indice_hash_all_tables_name))
+                else:
+                    self.__initializers.append(
+                        helper.make_tensor(
+                            name=key_to_indice_hash_all_tables_name,
+                            data_type=onnx.mapping.NP_TYPE_TO_TENSOR_TYPE[
+                                key_to_indice_hash_all_tables.dtype
+                            ],
+                            dims=key_to_indice_hash_all_tables.shape,
+                            vals=key_to_indice_hash_all_tables.flatten(),
+                        )
+                    )
         elif (
             layer_type == "DistributedSlotSparseEmbeddingHash"
             or layer_type == "LocalizedSlotSparseEmbeddingHash"
@@ -95,22 +146,35 @@ class GraphBuilder(object):
                 embedding_table_name = layer_params.top_names[0] + "_embedding_table"
                 indice_name = layer_params.top_names[0] + "_indice"
                 embedding_feature_name = layer_params.top_names[0] + "_embedding_feature"
-                self.__initializers.append(
-                    helper.make_tensor(
-                        name=embedding_table_name,
-                        data_type=onnx.mapping.NP_TYPE_TO_TENSOR_TYPE[embedding_table.dtype],
-                        dims=embedding_table.shape,
-                        vals=embedding_table.flatten(),
+                if self.__use_external_data(embedding_table):
+                    self.__initializers.append(
+                        self.__make_external_tensor(embedding_table_name, embedding_table)
                     )
-                )
-                self.__nodes.append(
-                    helper.make_node(
-                        op_type="Gather",
-                        inputs=["key_to_indice_hash_all_tables", layer_params.bottom_names[0]],
-                        outputs=[indice_name],
-                        axis=0,
+                else:
+                    self.__initializers.append(
+                        helper.make_tensor(
+                            name=embedding_table_name,
+                            data_type=onnx.mapping.NP_TYPE_TO_TENSOR_TYPE[embedding_table.dtype],
+                            dims=embedding_table.shape,
+                            vals=embedding_table.flatten(),
+                        )
+                    )
+                if self.__compact_key_mapping:
+                    self.__add_compact_key_mapping(
+                        layer_params.top_names[0],
+                        weights_dict["embedding_keys"],
+                        layer_params.bottom_names[0],
+                        indice_name,
+                    )
+                else:
+                    self.__nodes.append(
+                        helper.make_node(
+                            op_type="Gather",
+                            inputs=["key_to_indice_hash_all_tables", layer_params.bottom_names[0]],
+                            outputs=[indice_name],
+                            axis=0,
+                        )
                     )
-                )
                 self.__nodes.append(
                     helper.make_node(
                         op_type="Gather",
@@ -1499,12 +1563,166 @@ class GraphBuilder(object):
             raise ValueError(layer_type + " is not supported in HugeCTR to ONNX converter")
         self.__counter += 1
 
+    def __use_external_data(self, array):
+        return (
+            self.__external_data_path is not None and array.nbytes >= self.__external_data_threshold
+        )
+
+    def __make_external_tensor(self, name, array):
+        """Stream the array to the external data file and create the initializer that refers to it
+        Args:
+            name: str, name of the initializer
+            array: np.ndarray, values of the initializer, which are written without extra copies
+        """
+        tensor = TensorProto()
+        tensor.name = name
+        tensor.data_type = onnx.mapping.NP_TYPE_TO_TENSOR_TYPE[array.dtype]
+        tensor.dims.extend(array.shape)
+        with open(self.__external_data_path, "ab") as file:
+            offset = file.tell()
+            padding = -offset % EXTERNAL_DATA_ALIGNMENT
+            file.write(b"\0" * padding)
+            offset += padding
+            np.ascontiguousarray(array).tofile(file)
+        tensor.data_location = TensorProto.EXTERNAL
+        for key, value in [
+            ("location", os.path.basename(self.__external_data_path)),
+            ("offset", str(offset)),
+            ("length", str(array.nbytes)),
+        ]:
+            entry = tensor.external_data.add()
+            entry.key = key
+            entry.value = value
+        return tensor
+
+    def __add_compact_key_mapping(self, prefix, keys, key_name, indice_name):
+        """Add the nodes that resolve keys to embedding table indices with a binary search
+        Args:
+            prefix: str, prefix of the names of the initializers and intermediate tensors
+            keys: np.ndarray, int64 keys of the embedding table
+            key_name: str, name of the input keys, whose shape is [batch, slot_num, max_nnz]
+            indice_name: str, name of the output indices, whose shape is the same as key_name
+        """
+        sorted_keys, sorted_indices, num_steps = build_compact_key_mapping(keys)
+        for name, value in [
+            (prefix + "_sorted_keys", sorted_keys),
+            (prefix + "_sorted_indices", sorted_indices),
+        ]:
+            if self.__use_external_data(value):
+                self.__initializers.append(self.__make_external_tensor(name, value))
+            else:
+                self.__initializers.append(numpy_helper.from_array(value, name))
+        # Branchless lower bound, position += step if sorted_keys[position + step - 1] < key,
+        # every intermediate tensor has the same shape as the input keys
+        position = None
+        for i in range(num_steps):
+            step = 1 << (num_steps - 1 - i)
+            step_name = "{}_step{}".format(prefix, i)
+            for name, value in [
+                (step_name + "_step", np.array(step, dtype=np.int64)),
+                (step_name + "_step_minus_one", np.array(step - 1, dtype=np.int64)),
+            ]:
+                self.__initializers.append(numpy_helper.from_array(value, name))
+            if position is None:
+                probe = step_name + "_step_minus_one"
+                advanced = step_name + "_step"
+                position = step_name + "_zero"
+                self.__initializers.append(
+                    numpy_helper.from_array(np.array(0, dtype=np.int64), position)
+                )
+            else:
+                probe = step_name + "_probe"
+                advanced = step_name + "_advanced"
+                self.__nodes.append(
+                    helper.make_node(
+                        op_type="Add",
+                        inputs=[position, step_name + "_step_minus_one"],
+                        outputs=[probe],
+                    )
+                )
+                self.__nodes.append(
+                    helper.make_node(
+                        op_type="Add",
+                        inputs=[position, step_name + "_step"],
+                        outputs=[advanced],
+                    )
+                )
+            self.__nodes.append(
+                helper.make_node(
+                    op_type="Gather",
+                    inputs=[prefix + "_sorted_keys", probe],
+                    outputs=[step_name + "_probe_key"],
+                    axis=0,
+                )
+            )
+            self.__nodes.append(
+                helper.make_node(
+                    op_type="Less",
+                    inputs=[step_name + "_probe_key", key_name],
+                    outputs=[step_name + "_less"],
+                )
+            )
+            self.__nodes.append(
+                helper.make_node(
+                    op_type="Where",
+                    inputs=[step_name + "_less", advanced, position],
+                    outputs=[step_name + "_position"],
+                )
+            )
+            position = step_name + "_position"
+        if position is None:
+            # An empty table only has the padding slot
+            position = prefix + "_zero_position"
+            self.__initializers.append(
+                numpy_helper.from_array(np.array(0, dtype=np.int64), position)
+            )
+        self.__nodes.append(
+            helper.make_node(
+                op_type="Gather",
+                inputs=[prefix + "_sorted_keys", position],
+                outputs=[prefix + "_found_key"],
+                axis=0,
+            )
+        )
+        self.__nodes.append(
+            helper.make_node(
+                op_type="Equal",
+                inputs=[prefix + "_found_key", key_name],
+                outputs=[prefix + "_match"],
+            )
+        )
+        self.__nodes.append(
+            helper.make_node(
+                op_type="Gather",
+                inputs=[prefix + "_sorted_indices", position],
+                outputs=[prefix + "_found_indice"],
+                axis=0,
+            )
+        )
+        # Indice 0 is returned for non-existing keys
+        self.__nodes.append(
+            helper.make_node(
+                op_type="Where",
+                inputs=[prefix + "_match", prefix + "_found_indice", prefix + "_zero_indice"],
+                outputs=[indice_name],
+            )
+        )
+        self.__initializers.append(
+            numpy_helper.from_array(np.array(0, dtype=np.int64), prefix + "_zero_indice")
+        )
+
     def create_graph(self, name="hugectr_graph"):
         # Finalize key to indice hash
-        key_to_indice_tensor = numpy_helper.from_array(
-            self.__key_to_indice_hash_all_tables, "key_to_indice_hash_all_tables"
-        )
-        self.__initializers[0].CopyFrom(key_to_indice_tensor)
+        if not self.__compact_key_mapping:
+            if self.__use_external_data(self.__key_to_indice_hash_all_tables):
+                key_to_indice_tensor = self.__make_external_tensor(
+                    "key_to_indice_hash_all_tables", self.__key_to_indice_hash_all_tables
+                )
+            else:
+                key_to_indice_tensor = numpy_helper.from_array(
+                    self.__key_to_indice_hash_all_tables, "key_to_indice_hash_all_tables"
+                )
+            self.__initializers[0].CopyFrom(key_to_indice_tensor)
         # Create the graph (GraphProto)
         self.__graph_def = helper.make_graph(
             self.__nodes, name, self.__inputs, self.__outputs, self.__initializers
@@ -1515,7 +1733,21 @@ class GraphBuilder(object):
         model_def = helper.make_model(self.__graph_def)
         model_def.opset_import[0].version = op_version
         model_def.ir_version = ir_version
-        onnx.checker.check_model(model_def)
-        print("[HUGECTR2ONNX][INFO]: The model is checked!")
-        onnx.save(model_def, model_path)
+        if self.__external_data_path is not None and os.path.dirname(
+            os.path.abspath(self.__external_data_path)
+        ) != os.path.dirname(os.path.abspath(model_path)):
+            raise ValueError(
+                "The external data file {} must be in the same folder as the model {}".format(
+                    self.__external_data_path, model_path
+                )
+            )
+        if self.__external_data_path is None:
+            onnx.checker.check_model(model_def)
+            print("[HUGECTR2ONNX][INFO]: The model is checked!")
+            onnx.save(model_def, model_path)
+        else:
+            onnx.save(model_def, model_path)
+            # The external data file can only be resolved relative to the saved model
+            onnx.checker.check_model(model_path)
+            print("[HUGECTR2ONNX][INFO]: The model is checked!")
         print("[HUGECTR2ONNX][INFO]: The model is saved at {}".format(model_path))
@@ -15,7 +15,6 @@
 """
 
 import os
-import struct
 import numpy as np
 import json
 
@@ -55,6 +54,9 @@ ONNX_LAYER_TYPES = {
 
 EXEMPTION_LAYER_TYPES = {"Cast", "FusedReshapeConcatGeneral", "GRU", "Gather", "ReLUHalf", "Select"}
 
+# Number of rows copied at a time when loading sparse models
+SPARSE_CHUNK_ROWS = 1 << 20
+
 
 def get_tensor_names(clause):
     if isinstance(clause, list):
@@ -65,6 +67,58 @@ def get_tensor_names(clause):
         return []
 
 
+def get_sparse_model_rows(sparse_model, embedding_vec_size):
+    """Get the number of complete (key, embedding vector) rows of a HugeCTR sparse model
+    Args:
+        sparse_model: str, sparse model folder that contains the key and emb_vector files
+        embedding_vec_size: int, embedding vector size
+    """
+    return min(
+        os.path.getsize(os.path.join(sparse_model, "key")) // 8,
+        os.path.getsize(os.path.join(sparse_model, "emb_vector")) // (4 * embedding_vec_size),
+    )
+
+
+def load_sparse_model(
+    sparse_model, embedding_vec_size, key_to_indice, embedding_table, chunk_rows=SPARSE_CHUNK_ROWS
+):
+    """Load the key and emb_vector files of a HugeCTR sparse model in bulk
+    Args:
+        sparse_model: str, sparse model folder that contains the key and emb_vector files
+        embedding_vec_size: int, embedding vector size
+        key_to_indice: np.ndarray, key to indice hash that will be filled in place,
+            skipped if None
+        embedding_table: np.ndarray, embedding table that will be filled in place,
+            indice 0 is reserved for default values of non-exisiting keys
+        chunk_rows: int, number of rows copied per chunk
+    Returns:
+        num_rows: int, number of rows loaded from the sparse model
+    """
+    key_path = os.path.join(sparse_model, "key")
+    vec_path = os.path.join(sparse_model, "emb_vector")
+    num_rows = get_sparse_model_rows(sparse_model, embedding_vec_size)
+    # indice 0 is reserved for default values of non-exisiting keys
+    loadable_rows = min(num_rows, embedding_table.shape[0] - 1)
+    if loadable_rows > 0:
+        keys = np.memmap(key_path, dtype=np.int64, mode="r", shape=(loadable_rows,))
+        vectors = np.memmap(
+            vec_path, dtype=np.float32, mode="r", shape=(loadable_rows, embedding_vec_size)
+        )
+        for begin in range(0, loadable_rows, chunk_rows):
+            end = min(begin + chunk_rows, loadable_rows)
+            if key_to_indice is not None:
+                key_to_indice[keys[begin:end]] = np.arange(begin + 1, end + 1, dtype=np.int64)
+            embedding_table[begin + 1 : end + 1] = vectors[begin:end]
+        del keys, vectors
+    if num_rows > loadable_rows:
+        raise IndexError(
+            "{} has {} keys, which exceeds the embedding table size {}".format(
+                sparse_model, num_rows, loadable_rows
+            )
+        )
+    return num_rows
+
+
 class LayerParams(object):
     def __init__(self):
         """Create LayerParams for HugeCTR"""
@@ -112,7 +166,13 @@ class LayerParams(object):
 
 class HugeCTRLoader(object):
     def __init__(
-        self, graph_config, dense_model, convert_embedding=False, sparse_models=None, ntp_file=None
+        self,
+        graph_config,
+        dense_model,
+        convert_embedding=False,
+        sparse_models=None,
+        ntp_file=None,
+        compact_key_mapping=False,
     ):
         """Create HugeCTRLoader
         Args:
@@ -121,10 +181,13 @@ class HugeCTRLoader(object):
             convert_embedding: boolean, whether converting sparse embedding models to ONNX
             sparse_models: List[str], sparse model files
             ntp_file: str, file that stores non-trainable parameters
+            compact_key_mapping: boolean, whether sizing embedding tables by the number of keys in
+                the sparse models and exporting their keys instead of the dense key to indice hash
         """
         self.__graph_config = graph_config
         self.__dense_model = dense_model
         self.__convert_embeddding = convert_embedding
+        self.__compact_key_mapping = compact_key_mapping
         self.__sparse_models = sparse_models
         self.__ntp_file = ntp_file
         self.__layers_config = json.load(open(graph_config, "rb"))["layers"]
@@ -137,7 +200,9 @@ class HugeCTRLoader(object):
             self.__ntp_config = None
         self.__ntp_counter = 0
         self.__dimensions = {}
+        # Offset in bytes of the next weights to read from the dense model
         self.__offset = 0
+        self.__dense_weights = None
         self.__vocab_size_all_tables = 0
         self.__key_to_indice_hash_all_tables = None
         for i in range(self.layers):
@@ -151,9 +216,29 @@ class HugeCTRLoader(object):
                     "max_vocabulary_size_global"
                 ]
                 self.__vocab_size_all_tables += max_vocab_size_global
-        self.__key_to_indice_hash_all_tables = np.zeros(
-            shape=(self.__vocab_size_all_tables,), dtype=np.int64
-        )
+        if not self.__compact_key_mapping:
+            self.__key_to_indice_hash_all_tables = np.zeros(
+                shape=(self.__vocab_size_all_tables,), dtype=np.int64
+            )
+
+    def __read_dense_weights(self, shape):
+        """Take the next weights of the dense model as a zero-copy view and advance the offset
+        Args:
+            shape: tuple, shape of the weights
+        """
+        if self.__dense_weights is None:
+            # Map the whole dense model once per loader
+            self.__dense_weights = np.memmap(self.__dense_model, dtype=np.float32, mode="r")
+        begin = self.__offset // 4
+        end = begin + int(np.prod(shape))
+        if end > self.__dense_weights.shape[0]:
+            raise ValueError(
+                "{} has {} bytes, which is less than the {} bytes required by the layers".format(
+                    self.__dense_model, self.__dense_weights.shape[0] * 4, end * 4
+                )
+            )
+        self.__offset = end * 4
+        return self.__dense_weights[begin:end].reshape(shape)
 
     @property
     def key_to_indice_hash_all_tables(self):
@@ -210,31 +295,32 @@ class HugeCTRLoader(object):
                 layer_params.combiner = (
                     0 if layer_config["sparse_embedding_hparam"]["combiner"] == "sum" else 1
                 )
-                max_vocab_size_global = layer_config["sparse_embedding_hparam"][
-                    "max_vocabulary_size_global"
-                ]
-                # indice 0 is reserved for default values of non-exisiting keys
-                embedding_table = np.zeros(
-                    shape=(max_vocab_size_global + 1, embedding_vec_size), dtype=np.float32
-                )
-                with open(
-                    self.__sparse_models[self.__embedding_counter] + "/key", "rb"
-                ) as key_file, open(
-                    self.__sparse_models[self.__embedding_counter] + "/emb_vector", "rb"
-                ) as vec_file:
+                sparse_model = self.__sparse_models[self.__embedding_counter]
+                if self.__compact_key_mapping:
+                    num_rows = get_sparse_model_rows(sparse_model, embedding_vec_size)
+                    # indice 0 is reserved for default values of non-exisiting keys
+                    embedding_table = np.zeros(
+                        shape=(num_rows + 1, embedding_vec_size), dtype=np.float32
+                    )
+                    load_sparse_model(sparse_model, embedding_vec_size, None, embedding_table)
+                    layer_weights_dict["embedding_keys"] = np.fromfile(
+                        os.path.join(sparse_model, "key"), dtype=np.int64, count=num_rows
+                    )
+                else:
+                    max_vocab_size_global = layer_config["sparse_embedding_hparam"][
+                        "max_vocabulary_size_global"
+                    ]
+                    # indice 0 is reserved for default values of non-exisiting keys
+                    embedding_table = np.zeros(
+                        shape=(max_vocab_size_global + 1, embedding_vec_size), dtype=np.float32
+                    )
                     try:
-                        # indice 0 is reserved for default values of non-exisiting keys
-                        indice = 1
-                        while True:
-                            key_buffer = key_file.read(8)
-                            vec_buffer = vec_file.read(4 * embedding_vec_size)
-                            if len(key_buffer) == 0 or len(vec_buffer) == 0:
-                                break
-                            key = struct.unpack("q", key_buffer)[0]
-                            values = struct.unpack(str(embedding_vec_size) + "f", vec_buffer)
-                            self.key_to_indice_hash_all_tables[key] = indice
-                            embedding_table[indice] = values
-                            indice += 1
+                        load_sparse_model(
+                            sparse_model,
+                            embedding_vec_size,
+                            self.key_to_indice_hash_all_tables,
+                            embedding_table,
+                        )
                     except BaseException as error:
                         print(error)
                 layer_weights_dict["embedding_table"] = embedding_table
@@ -248,15 +334,8 @@ class HugeCTRLoader(object):
             layer_params.eps = layer_config["bn_param"]["eps"]
             self.__dimensions[layer_config["top"]] = self.__dimensions[layer_config["bottom"]]
             in_feature = self.__dimensions[layer_config["bottom"]]
-            layer_bytes = in_feature * 4 * 2
-            with open(self.__dense_model, "rb") as file:
-                file.seek(self.__offset, 0)
-                buffer = file.read(layer_bytes)
-                gamma = struct.unpack(str(in_feature) + "f", buffer[: in_feature * 4])
-                beta = struct.unpack(str(in_feature) + "f", buffer[in_feature * 4 :])
-                gamma = np.reshape(np.float32(gamma), newshape=(in_feature,))
-                beta = np.reshape(np.float32(beta), newshape=(in_feature,))
-            self.__offset += layer_bytes
+            gamma = self.__read_dense_weights((in_feature,))
+            beta = self.__read_dense_weights((in_feature,))
             ntp_config = self.__ntp_config[self.__ntp_counter]
             running_mean = np.array(ntp_config["mean"], dtype=np.float32)
             running_variance = np.array(ntp_config["var"], dtype=np.float32)
@@ -270,15 +349,8 @@ class HugeCTRLoader(object):
             dim_in = self.__dimensions[layer_config["bottom"]]
             self.__dimensions[layer_config["top"]] = self.__dimensions[layer_config["bottom"]]
             in_feature = dim_in[len(dim_in) - 1]
-            layer_bytes = in_feature * 4 * 2
-            with open(self.__dense_model, "rb") as file:
-                file.seek(self.__offset, 0)
-                buffer = file.read(layer_bytes)
-                gamma = struct.unpack(str(in_feature) + "f", buffer[: in_feature * 4])
-                beta = struct.unpack(str(in_feature) + "f", buffer[in_feature * 4 :])
-                gamma = np.reshape(np.float32(gamma), newshape=(in_feature,))
-                beta = np.reshape(np.float32(beta), newshape=(in_feature,))
-            self.__offset += layer_bytes
+            gamma = self.__read_dense_weights((in_feature,))
+            beta = self.__read_dense_weights((in_feature,))
             # ntp_config = self.__ntp_config[self.__ntp_counter]
             # running_mean = np.array(ntp_config["mean"], dtype = np.float32)
             # running_variance = np.array(ntp_config["var"], dtype = np.float32)
@@ -334,17 +406,8 @@ class HugeCTRLoader(object):
                 self.__dimensions[layer_config["top"]] = layer_params.num_output
                 in_feature = self.__dimensions[layer_config["bottom"]]
             out_feature = layer_params.num_output
-            layer_bytes = (in_feature * out_feature + 1 * out_feature) * 4
-            with open(self.__dense_model, "rb") as file:
-                file.seek(self.__offset, 0)
-                buffer = file.read(layer_bytes)
-                weight = struct.unpack(
-                    str(in_feature * out_feature) + "f", buffer[: in_feature * out_feature * 4]
-                )
-                bias = struct.unpack(str(out_feature) + "f", buffer[in_feature * out_feature * 4 :])
-                weight = np.reshape(np.float32(weight), newshape=(in_feature, out_feature))
-                bias = np.reshape(np.float32(bias), newshape=(1, out_feature))
-            self.__offset += layer_bytes
+            weight = self.__read_dense_weights((in_feature, out_feature))
+            bias = self.__read_dense_weights((1, out_feature))
             layer_weights_dict[layer_config["top"] + "_weight"] = weight
             layer_weights_dict[layer_config["top"] + "_bias"] = bias
         elif layer_type == "MLP":
@@ -363,19 +426,8 @@ class HugeCTRLoader(object):
                 if i != 0:
                     in_feature = layer_params.num_outputs[i - 1]
                 out_feature = layer_params.num_outputs[i]
-                layer_bytes = (in_feature * out_feature + 1 * out_feature) * 4
-                with open(self.__dense_model, "rb") as file:
-                    file.seek(self.__offset, 0)
-                    buffer = file.read(layer_bytes)
-                    weight = struct.unpack(
-                        str(in_feature * out_feature) + "f", buffer[: in_feature * out_feature * 4]
-                    )
-                    bias = struct.unpack(
-                        str(out_feature) + "f", buffer[in_feature * out_feature * 4 :]
-                    )
-                    weight = np.reshape(np.float32(weight), newshape=(in_feature, out_feature))
-                    bias = np.reshape(np.float32(bias), newshape=(1, out_feature))
-                self.__offset += layer_bytes
+                weight = self.__read_dense_weights((in_feature, out_feature))
+                bias = self.__read_dense_weights((1, out_feature))
                 layer_weights_dict[layer_config["top"] + str(i) + "_weight"] = weight
                 layer_weights_dict[layer_config["top"] + str(i) + "_bias"] = bias
         elif layer_type == "FusedReshapeConcat":
@@ -426,25 +478,11 @@ class HugeCTRLoader(object):
             self.__dimensions[layer_config["top"]] = self.__dimensions[layer_config["bottom"]]
             num_layers = layer_params.num_layers
             in_feature = self.__dimensions[layer_config["bottom"]]
-            layer_bytes = in_feature * 2 * num_layers * 4
-            with open(self.__dense_model, "rb") as file:
-                file.seek(self.__offset, 0)
-                buffer = file.read(layer_bytes)
-                weights = []
-                biases = []
-                each_layer_bytes = layer_bytes // num_layers
-                for i in range(num_layers):
-                    weight = struct.unpack(
-                        str(in_feature) + "f",
-                        buffer[i * each_layer_bytes : i * each_layer_bytes + in_feature * 4],
-                    )
-                    bias = struct.unpack(
-                        str(in_feature) + "f",
-                        buffer[i * each_layer_bytes + in_feature * 4 : (i + 1) * each_layer_bytes],
-                    )
-                    weights.append(np.reshape(np.float32(weight), newshape=(len(weight), 1)))
-                    biases.append(np.reshape(np.float32(bias), newshape=(1, len(bias))))
-            self.__offset += layer_bytes
+            weights = []
+            biases = []
+            for i in range(num_layers):
+                weights.append(self.__read_dense_weights((in_feature, 1)))
+                biases.append(self.__read_dense_weights((1, in_feature)))
             layer_weights_dict[layer_config["top"] + "_weights"] = weights
             layer_weights_dict[layer_config["top"] + "_biases"] = biases
         elif layer_type == "PReLU_Dice":
@@ -538,15 +576,7 @@ class HugeCTRLoader(object):
             )
             slot_num = layer_params.weight_dims[0]
             vec_size = layer_params.weight_dims[1]
-            layer_bytes = slot_num * vec_size * 4
-            with open(self.__dense_model, "rb") as file:
-                file.seek(self.__offset, 0)
-                buffer = file.read(layer_bytes)
-                weight = struct.unpack(
-                    str(slot_num * vec_size) + "f", buffer[: slot_num * vec_size * 4]
-                )
-                weight = np.reshape(np.float32(weight), newshape=(slot_num, vec_size))
-            self.__offset += layer_bytes
+            weight = self.__read_dense_weights((slot_num, vec_size))
             layer_weights_dict[layer_config["top"] + "_weight"] = weight
         elif layer_type == "BinaryCrossEntropyLoss":
             layer_params.layer_type = "Sigmoid"
@@ -1,6 +1,6 @@
 import os
-import queue
-import concurrent
+import mmap
+import concurrent.futures
 
 import numpy as np
 import tensorflow as tf
@@ -23,10 +23,16 @@ class BinaryDataset:
         category_raw_type=np.int32,
         hotness_per_table: List[int] = None,
         log=True,
+        num_workers=1,
+        shuffle=False,
+        seed=0,
     ):
         """
         * batch_size : The batch size of local rank, which means the total batch size of all ranks should be (batch_size * global_size).
-        * prefetch   : If prefetch > 1, it can only be read sequentially, otherwise it will return incorrect samples.
+        * prefetch   : The number of batches read ahead of the current one, in the order of the iteration.
+        * num_workers: The number of threads reading the batches.
+        * shuffle    : Shuffle the order of the global batches at every epoch. All the ranks should use the same seed,
+                       so that they read the same global batch. The last batch is kept last when drop_last=False.
         """
         self._hotness_per_table = hotness_per_table
         self._hotness_per_sample = np.sum(hotness_per_table)
@@ -80,12 +86,16 @@ class BinaryDataset:
                 ) * batch_size + self._samples_in_last_batch
 
         self._prefetch = min(prefetch, self._num_entries)
-        self._prefetch_queue = queue.Queue()
-        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, num_workers))
+        # batch index -> future of the batches being read, at most prefetch + 1 of them
+        self._futures = {}
 
-        self._label_file = os.open(label_bin, os.O_RDONLY)
-        self._dense_file = os.open(dense_bin, os.O_RDONLY)
-        self._category_file = os.open(category_bin, os.O_RDONLY)
+        self._files = []
+        self._mmaps = []
+        for file in [label_bin, dense_bin, category_bin]:
+            fd = os.open(file, os.O_RDONLY)
+            self._files.append(fd)
+            self._mmaps.append(mmap.mmap(fd, 0, access=mmap.ACCESS_READ))
 
         self._label_raw_type = label_raw_type
         self._dense_raw_type = dense_raw_type
@@ -93,11 +103,14 @@ class BinaryDataset:
 
         self._log = log
 
-        self._row_lengths = []
-        for i in range(len(self._hotness_per_table)):
-            self._row_lengths.append(
-                tf.repeat(self._hotness_per_table[i], repeats=self._batch_size)
-            )
+        self._shuffle = shuffle
+        self._seed = seed
+        self._epoch = 0
+        self._order = np.arange(self._num_entries)
+
+        # batch size -> row lengths of every table
+        self._row_lengths = {}
+        self._get_row_lengths(self._batch_size)
 
     def _check_file(
         self, label_bin, dense_bin, category_bin, label_type_byte, sparse_hotness_per_sample
@@ -108,8 +121,6 @@ class BinaryDataset:
         if num_samples <= 0:
             raise RuntimeError("There must be at least one sample in %s" % label_bin)
 
-        if num_samples <= 0:
-            raise RuntimeError("There must be at least one sample in %s" % label_bin)
         # check file size
         for file, bytes_per_sample in [
             [label_bin, 4],
@@ -128,28 +139,72 @@ class BinaryDataset:
                 )
 
     def __del__(self):
-        for file in [self._label_file, self._dense_file, self._category_file]:
-            if file is not None:
-                os.close(file)
+        executor = getattr(self, "_executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        # the memory maps are released with the last batch referring to them
+        for file in getattr(self, "_files", []):
+            os.close(file)
 
     def __len__(self):
         return self._num_entries
 
+    def __iter__(self):
+        self.set_epoch(self._epoch)
+        self._epoch += 1
+        for idx in range(self._num_entries):
+            yield self[idx]
+
+    def set_epoch(self, epoch):
+        """The order of the batches of an epoch, which only depends on the seed and the epoch"""
+        if not self._shuffle:
+            return
+        num_full_batches = self._num_entries if self._drop_last else self._num_entries - 1
+        rng = np.random.default_rng([self._seed, epoch])
+        order = np.arange(self._num_entries)
+        order[:num_full_batches] = rng.permutation(num_full_batches)
+        if not np.array_equal(order, self._order):
+            self._order = order
+            self._cancel_futures()
+
     def __getitem__(self, idx):
         if idx >= self._num_entries:
             raise IndexError()
 
         if self._prefetch <= 1:
-            return self._get(idx)
-
-        if idx == 0:
-            for i in range(self._prefetch):
-                self._prefetch_queue.put(self._executor.submit(self._get, (i)))
-
-        if idx < (self._num_entries - self._prefetch):
-            self._prefetch_queue.put(self._executor.submit(self._get, (idx + self._prefetch)))
-
-        return self._prefetch_queue.get().result()
+            return self._get(self._order[idx])
+
+        # the batches are read ahead in the order of the iteration, any other index is read on demand
+        future = self._futures.pop(idx, None)
+        if future is None:
+            future = self._executor.submit(self._get, self._order[idx])
+        for i in [i for i in self._futures if i <= idx or i > idx + self._prefetch]:
+            self._futures.pop(i).cancel()
+        for i in range(idx + 1, min(idx + 1 + self._prefetch, self._num_entries)):
+            if i not in self._futures:
+                self._futures[i] = self._executor.submit(self._get, self._order[i])
+        return future.result()
+
+    def _cancel_futures(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+
+    def _get_row_lengths(self, batch):
+        if batch not in self._row_lengths:
+            self._row_lengths[batch] = [
+                tf.repeat(hotness, repeats=batch) for hotness in self._hotness_per_table
+            ]
+        return self._row_lengths[batch]
+
+    def _read(self, file_id, dtype, num_per_sample, batch, sample_offset):
+        """A zero-copy view of the samples in the memory map"""
+        return np.frombuffer(
+            self._mmaps[file_id],
+            dtype=dtype,
+            count=batch * num_per_sample,
+            offset=np.dtype(dtype).itemsize * num_per_sample * sample_offset,
+        ).reshape([batch, num_per_sample])
 
     def _get(self, idx):
         # calculate the offset & number of the samples to be read
@@ -164,61 +219,51 @@ class BinaryDataset:
                 self._batch_size * self._global_rank
             )
             batch = self._batch_size
-        row_lengths = self._row_lengths
-        if batch != self._batch_size:
-            row_lengths = []
-            for i in range(len(self._hotness_per_table)):
-                row_lengths.append(tf.repeat(self._hotness_per_table[i], repeats=batch))
-
-        # read the data from binary file
-        label_raw_data = os.pread(self._label_file, 4 * batch, 4 * sample_offset)
-        label = np.frombuffer(label_raw_data, dtype=self._label_raw_type).reshape([batch, 1])
-
-        dense_raw_data = os.pread(self._dense_file, 52 * batch, 52 * sample_offset)
-        dense = np.frombuffer(dense_raw_data, dtype=self._dense_raw_type).reshape([batch, 13])
-        category_raw_data = os.pread(
-            self._category_file,
-            self._hotness_per_sample * 4 * batch,
-            self._hotness_per_sample * 4 * sample_offset,
-        )
-        category = np.frombuffer(category_raw_data, dtype=self._category_raw_type).reshape(
-            [batch, self._hotness_per_sample]
-        )
-        indices = np.cumsum(self._hotness_per_table)[:-1]
+        row_lengths = self._get_row_lengths(batch)
 
-        sub_arrays = np.split(category, indices, axis=1)
+        label = self._read(0, self._label_raw_type, 1, batch, sample_offset)
+        dense = self._read(1, self._dense_raw_type, 13, batch, sample_offset)
+        category = self._read(
+            2, self._category_raw_type, self._hotness_per_sample, batch, sample_offset
+        )
 
-        if (
-            self._label_raw_type == self._dense_raw_type
-            and self._label_raw_type == self._category_raw_type
-        ):
-            data = np.concatenate([label, dense, category], axis=1)
-            data = tf.convert_to_tensor(data)
-            label = tf.cast(data[:, 0:1], dtype=tf.float32)
-            dense = tf.cast(data[:, 1:14], dtype=tf.float32)
-            category_np = data[:, 14:]
-            flat_values = tf.reshape(category_np, [-1])
-            category_ragged_tensors = []
-            for i in range(len(sub_arrays)):
-                flat_values = tf.reshape(sub_arrays[i], [-1])
-                category_ragged_tensors.append(
-                    tf.RaggedTensor.from_row_lengths(flat_values, row_lengths[i])
-                )
+        label = tf.convert_to_tensor(label, dtype=tf.float32)
+        dense = tf.convert_to_tensor(dense, dtype=tf.float32)
 
-        else:
-            label = tf.convert_to_tensor(label, dtype=tf.float32)
-            dense = tf.convert_to_tensor(dense, dtype=tf.float32)
-            category = tf.convert_to_tensor(category, dtype=tf.int64)
-
-            category_ragged_tensors = []
-            for i in range(len(sub_arrays)):
-                flat_values = tf.reshape(sub_arrays[i], [-1])
-                category_ragged_tensors.append(
-                    tf.RaggedTensor.from_row_lengths(flat_values, row_lengths[i])
-                )
+        indices = np.cumsum(self._hotness_per_table)[:-1]
+        sub_arrays = np.split(category, indices, axis=1)
+        category_ragged_tensors = []
+        for i in range(len(sub_arrays)):
+            flat_values = tf.reshape(sub_arrays[i], [-1])
+            category_ragged_tensors.append(
+                tf.RaggedTensor.from_row_lengths(flat_values, row_lengths[i])
+            )
 
         # preprocess
         if self._log:
             dense = tf.math.log(dense + 3.0)
 
         return (dense, category_ragged_tensors), label
+
+    def to_tf_dataset(self, prefetch=tf.data.AUTOTUNE):
+        """A tf.data.Dataset of the batches, every iteration of it is an epoch"""
+        category_spec = [
+            tf.RaggedTensorSpec(
+                shape=[None, None],
+                dtype=tf.as_dtype(self._category_raw_type),
+                ragged_rank=1,
+                row_splits_dtype=self._get_row_lengths(self._batch_size)[0].dtype,
+            )
+            for _ in self._hotness_per_table
+        ]
+        output_signature = (
+            (tf.TensorSpec(shape=[None, 13], dtype=tf.float32), tuple(category_spec)),
+            tf.TensorSpec(shape=[None, 1], dtype=tf.float32),
+        )
+
+        def generator():
+            for (dense, category), label in self:
+                yield (dense, tuple(category)), label
+
+        dataset = tf.data.Dataset.from_generator(generator, output_signature=output_signature)
+        return dataset.prefetch(prefetch)
@@ -0,0 +1,108 @@
+import os
+import tempfile
+
+import numpy as np
+
+from dataset import BinaryDataset
+
+HOTNESS_PER_TABLE = [1, 3, 2]
+
+
+def write_dataset(data_dir, num_samples):
+    # the label of a sample is its index, so a batch is identified by its labels
+    np.arange(num_samples, dtype=np.int32).tofile(os.path.join(data_dir, "label.bin"))
+    dense = np.arange(num_samples * 13, dtype=np.int32) % 1000
+    dense.tofile(os.path.join(data_dir, "dense.bin"))
+    category = np.arange(num_samples * sum(HOTNESS_PER_TABLE), dtype=np.int32)
+    category.tofile(os.path.join(data_dir, "category.bin"))
+
+
+def make_dataset(data_dir, global_rank=0, **kwargs):
+    return BinaryDataset(
+        os.path.join(data_dir, "label.bin"),
+        os.path.join(data_dir, "dense.bin"),
+        os.path.join(data_dir, "category.bin"),
+        batch_size=4,
+        global_rank=global_rank,
+        global_size=2,
+        hotness_per_table=HOTNESS_PER_TABLE,
+        **kwargs,
+    )
+
+
+def to_numpy(batch):
+    (dense, category), label = batch
+    return label.numpy().reshape(-1), dense.numpy(), [c.flat_values.numpy() for c in category]
+
+
+def get_batches(dataset):
+    """The batches of an epoch as numpy arrays"""
+    return [to_numpy(batch) for batch in dataset]
+
+
+def assert_batches_equal(batches, expected):
+    assert len(batches) == len(expected)
+    for batch, expected_batch in zip(batches, expected):
+        np.testing.assert_array_equal(batch[0], expected_batch[0])
+        np.testing.assert_array_equal(batch[1], expected_batch[1])
+        for category, expected_category in zip(batch[2], expected_batch[2]):
+            np.testing.assert_array_equal(category, expected_category)
+
+
+def test_shuffle(data_dir):
+    for global_rank in range(2):
+        unshuffled = get_batches(make_dataset(data_dir, global_rank, drop_last=False))
+        # 103 samples: 12 global batches of 8 and a partial last batch of 7
+        assert len(unshuffled) == 13
+        assert unshuffled[-1][0].size == (4 if global_rank == 0 else 3)
+
+        dataset = make_dataset(data_dir, global_rank, drop_last=False, shuffle=True, seed=1)
+        epoch0 = get_batches(dataset)
+        epoch1 = get_batches(dataset)
+        for shuffled in [epoch0, epoch1]:
+            # a permutation of the unshuffled batches, the partial last batch stays last
+            order = [int(batch[0][0]) // 8 for batch in shuffled]
+            assert sorted(order) == list(range(13))
+            assert order[-1] == 12
+            assert_batches_equal(shuffled, [unshuffled[i] for i in order])
+        assert [b[0][0] for b in epoch0] != [b[0][0] for b in epoch1]
+
+        # the order only depends on the seed and the epoch
+        other = make_dataset(data_dir, global_rank, drop_last=False, shuffle=True, seed=1)
+        assert_batches_equal(get_batches(other), epoch0)
+        other.set_epoch(1)
+        assert_batches_equal([to_numpy(other[i]) for i in range(13)], epoch1)
+
+
+def test_num_workers(data_dir):
+    for drop_last, shuffle in [(True, False), (False, True)]:
+        expected = get_batches(
+            make_dataset(data_dir, drop_last=drop_last, shuffle=shuffle, prefetch=1, num_workers=1)
+        )
+        dataset = make_dataset(
+            data_dir, drop_last=drop_last, shuffle=shuffle, prefetch=5, num_workers=4
+        )
+        assert_batches_equal(get_batches(dataset), expected)
+        # random access while the next batches are prefetched
+        for idx in [3, 0, len(expected) - 1, 2]:
+            assert_batches_equal([to_numpy(dataset[idx])], [expected[idx]])
+
+
+def test_to_tf_dataset(data_dir):
+    reference = make_dataset(data_dir, drop_last=False, shuffle=True)
+    expected_epochs = [get_batches(reference), get_batches(reference)]
+    dataset = make_dataset(data_dir, drop_last=False, shuffle=True, num_workers=2, prefetch=3)
+    tf_dataset = dataset.to_tf_dataset()
+    # every iteration of the tf.data.Dataset is an epoch
+    for expected in expected_epochs:
+        assert_batches_equal(get_batches(tf_dataset), expected)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_dataset(data_dir, 103)
+        test_shuffle(data_dir)
+        test_num_workers(data_dir)
+        test_to_tf_dataset(data_dir)
+
+    print("[SOK INFO] Test of BinaryDataset passed.")
@@ -2,8 +2,159 @@ import os
 import argparse
 import time
 import json
+import multiprocessing
 import numpy as np
 
+NUM_DENSE = 13
+NUM_LABEL = 1
+MULTI_HOT_SIZES = [
+    3,
+    2,
+    1,
+    2,
+    6,
+    1,
+    1,
+    1,
+    1,
+    7,
+    3,
+    8,
+    1,
+    6,
+    9,
+    5,
+    1,
+    1,
+    1,
+    12,
+    100,
+    27,
+    10,
+    3,
+    1,
+    1,
+]
+
+
+def get_sample_type(hotness_per_table):
+    # 4 bytes per data, the label, dense and category are split as raw bytes
+    return np.dtype(
+        [
+            ("label", np.int32, (NUM_LABEL,)),
+            ("dense", np.int32, (NUM_DENSE,)),
+            ("category", np.int32, (int(np.sum(hotness_per_table)),)),
+        ]
+    )
+
+
+def get_ranges(num_samples, num_ranges):
+    bounds = [num_samples * i // num_ranges for i in range(num_ranges + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def get_output_paths(output, shard_id, num_shards):
+    output_dir = output if num_shards == 1 else os.path.join(output, "rank_%d" % shard_id)
+    return [os.path.join(output_dir, name) for name in ["label.bin", "dense.bin", "category.bin"]]
+
+
+def apply_dense_log(dense, dense_type):
+    # the same as BinaryDataset(log=True), which computes log(dense + 3) in float32
+    dense = dense.view(dense_type).astype(np.float32)
+    return np.log(dense + np.float32(3.0)).astype(np.float32)
+
+
+def split_range(task):
+    """Split the samples in [begin, end) of the input, which belong to the shard at shard_begin"""
+    input_file, sample_type, begin, end, shard_begin, output_paths, dense_log, dense_type = task
+    samples = np.memmap(input_file, dtype=sample_type, mode="r")
+    fds = [os.open(path, os.O_WRONLY) for path in output_paths]
+    chunk_size = 1024 * 1024
+    try:
+        for chunk_begin in range(begin, end, chunk_size):
+            chunk = samples[chunk_begin : min(chunk_begin + chunk_size, end)]
+            columns = [chunk["label"], chunk["dense"], chunk["category"]]
+            if dense_log:
+                columns[1] = apply_dense_log(np.asarray(columns[1]), dense_type)
+            for fd, column in zip(fds, columns):
+                column = np.ascontiguousarray(column)
+                bytes_per_sample = column.itemsize * column.shape[1]
+                os.pwrite(fd, column.tobytes(), (chunk_begin - shard_begin) * bytes_per_sample)
+    finally:
+        for fd in fds:
+            os.close(fd)
+    return end - begin
+
+
+def split_bin(
+    input_file,
+    output,
+    hotness_per_table,
+    num_shards=1,
+    num_workers=1,
+    dense_log=False,
+    dense_type=np.int32,
+):
+    """
+    Split the interleaved raw file into label.bin, dense.bin and category.bin. The output files
+    are preallocated and every worker writes a range of the samples at their offsets. With
+    num_shards > 1, the samples are split into rank_<i> directories of the same number of samples,
+    so that the ranks read the same number of batches. The last num_samples % num_shards samples
+    are dropped then. Returns the number of samples of every output directory
+    """
+    sample_type = get_sample_type(hotness_per_table)
+    size = os.path.getsize(input_file)
+    print("BYTES_PER_SAMPLE = ", sample_type.itemsize)
+    assert size % sample_type.itemsize == 0
+    num_samples = size // sample_type.itemsize
+
+    samples_per_shard = num_samples // num_shards
+    if samples_per_shard * num_shards < num_samples:
+        print("Drop the last %d samples" % (num_samples - samples_per_shard * num_shards))
+    num_samples = samples_per_shard * num_shards
+
+    tasks = []
+    # split every shard into about the same number of ranges as the workers
+    num_ranges_per_shard = max(1, num_workers // num_shards)
+    for shard_id in range(num_shards):
+        shard_begin = shard_id * samples_per_shard
+        output_paths = get_output_paths(output, shard_id, num_shards)
+        os.makedirs(os.path.dirname(output_paths[0]), exist_ok=True)
+        for path, field in zip(output_paths, ["label", "dense", "category"]):
+            with open(path, "wb") as f:
+                f.truncate(samples_per_shard * sample_type[field].itemsize)
+        for begin, end in get_ranges(samples_per_shard, num_ranges_per_shard):
+            if end > begin:
+                tasks.append(
+                    (
+                        input_file,
+                        sample_type,
+                        shard_begin + begin,
+                        shard_begin + end,
+                        shard_begin,
+                        output_paths,
+                        dense_log,
+                        dense_type,
+                    )
+                )
+
+    start_time = time.time()
+    num_finished = 0
+    with multiprocessing.Pool(max(1, min(num_workers, len(tasks)))) as pool:
+        for num in pool.imap_unordered(split_range, tasks):
+            num_finished += num
+            elapsed = time.time() - start_time
+            print(
+                "%d/%d samples finished, %.0f samples/s, remaining time: %.2f min"
+                % (
+                    num_finished,
+                    num_samples,
+                    num_finished / elapsed,
+                    (elapsed / 60) * (num_samples / num_finished - 1),
+                )
+            )
+    return samples_per_shard
+
 
 if __name__ == "__main__":
 
@@ -15,118 +166,58 @@ if __name__ == "__main__":
     parser.add_argument("--label_type", type=str, default="int32")
     parser.add_argument("--category_type", type=str, default="int32")
     parser.add_argument("--dense_log", type=str, default="True")
+    parser.add_argument(
+        "--hotness_per_table",
+        type=str,
+        default=str(MULTI_HOT_SIZES),
+        help="The list of hotness of every table",
+    )
+    parser.add_argument(
+        "--apply_dense_log",
+        action="store_true",
+        help="Apply the dense_log transform when splitting, so it is not applied when reading",
+    )
+    parser.add_argument(
+        "--num_shards", type=int, default=1, help="Split the samples into a directory per rank"
+    )
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
     args = parser.parse_args()
 
     args.slot_size_array = eval(args.slot_size_array)
     assert isinstance(args.slot_size_array, list)
+    args.hotness_per_table = eval(args.hotness_per_table)
+    assert isinstance(args.hotness_per_table, list)
 
     if args.dense_log == "False":
         args.dense_log = False
     else:
         args.dense_log = True
 
-    MULTI_HOT_SIZES = [
-        3,
-        2,
-        1,
-        2,
-        6,
-        1,
-        1,
-        1,
-        1,
-        7,
-        3,
-        8,
-        1,
-        6,
-        9,
-        5,
-        1,
-        1,
-        1,
-        12,
-        100,
-        27,
-        10,
-        3,
-        1,
-        1,
-    ]
-
-    sparse_hotness_per_sample = np.sum(MULTI_HOT_SIZES)
     if not os.path.exists(args.output):
         os.makedirs(args.output)
-    size = os.path.getsize(args.input)
-    NKEYS_PER_SAMPLE = sum(MULTI_HOT_SIZES)
-    NUM_TABLE = 26
-    NUM_DENSE = 13
-    NUM_LABEL = 1
-    BYTES_PER_SAMPLE = (
-        NKEYS_PER_SAMPLE + NUM_DENSE + NUM_LABEL
-    ) * 4  # 4 bytes per data , float32 , uint32
-
-    print("BYTES_PER_SAMPLE = ", BYTES_PER_SAMPLE)
-    assert size % BYTES_PER_SAMPLE == 0
-    num_samples = size // BYTES_PER_SAMPLE
-
-    chunk_size = 1024 * 1024
-
-    inp_f = open(args.input, "rb")
-
-    label_f = open(os.path.join(args.output, "label.bin"), "wb")
-    dense_f = open(os.path.join(args.output, "dense.bin"), "wb")
-    category_f = open(os.path.join(args.output, "category.bin"), "wb")
-
-    num_loops = num_samples // chunk_size + 1
-
-    start_time = time.time()
-    for i in range(num_loops):
-        t = time.time()
-
-        if i == (num_loops - 1):
-            batch = min(chunk_size, num_samples % chunk_size)
-            if batch == 0:
-                break
-        else:
-            batch = chunk_size
-
-        raw_buffer = inp_f.read(BYTES_PER_SAMPLE * batch)
-
-        for j in range(batch):
-            label_buffer = raw_buffer[j * BYTES_PER_SAMPLE : j * BYTES_PER_SAMPLE + 4]
-            dense_buffer = raw_buffer[j * BYTES_PER_SAMPLE + 4 : j * BYTES_PER_SAMPLE + 56]
-            category_buffer = raw_buffer[
-                j * BYTES_PER_SAMPLE + 56 : j * BYTES_PER_SAMPLE + BYTES_PER_SAMPLE
-            ]
-
-            label_f.write(label_buffer)
-            dense_f.write(dense_buffer)
-            category_f.write(category_buffer)
-
-        print(
-            "%d/%d batch finished. write %d samples, time: %.2fms, remaining time: %.2f min"
-            % (
-                i + 1,
-                num_loops,
-                batch,
-                (time.time() - t) * 1000,
-                ((time.time() - start_time) / 60) * (num_loops / (i + 1) - 1),
-            )
-        )
-
-    inp_f.close()
-    label_f.close()
-    dense_f.close()
-    category_f.close()
+    dtype = {"int32": np.int32, "float32": np.float32}
+    apply_log = args.dense_log and args.apply_dense_log
+    samples_per_shard = split_bin(
+        args.input,
+        args.output,
+        args.hotness_per_table,
+        args.num_shards,
+        args.num_workers,
+        apply_log,
+        dtype[args.dense_type],
+    )
 
     metadata = {
         "vocab_sizes": args.slot_size_array,
         "label_raw_type": args.label_type,
-        "dense_raw_type": args.dense_type,
+        # the transformed dense features are float32 and should not be transformed again
+        "dense_raw_type": "float32" if apply_log else args.dense_type,
         "category_raw_type": args.category_type,
-        "dense_log": args.dense_log,
-        "hotness_per_table": MULTI_HOT_SIZES,
+        "dense_log": args.dense_log and not apply_log,
+        "hotness_per_table": args.hotness_per_table,
+        # the reader of rank i reads rank_<i>/ if num_shards > 1
+        "num_shards": args.num_shards,
+        "samples_per_shard": samples_per_shard,
     }
     with open(os.path.join(args.output, "metadata.json"), "w") as f:
         json.dump(metadata, f)
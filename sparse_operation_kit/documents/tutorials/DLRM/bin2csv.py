@@ -15,120 +15,252 @@
 """
 
 import argparse
+import glob
 import os
-import struct
-import csv
+import re
+import time
 import multiprocessing
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+def get_file_index(filename):
+    """Sort key of the files, which orders part2 before part10"""
+    return [int(s) if s.isdigit() else s for s in re.split(r"(\d+)", filename)]
 
 
 def get_file_size_in_bytes(filename):
     return os.path.getsize(filename)
 
 
-class BinaryToCSV(object):
-    def __init__(self, args, save_header=False):
-        self.args = args
-        self.save_header = save_header
+class RawFormat(object):
+    """
+    The HugeCTR raw format, every sample is a label, num_dense_features float dense features
+    and num_cate_features categorical keys, all of them are 4 bytes
+    """
 
-        self.slot_size_array = [
-            39884407,
-            39043,
-            17289,
-            7420,
-            20263,
-            3,
-            7120,
-            1543,
-            63,
-            38532952,
-            2953546,
-            403346,
-            10,
-            2208,
-            11938,
-            155,
-            4,
-            976,
-            14,
-            39979772,
-            25641295,
-            39664985,
-            585935,
-            12972,
-            108,
-            36,
-        ]
-        self.num_dense_features = 13
-        self.num_cate_features = 26
-        self.item_num_per_sample = 1 + self.num_dense_features + self.num_cate_features
-        self.sample_format = (
-            r"1I" + str(self.num_dense_features) + "f" + str(self.num_cate_features) + "I"
+    def __init__(self, num_dense_features=13, num_cate_features=26):
+        self.num_dense_features = num_dense_features
+        self.num_cate_features = num_cate_features
+        self.sample_type = np.dtype(
+            [
+                ("label", np.int32),
+                ("dense", np.float32, (num_dense_features,)),
+                ("cate", np.uint32, (num_cate_features,)),
+            ]
         )
-        self.dense_feature_keys = [f"int-feature-{x + 1}" for x in range(self.num_dense_features)]
+        self.sample_size_in_bytes = self.sample_type.itemsize
+        self.label_key = "clicked"
+        self.dense_feature_keys = [f"int-feature-{x + 1}" for x in range(num_dense_features)]
         self.cate_feature_keys = [
-            "categorical-feature-%d" % x for x in range(self.num_dense_features + 1, 40)
+            "categorical-feature-%d" % x
+            for x in range(num_dense_features + 1, num_dense_features + num_cate_features + 1)
         ]
-        self.label_key = "clicked"
         self.header = [self.label_key] + self.dense_feature_keys + self.cate_feature_keys
 
-        self.sample_size_in_bytes = 1 * 4 + self.num_dense_features * 4 + self.num_cate_features * 4
-        self.file_size_in_bytes = get_file_size_in_bytes(self.args.input_file)
-        if self.file_size_in_bytes % self.sample_size_in_bytes != 0:
+    def map_file(self, filename, mode="r"):
+        """View a raw file as a structured array without reading it"""
+        file_size_in_bytes = get_file_size_in_bytes(filename)
+        if file_size_in_bytes % self.sample_size_in_bytes != 0:
             raise RuntimeError(
-                "The filesize of {} is not divisible to samplesize.".format(self.args.input_file)
+                "The filesize of {} is not divisible to samplesize.".format(filename)
             )
+        if file_size_in_bytes == 0:
+            return np.zeros(0, dtype=self.sample_type)
+        return np.memmap(filename, dtype=self.sample_type, mode=mode)
 
-        self.samples_num = self.file_size_in_bytes // self.sample_size_in_bytes
-        self.samples_num_each_shard = self.samples_num // self.args.num_output_files
+    def to_table(self, samples):
+        columns = [pa.array(samples["label"])]
+        columns += [pa.array(samples["dense"][:, i]) for i in range(self.num_dense_features)]
+        columns += [pa.array(samples["cate"][:, i]) for i in range(self.num_cate_features)]
+        return pa.Table.from_arrays(columns, names=self.header)
 
-        if not os.path.exists(self.args.output_path):
-            os.makedirs(self.args.output_path)
+    def from_table(self, table):
+        """The columns are taken by position: label, dense features and categorical keys"""
+        if table.num_columns != len(self.header):
+            raise RuntimeError(
+                "Expect {} columns but got {}".format(len(self.header), table.num_columns)
+            )
+        samples = np.empty(table.num_rows, dtype=self.sample_type)
+        columns = [column.to_numpy() for column in table.columns]
+        samples["label"] = columns[0]
+        samples["dense"] = np.stack(columns[1 : 1 + self.num_dense_features], axis=1)
+        samples["cate"] = np.stack(columns[1 + self.num_dense_features :], axis=1)
+        return samples
 
-    def __call__(self):
-        if 1 == self.args.num_output_files:
-            self.convert_func(shard_id=0)
-        else:
-            processes = os.cpu_count() // 2 if os.cpu_count() // 2 >= 1 else 1
-            chunksize = self.args.num_output_files // processes
-            with multiprocessing.Pool(processes=processes) as pool:
-                pool.imap(self.convert_func, range(self.args.num_output_files), chunksize=chunksize)
-                pool.close()
-                pool.join()
-
-    def convert_func(self, shard_id):
-        my_begin_index = self.samples_num_each_shard * shard_id
-        my_end_index = self.samples_num_each_shard * (shard_id + 1)
-        my_end_index = my_end_index if my_end_index <= self.samples_num else self.samples_num
-
-        save_name = os.path.join(
-            self.args.output_path, self.args.save_prefix + str(shard_id) + ".csv"
+    def write_csv(self, samples, out_file, save_header):
+        if pa is not None:
+            pa_csv.write_csv(
+                self.to_table(samples),
+                out_file,
+                pa_csv.WriteOptions(include_header=save_header, delimiter="\t"),
+            )
+            return
+        # float32 needs at most 9 significant digits to be read back exactly
+        fmt = ["%d"] + ["%.9g"] * self.num_dense_features + ["%d"] * self.num_cate_features
+        data = np.column_stack([samples["label"], samples["dense"], samples["cate"]]).astype(
+            np.float64
+        )
+        np.savetxt(
+            out_file,
+            data,
+            fmt=fmt,
+            delimiter="\t",
+            header="\t".join(self.header) if save_header else "",
+            comments="",
         )
 
-        with open(self.args.input_file, "rb") as InFile, open(save_name, "w") as OutFile:
-            # skip samples not belonging to me
-            InFile.seek(self.sample_size_in_bytes * my_begin_index, 0)
-            # Read my samples
-            data_buffer = InFile.read((my_end_index - my_begin_index) * self.sample_size_in_bytes)
-            # convert to numerical data
-            unpack_format = self.sample_format * (my_end_index - my_begin_index)
-            data = struct.unpack(unpack_format, data_buffer)
-            data = [
-                data[i * self.item_num_per_sample : (i + 1) * self.item_num_per_sample]
-                for i in range(my_end_index - my_begin_index)
-            ]
-            # save to CSV file.
-            writer = csv.writer(OutFile, delimiter="\t")
-            if self.save_header:
-                writer.writerow(self.header)  # TF.dataset cannot correctly skip header
-            writer.writerows(data)
-        print("[INFO]: Saved %s done." % (save_name))
 
+def convert_raw_shard(task):
+    (
+        raw_format,
+        input_file,
+        save_name,
+        begin,
+        end,
+        output_format,
+        row_group_size,
+        save_header,
+    ) = task
+    samples = raw_format.map_file(input_file)
+    if output_format == "parquet":
+        writer = pq.ParquetWriter(save_name, raw_format.to_table(samples[:0]).schema)
+        for chunk_begin in range(begin, end, row_group_size):
+            chunk = np.asarray(samples[chunk_begin : min(chunk_begin + row_group_size, end)])
+            writer.write_table(raw_format.to_table(chunk), row_group_size=row_group_size)
+        writer.close()
+    else:
+        with open(save_name, "wb" if pa is not None else "w") as out_file:
+            for chunk_begin in range(begin, end, row_group_size):
+                chunk = np.asarray(samples[chunk_begin : min(chunk_begin + row_group_size, end)])
+                raw_format.write_csv(chunk, out_file, save_header and chunk_begin == begin)
+    return save_name, end - begin
 
-if __name__ == "__main__":
+
+def convert_raw_files(
+    input_file,
+    output_path,
+    save_prefix,
+    num_output_files=1,
+    output_format="csv",
+    raw_format=None,
+    row_group_size=1 << 20,
+    num_workers=1,
+    save_header=False,
+):
+    """
+    Convert a raw file to num_output_files csv or parquet shards, every shard is converted in
+    chunks of row_group_size samples by a worker process
+    """
+    if output_format == "parquet" and pa is None:
+        raise RuntimeError("pyarrow is required to write parquet files")
+    raw_format = raw_format if raw_format is not None else RawFormat()
+    samples_num = raw_format.map_file(input_file).shape[0]
+    samples_num_each_shard = samples_num // num_output_files
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    tasks = []
+    for shard_id in range(num_output_files):
+        begin = samples_num_each_shard * shard_id
+        # the last shard takes the rest of the samples
+        end = samples_num if shard_id == num_output_files - 1 else begin + samples_num_each_shard
+        save_name = os.path.join(output_path, save_prefix + str(shard_id) + "." + output_format)
+        tasks.append(
+            (
+                raw_format,
+                input_file,
+                save_name,
+                begin,
+                end,
+                output_format,
+                row_group_size,
+                save_header,
+            )
+        )
+    run_tasks(convert_raw_shard, tasks, num_workers, samples_num)
+
+
+def convert_parquet_file(task):
+    raw_format, input_file, output_file, begin = task
+    parquet_file = pq.ParquetFile(input_file)
+    samples = raw_format.map_file(output_file, mode="r+")
+    for row_group in range(parquet_file.num_row_groups):
+        chunk = raw_format.from_table(parquet_file.read_row_group(row_group))
+        samples[begin : begin + chunk.shape[0]] = chunk
+        begin += chunk.shape[0]
+    samples.flush()
+    return input_file, parquet_file.metadata.num_rows
+
+
+def convert_parquet_files(input_files, output_file, raw_format=None, num_workers=1):
+    """
+    Convert parquet files to a raw file in the order of input_files. The samples of every file
+    are written to their own range of the preallocated raw file by a worker process
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read parquet files")
+    raw_format = raw_format if raw_format is not None else RawFormat()
+    num_rows = [pq.ParquetFile(input_file).metadata.num_rows for input_file in input_files]
+    offsets = np.cumsum([0] + num_rows)
+    with open(output_file, "wb") as f:
+        f.truncate(int(offsets[-1]) * raw_format.sample_size_in_bytes)
+    if offsets[-1] == 0:
+        return
+    tasks = [
+        (raw_format, input_file, output_file, int(begin))
+        for input_file, begin in zip(input_files, offsets[:-1])
+    ]
+    run_tasks(convert_parquet_file, tasks, num_workers, int(offsets[-1]))
+
+
+def run_tasks(func, tasks, num_workers, samples_num):
+    start = time.time()
+    converted_num = 0
+    with multiprocessing.Pool(processes=max(1, min(num_workers, len(tasks)))) as pool:
+        for save_name, num in pool.imap_unordered(func, tasks):
+            converted_num += num
+            elapsed = max(time.time() - start, 1e-6)
+            print(
+                "[INFO]: Converted %s, %d/%d samples, %.0f rows/s."
+                % (save_name, converted_num, samples_num, converted_num / elapsed)
+            )
+
+
+class BinaryToCSV(object):
+    def __init__(self, args, save_header=False):
+        self.args = args
+        self.save_header = save_header
+        self.raw_format = RawFormat()
+
+    def __call__(self):
+        convert_raw_files(
+            self.args.input_file,
+            self.args.output_path,
+            self.args.save_prefix,
+            self.args.num_output_files,
+            "csv",
+            self.raw_format,
+            num_workers=max(1, os.cpu_count() // 2),
+            save_header=self.save_header,
+        )
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
-        "--input_file", type=str, required=True, help="the filename of the binary file"
+        "--input_file",
+        type=str,
+        required=True,
+        help="the filename of the binary file, or a glob pattern of parquet files with "
+        "--output_format=raw",
     )
     parser.add_argument(
         "--num_output_files", type=int, required=False, default=1, help="the number of shards"
@@ -139,7 +271,49 @@ if __name__ == "__main__":
     parser.add_argument(
         "--save_prefix", type=str, required=True, help="the prefix for saving outptu shards"
     )
+    parser.add_argument(
+        "--output_format",
+        type=str,
+        choices=["csv", "parquet", "raw"],
+        default="csv",
+        help="raw converts the parquet files to <output_path>/<save_prefix>.bin",
+    )
+    parser.add_argument(
+        "--row_group_size",
+        type=int,
+        default=1 << 20,
+        help="the number of samples in a parquet row group, or converted at a time",
+    )
+    parser.add_argument("--num_workers", type=int, default=max(1, os.cpu_count() // 2))
+    parser.add_argument("--num_dense_features", type=int, default=13)
+    parser.add_argument("--num_cate_features", type=int, default=26)
+    parser.add_argument("--save_header", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    raw_format = RawFormat(args.num_dense_features, args.num_cate_features)
+    if args.output_format == "raw":
+        if not os.path.exists(args.output_path):
+            os.makedirs(args.output_path)
+        convert_parquet_files(
+            sorted(glob.glob(args.input_file), key=get_file_index),
+            os.path.join(args.output_path, args.save_prefix + ".bin"),
+            raw_format,
+            args.num_workers,
+        )
+    else:
+        convert_raw_files(
+            args.input_file,
+            args.output_path,
+            args.save_prefix,
+            args.num_output_files,
+            args.output_format,
+            raw_format,
+            args.row_group_size,
+            args.num_workers,
+            args.save_header,
+        )
 
-    args = parser.parse_args()
 
-    BinaryToCSV(args)()
+if __name__ == "__main__":
+    main()
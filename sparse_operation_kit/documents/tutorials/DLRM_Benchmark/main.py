@@ -69,6 +69,27 @@ def set_affinity(rank):
     os.sched_setaffinity(0, my_affinity)
 
 
+def get_dataset_files(split_dir, rank, size):
+    """
+    The label, dense and category files of a split of the dataset, and the rank and size to read
+    them with. If split_bin.py sharded the split by rank, every rank reads its whole shard
+    """
+    num_shards = 1
+    metadata_path = os.path.join(split_dir, "metadata.json")
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r") as f:
+            num_shards = json.load(f).get("num_shards", 1)
+    if num_shards > 1:
+        if num_shards != size:
+            raise RuntimeError(
+                "%s is sharded for %d ranks, but there are %d ranks" % (split_dir, num_shards, size)
+            )
+        split_dir = os.path.join(split_dir, "rank_%d" % rank)
+        rank, size = 0, 1
+    files = [os.path.join(split_dir, name) for name in ["label.bin", "dense.bin", "category.bin"]]
+    return files, rank, size
+
+
 if __name__ == "__main__":
 
     if args.amp:
@@ -139,28 +160,30 @@ if __name__ == "__main__":
         print("[Info] Using dataset in %s" % args.data_dir)
         dtype = {"int32": np.int32, "float32": np.float32}
         dataset_dir = args.data_dir
+        train_files, train_rank, train_size = get_dataset_files(
+            os.path.join(dataset_dir, "train"), hvd.rank(), hvd.size()
+        )
         dataset = BinaryDataset(
-            os.path.join(dataset_dir, "train/label.bin"),
-            os.path.join(dataset_dir, "train/dense.bin"),
-            os.path.join(dataset_dir, "train/category.bin"),
+            *train_files,
             batch_size=global_batch_size // hvd.size(),
             drop_last=True,
-            global_rank=hvd.rank(),
-            global_size=hvd.size(),
+            global_rank=train_rank,
+            global_size=train_size,
             prefetch=20,
             label_raw_type=dtype[metadata["label_raw_type"]],
             dense_raw_type=dtype[metadata["dense_raw_type"]],
             category_raw_type=dtype[metadata["category_raw_type"]],
             log=metadata["dense_log"],
         )
+        test_files, test_rank, test_size = get_dataset_files(
+            os.path.join(dataset_dir, "test"), hvd.rank(), hvd.size()
+        )
         test_dataset = BinaryDataset(
-            os.path.join(dataset_dir, "test/label.bin"),
-            os.path.join(dataset_dir, "test/dense.bin"),
-            os.path.join(dataset_dir, "test/category.bin"),
+            *test_files,
             batch_size=global_batch_size // hvd.size(),
             drop_last=False,
-            global_rank=hvd.rank(),
-            global_size=hvd.size(),
+            global_rank=test_rank,
+            global_size=test_size,
             prefetch=20,
             label_raw_type=dtype[metadata["label_raw_type"]],
             dense_raw_type=dtype[metadata["dense_raw_type"]],
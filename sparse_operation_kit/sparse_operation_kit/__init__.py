@@ -68,7 +68,11 @@ from sparse_operation_kit.optimizer import SGD
 from sparse_operation_kit.lookup import lookup_sparse, sparse_read_and_evict
 from sparse_operation_kit.lookup import all2all_dense_embedding
 
-from sparse_operation_kit.dump_load import dump, load, incremental_model_dump
+from sparse_operation_kit.dump_load import dump, dump_async, load, incremental_model_dump
+from sparse_operation_kit.dump_load import incremental_model_dump_chunks
+from sparse_operation_kit.dump_load import incremental_model_dump_to_sink
+from sparse_operation_kit.dump_load import IncrementalDumpSink, DeltaLogSink, HashMapBackendDumpSink
+from sparse_operation_kit.dump_load import read_delta_log, apply_delta_log
 
 
 # a specific code path for dl framework tf2.11.0
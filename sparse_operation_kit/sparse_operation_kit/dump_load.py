@@ -15,8 +15,11 @@
 #
 import os
 import sys
+import json
 import string
+import threading
 import numpy as np
+from concurrent import futures
 from enum import Enum
 import tensorflow as tf
 from tensorflow.python.framework import ops
@@ -51,7 +54,16 @@ opt_var_name_max_length = 32
 table_name_max_length = 256
 file_head_length = 296
 save_buffer_size_bytes = 1024 * 1024 * 64  # 1Gb
+load_buffer_size_bytes = 1024 * 1024 * 64
+dump_async_staging_bytes = 1024 * 1024 * 1024
+incremental_dump_chunk_rows = 1024 * 1024
+delta_log_magic = b"sokdelta"
+delta_log_version = 1
+hash_map_backend_dump_magic = b"bin\0"
+hash_map_backend_dump_version = 1
 optimizer_names = ["SGD", "Adamax", "Adadelta", "Adagrad", "Ftrl", "Adam"]
+sharded_manifest_name = "sharded_manifest.json"
+sharded_format_version = 1
 
 
 class data_type_convert:
@@ -771,6 +783,239 @@ def save_table_to_filesystem_dynamic(var, optimizer, path, have_states):
         save_optimizer_to_filesysyem_dynamic(optimizer, var, path, sok_var_info)
 
 
+def get_table_name(var):
+    table_name = var.name
+    for i in string.punctuation:
+        table_name = table_name.replace(i, "_")
+    return table_name
+
+
+def get_shard_path(path, file_name, shard_id):
+    return path + "/" + file_name + "-shard" + str(shard_id)
+
+
+def get_tensor_row_bytes(tensor):
+    row_bytes = tensor.dtype.size
+    if len(tensor.shape) > 1:
+        row_bytes *= max(tensor.shape[1], 1)
+    return row_bytes
+
+
+def get_shard_rounds(tensor):
+    # copy the tensor to host round by round, so the host memory is bounded by save_buffer_size_bytes
+    num_rows = tensor.shape[0]
+    rows_per_round = max(save_buffer_size_bytes // get_tensor_row_bytes(tensor), 1)
+    for start_offset in range(0, num_rows, rows_per_round):
+        yield start_offset, min(start_offset + rows_per_round, num_rows)
+
+
+def save_tensor_to_shard(shard_path, tensor):
+    with open(shard_path, mode="ba+") as fshard:
+        for start_offset, end_offset in get_shard_rounds(tensor):
+            tensor[start_offset:end_offset].numpy().tofile(fshard)
+
+
+def save_table_to_filesystem_sharded(var, optimizer, path, have_states):
+    """
+    Every rank writes the rows it owns into its own key/weight/slot shard files,
+    without gathering them to GPU 0. Returns the manifest entry of the table.
+    """
+    table_entry, sok_var_info, shard_tensors = get_sharded_table_tensors(
+        var, optimizer, have_states
+    )
+    for file_name, file_type, var_name, data_index, tensor in shard_tensors:
+        shard_path = get_shard_path(path, file_name, global_gpu_id())
+        write_file_head(shard_path, sok_var_info, file_type, var_name, data_index)
+        save_tensor_to_shard(shard_path, tensor)
+    return table_entry
+
+
+def get_sharded_table_tensors(var, optimizer, have_states):
+    """
+    Collect the tensors of the rows owned by this rank, sorted by key.
+    Returns the manifest entry of the table, the file head info and a list of
+    (file_name, file_type, var_name, data_index, tensor) for every shard file.
+    """
+    global_gpu_num = num_gpus()
+    gpu_id = global_gpu_id()
+    table_name = get_table_name(var)
+    target_gpu = var.target_gpu
+    is_dynamic = isinstance(var, DynamicVariable)
+    optimizer_name = get_sok_optimizer_name(optimizer)
+    slot_names = []
+    if optimizer != None and have_states[0]:
+        slot_names = optimizer.get_slot_names()
+
+    if is_dynamic:
+        key_dtype = var.key_type
+        emb_dtype = var.handle_dtype
+        ev_length = var.dimension
+    else:
+        key_dtype = tf.int64 if target_gpu == -1 else tf.uint64
+        emb_dtype = var.dtype
+        ev_length = var.shape[1]
+    slot_dtypes = [optimizer.get_slot(var, slot_name).dtype for slot_name in slot_names]
+
+    num_ev = 0
+    sok_var_info = SOK_var_info()
+    shard_tensors = []
+    if target_gpu == -1 or gpu_id == target_gpu:
+        if is_dynamic:
+            indice, weight = export(var)
+            sort_indice_tensor = tf.cast(tf.argsort(indice), tf.int64)
+            weight = tf.gather(weight, sort_indice_tensor)
+            indice = tf.gather(indice, sort_indice_tensor)
+        else:
+            indice_np = np.arange(
+                var.shape[0], dtype=data_type_convert.convert_to_np_dtype(key_dtype)
+            )
+            if target_gpu == -1:
+                indice_np = indice_np * global_gpu_num + gpu_id
+            indice = tf.convert_to_tensor(indice_np, dtype=key_dtype)
+            weight = tf.convert_to_tensor(var, var.dtype)
+        num_ev = indice.shape[0]
+
+        sok_var_info.opt_name = optimizer_name
+        sok_var_info.key_type = data_type_convert.convert_to_int(key_dtype)
+        sok_var_info.emb_type = data_type_convert.convert_to_int(emb_dtype)
+        sok_var_info.emb_num = num_ev
+        sok_var_info.emb_length = ev_length
+
+        shard_tensors.append(
+            (table_name + "-key", FileType.Key.value, "", sok_var_info.key_type, indice)
+        )
+        shard_tensors.append(
+            (table_name + "-weight", FileType.Emb.value, "", sok_var_info.emb_type, weight)
+        )
+
+        for slot_name, slot_dtype in zip(slot_names, slot_dtypes):
+            slot_var = optimizer.get_slot(var, slot_name)
+            if is_dynamic:
+                state_indice, state_tensor = export(slot_var)
+                sort_indice_tensor = tf.cast(tf.argsort(state_indice), tf.int64)
+                state_tensor = tf.gather(state_tensor, sort_indice_tensor)
+            else:
+                state_tensor = tf.convert_to_tensor(slot_var, dtype=slot_var.dtype)
+            shard_tensors.append(
+                (
+                    table_name + "-" + optimizer_name + "-" + slot_name,
+                    FileType.OptState.value,
+                    slot_name,
+                    data_type_convert.convert_to_int(slot_dtype),
+                    state_tensor,
+                )
+            )
+
+    num_ev_tensor = tf.convert_to_tensor([num_ev], dtype=tf.int64)
+    if global_gpu_num > 1:
+        num_ev_tensor = allgather(num_ev_tensor)
+    shard_rows = [int(n) for n in num_ev_tensor.numpy()]
+    if is_dynamic and sum(shard_rows) == 0:
+        raise Exception("dynamic table don't have value in it , table_name:", table_name)
+
+    table_entry = {
+        "table_name": table_name,
+        "is_dynamic": is_dynamic,
+        "target_gpu": target_gpu,
+        "key_type": data_type_convert.convert_to_int(key_dtype),
+        "emb_type": data_type_convert.convert_to_int(emb_dtype),
+        "ev_length": int(ev_length),
+        "opt_name": optimizer_name,
+        "slot_names": list(slot_names),
+        "slot_types": [data_type_convert.convert_to_int(slot_dtype) for slot_dtype in slot_dtypes],
+        "shard_rows": shard_rows,
+    }
+    return table_entry, sok_var_info, shard_tensors
+
+
+def save_sharded_manifest(path, table_entries):
+    if global_gpu_id() != 0:
+        return
+    manifest_path = path + "/" + sharded_manifest_name
+    manifest = {"version": sharded_format_version, "num_shards": num_gpus(), "tables": {}}
+    if os.path.exists(manifest_path):
+        # keep the tables dumped into the same folder before, every table entry records its own
+        # shard number in shard_rows, so tables dumped with a different rank number stay loadable
+        manifest["tables"] = load_sharded_manifest(path)["tables"]
+    for table_entry in table_entries:
+        manifest["tables"][table_entry["table_name"]] = table_entry
+    with open(manifest_path, "w") as fmanifest:
+        json.dump(manifest, fmanifest, indent=2)
+
+
+def remove_tables_from_sharded_manifest(path, table_names):
+    # tables dumped in the legacy format must not be shadowed by a stale sharded dump
+    if global_gpu_id() != 0:
+        return
+    manifest = load_sharded_manifest(path)
+    if manifest is None:
+        return
+    for table_name in table_names:
+        manifest["tables"].pop(table_name, None)
+    with open(path + "/" + sharded_manifest_name, "w") as fmanifest:
+        json.dump(manifest, fmanifest, indent=2)
+
+
+def load_sharded_manifest(path):
+    manifest_path = path + "/" + sharded_manifest_name
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as fmanifest:
+        manifest = json.load(fmanifest)
+    if manifest.get("version") != sharded_format_version:
+        raise Exception(
+            "sharded manifest %s has version %s, but SOK only support version %d"
+            % (manifest_path, manifest.get("version"), sharded_format_version)
+        )
+    return manifest
+
+
+def map_file_data(file_path, np_dtype, ev_length=None):
+    """
+    Memory map the data behind the file head, rows are only read from disk
+    when they are accessed.
+    """
+    num_items = (os.stat(file_path).st_size - file_head_length) // np.dtype(np_dtype).itemsize
+    shape = (num_items,) if ev_length is None else (num_items // ev_length, ev_length)
+    if num_items == 0:
+        return np.zeros(shape, dtype=np_dtype)
+    return np.memmap(file_path, dtype=np_dtype, mode="r", offset=file_head_length, shape=shape)
+
+
+def get_load_chunk_rows(row_bytes):
+    return max(load_buffer_size_bytes // max(row_bytes, 1), 1)
+
+
+def select_owned_rows(indice_map, global_gpu_num, gpu_id):
+    """
+    Scan the memory mapped keys chunk by chunk, and return the positions of
+    the keys owned by gpu_id.
+    """
+    chunk_rows = get_load_chunk_rows(indice_map.dtype.itemsize)
+    positions = [np.zeros(0, dtype=np.int64)]
+    for start_offset in range(0, indice_map.shape[0], chunk_rows):
+        indice_chunk = indice_map[start_offset : start_offset + chunk_rows]
+        positions.append(np.flatnonzero(indice_chunk % global_gpu_num == gpu_id) + start_offset)
+    return np.concatenate(positions)
+
+
+def gather_rows(data_map, positions=None):
+    """
+    Copy the rows at positions(all rows if positions is None) of a memory mapped
+    file into host memory, the temporary memory is bounded by load_buffer_size_bytes.
+    """
+    num_rows = data_map.shape[0] if positions is None else positions.shape[0]
+    rows = np.empty((num_rows,) + data_map.shape[1:], dtype=data_map.dtype)
+    chunk_rows = get_load_chunk_rows(data_map.dtype.itemsize * int(np.prod(data_map.shape[1:])))
+    for start_offset in range(0, num_rows, chunk_rows):
+        end_offset = min(start_offset + chunk_rows, num_rows)
+        if positions is None:
+            rows[start_offset:end_offset] = data_map[start_offset:end_offset]
+        else:
+            rows[start_offset:end_offset] = data_map[positions[start_offset:end_offset]]
+    return rows
+
+
 def check_weight_file_valid(key_path, weight_path, optimizer_state_paths):
     if not os.path.exists(key_path):
         return False, "key file %s is not exist" % key_path
@@ -883,18 +1128,10 @@ def load_table_to_filesystem_static(var, optimizer, path):
         num_ev = var.shape[0]
         ev_length = var.shape[1]
 
-        with open(key_path, "rb") as fkey:
-            fkey.seek(file_head_length, os.SEEK_SET)
-            indice_np = np.fromfile(fkey, dtype=key_np_dtype)
-
-        with open(weight_path, "rb") as femb:
-            femb.seek(file_head_length, os.SEEK_SET)
-            weight_np = np.fromfile(femb, dtype=emb_np_dtype).reshape((-1, ev_length))
-        mask_np = indice_np % global_gpu_num == gpu_id
-        indice_np = indice_np[mask_np]
-        weight_np = weight_np[mask_np]
+        # only the rows owned by this rank are read from the memory mapped files
+        positions = select_owned_rows(map_file_data(key_path, key_np_dtype), global_gpu_num, gpu_id)
+        weight_np = gather_rows(map_file_data(weight_path, emb_np_dtype, ev_length), positions)
 
-        indice = tf.convert_to_tensor(indice_np, dtype=key_tf_dtype)
         weight = tf.convert_to_tensor(weight_np, dtype=emb_tf_dtype)
         try:
             var.assign(weight)
@@ -908,10 +1145,9 @@ def load_table_to_filesystem_static(var, optimizer, path):
                 tmp_np_dtype = data_type_convert.get_np_dtype_by_index(tmp_data_index)
 
                 slot_var = optimizer.get_slot(var, optimizer_state_names[i])
-                with open(optimizer_state_path, "rb") as ftmp:
-                    ftmp.seek(file_head_length, os.SEEK_SET)
-                    tmp_state_np = np.fromfile(ftmp, dtype=tmp_np_dtype).reshape((-1, ev_length))
-                tmp_state_np = tmp_state_np[mask_np]
+                tmp_state_np = gather_rows(
+                    map_file_data(optimizer_state_path, tmp_np_dtype, ev_length), positions
+                )
                 tmp_state = tf.convert_to_tensor(tmp_state_np, dtype=tmp_tf_dtype)
                 try:
                     slot_var.assign(tmp_state)
@@ -925,15 +1161,7 @@ def load_table_to_filesystem_static(var, optimizer, path):
             num_ev = var.shape[0]
             ev_length = var.shape[1]
 
-            with open(key_path, "rb") as fkey:
-                fkey.seek(file_head_length, os.SEEK_SET)
-                indice_np = np.fromfile(fkey, dtype=key_np_dtype)
-
-            with open(weight_path, "rb") as femb:
-                femb.seek(file_head_length, os.SEEK_SET)
-                weight_np = np.fromfile(femb, dtype=emb_np_dtype).reshape((-1, ev_length))
-
-            indice = tf.convert_to_tensor(indice_np, dtype=key_tf_dtype)
+            weight_np = gather_rows(map_file_data(weight_path, emb_np_dtype, ev_length))
             weight = tf.convert_to_tensor(weight_np, dtype=emb_tf_dtype)
             try:
                 var.assign(weight)
@@ -949,11 +1177,9 @@ def load_table_to_filesystem_static(var, optimizer, path):
                     tmp_np_dtype = data_type_convert.get_np_dtype_by_index(tmp_data_index)
 
                     slot_var = optimizer.get_slot(var, optimizer_state_names[i])
-                    with open(optimizer_state_path, "rb") as ftmp:
-                        ftmp.seek(file_head_length, os.SEEK_SET)
-                        tmp_state_np = np.fromfile(ftmp, dtype=tmp_np_dtype).reshape(
-                            (-1, ev_length)
-                        )
+                    tmp_state_np = gather_rows(
+                        map_file_data(optimizer_state_path, tmp_np_dtype, ev_length)
+                    )
                     tmp_state = tf.convert_to_tensor(tmp_state_np, dtype=tmp_tf_dtype)
                     try:
                         slot_var.assign(tmp_state)
@@ -1004,17 +1230,11 @@ def load_table_to_filesystem_dynamic(var, optimizer, path):
     # is distribute
     if target_gpu == -1:
         ev_length = var.shape[1]
-        with open(key_path, "rb") as fkey:
-            fkey.seek(file_head_length, os.SEEK_SET)
-            indice_np = np.fromfile(fkey, dtype=key_np_dtype)
-
-        with open(weight_path, "rb") as femb:
-            femb.seek(file_head_length, os.SEEK_SET)
-            weight_np = np.fromfile(femb, dtype=emb_np_dtype).reshape((-1, ev_length))
-
-        mask_np = indice_np % global_gpu_num == gpu_id
-        indice_np = indice_np[mask_np]
-        weight_np = weight_np[mask_np]
+        # only the rows owned by this rank are read from the memory mapped files
+        indice_map = map_file_data(key_path, key_np_dtype)
+        positions = select_owned_rows(indice_map, global_gpu_num, gpu_id)
+        indice_np = gather_rows(indice_map, positions)
+        weight_np = gather_rows(map_file_data(weight_path, emb_np_dtype, ev_length), positions)
 
         indice = tf.convert_to_tensor(indice_np, dtype=key_tf_dtype)
         weight = tf.convert_to_tensor(weight_np, dtype=emb_tf_dtype)
@@ -1027,23 +1247,17 @@ def load_table_to_filesystem_dynamic(var, optimizer, path):
                 tmp_np_dtype = data_type_convert.get_np_dtype_by_index(tmp_data_index)
 
                 slot_var = optimizer.get_slot(var, optimizer_state_names[i])
-                with open(optimizer_state_path, "rb") as ftmp:
-                    ftmp.seek(file_head_length, os.SEEK_SET)
-                    tmp_state_np = np.fromfile(ftmp, dtype=tmp_np_dtype).reshape((-1, ev_length))
-                tmp_state_np = tmp_state_np[mask_np]
+                tmp_state_np = gather_rows(
+                    map_file_data(optimizer_state_path, tmp_np_dtype, ev_length), positions
+                )
                 tmp_state = tf.convert_to_tensor(tmp_state_np, dtype=tmp_tf_dtype)
                 assign(slot_var, indice, tmp_state)
 
     else:
         if gpu_id == target_gpu:
             ev_length = var.dimension
-            with open(key_path, "rb") as fkey:
-                fkey.seek(file_head_length, os.SEEK_SET)
-                indice_np = np.fromfile(fkey, dtype=key_np_dtype)
-
-            with open(weight_path, "rb") as femb:
-                femb.seek(file_head_length, os.SEEK_SET)
-                weight_np = np.fromfile(femb, dtype=emb_np_dtype).reshape((-1, ev_length))
+            indice_np = gather_rows(map_file_data(key_path, key_np_dtype))
+            weight_np = gather_rows(map_file_data(weight_path, emb_np_dtype, ev_length))
 
             indice = tf.convert_to_tensor(indice_np, dtype=key_tf_dtype)
             weight = tf.convert_to_tensor(weight_np, dtype=emb_tf_dtype)
@@ -1056,15 +1270,133 @@ def load_table_to_filesystem_dynamic(var, optimizer, path):
                     tmp_np_dtype = data_type_convert.get_np_dtype_by_index(tmp_data_index)
 
                     slot_var = optimizer.get_slot(var, optimizer_state_names[i])
-                    with open(optimizer_state_path, "rb") as ftmp:
-                        ftmp.seek(file_head_length, os.SEEK_SET)
-                        tmp_state_np = np.fromfile(ftmp, dtype=tmp_np_dtype).reshape(
-                            (-1, ev_length)
-                        )
+                    tmp_state_np = gather_rows(
+                        map_file_data(optimizer_state_path, tmp_np_dtype, ev_length)
+                    )
                     tmp_state = tf.convert_to_tensor(tmp_state_np, dtype=tmp_tf_dtype)
                     assign(slot_var, indice, tmp_state)
 
 
+def load_table_from_shards(var, optimizer, path, table_entry):
+    """
+    Reassemble the rows owned by this rank from the shard files, the rank number
+    of loading can be different from the rank number of dumping.
+    """
+    global_gpu_num = num_gpus()
+    gpu_id = global_gpu_id()
+    table_name = table_entry["table_name"]
+    target_gpu = var.target_gpu
+    is_dynamic = isinstance(var, DynamicVariable)
+    if is_dynamic != table_entry["is_dynamic"]:
+        raise Exception(
+            "table %s is dumped from a %s variable, but is loaded into a %s variable"
+            % (
+                table_name,
+                "dynamic" if table_entry["is_dynamic"] else "static",
+                "dynamic" if is_dynamic else "static",
+            )
+        )
+    if target_gpu != -1 and gpu_id != target_gpu:
+        return
+
+    ev_length = table_entry["ev_length"]
+    key_tf_dtype = data_type_convert.get_tf_dtype_by_index(table_entry["key_type"])
+    key_np_dtype = data_type_convert.get_np_dtype_by_index(table_entry["key_type"])
+    emb_tf_dtype = data_type_convert.get_tf_dtype_by_index(table_entry["emb_type"])
+    emb_np_dtype = data_type_convert.get_np_dtype_by_index(table_entry["emb_type"])
+
+    optimizer_state_names = []
+    if optimizer is not None:
+        optimizer_name = get_sok_optimizer_name(optimizer)
+        if optimizer_name != table_entry["opt_name"]:
+            raise Exception(
+                "table %s is dumped with optimizer %s, but is loaded with optimizer %s"
+                % (table_name, table_entry["opt_name"], optimizer_name)
+            )
+        optimizer_state_names = optimizer.get_slot_names()
+        for slot_name in optimizer_state_names:
+            if slot_name not in table_entry["slot_names"]:
+                raise Exception(
+                    "can't find optimizer state %s of table %s in sharded dump"
+                    % (slot_name, table_name)
+                )
+
+    shard_ids = [
+        shard_id for shard_id, shard_rows in enumerate(table_entry["shard_rows"]) if shard_rows > 0
+    ]
+    # with the same rank number, rank r owns exactly the rows in shard r
+    same_sharding = target_gpu == -1 and len(table_entry["shard_rows"]) == global_gpu_num
+    if same_sharding:
+        shard_ids = [shard_id for shard_id in shard_ids if shard_id == gpu_id]
+
+    indice_nps = [np.zeros(0, dtype=key_np_dtype)]
+    weight_nps = [np.zeros((0, ev_length), dtype=emb_np_dtype)]
+    state_nps = []
+    for slot_name in optimizer_state_names:
+        slot_index = table_entry["slot_names"].index(slot_name)
+        state_np_dtype = data_type_convert.get_np_dtype_by_index(
+            table_entry["slot_types"][slot_index]
+        )
+        state_nps.append([np.zeros((0, ev_length), dtype=state_np_dtype)])
+    for shard_id in shard_ids:
+        key_path = get_shard_path(path, table_name + "-key", shard_id)
+        weight_path = get_shard_path(path, table_name + "-weight", shard_id)
+        state_paths = [
+            get_shard_path(
+                path, table_name + "-" + table_entry["opt_name"] + "-" + slot_name, shard_id
+            )
+            for slot_name in optimizer_state_names
+        ]
+        file_valid, error_msg = check_weight_file_valid(key_path, weight_path, state_paths)
+        if not file_valid:
+            raise Exception(error_msg)
+
+        indice_map = map_file_data(key_path, key_np_dtype)
+        positions = None
+        if target_gpu == -1 and not same_sharding:
+            positions = select_owned_rows(indice_map, global_gpu_num, gpu_id)
+        indice_nps.append(gather_rows(indice_map, positions))
+        weight_nps.append(
+            gather_rows(map_file_data(weight_path, emb_np_dtype, ev_length), positions)
+        )
+        for i, state_path in enumerate(state_paths):
+            state_map = map_file_data(state_path, state_nps[i][0].dtype, ev_length)
+            state_nps[i].append(gather_rows(state_map, positions))
+
+    indice_np = np.concatenate(indice_nps)
+    weight_np = np.concatenate(weight_nps)
+    state_nps = [np.concatenate(state_np_list) for state_np_list in state_nps]
+    if len(shard_ids) > 1:
+        # every shard is sorted by key, but the shards are interleaved for static variables
+        sort_indice_np = np.argsort(indice_np, kind="stable")
+        indice_np = indice_np[sort_indice_np]
+        weight_np = weight_np[sort_indice_np]
+        state_nps = [state_np[sort_indice_np] for state_np in state_nps]
+    indice = tf.convert_to_tensor(indice_np, dtype=key_tf_dtype)
+    weight = tf.convert_to_tensor(weight_np, dtype=emb_tf_dtype)
+    if is_dynamic:
+        assign(var, indice, weight)
+    else:
+        try:
+            var.assign(weight)
+        except:
+            raise Exception("sharded weight of table %s is not same with sok variable" % table_name)
+
+    for i, slot_name in enumerate(optimizer_state_names):
+        slot_var = optimizer.get_slot(var, slot_name)
+        state = tf.convert_to_tensor(state_nps[i], dtype=slot_var.dtype)
+        if is_dynamic:
+            assign(slot_var, indice, state)
+        else:
+            try:
+                slot_var.assign(state)
+            except:
+                raise Exception(
+                    "sharded state %s of table %s is not same with sok variable"
+                    % (slot_name, table_name)
+                )
+
+
 def dump_per_table(var, optimizer, path, have_states):
     if isinstance(var, DynamicVariable):
         save_table_to_filesystem_dynamic(var, optimizer, path, have_states)
@@ -1079,8 +1411,12 @@ def dump_per_table(var, optimizer, path, have_states):
         raise Exception("dump table type should be sok.DynamicVariable or sok.Variable")
 
 
-def load_per_table(var, optimizer, path):
-    if isinstance(var, DynamicVariable):
+def load_per_table(var, optimizer, path, manifest=None):
+    if manifest is not None and get_table_name(var) in manifest["tables"]:
+        if not isinstance(var, (DynamicVariable, DistributedVariable, LocalizedVariable)):
+            raise Exception("load table type should be sok.DynamicVariable or sok.Variable")
+        load_table_from_shards(var, optimizer, path, manifest["tables"][get_table_name(var)])
+    elif isinstance(var, DynamicVariable):
         load_table_to_filesystem_dynamic(var, optimizer, path)
     elif isinstance(var, DistributedVariable):
         load_table_to_filesystem_static(var, optimizer, path)
@@ -1102,8 +1438,9 @@ def load_table(path, load_vars, optimizer):
                 "the type of your input optimizer is not tf.optimizers.Optimizer or sok.optimizer.OptimizerWrapper, please checkout your dump optimizer input"
             )
         activate_optimizer_state(optimizer, load_vars)
+    manifest = load_sharded_manifest(path)
     for var in load_vars:
-        load_per_table(var, optimizer, path)
+        load_per_table(var, optimizer, path, manifest)
 
     ar_flag_np = np.arange(1)
     ar_flag = tf.convert_to_tensor(ar_flag_np, dtype=tf.int32)
@@ -1111,7 +1448,7 @@ def load_table(path, load_vars, optimizer):
     return
 
 
-def dump_table(path, dump_vars, optimizer):
+def check_dump_optimizer_type(optimizer):
     if optimizer is not None:
         if (
             (not isinstance(optimizer, tf.keras.optimizers.Optimizer))
@@ -1121,17 +1458,33 @@ def dump_table(path, dump_vars, optimizer):
             raise Exception(
                 "the type of your input optimizer is not tf.optimizers.Optimizer or sok.optimizer.OptimizerWrapper, please checkout your dump optimizer input"
             )
+
+
+def dump_table(path, dump_vars, optimizer, sharded=False):
+    check_dump_optimizer_type(optimizer)
     # have_states: first element is all_var_have_state, second element is all_var_not_have_state
     have_states = check_optimizer_is_valid(optimizer, dump_vars)
+    table_entries = []
     for var in dump_vars:
-        dump_per_table(var, optimizer, path, have_states)
+        if not sharded:
+            dump_per_table(var, optimizer, path, have_states)
+        elif isinstance(var, (DynamicVariable, DistributedVariable, LocalizedVariable)):
+            table_entries.append(
+                save_table_to_filesystem_sharded(var, optimizer, path, have_states)
+            )
+        else:
+            raise Exception("dump table type should be sok.DynamicVariable or sok.Variable")
+    if sharded:
+        save_sharded_manifest(path, table_entries)
+    else:
+        remove_tables_from_sharded_manifest(path, [get_table_name(var) for var in dump_vars])
     ar_flag_np = np.arange(1)
     ar_flag = tf.convert_to_tensor(ar_flag_np, dtype=tf.int32)
     _ = allreduce(ar_flag, op="sum")
     return
 
 
-def dump(path, dump_vars, optimizer=None):
+def dump(path, dump_vars, optimizer=None, sharded=False):
     """
     Abbreviated as ``sok.dump``.
 
@@ -1139,6 +1492,11 @@ def dump(path, dump_vars, optimizer=None):
 
     Table name prefix is same as variable name in tensorflow.
 
+    When ``sharded`` is True, every rank writes the rows it owns into its own key, weight and
+    optimizer state shard files in parallel, instead of gathering all rows to GPU 0, and GPU 0
+    writes a ``sharded_manifest.json`` describing the shards. ``sok.load`` detects the manifest
+    and reassembles the tables with any number of ranks.
+
     Now is only support ``SGD,Adamax,Adadelta,Adagrad,Ftrl,Adam`` optimizers.
 
     Note: for ``Adam`` optimizers , it functions in the same way as ``LazyAdam`` in SOK, rather than TensorFlow's ``Adam``
@@ -1151,6 +1509,8 @@ def dump(path, dump_vars, optimizer=None):
                Can be a single or list of sok.Variable and sok.DynamicVariable
     optimizer: SOK.OptimizerWrapper,optional,default is None
                when model train , need to dump optimizer state,input ``sok.OptimizerWrapper``
+    sharded: bool,optional,default is False
+             whether every rank writes its own shard files instead of gathering rows to GPU 0
 
     Returns
     -------
@@ -1184,6 +1544,13 @@ def dump(path, dump_vars, optimizer=None):
 
         sok.dump(path,v,optimizer)
     """
+    dump_vars, optimizer = prepare_dump(path, dump_vars, optimizer)
+    dump_table(path, dump_vars, optimizer, sharded)
+    print("[SOK INFO] SOK dump weight in path:", path, " success!")
+    return
+
+
+def prepare_dump(path, dump_vars, optimizer):
     try:
         os.makedirs(path, exist_ok=True)
     except:
@@ -1207,10 +1574,188 @@ def dump(path, dump_vars, optimizer=None):
         if len(optimizer) == 0:
             optimizer = None
         optimizer = optimizer[0]
+    return dump_vars, optimizer
 
-    dump_table(path, dump_vars, optimizer)
-    print("[SOK INFO] SOK dump weight in path:", path, " success!")
-    return
+
+class DumpAsyncHandle:
+    """
+    Returned by ``sok.dump_async``, tracks the background writes of one checkpoint.
+    """
+
+    def __init__(self, path, max_workers, max_staging_bytes):
+        self.path = path
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sok_dump_async"
+        )
+        self._futures = []
+        self._condition = threading.Condition()
+        self._staging_bytes = 0
+        self._max_staging_bytes = max_staging_bytes
+        self._table_entries = []
+        self._error = None
+        self._waited = False
+
+    def _stage(self, shard_path, file_offset, snapshot, start_offset, end_offset):
+        # the device to host copy and the write are both done by the thread pool, so the
+        # caller only enqueues the round of the device side snapshot
+        self._futures.append(
+            self._executor.submit(
+                self._write, shard_path, file_offset, snapshot, start_offset, end_offset
+            )
+        )
+
+    def _write(self, shard_path, file_offset, snapshot, start_offset, end_offset):
+        # a worker blocks while the staging buffers are full, so the host memory is bounded
+        # by max_staging_bytes
+        nbytes = (end_offset - start_offset) * get_tensor_row_bytes(snapshot)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._staging_bytes == 0
+                or self._staging_bytes + nbytes <= self._max_staging_bytes
+            )
+            self._staging_bytes += nbytes
+        try:
+            array = snapshot[start_offset:end_offset].numpy()
+            with open(shard_path, mode="r+b") as fshard:
+                fshard.seek(file_offset, os.SEEK_SET)
+                array.tofile(fshard)
+        finally:
+            with self._condition:
+                self._staging_bytes -= nbytes
+                self._condition.notify_all()
+
+    def _commit(self, table_entries):
+        self._table_entries = table_entries
+        self._executor.shutdown(wait=False)
+
+    def _check_all_ranks(self, error):
+        # every rank must see the same result, so the error flag is allreduced
+        error_flag = tf.convert_to_tensor([int(error is not None)], dtype=tf.int32)
+        error_ranks = int(allreduce(error_flag, op="sum").numpy()[0])
+        if error is None and error_ranks > 0:
+            error = Exception(
+                "sok.dump_async of path %s failed on %d ranks" % (self.path, error_ranks)
+            )
+        return error
+
+    def done(self):
+        """
+        Return True if the background writes of this rank are finished.
+        """
+        return all(pending_future.done() for pending_future in self._futures)
+
+    def wait(self):
+        """
+        Block until the checkpoint is written by every rank, and re-raise the error of
+        the background writes. It is a collective call, every rank must call it.
+        """
+        if not self._waited:
+            self._waited = True
+            futures.wait(self._futures)
+            for pending_future in self._futures:
+                if pending_future.exception() is not None:
+                    self._error = pending_future.exception()
+                    break
+            self._error = self._check_all_ranks(self._error)
+            # the manifest is only written after the shards of all ranks are written
+            # successfully, so a failed dump never looks loadable
+            if self._error is None:
+                try:
+                    save_sharded_manifest(self.path, self._table_entries)
+                except Exception as error:
+                    self._error = error
+                self._error = self._check_all_ranks(self._error)
+        if self._error is not None:
+            raise self._error
+        print("[SOK INFO] SOK dump weight in path:", self.path, " success!")
+
+
+def dump_async(path, dump_vars, optimizer=None, max_workers=4, max_staging_bytes=None):
+    """
+    Abbreviated as ``sok.dump_async``.
+
+    Dump the embedding tables into one folder in the background, with the same sharded
+    format as ``sok.dump(path, dump_vars, optimizer, sharded=True)``.
+
+    The tables are snapshotted on device before ``sok.dump_async`` returns, so training can
+    continue to update them, the snapshot needs as much free device memory as the rows owned
+    by this rank. A thread pool copies the snapshot to host round by round and writes it to
+    the shard files, the host staging memory is bounded by ``max_staging_bytes``. The
+    ``sharded_manifest.json`` is written by ``wait()`` once every rank finished its writes
+    successfully, ``sok.load`` can load the folder after ``wait()`` of the returned handle is
+    called on every rank.
+
+    Parameters
+    ----------
+    path: string
+          weight file folder
+    dump_vars: List,Tuple,SOK Variable
+               Can be a single or list of sok.Variable and sok.DynamicVariable
+    optimizer: SOK.OptimizerWrapper,optional,default is None
+               when model train , need to dump optimizer state,input ``sok.OptimizerWrapper``
+    max_workers: int,optional,default is 4
+                 number of the threads writing shard files
+    max_staging_bytes: int,optional,default is None
+                       max bytes of the host staging buffers, 1GB if it is None
+
+    Returns
+    -------
+    handle: DumpAsyncHandle
+            ``handle.done()`` returns whether the writes of this rank are finished,
+            ``handle.wait()`` blocks until the writes of all ranks are finished and re-raises
+            the error of the background writes, it must be called by every rank
+
+    Example
+    -------
+    .. code-block:: python
+
+        handle = sok.dump_async(path, sok_vars, optimizer)
+        for step in range(steps):
+            train_step()
+        handle.wait()
+    """
+    dump_vars, optimizer = prepare_dump(path, dump_vars, optimizer)
+    check_dump_optimizer_type(optimizer)
+    for var in dump_vars:
+        if not isinstance(var, (DynamicVariable, DistributedVariable, LocalizedVariable)):
+            raise Exception("dump table type should be sok.DynamicVariable or sok.Variable")
+    if max_staging_bytes is None:
+        max_staging_bytes = dump_async_staging_bytes
+
+    have_states = check_optimizer_is_valid(optimizer, dump_vars)
+    handle = DumpAsyncHandle(path, max_workers, max_staging_bytes)
+    table_entries = []
+    try:
+        for var in dump_vars:
+            table_entry, sok_var_info, shard_tensors = get_sharded_table_tensors(
+                var, optimizer, have_states
+            )
+            table_entries.append(table_entry)
+            for file_name, file_type, var_name, data_index, tensor in shard_tensors:
+                shard_path = get_shard_path(path, file_name, global_gpu_id())
+                write_file_head(shard_path, sok_var_info, file_type, var_name, data_index)
+                # reserve the whole file, so the rounds can be written in any order
+                row_bytes = get_tensor_row_bytes(tensor)
+                os.truncate(shard_path, file_head_length + tensor.shape[0] * row_bytes)
+                # the exported rows of a dynamic table are already a copy, the rows of a
+                # static table are copied on device, so training can update the variables
+                snapshot = tensor
+                if not isinstance(var, DynamicVariable):
+                    with tf.device(tensor.device):
+                        snapshot = tf.identity(tensor)
+                for start_offset, end_offset in get_shard_rounds(snapshot):
+                    handle._stage(
+                        shard_path,
+                        file_head_length + start_offset * row_bytes,
+                        snapshot,
+                        start_offset,
+                        end_offset,
+                    )
+    except:
+        handle._executor.shutdown(wait=True)
+        raise
+    handle._commit(table_entries)
+    return handle
 
 
 def load(path, load_vars, optimizer=None):
@@ -1220,6 +1765,9 @@ def load(path, load_vars, optimizer=None):
     Load the embedding tables from sok weight folder.
     The sok table name must be the same with the weight file prefix.
 
+    Tables dumped with ``sharded=True`` are reassembled from their shard files according to
+    ``sharded_manifest.json``, the number of ranks can be different from the one of dumping.
+
     Now is only support ``SGD,Adamax,Adadelta,Adagrad,Ftrl,Adam`` optimizers.
 
     Note: for ``Adam`` optimizers , it functions in the same way as ``LazyAdam`` in SOK, rather than TensorFlow's ``Adam``
@@ -1292,6 +1840,53 @@ def load(path, load_vars, optimizer=None):
     return
 
 
+def check_incremental_dump_inputs(sok_vars, time_threshold):
+    is_list = isinstance(sok_vars, list) or isinstance(sok_vars, tuple)
+    if not is_list:
+        sok_vars = [sok_vars]
+    assert isinstance(sok_vars, list) or isinstance(sok_vars, tuple)
+
+    is_list_threshold = isinstance(time_threshold, list) or isinstance(time_threshold, tuple)
+
+    if not is_list_threshold:
+        time_threshold = [time_threshold]
+        if not (len(time_threshold) == 1 or len(time_threshold) == len(sok_vars)):
+            raise Exception(
+                "length of time_threshold should be 1 or same length with sok_vars, if length equals 1 , every sok_var will use same time_threshold!"
+            )
+
+    for i, sok_var in enumerate(sok_vars):
+        is_dynamic_variable = isinstance(sok_var, DynamicVariable)
+        if not is_dynamic_variable:
+            raise Exception(
+                "Now only support sok.DynamicVariable with HKV backend, but the {}-th sok variable in the input sok_vars is not a sok.DynamicVariable!".format(
+                    str(i)
+                )
+            )
+        tmp_backend = sok_var.backend_type
+        if tmp_backend != "hybrid":
+            raise Exception(
+                "Now only support sok.DynamicVariable with HKV backend, but the {}-th sok variable in the input sok_vars is not hkv backend!".format(
+                    str(i)
+                )
+            )
+
+    timestamp_list = []
+    if len(time_threshold) == 1:
+        timestamp = datetime.timestamp(time_threshold[0])
+        timestamp_ns = int(timestamp * 1e9)
+
+        for i in range(len(sok_vars)):
+            timestamp_list.append(np.array([timestamp_ns]))
+    else:
+        for i in range(len(time_threshold)):
+            tmp_time = time_threshold[i]
+            timestamp = datetime.timestamp(tmp_time)
+            timestamp_ns = int(timestamp * 1e9)
+            timestamp_list.append(np.array([timestamp_ns]))
+    return sok_vars, timestamp_list
+
+
 def incremental_model_dump(sok_vars, time_threshold, sess=None):
     """
     Abbreviated as ``sok.incremental_model_dump``.
@@ -1352,52 +1947,10 @@ def incremental_model_dump(sok_vars, time_threshold, sess=None):
         keys,values = sok.incremental_model_dump(v,utc_time)
     """
 
-    is_list = isinstance(sok_vars, list) or isinstance(sok_vars, tuple)
-    if not is_list:
-        sok_vars = [sok_vars]
-    assert isinstance(sok_vars, list) or isinstance(sok_vars, tuple)
-
-    is_list_threshold = isinstance(time_threshold, list) or isinstance(time_threshold, tuple)
-
-    if not is_list_threshold:
-        time_threshold = [time_threshold]
-        if not (len(time_threshold) == 1 or len(time_threshold) == len(sok_vars)):
-            raise Exception(
-                "length of time_threshold should be 1 or same length with sok_vars, if length equals 1 , every sok_var will use same time_threshold!"
-            )
-
+    sok_vars, timestamp_list = check_incremental_dump_inputs(sok_vars, time_threshold)
     if sess is not None:
         assert isinstance(sess, tf.compat.v1.Session)
 
-    for i, sok_var in enumerate(sok_vars):
-        is_dynamic_variable = isinstance(sok_var, DynamicVariable)
-        if not is_dynamic_variable:
-            raise Exception(
-                "Now only support sok.DynamicVariable with HKV backend, but the {}-th sok variable in the input sok_vars is not a sok.DynamicVariable!".format(
-                    str(i)
-                )
-            )
-        tmp_backend = sok_var.backend_type
-        if tmp_backend != "hybrid":
-            raise Exception(
-                "Now only support sok.DynamicVariable with HKV backend, but the {}-th sok variable in the input sok_vars is not hkv backend!".format(
-                    str(i)
-                )
-            )
-
-    timestamp_list = []
-    if len(time_threshold) == 1:
-        timestamp = datetime.timestamp(time_threshold[0])
-        timestamp_ns = int(timestamp * 1e9)
-
-        for i in range(len(sok_vars)):
-            timestamp_list.append(np.array([timestamp_ns]))
-    else:
-        for i in range(len(time_threshold)):
-            tmp_time = time_threshold[i]
-            timestamp = datetime.timestamp(tmp_time)
-            timestamp_ns = int(timestamp * 1e9)
-            timestamp_list.append(np.array([timestamp_ns]))
     var_num = len(sok_vars)
     keys_list_local = []
     values_list_local = []
@@ -1450,3 +2003,328 @@ def incremental_model_dump(sok_vars, time_threshold, sess=None):
                 keys_list_global.append(allgather(keys_list_local[i]).numpy())
                 values_list_global.append(allgather(values_list_local[i]).numpy())
     return keys_list_global, values_list_global
+
+
+def incremental_model_dump_chunks(sok_vars, time_threshold, chunk_rows=None, writer_gpu=0):
+    """
+    Abbreviated as ``sok.incremental_model_dump_chunks``.
+
+    Stream the keys and values updated after the time threshold from the given sok vars as
+    bounded-size chunks. Unlike ``sok.incremental_model_dump``, the chunks are only sent to
+    ``writer_gpu``, so the other ranks never hold the global incremental keys and values.
+
+    It is a collective generator, every rank must iterate it to the end. Chunks are only
+    yielded on ``writer_gpu``, the generator is empty on the other ranks. Only TensorFlow2
+    is supported.
+
+    Parameters
+    ----------
+    sok_vars: List,Tuple of SOK Variable
+               Can be a single or list of sok.DynamicVariable with HKV backend
+    time_threshold: List,Tuple of ``datetime.datetime``
+               Length of time_threshold should be 1 or same length with sok_vars, if length equals 1 , every sok_var will use same time_threshold
+    chunk_rows: int,optional,default is None
+                max rows sent by every rank in one chunk, 1M if it is None. A chunk on ``writer_gpu`` has at most ``chunk_rows * num_gpus`` rows
+    writer_gpu: int,optional,default is 0
+                global gpu id of the rank receiving the chunks
+
+    Returns
+    -------
+    chunks: generator of (table_name, keys, values)
+            ``keys`` and ``values`` are np.array of one chunk of the table named ``table_name``
+
+    Example
+    -------
+    .. code-block:: python
+
+        for table_name, keys, values in sok.incremental_model_dump_chunks(v, utc_time):
+            print(table_name, keys.shape, values.shape)
+    """
+    sok_vars, timestamp_list = check_incremental_dump_inputs(sok_vars, time_threshold)
+    if chunk_rows is None:
+        chunk_rows = incremental_dump_chunk_rows
+    global_gpu_num = num_gpus()
+    gpu_id = global_gpu_id()
+    if writer_gpu < 0 or writer_gpu >= global_gpu_num:
+        raise Exception("writer_gpu %d is out of range [0, %d)" % (writer_gpu, global_gpu_num))
+
+    for i, sok_var in enumerate(sok_vars):
+        table_name = get_table_name(sok_var)
+        time_threshold_tensor = tf.constant(timestamp_list[i], dtype=tf.uint64)
+        local_keys, local_values = raw_ops.dummy_var_export_if(
+            sok_var.handle, time_threshold_tensor
+        )
+        # every rank must take part in the same number of rounds
+        num_rounds = (local_keys.shape[0] + chunk_rows - 1) // chunk_rows
+        num_rounds_tensor = tf.convert_to_tensor([num_rounds], dtype=tf.int64)
+        if global_gpu_num > 1:
+            num_rounds_tensor = allreduce(num_rounds_tensor, op="max")
+        num_rounds = int(num_rounds_tensor.numpy()[0])
+
+        for round_id in range(num_rounds):
+            start_offset = min(round_id * chunk_rows, local_keys.shape[0])
+            end_offset = min(start_offset + chunk_rows, local_keys.shape[0])
+            with tf.device("CPU"):
+                tmp_keys = tf.identity(local_keys[start_offset:end_offset])
+                tmp_values = tf.identity(local_values[start_offset:end_offset])
+                if global_gpu_num > 1:
+                    splits = [0] * global_gpu_num
+                    splits[writer_gpu] = end_offset - start_offset
+                    tmp_keys, _ = alltoall(tmp_keys, splits)
+                    tmp_values, _ = alltoall(tmp_values, splits)
+            if gpu_id == writer_gpu and tmp_keys.shape[0] > 0:
+                yield table_name, tmp_keys.numpy(), tmp_values.numpy()
+        del local_keys
+        del local_values
+
+
+class IncrementalDumpSink:
+    """
+    Base class of the sinks of ``sok.incremental_model_dump_to_sink``,
+    ``write`` is called once per chunk on the writer rank.
+    """
+
+    def write(self, table_name, keys, values):
+        raise NotImplementedError("write() is not implemented")
+
+    def close(self):
+        pass
+
+
+class DeltaLogSink(IncrementalDumpSink):
+    """
+    Append the chunks into a delta log file, which can be applied by ``sok.apply_delta_log``.
+
+    The file starts with the magic ``sokdelta`` and a uint32 version, followed by one record
+    per chunk: uint32 length of table name, table name, uint32 key type, uint32 value type,
+    uint64 row number, uint64 ev length, keys and values.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        new_file = not os.path.exists(path) or os.stat(path).st_size == 0
+        self._file = open(path, mode="ba+")
+        if new_file:
+            self._file.write(delta_log_magic)
+            self._file.write(np.array([delta_log_version], dtype=np.uint32).tobytes())
+
+    def write(self, table_name, keys, values):
+        table_name_bytes = table_name.encode()
+        values = values.reshape((keys.shape[0], -1))
+        self._file.write(np.array([len(table_name_bytes)], dtype=np.uint32).tobytes())
+        self._file.write(table_name_bytes)
+        self._file.write(
+            np.array(
+                [
+                    data_type_convert.convert_to_int(tf.as_dtype(keys.dtype)),
+                    data_type_convert.convert_to_int(tf.as_dtype(values.dtype)),
+                ],
+                dtype=np.uint32,
+            ).tobytes()
+        )
+        self._file.write(np.array(values.shape, dtype=np.uint64).tobytes())
+        keys.tofile(self._file)
+        values.tofile(self._file)
+
+    def close(self):
+        self._file.close()
+
+
+class HashMapBackendDumpSink(IncrementalDumpSink):
+    """
+    Write the chunks of every table into ``<path>/<table_name>.bin``, with the raw dump format
+    of the HPS ``HashMapBackend``, so the file can be loaded by ``load_dump`` of HPS.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._files = {}
+
+    def write(self, table_name, keys, values):
+        values = values.reshape((keys.shape[0], -1))
+        if table_name not in self._files:
+            fdump = open(self.path + "/" + table_name + ".bin", mode="wb")
+            fdump.write(hash_map_backend_dump_magic)
+            fdump.write(
+                np.array(
+                    [
+                        hash_map_backend_dump_version,
+                        keys.dtype.itemsize,
+                        values.shape[1] * values.dtype.itemsize,
+                    ],
+                    dtype=np.uint32,
+                ).tobytes()
+            )
+            self._files[table_name] = fdump
+        # keys and values are interleaved in the HashMapBackend dump
+        records = np.empty(
+            keys.shape[0], dtype=[("key", keys.dtype), ("value", values.dtype, values.shape[1])]
+        )
+        records["key"] = keys
+        records["value"] = values
+        records.tofile(self._files[table_name])
+
+    def close(self):
+        for fdump in self._files.values():
+            fdump.close()
+        self._files = {}
+
+
+def incremental_model_dump_to_sink(sok_vars, time_threshold, sink, chunk_rows=None, writer_gpu=0):
+    """
+    Abbreviated as ``sok.incremental_model_dump_to_sink``.
+
+    Stream the keys and values updated after the time threshold from the given sok vars into
+    ``sink`` on ``writer_gpu`` chunk by chunk, see ``sok.incremental_model_dump_chunks``.
+    It is a collective call, every rank must call it. The sink is closed on return. If the sink
+    fails on ``writer_gpu``, the remaining chunks are still received and dropped, so that the
+    collectives finish, and every rank raises.
+
+    Parameters
+    ----------
+    sok_vars: List,Tuple of SOK Variable
+               Can be a single or list of sok.DynamicVariable with HKV backend
+    time_threshold: List,Tuple of ``datetime.datetime``
+               Length of time_threshold should be 1 or same length with sok_vars, if length equals 1 , every sok_var will use same time_threshold
+    sink: IncrementalDumpSink or string
+          ``sok.DeltaLogSink``, ``sok.HashMapBackendDumpSink`` or any ``sok.IncrementalDumpSink``,
+          a string is the path of a ``sok.DeltaLogSink``. It is only used on ``writer_gpu``
+    chunk_rows: int,optional,default is None
+                max rows sent by every rank in one chunk, 1M if it is None
+    writer_gpu: int,optional,default is 0
+                global gpu id of the rank writing the sink
+
+    Returns
+    -------
+    num_rows: int
+              rows written into the sink on ``writer_gpu``, 0 on the other ranks
+
+    Example
+    -------
+    .. code-block:: python
+
+        sok.incremental_model_dump_to_sink(v, utc_time, "./delta.log")
+        # in another job
+        sok.apply_delta_log("./delta.log", v)
+    """
+    is_writer = global_gpu_id() == writer_gpu
+    num_rows = 0
+    error = None
+    if is_writer and isinstance(sink, str):
+        try:
+            sink = DeltaLogSink(sink)
+        except Exception as open_error:
+            error = open_error
+    for table_name, keys, values in incremental_model_dump_chunks(
+        sok_vars, time_threshold, chunk_rows, writer_gpu
+    ):
+        # the other ranks are still inside the collectives of the generator, so after a failed
+        # write the remaining chunks are drained instead of leaving the generator
+        if error is not None:
+            continue
+        try:
+            sink.write(table_name, keys, values)
+            num_rows += keys.shape[0]
+        except Exception as write_error:
+            error = write_error
+    if is_writer and not isinstance(sink, str):
+        try:
+            sink.close()
+        except Exception as close_error:
+            if error is None:
+                error = close_error
+    # every rank raises if the writer failed
+    error_flag = tf.convert_to_tensor([int(error is not None)], dtype=tf.int32)
+    if num_gpus() > 1:
+        error_flag = allreduce(error_flag, op="sum")
+    if error is not None:
+        raise error
+    if int(error_flag.numpy()[0]) > 0:
+        raise Exception("sok.incremental_model_dump_to_sink failed on writer_gpu %d" % writer_gpu)
+    return num_rows
+
+
+def read_delta_log(path):
+    """
+    Read the records of a delta log written by ``sok.DeltaLogSink`` one by one,
+    yields (table_name, keys, values).
+    """
+    with open(path, "rb") as flog:
+        magic = flog.read(len(delta_log_magic))
+        version = np.frombuffer(flog.read(integer_length), dtype=np.uint32)
+        if magic != delta_log_magic or version.shape[0] != 1 or version[0] != delta_log_version:
+            raise Exception("%s is not a sok delta log with version %d" % (path, delta_log_version))
+        while True:
+            table_name_length = flog.read(integer_length)
+            if len(table_name_length) == 0:
+                break
+            table_name_length = int(np.frombuffer(table_name_length, dtype=np.uint32)[0])
+            table_name = flog.read(table_name_length).decode()
+            key_type, value_type = np.frombuffer(flog.read(integer_length * 2), dtype=np.uint32)
+            num_rows, ev_length = np.frombuffer(flog.read(long_long_length * 2), dtype=np.uint64)
+            num_rows, ev_length = int(num_rows), int(ev_length)
+            keys = np.fromfile(
+                flog, dtype=data_type_convert.get_np_dtype_by_index(int(key_type)), count=num_rows
+            )
+            values = np.fromfile(
+                flog,
+                dtype=data_type_convert.get_np_dtype_by_index(int(value_type)),
+                count=num_rows * ev_length,
+            )
+            if keys.shape[0] != num_rows or values.shape[0] != num_rows * ev_length:
+                raise Exception("delta log %s is truncated in table %s" % (path, table_name))
+            yield table_name, keys, values.reshape((num_rows, ev_length))
+
+
+def apply_delta_log(path, sok_vars):
+    """
+    Abbreviated as ``sok.apply_delta_log``.
+
+    Apply a delta log written by ``sok.incremental_model_dump_to_sink`` to the given sok vars.
+    Every rank reads the log record by record and assigns the keys it owns, so the host memory
+    is bounded by the chunk size of the log. Records of tables not in ``sok_vars`` are skipped.
+
+    Parameters
+    ----------
+    path: string
+          path of the delta log
+    sok_vars: List,Tuple of SOK Variable
+               Can be a single or list of sok.DynamicVariable
+
+    Returns
+    -------
+    num_rows: int
+              rows assigned on this rank
+    """
+    is_list = isinstance(sok_vars, list) or isinstance(sok_vars, tuple)
+    if not is_list:
+        sok_vars = [sok_vars]
+    var_dict = {}
+    for sok_var in sok_vars:
+        if not isinstance(sok_var, DynamicVariable):
+            raise Exception("apply_delta_log only support sok.DynamicVariable")
+        var_dict[get_table_name(sok_var)] = sok_var
+
+    global_gpu_num = num_gpus()
+    gpu_id = global_gpu_id()
+    num_rows = 0
+    for table_name, keys, values in read_delta_log(path):
+        sok_var = var_dict.get(table_name)
+        if sok_var is None:
+            continue
+        if sok_var.target_gpu == -1:
+            mask_np = keys % global_gpu_num == gpu_id
+            keys = keys[mask_np]
+            values = values[mask_np]
+        elif sok_var.target_gpu != gpu_id:
+            continue
+        if keys.shape[0] == 0:
+            continue
+        assign(
+            sok_var,
+            tf.convert_to_tensor(keys, dtype=sok_var.key_type),
+            tf.convert_to_tensor(values, dtype=sok_var.handle_dtype),
+        )
+        num_rows += keys.shape[0]
+    return num_rows
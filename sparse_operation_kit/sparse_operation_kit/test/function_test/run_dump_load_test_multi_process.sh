@@ -22,3 +22,6 @@ horovodrun -np ${task_num} python dump_load_localized_dynamic.py
 horovodrun -np ${task_num} python dump_load_localized_static.py
 
 
+horovodrun -np ${task_num} python dump_load_distribute_dynamic_sharded.py
+horovodrun -np ${task_num} python dump_load_distribute_static_sharded.py
+horovodrun -np ${task_num} python dump_load_distribute_dynamic_async.py
@@ -14,6 +14,7 @@
  limitations under the License.
 """
 
+import os
 import time
 import pytz
 from datetime import datetime
@@ -119,4 +120,31 @@ if __name__ == "__main__":
                 tmp_keys = keys[lookup_id]
                 tmp_keys = np.sort(tmp_keys)
                 np.testing.assert_array_equal(indices_np, tmp_keys)
+
+            # the streaming dump only gathers the chunks on rank 0
+            delta_log_path = "./incremental_dump_{}.log".format(str(i))
+            if hvd.rank() == 0 and os.path.exists(delta_log_path):
+                os.remove(delta_log_path)
+            num_rows = sok.incremental_model_dump_to_sink(
+                sok_vars, time_before, delta_log_path, chunk_rows=1024
+            )
+            num_rows = hvd.broadcast(tf.constant(num_rows, dtype=tf.int64), root_rank=0)
+            assert num_rows.numpy() == sum(tmp_keys.shape[0] for tmp_keys in keys)
+            if hvd.rank() == 0:
+                stream_keys = [[] for _ in sok_vars]
+                table_names = [sok.dump_load.get_table_name(v) for v in sok_vars]
+                for table_name, chunk_keys, chunk_values in sok.read_delta_log(delta_log_path):
+                    assert chunk_values.shape == (
+                        chunk_keys.shape[0],
+                        cols[table_names.index(table_name)],
+                    )
+                    stream_keys[table_names.index(table_name)].append(chunk_keys)
+                for lookup_id in range(num_lookups):
+                    np.testing.assert_array_equal(
+                        np.sort(np.concatenate(stream_keys[lookup_id])), np.sort(keys[lookup_id])
+                    )
+            hvd.allreduce(tf.constant(0), op=hvd.Sum)
+            num_applied = sok.apply_delta_log(delta_log_path, sok_vars)
+            num_applied = hvd.allreduce(tf.constant(num_applied, dtype=tf.int64), op=hvd.Sum)
+            assert num_applied.numpy() == num_rows.numpy()
             print("____________iter {} is pass!________________".format(str(i)))
@@ -0,0 +1,172 @@
+"""
+ Copyright (c) 2023, NVIDIA CORPORATION.
+ 
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+"""
+
+import json
+import os
+import tempfile
+import hugectr2onnx
+import onnxruntime as ort
+import numpy as np
+
+wide_vocab_size = 1000
+deep_vocab_size = 5000
+wide_slot_num, wide_nnz = 2, 2
+deep_slot_num, deep_nnz = 4, 3
+deep_vec_size = 8
+dense_dim = 13
+
+
+def generate_model(model_dir, rng, key_offset):
+    """Generate a synthetic WDL-like HugeCTR model whose sparse models only hold part of the keys"""
+    layers = [
+        {
+            "type": "Data",
+            "label": {"top": "label", "label_dim": 1},
+            "dense": {"top": "dense", "dense_dim": dense_dim},
+            "sparse": [
+                {
+                    "top": "wide_data",
+                    "slot_num": wide_slot_num,
+                    "nnz_per_slot": [wide_nnz] * wide_slot_num,
+                },
+                {
+                    "top": "deep_data",
+                    "slot_num": deep_slot_num,
+                    "nnz_per_slot": [deep_nnz] * deep_slot_num,
+                },
+            ],
+        },
+        {
+            "type": "DistributedSlotSparseEmbeddingHash",
+            "bottom": "wide_data",
+            "top": "sparse_embedding2",
+            "sparse_embedding_hparam": {
+                "max_vocabulary_size_global": wide_vocab_size,
+                "embedding_vec_size": 1,
+                "combiner": "sum",
+            },
+        },
+        {
+            "type": "LocalizedSlotSparseEmbeddingHash",
+            "bottom": "deep_data",
+            "top": "sparse_embedding1",
+            "sparse_embedding_hparam": {
+                "max_vocabulary_size_global": deep_vocab_size,
+                "embedding_vec_size": deep_vec_size,
+                "combiner": "mean",
+            },
+        },
+        {
+            "type": "Reshape",
+            "bottom": "sparse_embedding1",
+            "top": "reshape1",
+            "leading_dim": deep_slot_num * deep_vec_size,
+        },
+        {
+            "type": "Reshape",
+            "bottom": "sparse_embedding2",
+            "top": "reshape2",
+            "leading_dim": wide_slot_num,
+        },
+        {
+            "type": "Concat",
+            "bottom": ["reshape1", "reshape2", "dense"],
+            "top": "concat1",
+            "axis": 1,
+        },
+        {"type": "InnerProduct", "bottom": "concat1", "top": "fc1", "fc_param": {"num_output": 1}},
+        {"type": "BinaryCrossEntropyLoss", "bottom": ["fc1", "label"], "top": "loss"},
+    ]
+    graph_config = os.path.join(model_dir, "model.json")
+    with open(graph_config, "w") as file:
+        json.dump({"layers": layers}, file)
+    dense_model = os.path.join(model_dir, "dense.model")
+    in_feature = deep_slot_num * deep_vec_size + wide_slot_num + dense_dim
+    rng.standard_normal(in_feature + 1, dtype=np.float32).tofile(dense_model)
+    sparse_models = []
+    for name, key_begin, vocab_size, vec_size in [
+        ("wide", 0, wide_vocab_size, 1),
+        ("deep", wide_vocab_size, deep_vocab_size, deep_vec_size),
+    ]:
+        sparse_model = os.path.join(model_dir, name + "_sparse.model")
+        os.makedirs(sparse_model)
+        keys = key_begin + rng.choice(vocab_size, size=vocab_size // 2, replace=False)
+        # The last occurrence of a duplicated key wins
+        keys = np.concatenate([keys, keys[:10]]).astype(np.int64) + key_offset
+        keys.tofile(os.path.join(sparse_model, "key"))
+        rng.standard_normal((keys.shape[0], vec_size), dtype=np.float32).tofile(
+            os.path.join(sparse_model, "emb_vector")
+        )
+        sparse_models.append(sparse_model)
+    return graph_config, dense_model, sparse_models
+
+
+def run_onnx_model(onnx_model_path, dense, wide_data, deep_data):
+    sess = ort.InferenceSession(onnx_model_path)
+    res = sess.run(
+        output_names=[sess.get_outputs()[0].name],
+        input_feed={"dense": dense, "wide_data": wide_data, "deep_data": deep_data},
+    )
+    return res[0]
+
+
+def hugectr2onnx_compact_key_mapping_test(batch_size, seed):
+    rng = np.random.default_rng(seed)
+    dense = rng.standard_normal((batch_size, dense_dim), dtype=np.float32)
+    # Half of the queried keys do not exist in the sparse models
+    wide_data = rng.integers(
+        0, wide_vocab_size, size=(batch_size, wide_slot_num, wide_nnz), dtype=np.int64
+    )
+    deep_data = wide_vocab_size + rng.integers(
+        0, deep_vocab_size, size=(batch_size, deep_slot_num, deep_nnz), dtype=np.int64
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = {}
+        # A key offset beyond the max vocabulary size can only be converted with compact mapping
+        for mode, key_offset, compact_key_mapping in [
+            ("dense", 0, False),
+            ("compact", 0, True),
+            ("compact_offset", 1 << 40, True),
+        ]:
+            model_dir = os.path.join(work_dir, mode)
+            os.makedirs(model_dir)
+            graph_config, dense_model, sparse_models = generate_model(
+                model_dir, np.random.default_rng(seed), key_offset
+            )
+            onnx_model_path = os.path.join(model_dir, mode + ".onnx")
+            hugectr2onnx.converter.convert(
+                onnx_model_path,
+                graph_config,
+                dense_model,
+                True,
+                sparse_models,
+                compact_key_mapping=compact_key_mapping,
+            )
+            results[mode] = run_onnx_model(
+                onnx_model_path, dense, wide_data + key_offset, deep_data + key_offset
+            )
+    for mode in ["compact", "compact_offset"]:
+        if not np.array_equal(results[mode], results["dense"]):
+            raise RuntimeError(
+                "{} key mapping does not match dense key mapping, max diff {}".format(
+                    mode, np.max(np.abs(results[mode] - results["dense"]))
+                )
+            )
+    print("Compact key mapping matches dense key mapping")
+
+
+if __name__ == "__main__":
+    hugectr2onnx_compact_key_mapping_test(1024, 0)
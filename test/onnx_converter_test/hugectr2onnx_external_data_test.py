@@ -0,0 +1,84 @@
+"""
+ Copyright (c) 2023, NVIDIA CORPORATION.
+ 
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+"""
+
+import os
+import tempfile
+import hugectr2onnx
+import numpy as np
+from hugectr2onnx_compact_key_mapping_test import (
+    generate_model,
+    run_onnx_model,
+    wide_vocab_size,
+    wide_slot_num,
+    wide_nnz,
+    deep_vocab_size,
+    deep_slot_num,
+    deep_nnz,
+    dense_dim,
+)
+
+
+def hugectr2onnx_external_data_test(batch_size, seed):
+    rng = np.random.default_rng(seed)
+    dense = rng.standard_normal((batch_size, dense_dim), dtype=np.float32)
+    wide_data = rng.integers(
+        0, wide_vocab_size, size=(batch_size, wide_slot_num, wide_nnz), dtype=np.int64
+    )
+    deep_data = wide_vocab_size + rng.integers(
+        0, deep_vocab_size, size=(batch_size, deep_slot_num, deep_nnz), dtype=np.int64
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        graph_config, dense_model, sparse_models = generate_model(
+            work_dir, np.random.default_rng(seed), 0
+        )
+        for compact_key_mapping in [False, True]:
+            results = {}
+            for save_as_external_data in [False, True]:
+                onnx_model_path = os.path.join(
+                    work_dir,
+                    "model_{}_{}.onnx".format(int(compact_key_mapping), int(save_as_external_data)),
+                )
+                hugectr2onnx.converter.convert(
+                    onnx_model_path,
+                    graph_config,
+                    dense_model,
+                    True,
+                    sparse_models,
+                    compact_key_mapping=compact_key_mapping,
+                    save_as_external_data=save_as_external_data,
+                )
+                results[save_as_external_data] = run_onnx_model(
+                    onnx_model_path, dense, wide_data, deep_data
+                )
+                if save_as_external_data:
+                    model_bytes = os.path.getsize(onnx_model_path)
+                    data_bytes = os.path.getsize(onnx_model_path + ".data")
+                    if model_bytes > 64 * 1024 or data_bytes < deep_vocab_size // 2 * 4:
+                        raise RuntimeError(
+                            "Embedding tables are not saved as external data, "
+                            "model {} bytes, external data {} bytes".format(model_bytes, data_bytes)
+                        )
+            if not np.array_equal(results[True], results[False]):
+                raise RuntimeError(
+                    "External data model does not match, compact_key_mapping {}".format(
+                        compact_key_mapping
+                    )
+                )
+    print("External data models match inline models")
+
+
+if __name__ == "__main__":
+    hugectr2onnx_external_data_test(1024, 0)
@@ -0,0 +1,113 @@
+"""
+ Copyright (c) 2023, NVIDIA CORPORATION.
+ 
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+"""
+
+import argparse
+import os
+import struct
+import tempfile
+import time
+import numpy as np
+from hugectr2onnx.hugectr_loader import load_sparse_model
+
+
+def generate_sparse_model(sparse_model, num_rows, max_vocab_size, embedding_vec_size, seed):
+    os.makedirs(sparse_model, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    keys = rng.choice(max_vocab_size, size=num_rows, replace=False).astype(np.int64)
+    keys.tofile(os.path.join(sparse_model, "key"))
+    for begin in range(0, num_rows, 1 << 20):
+        end = min(begin + (1 << 20), num_rows)
+        vectors = rng.standard_normal((end - begin, embedding_vec_size), dtype=np.float32)
+        with open(os.path.join(sparse_model, "emb_vector"), "ab") as file:
+            vectors.tofile(file)
+
+
+def load_sparse_model_struct(sparse_model, embedding_vec_size, key_to_indice, embedding_table):
+    """Per-record reference loader, i.e., the implementation before bulk loading"""
+    with open(sparse_model + "/key", "rb") as key_file, open(
+        sparse_model + "/emb_vector", "rb"
+    ) as vec_file:
+        indice = 1
+        while True:
+            key_buffer = key_file.read(8)
+            vec_buffer = vec_file.read(4 * embedding_vec_size)
+            if len(key_buffer) == 0 or len(vec_buffer) == 0:
+                break
+            key = struct.unpack("q", key_buffer)[0]
+            values = struct.unpack(str(embedding_vec_size) + "f", vec_buffer)
+            key_to_indice[key] = indice
+            embedding_table[indice] = values
+            indice += 1
+    return indice - 1
+
+
+def run_loader(loader, sparse_model, max_vocab_size, embedding_vec_size):
+    key_to_indice = np.zeros(shape=(max_vocab_size,), dtype=np.int64)
+    embedding_table = np.zeros(shape=(max_vocab_size + 1, embedding_vec_size), dtype=np.float32)
+    start = time.time()
+    num_rows = loader(sparse_model, embedding_vec_size, key_to_indice, embedding_table)
+    elapsed = time.time() - start
+    return key_to_indice, embedding_table, num_rows, elapsed
+
+
+def sparse_model_loading_benchmark(num_rows, max_vocab_size, embedding_vec_size, seed, skip_struct):
+    with tempfile.TemporaryDirectory() as work_dir:
+        sparse_model = os.path.join(work_dir, "synthetic_sparse.model")
+        generate_sparse_model(sparse_model, num_rows, max_vocab_size, embedding_vec_size, seed)
+        key_to_indice, embedding_table, rows, elapsed = run_loader(
+            load_sparse_model, sparse_model, max_vocab_size, embedding_vec_size
+        )
+        print(
+            "[HUGECTR2ONNX][INFO]: bulk loading: {} rows in {:.3f}s, {:.0f} rows/s".format(
+                rows, elapsed, rows / elapsed
+            )
+        )
+        if skip_struct:
+            return
+        ref_key_to_indice, ref_embedding_table, ref_rows, ref_elapsed = run_loader(
+            load_sparse_model_struct, sparse_model, max_vocab_size, embedding_vec_size
+        )
+        print(
+            "[HUGECTR2ONNX][INFO]: struct loading: {} rows in {:.3f}s, {:.0f} rows/s".format(
+                ref_rows, ref_elapsed, ref_rows / ref_elapsed
+            )
+        )
+        if (
+            rows != ref_rows
+            or not np.array_equal(key_to_indice, ref_key_to_indice)
+            or embedding_table.tobytes() != ref_embedding_table.tobytes()
+        ):
+            raise RuntimeError("Bulk loading is not bit-identical to struct loading")
+        print(
+            "[HUGECTR2ONNX][INFO]: bulk loading is bit-identical, speedup {:.1f}x".format(
+                ref_elapsed / elapsed
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sparse model loading of hugectr2onnx.")
+    parser.add_argument("--num_rows", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--max_vocab_size", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--embedding_vec_size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--skip_struct", action="store_true", help="Skip the per-record reference loader"
+    )
+    args = parser.parse_args()
+    sparse_model_loading_benchmark(
+        args.num_rows, args.max_vocab_size, args.embedding_vec_size, args.seed, args.skip_struct
+    )
@@ -28,6 +28,7 @@
 #include <hps/redis_backend.hpp>
 #include <hps/rocksdb_backend.hpp>
 #include <memory>
+#include <numeric>
 #include <vector>
 
 using namespace HugeCTR;
@@ -249,6 +250,75 @@ void db_backend_dump_test(DatabaseType_t database_type) {
   }
 }
 
+template <typename Key>
+void hash_map_backend_overflow_test(const DatabaseOverflowPolicy_t overflow_policy,
+                                    const size_t overflow_sample_size) {
+  HashMapBackendParams params;
+  params.max_batch_size = 10;
+  params.num_partitions = 4;
+  params.overflow_margin = 100;
+  params.overflow_policy = overflow_policy;
+  params.overflow_sample_size = overflow_sample_size;
+  std::unique_ptr<DatabaseBackendBase<Key>> db{std::make_unique<HashMapBackend<Key>>(params)};
+
+  const std::string& tag{HierParameterServerBase::make_tag_name("overflow", "test")};
+
+  std::vector<Key> keys(10000);
+  std::iota(keys.begin(), keys.end(), 0);
+
+  // Insert a few keys, and use them frequently.
+  for (Key k{0}; k < 10; ++k) {
+    const double kk{static_cast<double>(k * k)};
+    db->insert(tag, 1, &k, reinterpret_cast<const char*>(&kk), sizeof(double), sizeof(double));
+  }
+  for (size_t i{0}; i < 100; ++i) {
+    std::vector<double> values(10);
+    db->fetch(tag, values.size(), keys.data(), reinterpret_cast<char*>(values.data()),
+              sizeof(double), [&](size_t index) { FAIL(); });
+  }
+
+  // Insert many more keys than the partitions can hold, while the first keys stay in use.
+  const size_t num_keys{keys.size() / 2};
+  for (Key k{10}; k < static_cast<Key>(num_keys); ++k) {
+    const double kk{static_cast<double>(k * k)};
+    db->insert(tag, 1, &k, reinterpret_cast<const char*>(&kk), sizeof(double), sizeof(double));
+
+    std::vector<double> values(10);
+    db->fetch(tag, values.size(), keys.data(), reinterpret_cast<char*>(values.data()),
+              sizeof(double), [&](size_t index) {
+                // Frequently used keys must not be evicted.
+                EXPECT_NE(overflow_policy, DatabaseOverflowPolicy_t::EvictLeastUsed);
+              });
+  }
+  EXPECT_LE(db->size(tag), params.num_partitions * params.overflow_margin);
+
+  // Once they are no longer used, the first keys age and are eventually evicted, too.
+  for (Key k{static_cast<Key>(num_keys)}; k < static_cast<Key>(keys.size()); ++k) {
+    const double kk{static_cast<double>(k * k)};
+    db->insert(tag, 1, &k, reinterpret_cast<const char*>(&kk), sizeof(double), sizeof(double));
+  }
+  const size_t size{db->size(tag)};
+  EXPECT_LE(size, params.num_partitions * params.overflow_margin);
+
+  // The remaining keys still map to their values.
+  size_t num_hits{0};
+  for (const Key& k : keys) {
+    double v;
+    bool hit{true};
+    db->fetch(tag, 1, &k, reinterpret_cast<char*>(&v), sizeof(double),
+              [&](size_t index) { hit = false; });
+    if (hit) {
+      EXPECT_DOUBLE_EQ(v, static_cast<double>(k * k));
+      EXPECT_GE(k, 10);
+      ++num_hits;
+    }
+  }
+  EXPECT_EQ(num_hits, size);
+
+  EXPECT_EQ(db->evict(tag, keys.size(), keys.data()), size);
+  EXPECT_EQ(db->size(tag), 0u);
+}
+
 }  // namespace
 
 TEST(db_backend_insert_fetch_test, HashMap) {
@@ -276,3 +346,14 @@ TEST(db_backend_dump_load, RedisCluster) {
   db_backend_dump_test<long long>(DatabaseType_t::RedisCluster);
 }
 TEST(db_backend_dump_load, RocksDB) { db_backend_dump_test<long long>(DatabaseType_t::RocksDB); }
+
+TEST(db_backend_overflow, HashMap) {
+  hash_map_backend_overflow_test<long long>(DatabaseOverflowPolicy_t::EvictRandom, 0);
+  hash_map_backend_overflow_test<long long>(DatabaseOverflowPolicy_t::EvictLeastUsed, 0);
+  hash_map_backend_overflow_test<long long>(DatabaseOverflowPolicy_t::EvictOldest, 0);
+}
+TEST(db_backend_overflow, HashMapSampled) {
+  hash_map_backend_overflow_test<long long>(DatabaseOverflowPolicy_t::EvictRandom, 5);
+  hash_map_backend_overflow_test<long long>(DatabaseOverflowPolicy_t::EvictLeastUsed, 5);
+  hash_map_backend_overflow_test<long long>(DatabaseOverflowPolicy_t::EvictOldest, 5);
+}
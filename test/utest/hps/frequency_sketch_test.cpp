@@ -0,0 +1,63 @@
+/*
+ * Copyright (c) 2023, NVIDIA CORPORATION.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include <gtest/gtest.h>
+
+#include <hps/frequency_sketch.hpp>
+
+using namespace HugeCTR;
+
+namespace {
+
+TEST(frequency_sketch, increment) {
+  FrequencySketch sketch(1000);
+  for (uint32_t i{1}; i <= 10; ++i) {
+    EXPECT_EQ(sketch.increment(42), i);
+  }
+  EXPECT_EQ(sketch.estimate(42), 10);
+  EXPECT_EQ(sketch.estimate(43), 0);
+
+  // Counters saturate.
+  for (size_t i{}; i != 2 * FrequencySketch::max_frequency; ++i) {
+    sketch.increment(7);
+  }
+  EXPECT_EQ(sketch.estimate(7), FrequencySketch::max_frequency);
+
+  sketch.clear();
+  EXPECT_EQ(sketch.estimate(42), 0);
+  EXPECT_EQ(sketch.estimate(7), 0);
+}
+
+TEST(frequency_sketch, aging) {
+  FrequencySketch sketch(1000);
+  for (size_t i{}; i != 100; ++i) {
+    sketch.increment(42);
+  }
+
+  // Each window of other keys halves the estimate (+ hash collisions).
+  for (uint64_t k{1000}; k != 1900; ++k) {
+    sketch.increment(k);
+  }
+  EXPECT_GE(sketch.estimate(42), 50);
+  EXPECT_LE(sketch.estimate(42), 51);
+
+  for (uint64_t k{10000}; k != 20000; ++k) {
+    sketch.increment(k);
+  }
+  EXPECT_LE(sketch.estimate(42), 2);
+}
+
+}  // namespace
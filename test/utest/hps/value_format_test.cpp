@@ -0,0 +1,141 @@
+/*
+ * Copyright (c) 2023, NVIDIA CORPORATION.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include <gtest/gtest.h>
+
+#include <algorithm>
+#include <cmath>
+#include <hps/value_format.hpp>
+#include <limits>
+#include <random>
+#include <vector>
+
+using namespace HugeCTR;
+
+namespace {
+
+std::vector<float> round_trip(const DatabaseValueFormat_t value_format,
+                              const std::vector<float>& values) {
+  const uint32_t value_size{static_cast<uint32_t>(values.size() * sizeof(float))};
+
+  // Offset by one byte to make sure unaligned buffers work.
+  std::vector<char> encoded(get_encoded_value_size(value_format, value_size) + 1);
+  encode_value(value_format, reinterpret_cast<const char*>(values.data()), value_size, &encoded[1]);
+
+  std::vector<char> decoded(value_size + 1);
+  decode_value(value_format, &encoded[1], value_size, &decoded[1]);
+
+  std::vector<float> result(values.size());
+  std::copy_n(&decoded[1], value_size, reinterpret_cast<char*>(result.data()));
+  return result;
+}
+
+std::vector<float> make_values(const size_t n) {
+  std::mt19937 gen{42};
+  std::normal_distribution<float> dist{0.f, 0.05f};
+  std::vector<float> values(n);
+  for (float& v : values) {
+    v = dist(gen);
+  }
+  return values;
+}
+
+TEST(value_format, encoded_value_size) {
+  EXPECT_EQ(get_encoded_value_size(DatabaseValueFormat_t::FP32, 13), 13);
+  EXPECT_EQ(get_encoded_value_size(DatabaseValueFormat_t::FP16, 128 * sizeof(float)), 256);
+  EXPECT_EQ(get_encoded_value_size(DatabaseValueFormat_t::BF16, 128 * sizeof(float)), 256);
+  EXPECT_EQ(get_encoded_value_size(DatabaseValueFormat_t::INT8, 128 * sizeof(float)),
+            sizeof(float) + 128);
+}
+
+TEST(value_format, fp32) {
+  const std::vector<float>& values{make_values(127)};
+  EXPECT_EQ(round_trip(DatabaseValueFormat_t::FP32, values), values);
+}
+
+TEST(value_format, fp16) {
+  const std::vector<float>& values{make_values(127)};
+  const std::vector<float>& result{round_trip(DatabaseValueFormat_t::FP16, values)};
+  for (size_t i{}; i != values.size(); ++i) {
+    EXPECT_NEAR(result[i], values[i], std::abs(values[i]) * 0x1p-11f + 0x1p-25f);
+  }
+
+  // Exactly representable values, and special values.
+  const std::vector<float> exact{
+      0.f, -0.f, 1.f, -2.5f, 65504.f, 0x1p-24f, std::numeric_limits<float>::infinity()};
+  EXPECT_EQ(round_trip(DatabaseValueFormat_t::FP16, exact), exact);
+  EXPECT_EQ(round_trip(DatabaseValueFormat_t::FP16, {1e6f})[0],
+            std::numeric_limits<float>::infinity());
+  EXPECT_TRUE(std::isnan(
+      round_trip(DatabaseValueFormat_t::FP16, {std::numeric_limits<float>::quiet_NaN()})[0]));
+}
+
+TEST(value_format, bf16) {
+  const std::vector<float>& values{make_values(127)};
+  const std::vector<float>& result{round_trip(DatabaseValueFormat_t::BF16, values)};
+  for (size_t i{}; i != values.size(); ++i) {
+    EXPECT_NEAR(result[i], values[i], std::abs(values[i]) * 0x1p-8f);
+  }
+
+  const std::vector<float> exact{0.f,   -0.f,     1.f,
+                                 -2.5f, 0x1p100f, -std::numeric_limits<float>::infinity()};
+  EXPECT_EQ(round_trip(DatabaseValueFormat_t::BF16, exact), exact);
+  EXPECT_TRUE(std::isnan(
+      round_trip(DatabaseValueFormat_t::BF16, {std::numeric_limits<float>::quiet_NaN()})[0]));
+}
+
+TEST(value_format, int8) {
+  const std::vector<float>& values{make_values(127)};
+  const std::vector<float>& result{round_trip(DatabaseValueFormat_t::INT8, values)};
+  float max_abs{0};
+  for (const float v : values) {
+    max_abs = std::max(max_abs, std::abs(v));
+  }
+  const float scale{max_abs / 127.f};
+  for (size_t i{}; i != values.size(); ++i) {
+    EXPECT_NEAR(result[i], values[i], 0.5f * scale * (1 + 1e-5f));
+  }
+
+  // All-zero vectors must not produce NaNs.
+  EXPECT_EQ(round_trip(DatabaseValueFormat_t::INT8, std::vector<float>(8, 0.f)),
+            std::vector<float>(8, 0.f));
+
+  // Non-finite elements must not affect the scale of the finite elements.
+  constexpr float inf{std::numeric_limits<float>::infinity()};
+  constexpr float nan{std::numeric_limits<float>::quiet_NaN()};
+  const std::vector<float> special{1.f, -0.5f, inf, -inf, nan, -nan, 0.25f};
+  const std::vector<float> expected{1.f, -0.5f, 1.f, -1.f, 0.f, 0.f, 0.25f};
+  const std::vector<float>& special_result{round_trip(DatabaseValueFormat_t::INT8, special)};
+  for (size_t i{}; i != special.size(); ++i) {
+    EXPECT_NEAR(special_result[i], expected[i], 0.5f / 127.f * (1 + 1e-5f));
+  }
+  EXPECT_EQ(round_trip(DatabaseValueFormat_t::INT8, {nan, inf, -inf, 0.f}),
+            std::vector<float>(4, 0.f));
+}
+
+TEST(value_format, select_value_format) {
+  const std::vector<std::regex> filters{std::regex{"hps_et\\.model\\.sparse_embedding[0-9]+"}};
+  EXPECT_EQ(
+      select_value_format("hps_et.model.sparse_embedding1", DatabaseValueFormat_t::FP16, filters),
+      DatabaseValueFormat_t::FP16);
+  EXPECT_EQ(
+      select_value_format("hps_et.model.dense_embedding", DatabaseValueFormat_t::FP16, filters),
+      DatabaseValueFormat_t::FP32);
+  EXPECT_EQ(select_value_format("anything", DatabaseValueFormat_t::INT8, {std::regex{".+"}}),
+            DatabaseValueFormat_t::INT8);
+}
+
+}  // namespace
@@ -14,18 +14,24 @@
  * limitations under the License.
  */
 
+#include <algorithm>
 #include <argparse/argparse.hpp>
+#include <atomic>
 #include <core/memory.hpp>
 #include <core23/logger.hpp>
+#include <functional>
 #include <hps/hash_map_backend.hpp>
 #include <hps/hier_parameter_server_base.hpp>
 #include <hps/mp_hash_map_backend.hpp>
 #include <hps/redis_backend.hpp>
 #include <hps/rocksdb_backend.hpp>
 #include <iostream>
+#include <limits>
+#include <optional>
 #include <random>
 #include <sstream>
 #include <string>
+#include <thread>
 #include <unordered_map>
 #include <vector>
 
@@ -61,6 +67,16 @@ int main(int argc, char** argv) {
       .default_value(false)
       .implicit_value(true);
 
+  args.add_argument("--test_steady_insert")
+      .help("Enables the steady state test, that keeps inserting new keys into the full database.")
+      .default_value(false)
+      .implicit_value(true);
+
+  args.add_argument("--test_contention")
+      .help("Enables the contention test, with concurrent fetch and insert threads.")
+      .default_value(false)
+      .implicit_value(true);
+
   args.add_argument("--seed")
       .help("Seed for the random number generator.")
       .default_value<uint64_t>(4711)
@@ -87,6 +103,56 @@ int main(int argc, char** argv) {
       .default_value<size_t>(8L * 1024 * 1024)
       .scan<'u', size_t>();
 
+  args.add_argument("--hm_value_format")
+      .help("Format in which the hashmap stores values (fp32, fp16, bf16 or int8).")
+      .default_value<std::string>("fp32");
+
+  // Overflow parameters (volatile databases).
+  args.add_argument("--overflow_margin")
+      .help("Maximum number of values per partition.")
+      .default_value<size_t>(std::numeric_limits<size_t>::max())
+      .scan<'u', size_t>();
+
+  args.add_argument("--overflow_policy")
+      .help("Overflow policy (evict_random, evict_least_used or evict_oldest).")
+      .default_value<std::string>("evict_random");
+
+  args.add_argument("--overflow_target")
+      .help("Overflow resolution target.")
+      .default_value<double>(0.8)
+      .scan<'g', double>();
+
+  args.add_argument("--overflow_samples")
+      .help("Number of sampled values per eviction (0 = sort the partition).")
+      .default_value<size_t>(0)
+      .scan<'u', size_t>();
+
+  // Contention test parameters.
+  args.add_argument("--ct_readers")
+      .help("Number of fetch threads in the contention test.")
+      .default_value<size_t>(4)
+      .scan<'u', size_t>();
+
+  args.add_argument("--ct_writers")
+      .help("Number of insert threads in the contention test.")
+      .default_value<size_t>(1)
+      .scan<'u', size_t>();
+
+  args.add_argument("--ct_fetch_size")
+      .help("Amount of values per fetch in the contention test.")
+      .default_value<size_t>(1024)
+      .scan<'u', size_t>();
+
+  args.add_argument("--ct_insert_size")
+      .help("Amount of values per insert in the contention test (at most fill_burst).")
+      .default_value<size_t>(64L * 1024)
+      .scan<'u', size_t>();
+
+  args.add_argument("--ct_duration")
+      .help("Duration of the contention test in seconds.")
+      .default_value<size_t>(10)
+      .scan<'u', size_t>();
+
   // Redis parameters.
   args.add_argument("--re_address")
       .help("Redis server address.")
@@ -164,12 +230,26 @@ int main(int argc, char** argv) {
   const auto no_test_insert_evict = args.get<bool>("--no_test_insert_evict");
   const auto no_test_upsert = args.get<bool>("--no_test_upsert");
   const auto no_test_fetch = args.get<bool>("--no_test_fetch");
+  const auto test_steady_insert = args.get<bool>("--test_steady_insert");
+  const auto test_contention = args.get<bool>("--test_contention");
   const auto seed = args.get<uint64_t>("--seed");
   // HM parameters.
   const auto hm_parts = args.get<size_t>("--hm_parts");
   const auto hm_alloc_rate = args.get<size_t>("--hm_alloc_rate");
   const auto hm_sm_size = args.get<size_t>("--hm_sm_size");
   const auto hm_batch_size = args.get<size_t>("--hm_batch_size");
+  const auto hm_value_format_name = args.get<std::string>("--hm_value_format");
+  // Overflow parameters.
+  const auto overflow_margin = args.get<size_t>("--overflow_margin");
+  const auto overflow_policy_name = args.get<std::string>("--overflow_policy");
+  const auto overflow_target = args.get<double>("--overflow_target");
+  const auto overflow_samples = args.get<size_t>("--overflow_samples");
+  // Contention test parameters.
+  const auto ct_readers = args.get<size_t>("--ct_readers");
+  const auto ct_writers = args.get<size_t>("--ct_writers");
+  const auto ct_fetch_size = args.get<size_t>("--ct_fetch_size");
+  const auto ct_insert_size = args.get<size_t>("--ct_insert_size");
+  const auto ct_duration = args.get<size_t>("--ct_duration");
   // Redis parameters.
   const auto re_address = args.get<std::string>("--re_address");
   const auto re_parts = args.get<size_t>("--re_parts");
@@ -191,6 +271,8 @@ int main(int argc, char** argv) {
             << "  no_test_insert_evict = " << no_test_insert_evict << std::endl
             << "  no_test_upsert       = " << no_test_upsert << std::endl
             << "  no_test_fetch        = " << no_test_fetch << std::endl
+            << "  test_steady_insert   = " << test_steady_insert << std::endl
+            << "  test_contention      = " << test_contention << std::endl
             << "  seed                 = " << seed << std::endl
             << "  -----------------------------" << std::endl
             << "  broker = " << kafka_broker << std::endl
@@ -198,11 +280,23 @@ int main(int argc, char** argv) {
             << "  model = " << model_name << std::endl
             << "  table = " << table_name << std::endl
             << "  -----------------------------" << std::endl
-            << "  db_type        = " << db_type << std::endl
-            << "  hm_parts       = " << hm_parts << std::endl
-            << "  hm_alloc_rate  = " << hm_alloc_rate << std::endl
-            << "  hm_sm_size     = " << hm_sm_size << std::endl
-            << "  hm_batch_size  = " << hm_batch_size << std::endl
+            << "  db_type         = " << db_type << std::endl
+            << "  hm_parts        = " << hm_parts << std::endl
+            << "  hm_alloc_rate   = " << hm_alloc_rate << std::endl
+            << "  hm_sm_size      = " << hm_sm_size << std::endl
+            << "  hm_batch_size   = " << hm_batch_size << std::endl
+            << "  hm_value_format = " << hm_value_format_name << std::endl
+            << std::endl
+            << "  overflow_margin  = " << overflow_margin << std::endl
+            << "  overflow_policy  = " << overflow_policy_name << std::endl
+            << "  overflow_target  = " << overflow_target << std::endl
+            << "  overflow_samples = " << overflow_samples << std::endl
+            << std::endl
+            << "  ct_readers     = " << ct_readers << std::endl
+            << "  ct_writers     = " << ct_writers << std::endl
+            << "  ct_fetch_size  = " << ct_fetch_size << std::endl
+            << "  ct_insert_size = " << ct_insert_size << std::endl
+            << "  ct_duration    = " << ct_duration << " s" << std::endl
             << std::endl
             << "  re_address     = " << re_address << std::endl
             << "  re_parts       = " << re_parts << std::endl
@@ -222,25 +316,60 @@ int main(int argc, char** argv) {
 
   const std::string tag_name = HierParameterServerBase::make_tag_name(model_name, table_name);
 
+  std::optional<DatabaseOverflowPolicy_t> overflow_policy;
+  for (const DatabaseOverflowPolicy_t policy :
+       {DatabaseOverflowPolicy_t::EvictRandom, DatabaseOverflowPolicy_t::EvictLeastUsed,
+        DatabaseOverflowPolicy_t::EvictOldest}) {
+    if (overflow_policy_name == hctr_enum_to_c_str(policy)) {
+      overflow_policy = policy;
+    }
+  }
+  if (!overflow_policy) {
+    HCTR_DIE("Unsupported overflow_policy!");
+  }
+  std::optional<DatabaseValueFormat_t> hm_value_format;
+  for (const DatabaseValueFormat_t value_format :
+       {DatabaseValueFormat_t::FP32, DatabaseValueFormat_t::FP16, DatabaseValueFormat_t::BF16,
+        DatabaseValueFormat_t::INT8}) {
+    if (hm_value_format_name == hctr_enum_to_c_str(value_format)) {
+      hm_value_format = value_format;
+    }
+  }
+  if (!hm_value_format) {
+    HCTR_DIE("Unsupported hm_value_format!");
+  }
+
+  const auto set_overflow_params = [&](VolatileBackendParams& params) {
+    params.overflow_margin = overflow_margin;
+    params.overflow_policy = *overflow_policy;
+    params.overflow_resolution_target = overflow_target;
+    params.overflow_sample_size = overflow_samples;
+  };
+
   std::unique_ptr<DatabaseBackendBase<Key>> db;
   if (db_type == "hashmap") {
     HashMapBackendParams params;
     params.max_batch_size = hm_batch_size;
     params.num_partitions = hm_parts;
+    set_overflow_params(params);
     params.allocation_rate = hm_alloc_rate;
+    params.value_format = *hm_value_format;
     db = std::make_unique<HashMapBackend<Key>>(params);
   } else if (db_type == "mp_hashmap") {
     MultiProcessHashMapBackendParams params;
     params.max_batch_size = hm_batch_size;
     params.num_partitions = hm_parts;
+    set_overflow_params(params);
     params.allocation_rate = hm_alloc_rate;
     params.shared_memory_size = hm_sm_size;
+    params.value_format = *hm_value_format;
     db = std::make_unique<MultiProcessHashMapBackend<Key>>(params);
 #ifdef HCTR_USE_REDIS
   } else if (db_type == "redis") {
     RedisClusterBackendParams params;
     params.max_batch_size = re_batch_size;
     params.num_partitions = re_parts;
+    set_overflow_params(params);
     params.address = re_address;
     params.num_node_connections = re_connections;
     db = std::make_unique<RedisClusterBackend<Key>>(params);
@@ -380,6 +509,125 @@ int main(int argc, char** argv) {
         }
       }
     }
+
+    // Steady state: Every burst inserts new keys, which overflows a full database.
+    for (size_t k = 0, next_key = fill_amount; test_steady_insert && k < query_repeat; ++k) {
+      for (size_t j = 0; j < fill_burst; ++j) {
+        keys[j] = static_cast<Key>(next_key++);
+      }
+
+      const auto t0 = std::chrono::high_resolution_clock::now();
+
+      db->insert(tag_name, fill_burst, keys.data(), reinterpret_cast<const char*>(in_values.data()),
+                 emb_size * sizeof(float), emb_size * sizeof(float));
+
+      const auto t1 = std::chrono::high_resolution_clock::now();
+      const auto dur = std::chrono::duration_cast<std::chrono::microseconds>(t1 - t0);
+      HCTR_LOG_S(INFO, WORLD) << "DB size = " << db->size(tag_name) << ", k = " << k
+                              << ", steady insert time = " << dur.count() << " us, " << std::fixed
+                              << std::setprecision(3) << (fill_burst / 1.0 / dur.count())
+                              << " M keys/s" << std::endl;
+    }
+
+    // Contention: Readers fetch filled keys, while writers insert keys of which half are new.
+    if (test_contention) {
+      HCTR_LOG_S(INFO, WORLD) << "Contention test with " << ct_readers << " readers and "
+                              << ct_writers << " writers..." << std::endl;
+
+      const size_t insert_size = std::min(ct_insert_size, fill_burst);
+      const Key num_filled = static_cast<Key>(std::max<size_t>(fill_amount, 1));
+      std::atomic<bool> stop{false};
+      std::atomic<size_t> num_inserted{0};
+      std::vector<std::vector<int64_t>> latencies(ct_readers);
+
+      const auto run = [&](const std::function<void()>& body) {
+        try {
+          while (!stop) {
+            body();
+          }
+        } catch (const std::exception& error) {
+          HCTR_LOG_S(ERROR, WORLD) << "Error: " << error.what() << std::endl;
+          stop = true;
+        }
+      };
+
+      std::vector<std::thread> threads;
+      for (size_t t = 0; t < ct_readers; ++t) {
+        threads.emplace_back([&, t]() {
+          std::mt19937_64 gen(seed + 1 + t);
+          std::uniform_int_distribution<Key> key_dist(0, num_filled - 1);
+          std::vector<Key> keys(ct_fetch_size);
+          std::vector<float, AlignedAllocator<float>> values(keys.size() * emb_size);
+
+          run([&]() {
+            for (Key& key : keys) {
+              key = key_dist(gen);
+            }
+
+            const auto t0 = std::chrono::high_resolution_clock::now();
+            db->fetch(tag_name, keys.size(), keys.data(), reinterpret_cast<char*>(values.data()),
+                      emb_size * sizeof(float), [&](const size_t) {});
+            const auto t1 = std::chrono::high_resolution_clock::now();
+            latencies[t].emplace_back(
+                std::chrono::duration_cast<std::chrono::nanoseconds>(t1 - t0).count());
+          });
+        });
+      }
+      for (size_t t = 0; t < ct_writers; ++t) {
+        threads.emplace_back([&, t]() {
+          std::mt19937_64 gen(seed + 1 + ct_readers + t);
+          std::uniform_int_distribution<Key> key_dist(0, 2 * num_filled - 1);
+          std::vector<Key> keys(insert_size);
+
+          run([&]() {
+            for (Key& key : keys) {
+              key = key_dist(gen);
+            }
+
+            db->insert(tag_name, keys.size(), keys.data(),
+                       reinterpret_cast<const char*>(in_values.data()), emb_size * sizeof(float),
+                       emb_size * sizeof(float));
+            num_inserted += keys.size();
+          });
+        });
+      }
+
+      const auto t0 = std::chrono::high_resolution_clock::now();
+      for (size_t s = 0; !stop && s < ct_duration; ++s) {
+        std::this_thread::sleep_for(std::chrono::seconds(1));
+      }
+      stop = true;
+      for (std::thread& thread : threads) {
+        thread.join();
+      }
+      const auto t1 = std::chrono::high_resolution_clock::now();
+      const double dur = std::chrono::duration<double>(t1 - t0).count();
+
+      std::vector<int64_t> all_latencies;
+      for (const std::vector<int64_t>& l : latencies) {
+        all_latencies.insert(all_latencies.end(), l.begin(), l.end());
+      }
+      std::sort(all_latencies.begin(), all_latencies.end());
+      const auto percentile = [&](const double p) {
+        if (all_latencies.empty()) {
+          return 0.0;
+        }
+        const size_t i = static_cast<size_t>(p * static_cast<double>(all_latencies.size() - 1));
+        return static_cast<double>(all_latencies[i]) / 1000.0;
+      };
+
+      HCTR_LOG_S(INFO, WORLD) << "DB size = " << db->size(tag_name)
+                              << ", num fetches = " << all_latencies.size()
+                              << ", fetch rate = " << std::fixed << std::setprecision(3)
+                              << (all_latencies.size() * ct_fetch_size / dur / 1e6)
+                              << " M keys/s, insert rate = " << (num_inserted / dur / 1e6)
+                              << " M keys/s" << std::endl;
+      HCTR_LOG_S(INFO, WORLD) << "Fetch latency: p50 = " << percentile(0.5)
+                              << " us, p90 = " << percentile(0.9)
+                              << " us, p99 = " << percentile(0.99)
+                              << " us, p99.9 = " << percentile(0.999)
+                              << " us, max = " << percentile(1.0) << " us" << std::endl;
+    }
   } catch (const DatabaseBackendError& error) {
     HCTR_LOG_S(ERROR, WORLD) << "Partition #" << error.partition() << ": " << error.what()
                              << std::endl;
@@ -18,46 +18,91 @@ import sys
 import os
 import argparse
 import logging
+import multiprocessing
 import numpy as np
-import cudf
 import glob
 
+try:
+    import cudf
+except ImportError:
+    cudf = None
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
 logging.basicConfig(format="%(asctime)s %(message)s")
 logging.root.setLevel(logging.NOTSET)
 
 CRITEO_CAT_POS = [c for c in range(14, 40)]
 
 
-def generate_keyset_for_single_file(file, cat_features_pos, cum_slot_size_array):
+def read_unique_keys_cpu(file, cat_features_pos):
+    """Sorted unique keys of every categorical column, read row group by row group"""
+    parquet_file = pq.ParquetFile(file)
+    columns = [parquet_file.schema_arrow.names[pos] for pos in cat_features_pos]
+    row_group_keysets = [[np.zeros(0, dtype=np.int64)] for _ in cat_features_pos]
+    for row_group in range(parquet_file.num_row_groups):
+        table = parquet_file.read_row_group(row_group, columns=columns)
+        for i, column in enumerate(table.columns):
+            row_group_keysets[i].append(np.unique(column.to_numpy()).astype(np.int64))
+    return [np.unique(np.concatenate(keysets)) for keysets in row_group_keysets]
+
+
+def read_unique_keys_gpu(file, cat_features_pos):
     df = cudf.read_parquet(file)
     keysets = []
-    for i in range(len(cat_features_pos)):
-        unique_keys = df.iloc[:, cat_features_pos[i]].unique() + cum_slot_size_array[i]
-        keysets.append(set(unique_keys.to_pandas()))
+    for pos in cat_features_pos:
+        unique_keys = df.iloc[:, pos].unique().sort_values()
+        keysets.append(unique_keys.to_numpy().astype(np.int64, copy=False))
         del unique_keys
     return keysets
 
 
+def generate_keyset_for_single_file(task):
+    file, cat_features_pos, cum_slot_size_array, use_gpu = task
+    read_unique_keys = read_unique_keys_gpu if use_gpu else read_unique_keys_cpu
+    keysets = read_unique_keys(file, cat_features_pos)
+    return [keys + offset for keys, offset in zip(keysets, cum_slot_size_array)]
+
+
 def generate_keyset(
-    src_dir_path, dst_dir_path, cat_features_pos, slot_size_array, int32_keyset=False
+    src_dir_path,
+    dst_dir_path,
+    cat_features_pos,
+    slot_size_array,
+    int32_keyset=False,
+    num_workers=1,
+    use_gpu=False,
 ):
-    filelist = []
-    all_keysets = []
-    for _ in range(len(cat_features_pos)):
-        all_keysets.append(set())
-    cum_slot_size_array = np.cumsum(np.array([0] + slot_size_array[:-1]))
-    for file in glob.glob(src_dir_path + "/*.parquet"):
-        filelist.append(file)
-    for file in filelist:
-        cur_keysets = generate_keyset_for_single_file(file, cat_features_pos, cum_slot_size_array)
-        for i in range(len(all_keysets)):
-            all_keysets[i] = all_keysets[i].union(cur_keysets[i])
-    with open(dst_dir_path, "wb") as f:
-        int_size = 4 if int32_keyset else 8
-        for all_keys in all_keysets:
-            for k in all_keys:
-                f.write(int(k).to_bytes(int_size, "little", signed=True))
-    logging.info("Extracted keyset from {}".format(src_dir_path))
+    if use_gpu and cudf is None:
+        raise RuntimeError("cudf is required to extract the keyset on GPU")
+    if not use_gpu and pq is None:
+        raise RuntimeError("pyarrow is required to extract the keyset on CPU")
+    cum_slot_size_array = np.cumsum(np.array([0] + slot_size_array[:-1], dtype=np.int64))
+    filelist = sorted(glob.glob(src_dir_path + "/*.parquet"))
+    tasks = [(file, cat_features_pos, cum_slot_size_array, use_gpu) for file in filelist]
+    # the sorted unique keys of every slot are merged as the files are read
+    all_keysets = [np.zeros(0, dtype=np.int64) for _ in cat_features_pos]
+    # every process would create its own CUDA context, so the GPU path reads the files in turn
+    num_workers = 1 if use_gpu else max(1, min(num_workers, len(filelist)))
+    with multiprocessing.Pool(num_workers) as pool:
+        for cur_keysets in pool.imap_unordered(generate_keyset_for_single_file, tasks):
+            for i in range(len(all_keysets)):
+                all_keysets[i] = np.union1d(all_keysets[i], cur_keysets[i])
+    keyset = np.concatenate(all_keysets)
+    if int32_keyset:
+        if keyset.size > 0 and (
+            keyset.min() < np.iinfo(np.int32).min or keyset.max() > np.iinfo(np.int32).max
+        ):
+            raise RuntimeError("The keys do not fit in int32, please use an int64 keyset")
+        keyset = keyset.astype(np.int32)
+    keyset.tofile(dst_dir_path)
+    logging.info(
+        "Extracted keyset of {} keys from {} files in {}".format(
+            keyset.size, len(filelist), src_dir_path
+        )
+    )
 
 
 if __name__ == "__main__":
@@ -68,6 +113,10 @@ if __name__ == "__main__":
     arg_parser.add_argument("--cat_features_pos", nargs="*", type=int, required=False)
     arg_parser.add_argument("--slot_size_array", nargs="*", type=int, required=False)
     arg_parser.add_argument("--int32_keyset", type=bool, required=False, default=False)
+    arg_parser.add_argument("--num_workers", type=int, required=False, default=os.cpu_count())
+    arg_parser.add_argument(
+        "--use_gpu", action="store_true", help="Read the parquet files with cudf on GPU"
+    )
 
     args = arg_parser.parse_args()
 
@@ -83,4 +132,12 @@ if __name__ == "__main__":
     if len(cat_features_pos) != len(slot_size_array):
         sys.exit("ERROR: the cat_features_pos and slot_size_array do not have the same dimension")
 
-    generate_keyset(src_dir_path, keyset_path, cat_features_pos, slot_size_array, int32_keyset)
+    generate_keyset(
+        src_dir_path,
+        keyset_path,
+        cat_features_pos,
+        slot_size_array,
+        int32_keyset,
+        args.num_workers,
+        args.use_gpu,
+    )
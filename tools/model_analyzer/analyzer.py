@@ -14,49 +14,394 @@
  limitations under the License.
 """
 
-import tqdm
+import argparse
+import json
+import math
+import multiprocessing
+import os
 import sys
-import struct
-from os.path import getsize
-from os.path import exists
+import tempfile
+import numpy as np
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "../embedding_workspace_calculator")
+)
+from cal_vocabulary_size_per_gpu_and_workspace_size_per_gpu import (
+    cal_workspace_size_per_gpu_from_vocabulary_size_per_gpu,
+)
 
-def usage():
-    print("Usage: python analyzer.py <path to directory>")
-    print("Directory must contain 'key' and 'slot_id' files created using LocalizedSlotEmbedding.")
-    quit()
+# key is long long, slot_id is size_t and emb_vector is float
+key_type = np.int64
+slot_type = np.int64
+emb_type = np.float32
 
 
-if len(sys.argv) != 2:
-    usage()
+class ModelFiles:
+    def __init__(self, model_dir: str):
+        self.model_dir = model_dir
+        self.key_path = os.path.join(model_dir, "key")
+        self.slot_path = os.path.join(model_dir, "slot_id")
+        self.emb_path = os.path.join(model_dir, "emb_vector")
+        if not os.path.exists(self.key_path):
+            raise RuntimeError("Directory {} must contain a 'key' file".format(model_dir))
+        key_size = os.path.getsize(self.key_path)
+        if key_size % 8 != 0:
+            raise RuntimeError("Size of the key file {} is not a multiple of 8".format(key_size))
+        self.num_keys = key_size // 8
 
-dir = sys.argv[1]
-if not exists(dir + "/key") or not exists(dir + "/slot_id"):
-    usage()
+        # DistributedSlotEmbedding does not save slot_id, all the keys are in slot 0
+        self.has_slot = os.path.exists(self.slot_path)
+        if self.has_slot and os.path.getsize(self.slot_path) != key_size:
+            raise RuntimeError("The slot_id file does not have the same length as the key file")
 
-print("Running analysis on model files in directory: " + dir)
+        self.has_emb = os.path.exists(self.emb_path) and self.num_keys > 0
+        self.ev_size = 0
+        if self.has_emb:
+            emb_size = os.path.getsize(self.emb_path)
+            if emb_size % (self.num_keys * 4) != 0:
+                raise RuntimeError(
+                    "Size of the emb_vector file {} is not a multiple of {} keys".format(
+                        emb_size, self.num_keys
+                    )
+                )
+            self.ev_size = emb_size // (self.num_keys * 4)
 
-keysize = getsize(dir + "/key")
-slotsize = getsize(dir + "/slot_id")
+    def keys(self):
+        return np.memmap(self.key_path, dtype=key_type, mode="r", shape=(self.num_keys,))
 
-keyfile = open(dir + "/key", "rb")
-slotfile = open(dir + "/slot_id", "rb")
+    def slots(self, begin: int, end: int):
+        if not self.has_slot:
+            return np.zeros(end - begin, dtype=slot_type)
+        slots = np.memmap(self.slot_path, dtype=slot_type, mode="r", shape=(self.num_keys,))
+        return np.asarray(slots[begin:end])
 
-slot_set = [set()]
+    def emb_vectors(self):
+        return np.memmap(
+            self.emb_path, dtype=emb_type, mode="r", shape=(self.num_keys, self.ev_size)
+        )
 
-readsize = 0
-while readsize < slotsize:
-    slotval = struct.unpack("q", slotfile.read(8))[0]
-    keyval = struct.unpack("q", keyfile.read(8))[0]
 
-    while len(slot_set) < slotval + 1:
-        slot_set.append(set())
+def grow(array: np.array, size: int, fill_value) -> np.array:
+    if array.size >= size:
+        return array
+    return np.concatenate([array, np.full(size - array.size, fill_value, dtype=array.dtype)])
 
-    slot_set[slotval].add(keyval)
-    readsize += 8
 
-print("Analysis complete. Total keys: " + str(int(keysize / 8)))
-print("Number of slots: " + str(len(slot_set)))
-print("Vocabulary size (unique keys) per slot:")
-for x in range(len(slot_set)):
-    print("Slot " + str(x) + ": " + str(len(slot_set[x])))
+class SlotStats:
+    """Per-slot statistics of a range of the model files, which can be merged"""
+
+    def __init__(self):
+        self.num_keys = np.zeros(0, dtype=np.int64)
+        self.min_key = np.zeros(0, dtype=np.int64)
+        self.max_key = np.zeros(0, dtype=np.int64)
+        self.norm_sum = np.zeros(0, dtype=np.float64)
+        self.norm_min = np.zeros(0, dtype=np.float64)
+        self.norm_max = np.zeros(0, dtype=np.float64)
+        self.zero_vectors = np.zeros(0, dtype=np.int64)
+        self.non_finite_vectors = np.zeros(0, dtype=np.int64)
+
+    def resize(self, num_slots: int) -> None:
+        self.num_keys = grow(self.num_keys, num_slots, 0)
+        self.min_key = grow(self.min_key, num_slots, np.iinfo(np.int64).max)
+        self.max_key = grow(self.max_key, num_slots, np.iinfo(np.int64).min)
+        self.norm_sum = grow(self.norm_sum, num_slots, 0)
+        self.norm_min = grow(self.norm_min, num_slots, np.inf)
+        self.norm_max = grow(self.norm_max, num_slots, 0)
+        self.zero_vectors = grow(self.zero_vectors, num_slots, 0)
+        self.non_finite_vectors = grow(self.non_finite_vectors, num_slots, 0)
+
+    def update(self, keys: np.array, slots: np.array, emb_vectors: np.array = None) -> None:
+        if slots.size == 0:
+            return
+        if slots.min() < 0:
+            raise RuntimeError("Invalid slot id {}".format(slots.min()))
+        num_slots = int(slots.max()) + 1
+        self.resize(num_slots)
+        self.num_keys[:num_slots] += np.bincount(slots, minlength=num_slots)
+        np.minimum.at(self.min_key, slots, keys)
+        np.maximum.at(self.max_key, slots, keys)
+        if emb_vectors is None:
+            return
+        norms = np.sqrt(np.einsum("ij,ij->i", emb_vectors, emb_vectors, dtype=np.float64))
+        non_finite = ~np.isfinite(norms)
+        self.non_finite_vectors[:num_slots] += np.bincount(slots[non_finite], minlength=num_slots)
+        self.zero_vectors[:num_slots] += np.bincount(slots[norms == 0], minlength=num_slots)
+        slots, norms = slots[~non_finite], norms[~non_finite]
+        self.norm_sum[:num_slots] += np.bincount(slots, weights=norms, minlength=num_slots)
+        np.minimum.at(self.norm_min, slots, norms)
+        np.maximum.at(self.norm_max, slots, norms)
+
+    def merge(self, other) -> None:
+        num_slots = max(self.num_keys.size, other.num_keys.size)
+        self.resize(num_slots)
+        other.resize(num_slots)
+        self.num_keys += other.num_keys
+        np.minimum(self.min_key, other.min_key, out=self.min_key)
+        np.maximum(self.max_key, other.max_key, out=self.max_key)
+        self.norm_sum += other.norm_sum
+        np.minimum(self.norm_min, other.norm_min, out=self.norm_min)
+        np.maximum(self.norm_max, other.norm_max, out=self.norm_max)
+        self.zero_vectors += other.zero_vectors
+        self.non_finite_vectors += other.non_finite_vectors
+
+
+def get_partition(keys: np.array, num_partitions: int) -> np.array:
+    # multiplicative hashing, so that keys with a common stride are spread evenly
+    with np.errstate(over="ignore"):
+        hashes = keys.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return ((hashes >> np.uint64(32)) % np.uint64(num_partitions)).astype(np.int64)
+
+
+def get_spill_path(spill_dir: str, partition: int, range_id: int) -> str:
+    return os.path.join(spill_dir, "partition{}_range{}".format(partition, range_id))
+
+
+def analyze_range(task):
+    """
+    Per-slot key counts, key ranges and embedding vector norms of a range of the keys. The keys
+    (and slot ids) of the range are also spilled into one file per hash partition, so the
+    distinct keys can be counted per partition without scanning the key file again
+    """
+    model_dir, range_id, begin, end, chunk_keys, spill_dir, num_partitions = task
+    model = ModelFiles(model_dir)
+    keys = model.keys()
+    emb_vectors = model.emb_vectors() if model.has_emb else None
+    stats = SlotStats()
+    spill_files = [
+        open(get_spill_path(spill_dir, partition, range_id), "wb")
+        for partition in range(num_partitions)
+    ]
+    try:
+        for chunk_begin in range(begin, end, chunk_keys):
+            chunk_end = min(chunk_begin + chunk_keys, end)
+            chunk_keys_array = np.asarray(keys[chunk_begin:chunk_end])
+            chunk_slots = model.slots(chunk_begin, chunk_end)
+            stats.update(
+                chunk_keys_array,
+                chunk_slots,
+                None if emb_vectors is None else np.asarray(emb_vectors[chunk_begin:chunk_end]),
+            )
+            records = chunk_keys_array
+            if model.has_slot:
+                records = np.column_stack((chunk_keys_array, chunk_slots))
+            partitions = get_partition(chunk_keys_array, num_partitions)
+            order = np.argsort(partitions, kind="stable")
+            bounds = np.cumsum(np.bincount(partitions, minlength=num_partitions))
+            for partition, records_of_partition in enumerate(np.split(records[order], bounds[:-1])):
+                records_of_partition.tofile(spill_files[partition])
+    finally:
+        for spill_file in spill_files:
+            spill_file.close()
+    return stats
+
+
+def analyze_partition(task):
+    """
+    Distinct keys of a hash partition of the keys, read from the spill files written by
+    analyze_range, so a worker only reads and holds its own partition
+    """
+    spill_dir, partition, num_ranges, has_slot = task
+    records = np.concatenate(
+        [
+            np.fromfile(get_spill_path(spill_dir, partition, range_id), dtype=key_type)
+            for range_id in range(num_ranges)
+        ]
+    )
+    if has_slot:
+        records = records.reshape(-1, 2)
+        partition_keys, partition_slots = records[:, 0], records[:, 1]
+    else:
+        partition_keys, partition_slots = records, np.zeros(records.size, dtype=slot_type)
+    if partition_keys.size == 0:
+        return 0, 0, np.zeros(0, dtype=np.int64)
+
+    order = np.lexsort((partition_slots, partition_keys))
+    partition_keys, partition_slots = partition_keys[order], partition_slots[order]
+    new_key = np.concatenate([[True], partition_keys[1:] != partition_keys[:-1]])
+    new_pair = new_key | np.concatenate([[True], partition_slots[1:] != partition_slots[:-1]])
+    vocabulary_sizes = np.bincount(partition_slots[new_pair])
+    return int(new_key.sum()), int(new_pair.sum()), vocabulary_sizes
+
+
+def analyze_model(
+    model_dir: str, num_workers: int = 1, chunk_keys: int = 1 << 20, spill_dir: str = None
+) -> dict:
+    model = ModelFiles(model_dir)
+    if model.num_keys == 0:
+        # np.memmap cannot map the empty files of an empty snapshot
+        return get_report(model, SlotStats(), 0, 0, np.zeros(0, dtype=np.int64))
+
+    num_tasks = max(1, min(num_workers, math.ceil(model.num_keys / chunk_keys)))
+    bounds = [model.num_keys * i // num_tasks for i in range(num_tasks + 1)]
+
+    stats = SlotStats()
+    distinct_keys, distinct_slot_keys = 0, 0
+    vocabulary_sizes = np.zeros(0, dtype=np.int64)
+    with tempfile.TemporaryDirectory(dir=spill_dir) as task_spill_dir:
+        range_tasks = [
+            (model_dir, range_id, begin, end, chunk_keys, task_spill_dir, num_tasks)
+            for range_id, (begin, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+        ]
+        partition_tasks = [
+            (task_spill_dir, partition, num_tasks, model.has_slot) for partition in range(num_tasks)
+        ]
+        with multiprocessing.Pool(num_tasks) as pool:
+            for range_stats in pool.imap_unordered(analyze_range, range_tasks):
+                stats.merge(range_stats)
+            for num_keys, num_pairs, sizes in pool.imap_unordered(
+                analyze_partition, partition_tasks
+            ):
+                distinct_keys += num_keys
+                distinct_slot_keys += num_pairs
+                vocabulary_sizes = grow(vocabulary_sizes, sizes.size, 0)
+                vocabulary_sizes[: sizes.size] += sizes
+    return get_report(model, stats, distinct_keys, distinct_slot_keys, vocabulary_sizes)
+
+
+def get_report(
+    model: ModelFiles,
+    stats: SlotStats,
+    distinct_keys: int,
+    distinct_slot_keys: int,
+    vocabulary_sizes: np.array,
+) -> dict:
+    vocabulary_sizes = grow(vocabulary_sizes, stats.num_keys.size, 0)
+
+    slots = []
+    for slot_id in range(stats.num_keys.size):
+        num_keys = int(stats.num_keys[slot_id])
+        if num_keys == 0:
+            continue
+        slot = {
+            "slot_id": slot_id,
+            "num_keys": num_keys,
+            "vocabulary_size": int(vocabulary_sizes[slot_id]),
+            "duplicate_keys": num_keys - int(vocabulary_sizes[slot_id]),
+            "min_key": int(stats.min_key[slot_id]),
+            "max_key": int(stats.max_key[slot_id]),
+        }
+        if model.has_emb:
+            num_finite = num_keys - int(stats.non_finite_vectors[slot_id])
+            slot.update(
+                {
+                    "embedding_size_in_bytes": num_keys * model.ev_size * 4,
+                    "zero_vectors": int(stats.zero_vectors[slot_id]),
+                    "non_finite_vectors": int(stats.non_finite_vectors[slot_id]),
+                    "mean_norm": float(stats.norm_sum[slot_id] / num_finite) if num_finite else 0,
+                    "min_norm": float(stats.norm_min[slot_id]) if num_finite else 0,
+                    "max_norm": float(stats.norm_max[slot_id]) if num_finite else 0,
+                }
+            )
+        slots.append(slot)
+
+    return {
+        "model_dir": model.model_dir,
+        "num_keys": model.num_keys,
+        "distinct_keys": distinct_keys,
+        "duplicate_keys": model.num_keys - distinct_keys,
+        # the same key saved in more than one slot
+        "keys_in_multiple_slots": distinct_slot_keys - distinct_keys,
+        "num_slots": len(slots),
+        "has_slot_id": model.has_slot,
+        "embedding_vec_size": model.ev_size,
+        "embedding_size_in_bytes": model.num_keys * model.ev_size * 4,
+        "slots": slots,
+    }
+
+
+def add_sizing(report: dict, num_gpus: int, optimizer: str, optimizer_update_type: str) -> None:
+    """The workspace_size_per_gpu_in_mb of the embedding and the HPS cache size of the model"""
+    ev_size = report["embedding_vec_size"]
+    # the slots of LocalizedSlotEmbedding are placed on the GPUs round robin by slot id, the
+    # slots without keys are not in the report
+    num_slots = max([slot["slot_id"] + 1 for slot in report["slots"]], default=0)
+    vocabulary_sizes = np.zeros(num_slots, dtype=np.int64)
+    for slot in report["slots"]:
+        vocabulary_sizes[slot["slot_id"]] = slot["vocabulary_size"]
+    vocabulary_size_per_gpu = (
+        max(int(vocabulary_sizes[i::num_gpus].sum()) for i in range(num_gpus))
+        if report["has_slot_id"]
+        else math.ceil(report["distinct_keys"] / num_gpus)
+    )
+    report["sizing"] = {
+        "num_gpus": num_gpus,
+        "optimizer": optimizer,
+        "optimizer_update_type": optimizer_update_type,
+        "vocabulary_size_per_gpu": vocabulary_size_per_gpu,
+        "workspace_size_per_gpu_in_mb": cal_workspace_size_per_gpu_from_vocabulary_size_per_gpu(
+            vocabulary_size_per_gpu, ev_size, num_gpus, optimizer, optimizer_update_type
+        ),
+        # size of the embedding table cached in HPS, multiply it by gpucacheper for the GPU cache
+        "hps_embedding_table_size_in_mb": math.ceil(
+            report["distinct_keys"] * ev_size * 4 / (1024 * 1024)
+        ),
+    }
+
+
+def print_report(report: dict) -> None:
+    print("Analysis complete. Total keys: " + str(report["num_keys"]))
+    print(
+        "Distinct keys: {}, duplicate keys: {}".format(
+            report["distinct_keys"], report["duplicate_keys"]
+        )
+    )
+    if report["keys_in_multiple_slots"] > 0:
+        print("Keys in multiple slots: " + str(report["keys_in_multiple_slots"]))
+    print("Embedding vector size: " + str(report["embedding_vec_size"]))
+    print("Number of slots: " + str(report["num_slots"]))
+    print("Vocabulary size (unique keys) per slot:")
+    for slot in report["slots"]:
+        line = "Slot {}: {}, key range [{}, {}]".format(
+            slot["slot_id"], slot["vocabulary_size"], slot["min_key"], slot["max_key"]
+        )
+        if "mean_norm" in slot:
+            line += ", mean norm {:.4f}, zero vectors {}, non-finite vectors {}".format(
+                slot["mean_norm"], slot["zero_vectors"], slot["non_finite_vectors"]
+            )
+        print(line)
+    if "sizing" in report:
+        for key, value in report["sizing"].items():
+            print("{}: {}".format(key, value))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Statistics of the sparse model files (key, slot_id and emb_vector)"
+    )
+    parser.add_argument("model_dir", type=str, help="Directory of the sparse model files")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--chunk_keys", type=int, default=1 << 20, help="Number of keys processed at a time"
+    )
+    parser.add_argument(
+        "--spill_dir",
+        type=str,
+        default=None,
+        help="Directory of the temporary files of the keys bucketed by hash partition",
+    )
+    parser.add_argument("--json", type=str, default=None, help="Save the report as json")
+    parser.add_argument(
+        "--num_gpus", type=int, default=None, help="Estimate the workspace size for the GPUs"
+    )
+    parser.add_argument(
+        "--optimizer",
+        type=str,
+        choices=["adam", "adagrad", "momentumsgd", "nesterov", "sgd"],
+        default="adam",
+    )
+    parser.add_argument(
+        "--optimizer_update_type",
+        type=str,
+        choices=["local", "global", "lazy_global"],
+        default="global",
+    )
+    args = parser.parse_args()
+
+    print("Running analysis on model files in directory: " + args.model_dir)
+    report = analyze_model(args.model_dir, args.num_workers, args.chunk_keys, args.spill_dir)
+    if args.num_gpus is not None:
+        add_sizing(report, args.num_gpus, args.optimizer, args.optimizer_update_type)
+    print_report(report)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,63 @@
+"""
+ Copyright (c) 2023, NVIDIA CORPORATION.
+ 
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from analyzer import add_sizing, analyze_model, emb_type, key_type, slot_type
+
+
+def save_model(model_dir, keys, slots, emb_vectors):
+    np.asarray(keys, dtype=key_type).tofile(os.path.join(model_dir, "key"))
+    np.asarray(slots, dtype=slot_type).tofile(os.path.join(model_dir, "slot_id"))
+    np.asarray(emb_vectors, dtype=emb_type).tofile(os.path.join(model_dir, "emb_vector"))
+
+
+class TestAnalyzer(unittest.TestCase):
+    def test_empty_model(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            save_model(model_dir, [], [], [])
+            report = analyze_model(model_dir, num_workers=2)
+            add_sizing(report, 2, "adam", "global")
+        self.assertEqual(report["num_keys"], 0)
+        self.assertEqual(report["distinct_keys"], 0)
+        self.assertEqual(report["num_slots"], 0)
+        self.assertEqual(report["slots"], [])
+        self.assertEqual(report["sizing"]["vocabulary_size_per_gpu"], 0)
+
+    def test_model(self):
+        keys = [1, 2, 3, 2, 7, 7, 3]
+        slots = [0, 0, 0, 0, 1, 1, 1]
+        emb_vectors = np.ones((len(keys), 4))
+        emb_vectors[0] = 0
+        with tempfile.TemporaryDirectory() as model_dir:
+            save_model(model_dir, keys, slots, emb_vectors)
+            report = analyze_model(model_dir, num_workers=2, chunk_keys=2)
+        self.assertEqual(report["num_keys"], 7)
+        self.assertEqual(report["distinct_keys"], 4)
+        self.assertEqual(report["keys_in_multiple_slots"], 1)
+        self.assertEqual(report["embedding_vec_size"], 4)
+        self.assertEqual([slot["vocabulary_size"] for slot in report["slots"]], [3, 2])
+        self.assertEqual(report["slots"][0]["zero_vectors"], 1)
+        self.assertEqual(report["slots"][1]["min_key"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()